@@ -0,0 +1,116 @@
+"""
+Admin endpoints for usage and cost reporting.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from Backend.app.db.database import get_db
+from Backend.app.models.usage import MessageUsage, UsageDaily
+from Backend.app.models.user import User
+from Backend.app.core.security import get_admin_user
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+MAX_USAGE_RANGE_DAYS = 366
+
+
+class UsageRow(BaseModel):
+    """Aggregated usage for one day or one user."""
+    day: Optional[date] = None
+    user_id: Optional[UUID] = None
+    messages: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    embedding_tokens: int
+    rerank_tokens: int
+    avg_generation_ms: float
+
+
+class MessageUsageResponse(BaseModel):
+    """Usage recorded for one assistant message."""
+    message_id: UUID
+    user_id: UUID
+    model: Optional[str] = None
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    embedding_tokens: int
+    rerank_tokens: int
+    latencies_ms: Optional[dict] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+@router.get("/usage", response_model=List[UsageRow])
+def get_usage(
+    start: Optional[date] = Query(None, description="First day (UTC), defaults to 30 days ago"),
+    end: Optional[date] = Query(None, description="Last day (UTC), defaults to today"),
+    user_id: Optional[UUID] = Query(None, description="Restrict to one user"),
+    group_by: Literal["day", "user"] = "day",
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_admin_user)
+):
+    """
+    Token usage from the daily rollups, grouped by day or by user.
+
+    Reads only usage_daily (one row per user and day, indexed by day), so the
+    cost does not grow with the number of messages. Rollups are flushed every
+    USAGE_FLUSH_SECONDS, so the current day may lag slightly.
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days >= MAX_USAGE_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Invalid range (max {MAX_USAGE_RANGE_DAYS} days)")
+
+    group_column = UsageDaily.day if group_by == "day" else UsageDaily.user_id
+    messages = func.sum(UsageDaily.messages)
+    query = (
+        db.query(
+            group_column.label("day" if group_by == "day" else "user_id"),
+            messages.label("messages"),
+            func.sum(UsageDaily.prompt_tokens).label("prompt_tokens"),
+            func.sum(UsageDaily.completion_tokens).label("completion_tokens"),
+            func.sum(UsageDaily.cached_tokens).label("cached_tokens"),
+            func.sum(UsageDaily.embedding_tokens).label("embedding_tokens"),
+            func.sum(UsageDaily.rerank_tokens).label("rerank_tokens"),
+            (func.sum(UsageDaily.generation_ms) / func.nullif(messages, 0)).label("avg_generation_ms"),
+        )
+        .filter(UsageDaily.day >= start, UsageDaily.day <= end)
+    )
+    if user_id is not None:
+        query = query.filter(UsageDaily.user_id == user_id)
+    if group_by == "day":
+        query = query.group_by(UsageDaily.day).order_by(UsageDaily.day)
+    else:
+        # Heaviest users first
+        query = query.group_by(UsageDaily.user_id).order_by(
+            (func.sum(UsageDaily.prompt_tokens) + func.sum(UsageDaily.completion_tokens)).desc()
+        )
+
+    return [
+        UsageRow(**{**row._asdict(), "avg_generation_ms": round(row.avg_generation_ms or 0.0, 1)})
+        for row in query.limit(limit).all()
+    ]
+
+
+@router.get("/usage/messages/{message_id}", response_model=MessageUsageResponse)
+def get_message_usage(
+    message_id: UUID,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_admin_user)
+):
+    """Tokens and stage latencies recorded for one assistant message."""
+    usage = db.query(MessageUsage).filter(MessageUsage.message_id == message_id).first()
+    if not usage:
+        raise HTTPException(status_code=404, detail="No usage recorded for this message")
+    return usage
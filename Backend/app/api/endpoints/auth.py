@@ -2,8 +2,12 @@
 Authentication endpoints for user registration and login.
 """
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Awaitable, Optional, Tuple, TypeVar
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from Backend.app.db.database import get_db
 from Backend.app.models.user import User
@@ -18,33 +22,69 @@ from Backend.app.schemas.auth import (
     ResendVerificationRequest,
 )
 from Backend.app.core.security import (
-    hash_password,
-    verify_password,
-    create_access_token,
+    create_user_token,
     get_current_user,
 )
 from Backend.app.core.config import settings
+from Backend.app.core.dependencies import throttle_login
 from Backend.app.services.user_service import get_user_message_limit
 from Backend.app.services.email_service import email_service
+from Backend.app.services.email_outbox import email_outbox, enqueue_verification_email
+from Backend.app.services.google_auth import GoogleCredentialError, resolve_google_identity
+from Backend.app.services.password_hasher import PasswordHasherBusy, password_hasher
+from Backend.app.services.token_cache import get_token_version, revoke_user_tokens
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+T = TypeVar("T")
+
+
+async def password_job(job: Awaitable[T]) -> T:
+    """Await a password hash/verify, mapping a full hash queue to 503."""
+    try:
+        return await job
+    except PasswordHasherBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def find_user_by_email(db: Session, email: str):
+    """
+    Look up a user and end the read transaction.
+
+    The user is detached with its loaded columns and the connection goes back
+    to the pool, so it is not held while the request waits for bcrypt.
+    """
+    user = db.query(User).filter(User.email == email).first()
+    if user is not None:
+        db.expunge(user)
+    db.rollback()
+    return user
+
 
 @router.post("/register", response_model=RegisterResponse)
-def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     """
     Register a new user.
     
-    Creates a new user account and sends verification email.
+    Creates a new user account and queues the verification email on the
+    outbox. The password is hashed on the bcrypt pool and database calls run
+    in the threadpool, so the request never holds a threadpool slot while
+    bcrypt runs.
     """
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == request.email).first()
+    existing_user = await run_in_threadpool(find_user_by_email, db, request.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
+    password_hash = await password_job(password_hasher.hash(request.password))
+    
     # Generate verification token
     verification_token = email_service.generate_verification_token()
     token_expiry = email_service.get_token_expiry()
@@ -52,24 +92,23 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
     # Create new user (unverified)
     user = User(
         email=request.email,
-        password_hash=hash_password(request.password),
+        password_hash=password_hash,
         full_name=request.full_name,
         is_email_verified=False,
         email_verification_token=verification_token,
         email_verification_expires_at=token_expiry,
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    
-    # Send verification email
-    email_sent = email_service.send_verification_email(
-        to_email=request.email,
-        token=verification_token,
-        user_name=request.full_name
-    )
+
+    def save_user() -> None:
+        # The verification email commits with the user; the outbox worker sends it
+        db.add(user)
+        enqueue_verification_email(db, request.email, verification_token, request.full_name)
+        db.commit()
+
+    await run_in_threadpool(save_user)
+    email_outbox.notify()
     
-    if not email_sent:
+    if not email_service.is_configured():
         # Still create account, but warn about email
         return RegisterResponse(
             message="Account created. Email service unavailable - contact support for verification.",
@@ -140,40 +179,47 @@ def resend_verification(request: ResendVerificationRequest, db: Session = Depend
     
     user.email_verification_token = verification_token
     user.email_verification_expires_at = token_expiry
+    enqueue_verification_email(db, request.email, verification_token, user.full_name)
     db.commit()
-    
-    # Send email
-    email_service.send_verification_email(
-        to_email=request.email,
-        token=verification_token,
-        user_name=user.full_name
-    )
+    email_outbox.notify()
     
     return {"message": "If this email is registered, a verification link has been sent."}
 
 
-@router.post("/login", response_model=TokenResponse)
-def login(request: LoginRequest, db: Session = Depends(get_db)):
+@router.post("/login", response_model=TokenResponse, dependencies=[Depends(throttle_login)])
+async def login(request: LoginRequest, db: Session = Depends(get_db)):
     """
     Login with email and password.
     
-    Validates credentials and returns an access token.
+    Validates credentials and returns an access token. Attempts are limited
+    per client IP, the password is verified on the bcrypt pool, and a hash
+    made with another cost than BCRYPT_ROUNDS is replaced on success.
     """
     # Find user
-    user = db.query(User).filter(User.email == request.email).first()
-    if not user:
+    user = await run_in_threadpool(find_user_by_email, db, request.email)
+    if not user or not user.password_hash:
+        # No password set for Google-only accounts
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
     # Verify password
-    if not verify_password(request.password, user.password_hash):
+    valid, new_hash = await password_job(password_hasher.verify(request.password, user.password_hash))
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
+    if new_hash:
+        # Transparent upgrade to the configured bcrypt cost
+        def store_hash() -> None:
+            db.query(User).filter(User.id == user.id).update({User.password_hash: new_hash})
+            db.commit()
+
+        await run_in_threadpool(store_hash)
+    
     # Check if user is active
     if not user.is_active:
         raise HTTPException(
@@ -189,9 +235,8 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
         )
     
     # Create access token
-    access_token = create_access_token(
-        data={"sub": str(user.id), "email": user.email}
-    )
+    token_version = await run_in_threadpool(get_token_version, db, user.id)
+    access_token = create_user_token(user, token_version)
     
     return TokenResponse(
         access_token=access_token,
@@ -222,89 +267,105 @@ def get_me(current_user: User = Depends(get_current_user)):
     )
 
 
+@router.post("/logout-all")
+def logout_all(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Sign out of every session.
+    
+    Revokes all access tokens issued to the user so far, including the one
+    used for this request. Other worker processes honour the revocation
+    within TOKEN_VERSION_TTL_SECONDS.
+    """
+    revoke_user_tokens(db, current_user.id)
+    return {"message": "Signed out of all sessions"}
+
+
+def upsert_google_user(db: Session, google_id: str, email: str, full_name: Optional[str]) -> Tuple[User, int]:
+    """
+    Find or create the user of a Google identity.
+    
+    Returns:
+        (the user, detached from the session, and its current token version)
+    """
+    # Find existing user by google_id or email
+    user = db.query(User).filter(
+        (User.google_id == google_id) | (User.email == email)
+    ).first()
+    
+    if user:
+        # Update google_id if user exists but logged in with email before
+        if not user.google_id:
+            user.google_id = google_id
+        # Google OAuth users are automatically verified
+        if not user.is_email_verified:
+            user.is_email_verified = True
+        db.commit()
+    else:
+        # Create new user (Google OAuth users are auto-verified)
+        user = User(
+            email=email,
+            google_id=google_id,
+            full_name=full_name,
+            password_hash=None,  # No password for OAuth users
+            is_email_verified=True,  # Auto-verified for OAuth
+        )
+        db.add(user)
+        db.commit()
+    db.refresh(user)
+    token_version = get_token_version(db, user.id)
+    db.expunge(user)
+    db.rollback()
+    return user, token_version
+
+
 @router.post("/google", response_model=TokenResponse)
-def google_auth(request: GoogleAuthRequest, db: Session = Depends(get_db)):
+async def google_auth(request: GoogleAuthRequest, db: Session = Depends(get_db)):
     """
     Authenticate with Google OAuth.
     
-    Accepts Google access token, fetches user info, creates user if not exists, and returns JWT.
+    Accepts a Google ID token (verified locally against Google's cached
+    signing keys) or an access token (resolved via userinfo on the shared
+    HTTP client), creates the user if needed, and returns a JWT.
     Google OAuth users are automatically verified.
     """
-    import httpx
-    
     try:
-        # Verify access token by calling Google's userinfo endpoint
-        with httpx.Client() as client:
-            response = client.get(
-                "https://www.googleapis.com/oauth2/v3/userinfo",
-                headers={"Authorization": f"Bearer {request.credential}"}
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid Google token"
-                )
-            
-            userinfo = response.json()
-        
-        # Get user info from response
-        google_id = userinfo.get("sub")
-        email = userinfo.get("email")
-        full_name = userinfo.get("name")
-        
-        if not email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email not provided by Google"
-            )
-        
-        # Find existing user by google_id or email
-        user = db.query(User).filter(
-            (User.google_id == google_id) | (User.email == email)
-        ).first()
-        
-        if user:
-            # Update google_id if user exists but logged in with email before
-            if not user.google_id:
-                user.google_id = google_id
-            # Google OAuth users are automatically verified
-            if not user.is_email_verified:
-                user.is_email_verified = True
-            db.commit()
-        else:
-            # Create new user (Google OAuth users are auto-verified)
-            user = User(
-                email=email,
-                google_id=google_id,
-                full_name=full_name,
-                password_hash=None,  # No password for OAuth users
-                is_email_verified=True,  # Auto-verified for OAuth
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        
-        # Check if user is active
-        if not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="User account is deactivated"
-            )
-        
-        # Create access token
-        access_token = create_access_token(
-            data={"sub": str(user.id), "email": user.email}
-        )
-        
-        return TokenResponse(
-            access_token=access_token,
-            token_type="bearer",
-            expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        userinfo = await resolve_google_identity(request.credential)
+    except GoogleCredentialError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
         )
-        
     except httpx.HTTPError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Failed to verify Google token: {str(e)}"
         )
+    
+    # Get user info from the verified claims
+    google_id = userinfo.get("sub")
+    email = userinfo.get("email")
+    full_name = userinfo.get("name")
+    
+    if not email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email not provided by Google"
+        )
+    
+    user, token_version = await run_in_threadpool(upsert_google_user, db, google_id, email, full_name)
+    
+    # Check if user is active
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User account is deactivated"
+        )
+    
+    # Create access token
+    access_token = create_user_token(user, token_version)
+    
+    return TokenResponse(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
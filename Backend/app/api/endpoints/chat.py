@@ -4,13 +4,13 @@ Handles message streaming with subscription limits.
 """
 import logging
 from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from sqlalchemy.orm import Session
 
 from Backend.app.core.security import get_current_user
 from Backend.app.core.config import settings
+from Backend.app.core.dependencies import admit_generation, wants_queue_events
 from Backend.app.models.user import User
 from Backend.app.db.database import get_db
 from Backend.app.services.user_service import (
@@ -19,6 +19,8 @@ from Backend.app.services.user_service import (
     increment_message_count,
     decrement_message_count,
 )
+from Backend.app.services.generation_scheduler import ScheduledStreamingResponse, SchedulerFull, scheduled_stream
+from Backend.app.services.usage_service import UsageRecord, record_answer_usage
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +44,7 @@ async def chat_endpoint(
     Chat endpoint protected by JWT Auth.
     Streams the response from the RAG service.
     Enforces message limits based on subscription plan.
+    Generation slots are admitted by tier; when overloaded returns 503 with Retry-After.
     """
     # Re-query user from database to ensure we have a fresh, session-attached object
     user = db.query(User).filter(User.id == current_user.id).first()
@@ -61,27 +64,48 @@ async def chat_endpoint(
     if not rag_service:
         raise HTTPException(status_code=500, detail="RAG Service not initialized")
 
+    # Reserve a generation slot (or queue position) before charging the message
+    ticket = admit_generation(user.subscription_tier)
+    
     # Increment message count BEFORE starting the stream
-    user = increment_message_count(user, db)
+    try:
+        user = increment_message_count(user, db)
+    except Exception:
+        ticket.release()
+        raise
+    
+    usage = UsageRecord()
     
     try:
         async def generate():
             try:
                 # Use stream_chat_with_context - fixed method name
-                for chunk in rag_service.stream_chat_with_context(
-                    context_messages=[],  # No history for direct chat endpoint
-                    question=chat_request.message, 
-                    filters=chat_request.filters
+                async for chunk in scheduled_stream(
+                    ticket,
+                    lambda: rag_service.stream_chat_with_context(
+                        context_messages=[],  # No history for direct chat endpoint
+                        question=chat_request.message, 
+                        filters=chat_request.filters,
+                        tier=user.subscription_tier,
+                        usage=usage
+                    ),
+                    queue_events=wants_queue_events(request)
                 ):
                     yield chunk
+            except SchedulerFull as e:
+                # Shed while queued: don't charge the message
+                decrement_message_count(user, db)
+                yield f"Error: {str(e)}"
             except Exception as e:
                 logger.error(f"Error in chat streaming: {e}")
                 yield f"Error: {str(e)}"
+            record_answer_usage(user.id, usage)
         
-        return StreamingResponse(generate(), media_type="text/plain")
+        return ScheduledStreamingResponse(generate(), ticket, media_type="text/plain")
 
     except Exception as e:
         # Rollback message count on error
+        ticket.release()
         decrement_message_count(user, db)
         logger.error(f"Chat endpoint error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -4,7 +4,6 @@ Handles CRUD operations and message streaming with context.
 """
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
 from uuid import UUID
@@ -18,12 +17,21 @@ from Backend.app.schemas.chat import (
     ConversationDetailResponse,
     MessageCreate,
 )
-from Backend.app.core.security import get_current_user
+from Backend.app.core.security import Principal, get_current_principal, get_current_user
+from Backend.app.core.dependencies import admit_generation, wants_queue_events
 from Backend.app.services.user_service import (
     check_and_reset_message_count,
     check_message_limit,
+    decrement_message_count,
     increment_message_count,
 )
+from Backend.app.services.generation_scheduler import (
+    GUEST_TIER,
+    ScheduledStreamingResponse,
+    SchedulerFull,
+    scheduled_stream,
+)
+from Backend.app.services.usage_service import UsageRecord, record_answer_usage, save_message_usage
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +41,7 @@ router = APIRouter(prefix="/conversations", tags=["Conversations"])
 @router.get("", response_model=List[ConversationResponse])
 def list_conversations(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """List all conversations for the current user."""
     conversations = (
@@ -66,7 +74,7 @@ def create_conversation(
 def get_conversation(
     conversation_id: UUID,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get a conversation with all messages."""
     conversation = (
@@ -108,6 +116,7 @@ async def send_guest_message(
     """
     Send a message as a guest (one-time use).
     Does not save conversation to DB and returns streaming response directly.
+    Guests have the lowest generation priority and are shed first (503).
     """
     # Get RAG service
     rag_service = getattr(request.app.state, "rag_service", None)
@@ -117,18 +126,26 @@ async def send_guest_message(
     # Prepare filters for RAG
     filters = {}
     if data.filters:
-        for key in ["discipline", "grade", "publisher"]:
+        for key in ["discipline", "grade", "publisher", "model"]:
             if data.filters.get(key):
                 filters[key] = data.filters[key]
     
+    usage = UsageRecord()
+    
     # Generate and stream response
     async def generate():
         try:
             # Guest chat has no history context
-            for chunk in rag_service.stream_chat_with_context(
-                [],  # Empty context messages
-                data.message, 
-                filters
+            async for chunk in scheduled_stream(
+                ticket,
+                lambda: rag_service.stream_chat_with_context(
+                    [],  # Empty context messages
+                    data.message, 
+                    filters,
+                    tier=GUEST_TIER,
+                    usage=usage
+                ),
+                queue_events=wants_queue_events(request)
             ):
                 if isinstance(chunk, dict):
                     text = chunk.get("response", "")
@@ -139,8 +156,12 @@ async def send_guest_message(
             error_msg = f"Error generating response: {str(e)}"
             logger.error(error_msg)
             yield error_msg
-            
-    return StreamingResponse(generate(), media_type="text/plain")
+        record_answer_usage(None, usage)
+    
+    # Admitted last: nothing may fail between taking the slot and the response
+    # that releases it
+    ticket = admit_generation(GUEST_TIER)
+    return ScheduledStreamingResponse(generate(), ticket, media_type="text/plain")
 
 
 @router.post("/{conversation_id}/messages")
@@ -174,59 +195,75 @@ async def send_message(
     if not within_limit:
         raise HTTPException(status_code=429, detail=error_message)
     
-    # Increment message count
-    user = increment_message_count(user, db)
-    
     # Get RAG service
     rag_service = getattr(request.app.state, "rag_service", None)
     if not rag_service:
         raise HTTPException(status_code=500, detail="RAG Service not initialized")
     
-    # Get previous messages for context
-    previous_messages = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
-        .all()
-    )
+    # Reserve a generation slot (or queue position) before charging the message
+    ticket = admit_generation(user.subscription_tier)
     
-    # Build context from previous messages (last 10)
-    context_messages = [
-        {"role": msg.role, "content": msg.content}
-        for msg in previous_messages[-10:]
-    ]
+    try:
+        # Increment message count
+        user = increment_message_count(user, db)
     
-    # Save user message
-    user_message = Message(
-        conversation_id=conversation_id,
-        role="user",
-        content=data.message,
-        filters=data.filters
-    )
-    db.add(user_message)
+        # Get previous messages for context
+        previous_messages = (
+            db.query(Message)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at)
+            .all()
+        )
     
-    # Update conversation title if first message
-    if not previous_messages:
-        # Use first 50 chars of message as title
-        conversation.title = data.message[:50] + ("..." if len(data.message) > 50 else "")
+        # Build context from previous messages (last 10)
+        context_messages = [
+            {"role": msg.role, "content": msg.content}
+            for msg in previous_messages[-10:]
+        ]
     
-    db.commit()
+        # Save user message
+        user_message = Message(
+            conversation_id=conversation_id,
+            role="user",
+            content=data.message,
+            filters=data.filters
+        )
+        db.add(user_message)
+    
+        # Update conversation title if first message
+        if not previous_messages:
+            # Use first 50 chars of message as title
+            conversation.title = data.message[:50] + ("..." if len(data.message) > 50 else "")
+    
+        db.commit()
+    except Exception:
+        # No response will be sent to release the slot
+        ticket.release()
+        raise
     
     # Prepare filters for RAG
     filters = {}
     if data.filters:
-        for key in ["discipline", "grade", "publisher"]:
+        for key in ["discipline", "grade", "publisher", "model"]:
             if data.filters.get(key):
                 filters[key] = data.filters[key]
     
+    usage = UsageRecord()
+    
     # Generate and stream response
     async def generate():
         full_response = ""
         try:
-            for chunk in rag_service.stream_chat_with_context(
-                context_messages, 
-                data.message, 
-                filters
+            async for chunk in scheduled_stream(
+                ticket,
+                lambda: rag_service.stream_chat_with_context(
+                    context_messages, 
+                    data.message, 
+                    filters,
+                    tier=user.subscription_tier,
+                    usage=usage
+                ),
+                queue_events=wants_queue_events(request)
             ):
                 if isinstance(chunk, dict):
                     # Chain returns dict with 'response' key
@@ -235,6 +272,11 @@ async def send_message(
                     text = str(chunk)
                 full_response += text
                 yield text
+        except SchedulerFull as e:
+            # Shed while queued: don't charge the message
+            decrement_message_count(user, db)
+            full_response = f"Error generating response: {str(e)}"
+            yield full_response
         except Exception as e:
             error_msg = f"Error generating response: {str(e)}"
             logger.error(error_msg)
@@ -250,8 +292,11 @@ async def send_message(
                 filters=data.filters
             )
             db.add(assistant_message)
+            db.flush()
+            save_message_usage(db, assistant_message.id, user.id, usage)
             db.commit()
         except Exception as e:
             logger.error(f"Error saving assistant message: {e}")
+        record_answer_usage(user.id, usage)
     
-    return StreamingResponse(generate(), media_type="text/plain")
+    return ScheduledStreamingResponse(generate(), ticket, media_type="text/plain")
@@ -2,6 +2,7 @@
 Payment endpoints for Telegram Stars payment integration.
 """
 import logging
+import time
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -11,9 +12,10 @@ from datetime import datetime, timezone
 from Backend.app.db.database import get_db
 from Backend.app.models.user import User
 from Backend.app.models.payment import Payment
-from Backend.app.core.security import get_current_user
+from Backend.app.core.security import Principal, get_current_principal, get_current_user
 from Backend.app.core.config import settings
 from Backend.app.services.telegram_bot import telegram_bot_service, get_payment_link
+from Backend.app.services.telegram_updates import UpdateQueueFull, telegram_updates, update_received_at
 
 logger = logging.getLogger(__name__)
 
@@ -80,7 +82,7 @@ def get_payment_link_endpoint(
 @router.get("/status", response_model=PaymentStatusResponse)
 def get_payment_status(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Get payment status for the current user.
@@ -118,15 +120,31 @@ async def telegram_webhook(request: Request):
     
     This endpoint processes updates from Telegram including
     payment confirmations, pre-checkout queries, and commands.
+    With TELEGRAM_WEBHOOK_ASYNC the update is recorded (redeliveries of an
+    update_id are ignored) and acknowledged at once; the update queue
+    workers run the handlers.
     """
+    received_at = time.time()
     try:
         update_data = await request.json()
         logger.info(f"Received Telegram update: {update_data.get('update_id')}")
         
-        # Process the update
-        await telegram_bot_service.process_update(update_data)
+        if telegram_updates.running:
+            await telegram_updates.submit(update_data)
+            return WebhookResponse(ok=True)
+        
+        # Process the update inline
+        token = update_received_at.set(received_at)
+        try:
+            await telegram_bot_service.process_update(update_data)
+        finally:
+            update_received_at.reset(token)
         
         return WebhookResponse(ok=True)
+    
+    except UpdateQueueFull:
+        # Telegram redelivers updates that were not acknowledged
+        raise HTTPException(status_code=503, detail="Update queue is full")
         
     except Exception as e:
         logger.error(f"Webhook processing error: {e}")
@@ -49,7 +49,169 @@ class Settings(BaseSettings):
     QDRANT_URL: str = Field(default="", description="Qdrant URL")
     VOYAGE_API: str = Field(default="", description="Voyage AI API key")
     COLLECTION_NAME: str = "JauapAI_2"
+    COLLECTION_ALIAS: str = Field(
+        default="",
+        description="Alias switched to each versioned build; queried instead of COLLECTION_NAME when set"
+    )
+    ALIAS_CHECK_INTERVAL_SECONDS: int = Field(default=30, ge=1, description="How often to detect alias swaps")
+    VOYAGE_EMBED_MODEL: str = "voyage-4-lite"
+    DENSE_VECTOR_SIZE: int = Field(
+        default=1024,
+        ge=1,
+        description="Voyage output_dimension of the dense vector (256, 512, 1024 or 2048)"
+    )
+    DENSE_PREFETCH_VECTOR_SIZE: int = Field(
+        default=0,
+        ge=0,
+        description="Truncated (Matryoshka) dense vector size for first-stage search; 0 disables two-stage search"
+    )
+    DENSE_PREFETCH_LIMIT: int = Field(
+        default=100,
+        ge=1,
+        description="First-stage candidates rescored with the full dense vector"
+    )
+    QDRANT_BOOTSTRAP_COLLECTION: bool = Field(
+        default=True,
+        description="Validate vectors and create missing payload indexes on startup"
+    )
+    RAG_BACKGROUND_WARMUP: bool = Field(
+        default=False,
+        description="Load the RAG models after startup instead of blocking it (503 until ready)"
+    )
+    RETRIEVAL_CACHE_SIZE: int = Field(default=1024, ge=0, description="Cached retrieval results (0 disables)")
+    RETRIEVAL_CACHE_TTL_SECONDS: int = Field(default=600, ge=1, description="Retrieval cache entry lifetime")
+
+    # Single-flight coalescing of identical concurrent requests
+    COALESCE_RETRIEVAL: bool = Field(default=True, description="Share one hybrid search among identical in-flight queries")
+    COALESCE_GENERATION: bool = Field(default=True, description="Share one answer stream among identical history-free questions")
+
+    # Dense vector storage - quantization, on-disk originals and HNSW parameters
+    QDRANT_QUANTIZATION: str = Field(default="none", description="Dense vector quantization: none, scalar or binary")
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = Field(default=True, description="Keep quantized vectors in RAM")
+    QDRANT_QUANTIZATION_RESCORE: bool = Field(default=True, description="Rescore quantized candidates with original vectors")
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = Field(
+        default=2.0,
+        ge=1.0,
+        description="Default candidates fetched per result before rescoring"
+    )
+    QDRANT_ON_DISK_VECTORS: bool = Field(default=False, description="Store original dense vectors on disk (mmap)")
+    QDRANT_HNSW_M: int = Field(default=16, ge=0, description="HNSW edges per node")
+    QDRANT_HNSW_EF_CONSTRUCT: int = Field(default=100, ge=4, description="HNSW build-time candidate list size")
+    QDRANT_HNSW_EF: int = Field(default=128, ge=0, description="HNSW query-time candidate list size (0 = server default)")
+    
+    # Hot shard - in-process index for the most-queried disciplines
+    HOT_SHARD_DISCIPLINES: str = Field(
+        default="",
+        description="Comma-separated metadata.discipline values served from the local index (empty disables)"
+    )
+    HOT_SHARD_DIR: str = Field(default="/tmp/jauapai_hot_shard", description="Directory for memory-mapped shard files")
+    HOT_SHARD_REFRESH_SECONDS: int = Field(default=900, ge=10, description="Background shard rebuild interval")
+    
+    @property
+    def hot_shard_disciplines_list(self) -> List[str]:
+        """Parse HOT_SHARD_DISCIPLINES string into list."""
+        return [d.strip() for d in self.HOT_SHARD_DISCIPLINES.split(",") if d.strip()]
+
+    # Degraded mode - BM25 fallback retrieval while Qdrant is unavailable
+    LEXICAL_INDEX_DIR: str = Field(default="/tmp/jauapai_lexical", description="Directory of the on-disk BM25 index")
+    LEXICAL_FALLBACK_WORKERS: int = Field(default=2, ge=1, description="Processes serving BM25 searches")
+    LEXICAL_FALLBACK_TIMEOUT: float = Field(default=5.0, gt=0, description="Max seconds per BM25 search")
+    LEXICAL_INDEX_BUILD_ON_STARTUP: bool = Field(
+        default=True,
+        description="Build the BM25 index in the background when it is missing or outdated (one worker process builds)"
+    )
     
+    @property
+    def search_collection(self) -> str:
+        """Collection (or alias) the retriever queries."""
+        return self.COLLECTION_ALIAS or self.COLLECTION_NAME
+
+    # Qdrant transport - gRPC or pooled HTTP/2, timeouts and retries
+    QDRANT_PREFER_GRPC: bool = Field(default=False, description="Use gRPC instead of REST for Qdrant calls")
+    QDRANT_GRPC_PORT: int = Field(default=6334, ge=1)
+    QDRANT_HTTP2: bool = Field(default=True, description="Use HTTP/2 for REST transport")
+    QDRANT_POOL_SIZE: int = Field(default=20, ge=1, description="Max HTTP connections or gRPC channels")
+    QDRANT_KEEPALIVE_CONNECTIONS: int = Field(default=10, ge=0, description="Idle HTTP connections kept alive")
+    QDRANT_TIMEOUT: int = Field(default=10, ge=1, description="Client transport timeout in seconds")
+    QDRANT_QUERY_TIMEOUT: int = Field(default=5, ge=1, description="Server-side timeout for query_points in seconds")
+    QDRANT_MAX_RETRIES: int = Field(default=2, ge=0, description="Retries for transient Qdrant errors")
+    QDRANT_RETRY_BASE_DELAY: float = Field(default=0.1, gt=0, description="Initial retry backoff in seconds")
+    QDRANT_RETRY_MAX_DELAY: float = Field(default=1.0, gt=0, description="Maximum retry backoff in seconds")
+
+    # Reranker - "voyage" (remote API) or "local" (CPU cross-encoder)
+    RERANKER_BACKEND: str = Field(default="voyage", description="Primary reranker backend: voyage or local")
+    RERANKER_FALLBACK_BACKEND: str = Field(default="", description="Backend to use when the primary reranker fails")
+    RERANK_TOP_K: int = Field(default=5, ge=1, description="Number of chunks kept after reranking")
+    VOYAGE_RERANK_MODEL: str = "rerank-2.5"
+    LOCAL_RERANKER_MODEL: str = "BAAI/bge-reranker-v2-m3"
+    LOCAL_RERANKER_ONNX_PATH: str = Field(default="", description="Directory with model.onnx and tokenizer files")
+    LOCAL_RERANKER_MAX_LENGTH: int = Field(default=512, ge=16, description="Max tokens per query/document pair")
+    LOCAL_RERANKER_BATCH_SIZE: int = Field(default=16, ge=1, description="Pairs scored per forward pass")
+
+    # Retrieval workers - BGE-M3 query encoding (and optionally local rerank) in separate processes
+    ENCODER_WORKERS: int = Field(default=0, ge=0, description="Encoder processes (0 encodes in the API process)")
+    ENCODER_MAX_PENDING: int = Field(default=32, ge=0, description="Jobs allowed to wait for a busy encoder")
+    ENCODER_TIMEOUT: float = Field(default=10.0, gt=0, description="Max seconds per encode or rerank job")
+    ENCODER_LOCAL_RERANK: bool = Field(default=False, description="Run the local reranker in the encoder processes")
+
+    # Context budget - bounds rerank payloads and prompt context size
+    RERANK_MAX_CHUNK_TOKENS: int = Field(default=512, ge=16, description="Max tokens per chunk sent to the reranker")
+    CONTEXT_TOKEN_BUDGET: int = Field(default=4000, ge=100, description="Max tokens of retrieved context in the prompt")
+    CONTEXT_CHARS_PER_TOKEN: float = Field(default=3.0, gt=0, description="Chars-per-token ratio for token estimates")
+    CONTEXT_DEDUP_SIMILARITY: float = Field(default=0.85, gt=0, le=1, description="Shingle Jaccard threshold for duplicates")
+
+    # Resilience - per-dependency timeouts (Qdrant, Voyage, reranker, Gemini)
+    VOYAGE_EMBED_TIMEOUT: float = Field(default=5.0, gt=0, description="Max seconds for a query embedding")
+    RERANK_TIMEOUT: float = Field(default=5.0, gt=0, description="Max seconds for a rerank call")
+    GEMINI_TIMEOUT: float = Field(default=60.0, gt=0, description="Gemini client request timeout in seconds")
+    GEMINI_FIRST_TOKEN_TIMEOUT: float = Field(default=20.0, gt=0, description="Max seconds until the first streamed chunk")
+    GEMINI_STREAM_IDLE_TIMEOUT: float = Field(default=15.0, gt=0, description="Max seconds between streamed chunks")
+
+    # Circuit breakers, bulkheads and hedging for guarded dependencies
+    BREAKER_FAILURE_RATE: float = Field(default=0.5, gt=0, le=1, description="Failure ratio that opens a circuit")
+    BREAKER_MIN_CALLS: int = Field(default=5, ge=1, description="Calls in the window before the failure ratio counts")
+    BREAKER_WINDOW_SIZE: int = Field(default=20, ge=1, description="Recent calls considered by each circuit breaker")
+    BREAKER_RECOVERY_SECONDS: float = Field(default=30.0, gt=0, description="Seconds a circuit stays open before a probe")
+    DEPENDENCY_POOL_SIZE: int = Field(default=16, ge=1, description="Threads per guarded dependency; calls beyond it fail fast")
+    HEDGE_EMBEDDINGS: bool = Field(default=True, description="Hedge slow Voyage query embeddings")
+    HEDGE_RERANK: bool = Field(default=True, description="Hedge slow Voyage rerank calls (API backend only)")
+    HEDGE_PERCENTILE: float = Field(default=95, gt=0, lt=100, description="Latency percentile after which to hedge")
+    HEDGE_MIN_DELAY_MS: float = Field(default=50, ge=0, description="Lower bound for the hedge delay")
+
+    # LLM routing - model per tier / question length, failover chain
+    LLM_DEFAULT_MODEL: str = Field(default="gemini-3-flash-preview", description="Model for free/guest and short questions")
+    LLM_PRO_MODEL: str = Field(default="gemini-3-pro-preview", description="Model for long Pro questions and Pro requests (empty disables)")
+    LLM_FALLBACK_MODEL: str = Field(default="gpt-4o-mini", description="Last model in the failover chain (OpenAI models need OPENAI_API_KEY)")
+    LLM_LONG_QUESTION_CHARS: int = Field(default=400, ge=1, description="Pro questions at least this long use LLM_PRO_MODEL")
+    LLM_TEMPERATURE: float = Field(default=1.0, ge=0, le=2, description="Sampling temperature for all models")
+
+    # Usage accounting - per-user/day rollups written in batches
+    USAGE_FLUSH_SECONDS: float = Field(default=30.0, gt=0, description="Interval between usage_daily flushes")
+    USAGE_FLUSH_MAX_KEYS: int = Field(default=1000, ge=1, description="Flush early once this many user/day rows are pending")
+    ADMIN_EMAILS: str = Field(default="", description="Comma-separated emails allowed to use /admin endpoints")
+
+    @property
+    def admin_emails_list(self) -> List[str]:
+        """Parse ADMIN_EMAILS string into a lowercased list."""
+        return [email.strip().lower() for email in self.ADMIN_EMAILS.split(",") if email.strip()]
+
+    # Provider-side caching of the static prompt prefix
+    PROMPT_CACHE_BACKEND: str = Field(default="gemini", description="Context cache for the tutor instructions: gemini, local or none")
+    PROMPT_CACHE_TTL_SECONDS: int = Field(default=3600, ge=60, description="Lifetime of the cached instructions")
+    PROMPT_CACHE_MIN_TOKENS: int = Field(default=1024, ge=0, description="Provider minimum prefix size for explicit caching")
+    PROMPT_CACHE_CREATE_TIMEOUT: float = Field(default=5.0, gt=0, description="Max seconds to create the cached instructions")
+
+    # Generation admission control - per worker process
+    GENERATION_MAX_CONCURRENT: int = Field(default=8, ge=1, description="In-flight LLM streams per worker")
+    GENERATION_MAX_QUEUE: int = Field(default=64, ge=0, description="Requests waiting for a generation slot")
+    GENERATION_GUEST_MAX_QUEUE: int = Field(default=8, ge=0, description="Guest requests allowed to wait")
+    GENERATION_QUEUE_TIMEOUT: float = Field(default=30.0, gt=0, description="Max seconds a request waits for a slot")
+    GENERATION_EXPECTED_SECONDS: float = Field(
+        default=10.0,
+        gt=0,
+        description="Initial estimate of a generation's duration, for Retry-After"
+    )
+
     # JWT Authentication - SECRET_KEY is required, no default for security
     SECRET_KEY: str = Field(
         ...,  # Required, no default - must be set in environment
@@ -61,6 +223,33 @@ class Settings(BaseSettings):
         ge=1,
         description="Access token expiration in minutes"
     )
+    TOKEN_CACHE_SIZE: int = Field(default=10000, ge=0, description="Verified access tokens cached per process (0 disables)")
+    TRUSTED_TOKEN_CLAIMS: bool = Field(
+        default=False,
+        description="Read-only endpoints trust the signed tier/active claims instead of loading the user row"
+    )
+    TOKEN_VERSION_TTL_SECONDS: float = Field(
+        default=30.0,
+        ge=0,
+        description="How long a user's token version is cached; bounds how late other workers see a revocation"
+    )
+
+    # Password hashing and login throttling
+    BCRYPT_ROUNDS: int = Field(default=12, ge=4, le=31, description="bcrypt cost; other costs are rehashed on login")
+    PASSWORD_HASH_WORKERS: int = Field(default=2, ge=1, description="Threads running bcrypt hash/verify")
+    PASSWORD_HASH_MAX_PENDING: int = Field(default=32, ge=0, description="Hash jobs allowed to wait; more get 503")
+    LOGIN_ATTEMPTS_PER_MINUTE: int = Field(default=10, ge=1, description="Login attempts allowed per client IP per minute")
+    TRUST_PROXY_HEADERS: bool = Field(
+        default=True,
+        description="Take the client IP from the last X-Forwarded-For hop (set by Railway's proxy)"
+    )
+    
+    # Shared outbound HTTP client (Google OAuth); created in the app lifespan
+    OUTBOUND_HTTP2: bool = Field(default=True, description="Use HTTP/2 for outbound requests when h2 is installed")
+    OUTBOUND_POOL_SIZE: int = Field(default=50, ge=1, description="Max outbound HTTP connections")
+    OUTBOUND_KEEPALIVE_CONNECTIONS: int = Field(default=10, ge=0, description="Idle outbound connections kept alive")
+    OUTBOUND_KEEPALIVE_SECONDS: float = Field(default=120.0, gt=0, description="How long an idle connection is kept")
+    OUTBOUND_TIMEOUT: float = Field(default=10.0, gt=0, description="Outbound request timeout in seconds")
     
     # Google OAuth
     GOOGLE_CLIENT_ID: str = Field(default="", description="Google OAuth Client ID")
@@ -79,12 +268,34 @@ class Settings(BaseSettings):
     TELEGRAM_BOT_USERNAME: str = Field(default="", description="Telegram bot username without @")
     TELEGRAM_WEBHOOK_URL: str = Field(default="", description="Webhook URL for Telegram updates")
     PRO_PLAN_PRICE_STARS: int = Field(default=100, ge=1, description="Pro plan price in Telegram Stars")
+    TELEGRAM_WEBHOOK_ASYNC: bool = Field(
+        default=True,
+        description="Acknowledge webhook updates at once and process them on the update queue"
+    )
+    TELEGRAM_UPDATE_WORKERS: int = Field(default=4, ge=1, description="Concurrent Telegram update handlers")
+    TELEGRAM_UPDATE_QUEUE_SIZE: int = Field(default=1000, ge=1, description="Queued updates before the webhook answers 503")
+    TELEGRAM_UPDATE_LEASE_SECONDS: int = Field(
+        default=300,
+        ge=10,
+        description="Updates left in processing this long are replayed on start (their worker died)"
+    )
+    TELEGRAM_PRE_CHECKOUT_SLO_MS: float = Field(
+        default=2000.0,
+        gt=0,
+        description="Target for answering pre-checkout queries (Telegram's hard limit is 10 s)"
+    )
     
     # Email Service (Resend)
     RESEND_API_KEY: str = Field(default="", description="Resend API key for email sending")
     RESEND_FROM_EMAIL: str = Field(default="noreply@jauap.ai", description="Verified sender email address")
     FRONTEND_URL: str = Field(default="http://localhost:5173", description="Frontend URL for email links")
     EMAIL_VERIFICATION_EXPIRE_HOURS: int = Field(default=24, ge=1, description="Email verification token expiry in hours")
+    RESEND_API_URL: str = Field(default="https://api.resend.com", description="Resend API base URL (a local stand-in in tests)")
+    EMAIL_BATCH_SIZE: int = Field(default=50, ge=1, le=100, description="Outbox emails sent per Resend batch call")
+    EMAIL_POLL_SECONDS: float = Field(default=5.0, gt=0, description="Outbox poll interval when no email was enqueued locally")
+    EMAIL_MAX_ATTEMPTS: int = Field(default=8, ge=1, description="Delivery attempts before an outbox email is marked failed")
+    EMAIL_RETRY_BASE_SECONDS: float = Field(default=5.0, gt=0, description="First retry delay; doubles per attempt")
+    EMAIL_RETRY_MAX_SECONDS: float = Field(default=3600.0, gt=0, description="Upper bound of the retry delay")
     
     @property
     def plan_limits(self) -> Dict[str, int]:
@@ -6,6 +6,9 @@ from functools import lru_cache
 from fastapi import Request, HTTPException
 from typing import TYPE_CHECKING
 
+from Backend.app.services.generation_scheduler import GenerationTicket, SchedulerFull, generation_scheduler
+from Backend.app.services.login_throttle import LoginThrottled, client_ip, login_throttle
+
 if TYPE_CHECKING:
     from Backend.app.services.rag_service import RAGService
 
@@ -30,3 +33,48 @@ def get_rag_service(request: Request) -> "RAGService":
             detail="RAG Service not initialized. Please try again later."
         )
     return rag_service
+
+
+def admit_generation(tier: str) -> GenerationTicket:
+    """
+    Reserve an LLM generation slot (or a place in the queue) for a request.
+    
+    Args:
+        tier: Subscription tier ('pro', 'free') or 'guest'
+        
+    Returns:
+        Ticket to pass to scheduled_stream
+        
+    Raises:
+        HTTPException: 503 with Retry-After when the request is shed
+    """
+    try:
+        return generation_scheduler.admit(tier)
+    except SchedulerFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def wants_queue_events(request: Request) -> bool:
+    """Whether the client asked for a 'queued' event line before the answer stream."""
+    return request.headers.get("X-Queue-Events", "").lower() in ("1", "true")
+
+
+async def throttle_login(request: Request) -> None:
+    """
+    Count a login attempt for the client IP.
+    
+    Raises:
+        HTTPException: 429 with Retry-After when LOGIN_ATTEMPTS_PER_MINUTE is exceeded
+    """
+    try:
+        login_throttle.hit(client_ip(request))
+    except LoginThrottled as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
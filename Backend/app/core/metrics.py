@@ -0,0 +1,88 @@
+"""
+In-process metrics registry for observability.
+Collects counters, gauges and latency histograms exposed on the /metrics endpoint.
+"""
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+# Number of recent samples kept per histogram for percentile estimates
+HISTOGRAM_WINDOW = 1024
+
+
+def _key(name: str, labels: Optional[Dict[str, Any]] = None) -> str:
+    """Build a flat metric key such as 'rerank_latency_ms{backend=voyage}'."""
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters, gauges and histograms."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=HISTOGRAM_WINDOW))
+        self._histogram_totals: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+
+    def increment(self, name: str, value: float = 1, labels: Optional[Dict[str, Any]] = None) -> None:
+        """Add value to a monotonically increasing counter."""
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        """Record a sample (e.g. a latency in ms) in a histogram."""
+        key = _key(name, labels)
+        with self._lock:
+            self._histograms[key].append(value)
+            totals = self._histogram_totals[key]
+            totals[0] += 1
+            totals[1] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serializable view of all metrics."""
+        with self._lock:
+            histograms = {}
+            for key, samples in self._histograms.items():
+                ordered = sorted(samples)
+                count, total = self._histogram_totals[key]
+                histograms[key] = {
+                    "count": count,
+                    "sum": round(total, 3),
+                    "p50": _percentile(ordered, 50),
+                    "p95": _percentile(ordered, 95),
+                    "p99": _percentile(ordered, 99),
+                }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": histograms,
+            }
+
+    def reset(self) -> None:
+        """Clear all metrics (used by tests)."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self._histogram_totals.clear()
+
+
+def _percentile(ordered: list, pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return round(ordered[rank], 3)
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
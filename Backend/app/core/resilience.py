@@ -0,0 +1,448 @@
+"""
+Resilience helpers for calls to external services.
+Provides retries with jittered exponential backoff for sync and async callables,
+failure-rate circuit breakers, bulkheads (a bounded thread pool per
+dependency), and DependencyGuard, which adds timeouts and hedged requests on
+top of a breaker and a bulkhead.
+"""
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Iterator, Optional, TypeVar
+
+from Backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Compute a "full jitter" backoff delay for a retry attempt.
+
+    Args:
+        attempt: Zero-based retry attempt number
+        base_delay: Delay for the first retry in seconds
+        max_delay: Upper bound for any delay in seconds
+
+    Returns:
+        A random delay between 0 and min(max_delay, base_delay * 2**attempt)
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_call(
+    func: Callable[..., T],
+    *args: Any,
+    retries: int = 3,
+    base_delay: float = 0.1,
+    max_delay: float = 2.0,
+    is_retryable: Optional[Callable[[BaseException], bool]] = None,
+    **kwargs: Any,
+) -> T:
+    """
+    Call func, retrying transient failures with jittered backoff.
+
+    Args:
+        func: Callable to invoke
+        retries: Number of retries after the first attempt
+        base_delay: Initial backoff delay in seconds
+        max_delay: Maximum backoff delay in seconds
+        is_retryable: Predicate deciding whether an exception is transient
+            (all exceptions are retried when omitted)
+
+    Returns:
+        The result of func
+
+    Raises:
+        The last exception once retries are exhausted or it is not retryable
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or (is_retryable and not is_retryable(e)):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"{getattr(func, '__name__', func)} failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+async def aretry_call(
+    func: Callable[..., Awaitable[T]],
+    *args: Any,
+    retries: int = 3,
+    base_delay: float = 0.1,
+    max_delay: float = 2.0,
+    is_retryable: Optional[Callable[[BaseException], bool]] = None,
+    **kwargs: Any,
+) -> T:
+    """Async counterpart of retry_call for coroutine functions."""
+    for attempt in range(retries + 1):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or (is_retryable and not is_retryable(e)):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"{getattr(func, '__name__', func)} failed ({e}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the dependency's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one dependency.
+
+    closed: calls go through; the outcomes of the last window_size calls are
+        kept, and once at least min_calls are recorded with a failure ratio
+        of failure_rate or more the circuit opens.
+    open: calls are rejected for recovery_timeout seconds.
+    half_open: one probe call is let through; success closes the circuit,
+        failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window_size: int = 20,
+        recovery_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.recovery_timeout = recovery_timeout
+        self._outcomes: Deque[bool] = deque(maxlen=max(window_size, min_calls))
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        """Current state, moving open -> half_open once the recovery timeout has passed."""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now (admits a single probe when half-open)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            metrics.increment("circuit_rejections", labels={"name": self.name})
+            return False
+
+    def record_success(self) -> None:
+        """Record a successful call; closes a half-open circuit."""
+        with self._lock:
+            self._outcomes.append(True)
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                self._probing = False
+                self._publish()
+
+    def record_failure(self) -> None:
+        """Record a failed call; opens the circuit above the failure rate or on a failed probe."""
+        with self._lock:
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            tripped = (
+                len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.failure_rate
+            )
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and tripped):
+                logger.warning(f"Circuit {self.name} opened ({failures}/{len(self._outcomes)} calls failed)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._outcomes.clear()
+                self._probing = False
+                metrics.increment("circuit_opened", labels={"name": self.name})
+                self._publish()
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._publish()
+
+    def _publish(self) -> None:
+        level = {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[self._state]
+        metrics.set_gauge("circuit_state", level, {"name": self.name})
+
+
+class BulkheadFullError(CircuitOpenError):
+    """Raised when a call is rejected because all of the dependency's threads are busy."""
+
+
+class Bulkhead:
+    """
+    Bounded thread pool of one dependency.
+
+    A slot is taken before a call is submitted and given back only when the
+    call really finishes, including calls the caller already abandoned after
+    a timeout. A hanging dependency therefore ties up at most max_concurrent
+    threads, and further calls to it fail fast instead of queueing behind
+    the hung ones or starving other dependencies.
+    """
+
+    def __init__(self, name: str, max_concurrent: int) -> None:
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=f"{name}-dependency")
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> int:
+        """Free slots."""
+        with self._lock:
+            return self.max_concurrent - self._in_use
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free."""
+        with self._lock:
+            if self._in_use >= self.max_concurrent:
+                return False
+            self._in_use += 1
+            in_use = self._in_use
+        metrics.set_gauge("bulkhead_in_use", in_use, {"name": self.name})
+        return True
+
+    def release(self) -> None:
+        """Give back a slot."""
+        with self._lock:
+            self._in_use -= 1
+            in_use = self._in_use
+        metrics.set_gauge("bulkhead_in_use", in_use, {"name": self.name})
+
+    def submit(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        """
+        Run func on the pool under a slot the caller already acquired.
+
+        The slot is released once func returns or raises, or if the call
+        never starts (cancelled or the pool is shut down).
+        """
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def shutdown(self) -> None:
+        """Stop accepting calls and cancel the ones not started yet."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DependencyGuard:
+    """
+    Timeout, circuit breaker, bulkhead and optional request hedging for one dependency.
+
+    Calls run on the dependency's own bounded pool so the caller can stop
+    waiting after `timeout` seconds (the abandoned call finishes in the
+    background, still holding its slot). When the pool is full, calls fail
+    fast with BulkheadFullError. With hedging, a duplicate request is sent
+    when the first has not answered within the recent latency percentile and
+    the pool has a free slot; the first response wins. Only hedge idempotent
+    calls such as embeddings and reranking.
+    """
+
+    # Successful calls needed before hedging starts (the delay comes from their latencies)
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.05,
+        hedge_percentile: float = 95,
+        max_concurrent: int = 16,
+    ) -> None:
+        self.name = name
+        self.bulkhead = Bulkhead(name, max_concurrent)
+        self.timeout = timeout
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_percentile = hedge_percentile
+        self.latencies: Deque[float] = deque(maxlen=200)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off or has too few samples."""
+        if not self.hedge or len(self.latencies) < self.HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        rank = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return max(self.hedge_min_delay, ordered[rank])
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Call func under the guard.
+
+        Raises:
+            BulkheadFullError: All of the dependency's threads are busy
+            CircuitOpenError: The circuit is open
+            TimeoutError: No response within the timeout
+            Exception: Whatever func raised
+        """
+        self._admit()
+        start = time.perf_counter()
+        try:
+            result = self._run(func, args, kwargs)
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        metrics.observe("dependency_latency_ms", elapsed * 1000, {"name": self.name})
+        if self.breaker:
+            self.breaker.record_success()
+        return result
+
+    def stream(
+        self,
+        func: Callable[..., Iterator[T]],
+        *args: Any,
+        first_timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Iterator[T]:
+        """
+        Iterate a streaming call with a first-item timeout and an idle timeout between items.
+
+        The producer runs on the bulkhead, holding its slot until it stops
+        pulling items, which it does once the consumer stops iterating.
+        """
+        self._admit()
+        items: "queue.Queue" = queue.Queue()
+        stopped = threading.Event()
+        done = object()
+
+        def produce() -> None:
+            try:
+                for item in func(*args, **kwargs):
+                    if stopped.is_set():
+                        return
+                    items.put((item, None))
+                items.put((done, None))
+            except Exception as e:
+                items.put((None, e))
+
+        start = time.perf_counter()
+        timeout = first_timeout or self.timeout
+        first = True
+        failed = False
+        try:
+            self.bulkhead.submit(produce)
+            while True:
+                try:
+                    item, error = items.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"{self.name} stream produced nothing for {timeout}s") from None
+                if error is not None:
+                    raise error
+                if item is done:
+                    break
+                if first:
+                    first = False
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    metrics.observe("dependency_first_chunk_ms", elapsed_ms, {"name": self.name})
+                    timeout = idle_timeout or self.timeout
+                yield item
+        except Exception as e:
+            failed = True
+            self._record_failure(e)
+            raise
+        finally:
+            stopped.set()
+            # Also reached when the consumer closes the stream early
+            # (GeneratorExit): items arrived, so the dependency is up, and a
+            # half-open probe must not be left unresolved
+            if not failed and self.breaker:
+                self.breaker.record_success()
+
+    def close(self) -> None:
+        """Shut down the dependency's thread pool."""
+        self.bulkhead.shutdown()
+
+    def _admit(self) -> None:
+        # Take the slot before asking the breaker, so a rejection never
+        # leaves a half-open probe admitted but unresolved
+        if not self.bulkhead.try_acquire():
+            metrics.increment("bulkhead_rejections", labels={"name": self.name})
+            raise BulkheadFullError(f"{self.name} has {self.bulkhead.max_concurrent} calls in flight")
+        if self.breaker and not self.breaker.allow():
+            self.bulkhead.release()
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def _record_failure(self, error: Exception) -> None:
+        reason = "timeout" if isinstance(error, TimeoutError) else "error"
+        metrics.increment("dependency_failures", labels={"name": self.name, "reason": reason})
+        if self.breaker:
+            self.breaker.record_failure()
+
+    def _run(self, func: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        deadline = time.monotonic() + self.timeout
+        primary = self.bulkhead.submit(func, *args, **kwargs)
+        pending = {primary}
+
+        delay = self.hedge_delay()
+        if delay is not None and delay < self.timeout:
+            finished, _ = wait(pending, timeout=delay)
+            if not finished:
+                # A hedge only helps when it does not wait for a slot itself
+                if self.bulkhead.try_acquire():
+                    pending.add(self.bulkhead.submit(func, *args, **kwargs))
+                    metrics.increment("hedged_requests", labels={"name": self.name})
+                else:
+                    metrics.increment("hedges_skipped", labels={"name": self.name})
+
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            finished, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not finished:
+                break
+            for future in finished:
+                if future.exception() is None:
+                    if future is not primary:
+                        metrics.increment("hedge_wins", labels={"name": self.name})
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+
+        for future in pending:
+            future.cancel()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"{self.name} call timed out after {self.timeout}s")
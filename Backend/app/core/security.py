@@ -2,8 +2,10 @@
 Security module for authentication and authorization.
 Handles password hashing, JWT token creation/validation, and user authentication.
 """
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
@@ -11,11 +13,14 @@ from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
 from Backend.app.db.database import get_db
 from Backend.app.models.user import User
+from Backend.app.services.token_cache import get_token_version, verified_tokens
 
-# Password hashing context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context using bcrypt; hashes with another cost than
+# BCRYPT_ROUNDS are reported by verify_and_update_password for rehashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 # HTTP Bearer token security scheme
 security = HTTPBearer()
@@ -35,6 +40,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and rehash it if the stored hash uses outdated settings.
+    
+    Args:
+        plain_password: The plain text password to verify
+        hashed_password: The hashed password to check against
+        
+    Returns:
+        (matches, new hash to store or None if the stored hash is current)
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def hash_password(password: str) -> str:
     """
     Hash a password using bcrypt.
@@ -72,10 +91,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def create_user_token(user: User, token_version: int = 0) -> str:
+    """
+    Create an access token carrying the claims read-only endpoints may trust.
+    
+    Args:
+        user: The user the token is issued to
+        token_version: The user's current token version (see get_token_version)
+        
+    Returns:
+        The encoded JWT token string
+    """
+    return create_access_token({
+        "sub": str(user.id),
+        "email": user.email,
+        "tier": user.subscription_tier or "free",
+        "active": bool(user.is_active),
+        "ver": token_version,
+    })
+
+
 def decode_token(token: str) -> dict:
     """
     Decode and verify a JWT token.
     
+    Tokens verified before are answered from the verified-token cache until
+    they expire.
+    
     Args:
         token: The JWT token string to decode
         
@@ -85,8 +127,12 @@ def decode_token(token: str) -> dict:
     Raises:
         HTTPException: If the token is invalid or expired
     """
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        verified_tokens.put(token, payload)
         return payload
     except JWTError:
         raise HTTPException(
@@ -96,6 +142,46 @@ def decode_token(token: str) -> dict:
         )
 
 
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as far as read-only endpoints need it."""
+    id: uuid.UUID
+    email: Optional[str]
+    subscription_tier: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            subscription_tier=user.subscription_tier or "free",
+            is_active=bool(user.is_active),
+        )
+
+
+def _token_subject(payload: Dict[str, Any]) -> uuid.UUID:
+    """The user id a token was issued to."""
+    try:
+        return uuid.UUID(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token: missing user ID",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def _check_token_version(db: Session, user_id: uuid.UUID, payload: Dict[str, Any]) -> None:
+    """Reject tokens issued before the user's tokens were last revoked."""
+    if payload.get("ver", 0) < get_token_version(db, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -111,18 +197,11 @@ async def get_current_user(
         The authenticated User model instance
         
     Raises:
-        HTTPException: If token is invalid or user not found
+        HTTPException: If token is invalid, revoked or user not found
     """
-    token = credentials.credentials
-    payload = decode_token(token)
-    
-    user_id: Optional[str] = payload.get("sub")
-    if user_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token: missing user ID",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    payload = decode_token(credentials.credentials)
+    user_id = _token_subject(payload)
+    _check_token_version(db, user_id, payload)
     
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
@@ -139,3 +218,61 @@ async def get_current_user(
         )
     
     return user
+
+
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """
+    Get the current authenticated principal for read-only endpoints.
+    
+    With TRUSTED_TOKEN_CLAIMS the signed tier/active claims are trusted and the
+    users table is not read; only the (cached) token version is checked. The
+    claims reflect the user at sign-in, so endpoints that change state or
+    depend on fresh tier data must use get_current_user.
+    
+    Args:
+        credentials: The HTTP Bearer credentials
+        db: Database session
+        
+    Returns:
+        The authenticated Principal
+        
+    Raises:
+        HTTPException: If token is invalid, revoked or user not found
+    """
+    payload = decode_token(credentials.credentials)
+    if not settings.TRUSTED_TOKEN_CLAIMS or "ver" not in payload:
+        metrics.increment("auth_principal", labels={"source": "database"})
+        return Principal.from_user(await get_current_user(credentials, db))
+    
+    user_id = _token_subject(payload)
+    _check_token_version(db, user_id, payload)
+    if not payload.get("active", True):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User account is deactivated"
+        )
+    metrics.increment("auth_principal", labels={"source": "claims"})
+    return Principal(
+        id=user_id,
+        email=payload.get("email"),
+        subscription_tier=payload.get("tier", "free"),
+        is_active=True,
+    )
+
+
+async def get_admin_user(user: User = Depends(get_current_user)) -> User:
+    """
+    Require an authenticated user whose email is listed in ADMIN_EMAILS.
+    
+    Raises:
+        HTTPException: 403 if the user is not an admin
+    """
+    if user.email.lower() not in settings.admin_emails_list:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return user
@@ -0,0 +1,77 @@
+"""
+Qdrant client configuration.
+Builds sync and async clients with tuned transport settings (gRPC or pooled HTTP/2)
+and classifies transient errors for retries.
+"""
+from typing import Any, Dict
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+
+from Backend.app.core.config import settings
+
+# HTTP status codes worth retrying (rate limiting and transient server errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def qdrant_client_kwargs() -> Dict[str, Any]:
+    """
+    Build keyword arguments shared by QdrantClient and AsyncQdrantClient.
+
+    With QDRANT_PREFER_GRPC the pool size controls the number of gRPC channels;
+    otherwise it caps the HTTP connection pool (pool_size and limits are
+    mutually exclusive in qdrant-client).
+    """
+    kwargs: Dict[str, Any] = {
+        "url": settings.QDRANT_URL,
+        "api_key": settings.QDRANT_API or None,
+        "timeout": settings.QDRANT_TIMEOUT,
+        "prefer_grpc": settings.QDRANT_PREFER_GRPC,
+        "grpc_port": settings.QDRANT_GRPC_PORT,
+    }
+    if settings.QDRANT_PREFER_GRPC:
+        kwargs["pool_size"] = settings.QDRANT_POOL_SIZE
+    else:
+        kwargs["http2"] = settings.QDRANT_HTTP2
+        kwargs["limits"] = httpx.Limits(
+            max_connections=settings.QDRANT_POOL_SIZE,
+            max_keepalive_connections=settings.QDRANT_KEEPALIVE_CONNECTIONS,
+        )
+    return kwargs
+
+
+def create_qdrant_client() -> QdrantClient:
+    """Create the synchronous Qdrant client used by the RAG pipeline."""
+    return QdrantClient(**qdrant_client_kwargs())
+
+
+def create_async_qdrant_client() -> AsyncQdrantClient:
+    """Create an asyncio Qdrant client with the same transport settings."""
+    return AsyncQdrantClient(**qdrant_client_kwargs())
+
+
+def is_retryable_qdrant_error(exc: BaseException) -> bool:
+    """
+    Decide whether a Qdrant error is transient and safe to retry.
+
+    Retries connection/timeout failures, HTTP 429/5xx responses and gRPC
+    UNAVAILABLE / DEADLINE_EXCEEDED / RESOURCE_EXHAUSTED; client errors such
+    as a bad filter or a missing collection are not retried.
+    """
+    if isinstance(exc, UnexpectedResponse):
+        return exc.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(exc, (ResponseHandlingException, httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+
+    try:
+        import grpc
+    except ImportError:
+        return False
+    if isinstance(exc, grpc.RpcError) and hasattr(exc, "code"):
+        return exc.code() in {
+            grpc.StatusCode.UNAVAILABLE,
+            grpc.StatusCode.DEADLINE_EXCEEDED,
+            grpc.StatusCode.RESOURCE_EXHAUSTED,
+        }
+    return False
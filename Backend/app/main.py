@@ -2,18 +2,28 @@
 FastAPI application entry point.
 Configures middleware, routes, and startup/shutdown events.
 """
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 
 from Backend.app.core.config import settings
 from Backend.app.core.middleware import RequestIDMiddleware, RequestLoggingMiddleware
-from Backend.app.api.endpoints import chat, auth, conversations, subscription, vote, payments
-from Backend.app.services.rag_service import RAGService
+from Backend.app.core.metrics import metrics
+from Backend.app.api.endpoints import chat, auth, conversations, subscription, vote, payments, admin
 from Backend.app.db.database import engine, Base
 from Backend.app.models import user, chat as chat_models, vote as vote_models, payment as payment_models
-from Backend.app.services.telegram_bot import telegram_bot_service
+from Backend.app.models import usage as usage_models, email as email_models, telegram as telegram_models
+from Backend.app.services.email_outbox import email_outbox
+from Backend.app.services.http_client import http_client
+from Backend.app.services.telegram_updates import telegram_updates
+from Backend.app.services.usage_service import usage_aggregator
+
+# rag_service (torch, FlagEmbedding, voyageai, qdrant) and telegram_bot
+# (python-telegram-bot) are imported inside the lifespan, not at module load:
+# see Backend/benchmarks/import_time_benchmark.py for the import budget
 
 # Setup logging
 logging.basicConfig(
@@ -23,6 +33,30 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def create_rag_service():
+    """
+    Build the RAG service, importing its ML stack on first use.
+
+    Returns:
+        RAGService instance, or None if initialization failed
+    """
+    logger.info("Initializing RAG Service...")
+    try:
+        from Backend.app.services.rag_service import RAGService
+
+        rag_service = RAGService()
+        logger.info("RAG Service initialized successfully.")
+        return rag_service
+    except Exception as e:
+        logger.error(f"Failed to initialize RAG Service: {e}")
+        return None
+
+
+async def warm_up_rag_service(app: FastAPI) -> None:
+    """Load the RAG service off the event loop and publish it on app.state."""
+    app.state.rag_service = await run_in_threadpool(create_rag_service)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -38,22 +72,36 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to create database tables: {e}")
         logger.warning("Application starting without database - some features may be unavailable")
     
-    logger.info("Initializing RAG Service...")
-    try:
-        app.state.rag_service = RAGService()
-        logger.info("RAG Service initialized successfully.")
-    except Exception as e:
-        logger.error(f"Failed to initialize RAG Service: {e}")
-        app.state.rag_service = None
+    # Pooled keep-alive client for outbound HTTP (Google sign-in)
+    http_client.start()
+    
+    app.state.rag_service = None
+    app.state.rag_warmup = None
+    if settings.RAG_BACKGROUND_WARMUP:
+        # Serve auth/payments immediately; RAG endpoints return 503 until ready
+        app.state.rag_warmup = asyncio.create_task(warm_up_rag_service(app))
+    else:
+        await warm_up_rag_service(app)
+    
+    # Batched per-user/day usage rollups
+    usage_aggregator.start()
     
+    # Verification emails queued by requests
+    email_outbox.start()
 
     
+    # Webhook updates are acknowledged at once and handled by queue workers
+    if settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_WEBHOOK_ASYNC:
+        telegram_updates.start()
+    
     # Initialize Telegram Webhook if URL is configured
     if settings.TELEGRAM_WEBHOOK_URL:
         webhook_url = f"{settings.TELEGRAM_WEBHOOK_URL}{settings.API_V1_STR}/payments/webhook"
         logger.info(f"Setting Telegram webhook to: {webhook_url}")
         # Run in background to not block startup
         try:
+            from Backend.app.services.telegram_bot import telegram_bot_service
+
             await telegram_bot_service.set_webhook(webhook_url)
         except Exception as e:
             logger.error(f"Failed to set Telegram webhook during startup: {e}")
@@ -62,6 +110,14 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down...")
+    if app.state.rag_warmup is not None and not app.state.rag_warmup.done():
+        app.state.rag_warmup.cancel()
+    await usage_aggregator.stop()
+    await email_outbox.stop()
+    await telegram_updates.stop()
+    await http_client.aclose()
+    if app.state.rag_service is not None:
+        app.state.rag_service.close()
 
 
 # Create FastAPI app
@@ -91,6 +147,7 @@ app.include_router(conversations.router, prefix=settings.API_V1_STR)
 app.include_router(subscription.router, prefix=settings.API_V1_STR)
 app.include_router(vote.router, prefix=settings.API_V1_STR)
 app.include_router(payments.router, prefix=settings.API_V1_STR)
+app.include_router(admin.router, prefix=settings.API_V1_STR)
 
 
 @app.get("/health")
@@ -99,15 +156,33 @@ def health_check():
     Health check endpoint with dependency status.
     Returns status of the application and its dependencies.
     """
-    rag_status = "ready" if getattr(app.state, "rag_service", None) else "not_initialized"
+    rag_service = getattr(app.state, "rag_service", None)
+    rag_warmup = getattr(app.state, "rag_warmup", None)
+    if rag_service:
+        rag_status = "ready"
+    elif rag_warmup is not None and not rag_warmup.done():
+        rag_status = "warming_up"
+    else:
+        rag_status = "not_initialized"
     
     return {
         "status": "ok",
         "service": settings.PROJECT_NAME,
         "rag_service": rag_status,
+        "collection": getattr(rag_service, "collection_status", None),
+        "retrieval_mode": rag_service.retrieval_mode if rag_service else None,
     }
 
 
+@app.get("/metrics")
+def metrics_endpoint():
+    """
+    In-process metrics snapshot.
+    Returns counters, gauges and latency histograms collected by this worker.
+    """
+    return metrics.snapshot()
+
+
 @app.get("/")
 def root():
     """Root endpoint with API information."""
@@ -115,4 +190,5 @@ def root():
         "message": f"Welcome to {settings.PROJECT_NAME}",
         "docs": "/docs",
         "health": "/health",
+        "metrics": "/metrics",
     }
@@ -0,0 +1,36 @@
+"""
+Email outbox model: emails written with the transaction that triggers them, delivered by a worker.
+"""
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime, timezone
+import uuid
+
+from Backend.app.db.database import Base
+
+
+class EmailOutbox(Base):
+    """An email waiting for (or done with) delivery by the outbox worker."""
+    
+    __tablename__ = "email_outbox"
+
+    __table_args__ = (
+        Index('ix_email_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html = Column(Text, nullable=False)
+    
+    # Delivery tracking
+    status = Column(String, default="pending", nullable=False)  # pending, sent, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    # Next delivery attempt; pushed forward while a worker holds the row
+    next_attempt_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    last_error = Column(Text, nullable=True)
+    provider_id = Column(String, nullable=True)  # Resend email id
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(DateTime(timezone=True), nullable=True)
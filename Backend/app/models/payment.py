@@ -1,7 +1,7 @@
 """
 Payment model for tracking Telegram Stars transactions.
 """
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -14,12 +14,23 @@ class Payment(Base):
     """Payment record for Telegram Stars transactions."""
     
     __tablename__ = "payments"
+    __table_args__ = (
+        # At most one pending payment per user; repeated /start commands reuse it.
+        # create_all does not add indexes to an existing table: create it by hand there
+        Index(
+            "uq_payments_pending_user",
+            "user_id",
+            unique=True,
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     
     # Telegram payment identifiers
-    telegram_payment_charge_id = Column(String, unique=True, nullable=True)  # For refunds
+    telegram_payment_charge_id = Column(String, unique=True, nullable=True)  # For refunds; idempotency key
     provider_payment_charge_id = Column(String, nullable=True)
     
     # Payment details
@@ -0,0 +1,25 @@
+"""
+Telegram webhook update log, used for update_id deduplication and crash recovery.
+"""
+from sqlalchemy import Column, String, Integer, BigInteger, Text, DateTime, JSON, Index
+from datetime import datetime, timezone
+
+from Backend.app.db.database import Base
+
+
+class TelegramUpdate(Base):
+    """A webhook update accepted from Telegram and its processing state."""
+    
+    __tablename__ = "telegram_updates"
+
+    __table_args__ = (
+        Index('ix_telegram_updates_status', 'status'),
+    )
+
+    update_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=False)
+    kind = Column(String, nullable=False)  # pre_checkout_query, message, ...
+    payload = Column(JSON, nullable=False)
+    status = Column(String, default="pending", nullable=False)  # pending, processing, done, failed, expired
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    processed_at = Column(DateTime(timezone=True), nullable=True)  # Claim time while processing
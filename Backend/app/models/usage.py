@@ -0,0 +1,54 @@
+"""
+Usage accounting models: per assistant message and daily per-user rollups.
+"""
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime, ForeignKey, JSON, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime, timezone
+import uuid
+
+from Backend.app.db.database import Base
+
+
+class MessageUsage(Base):
+    """Tokens and stage latencies spent producing one assistant message."""
+
+    __tablename__ = "message_usage"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    message_id = Column(UUID(as_uuid=True), ForeignKey("messages.id", ondelete="CASCADE"), nullable=False, unique=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    model = Column(String, nullable=True)  # LLM that produced (the end of) the answer
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)  # Prompt tokens served from the provider cache
+    embedding_tokens = Column(Integer, default=0)
+    rerank_tokens = Column(Integer, default=0)
+    latencies_ms = Column(JSON, nullable=True)  # {retrieval, embed, rerank, first_token, generation}
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class UsageDaily(Base):
+    """Per-user, per-day usage totals, updated in batches by the usage aggregator."""
+
+    __tablename__ = "usage_daily"
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'day', name='uq_usage_daily_user_day'),
+        Index('ix_usage_daily_day', 'day'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    messages = Column(Integer, default=0, nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    cached_tokens = Column(Integer, default=0, nullable=False)
+    embedding_tokens = Column(Integer, default=0, nullable=False)
+    rerank_tokens = Column(Integer, default=0, nullable=False)
+    generation_ms = Column(Float, default=0, nullable=False)  # Summed end-to-end answer time
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
@@ -1,7 +1,7 @@
 """
 User model for authentication and subscription management.
 """
-from sqlalchemy import Column, String, Boolean, DateTime, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -41,3 +41,22 @@ class User(Base):
         cascade="all, delete-orphan",
         order_by="Conversation.updated_at.desc()"
     )
+
+
+class UserTokenVersion(Base):
+    """
+    Per-user access token version; tokens issued with an older `ver` claim are revoked.
+    
+    Kept out of the users table so existing deployments pick it up via create_all.
+    A user without a row is at version 0.
+    """
+    
+    __tablename__ = "user_token_versions"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
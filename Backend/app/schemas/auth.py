@@ -24,7 +24,7 @@ class TokenResponse(BaseModel):
 
 class GoogleAuthRequest(BaseModel):
     """Request body for Google OAuth authentication."""
-    credential: str  # Google ID token from frontend
+    credential: str  # Google ID token, or an OAuth access token (implicit flow)
 
 class VerifyEmailRequest(BaseModel):
     """Request to verify email with token."""
@@ -0,0 +1,342 @@
+"""
+Qdrant collection management.
+Ensures payload indexes for metadata filters exist, validates the named
+vectors used by the hybrid retriever, applies dense vector storage settings
+(quantization, on-disk originals, HNSW) and manages collection aliases.
+"""
+import logging
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+from qdrant_client import QdrantClient, models
+
+from Backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Named vectors queried by RAGService
+DENSE_VECTOR_NAME = "voyage-dense"
+SPARSE_VECTOR_NAME = "bge-sparse"
+# Leading DENSE_PREFETCH_VECTOR_SIZE dims of the dense vector, for two-stage search
+DENSE_SMALL_VECTOR_NAME = "voyage-dense-small"
+
+# Metadata keys users can filter on; each gets a keyword payload index
+FILTER_KEYS = ("discipline", "grade", "publisher")
+
+
+def filter_field(key: str) -> str:
+    """Payload path of a filter key (metadata is nested under 'metadata')."""
+    return f"metadata.{key}"
+
+
+QUANTIZATION_KINDS = ("none", "scalar", "binary")
+
+
+def quantization_config(kind: Optional[str] = None) -> Optional[models.QuantizationConfig]:
+    """
+    Quantization config for the dense vector.
+
+    Args:
+        kind: none, scalar (int8, 4x smaller) or binary (1 bit per dimension,
+            32x smaller); defaults to QDRANT_QUANTIZATION
+
+    Returns:
+        Qdrant quantization config, or None when quantization is disabled
+    """
+    kind = (kind or settings.QDRANT_QUANTIZATION).lower()
+    always_ram = settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=always_ram
+            )
+        )
+    if kind == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=always_ram))
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown quantization '{kind}', expected one of {QUANTIZATION_KINDS}")
+
+
+def hnsw_config() -> models.HnswConfigDiff:
+    """Collection HNSW build parameters from settings."""
+    return models.HnswConfigDiff(m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT)
+
+
+def dense_vector_params(
+    quantization: Optional[str] = None,
+    on_disk: Optional[bool] = None,
+) -> models.VectorParams:
+    """
+    Named dense vector params used when creating a collection.
+
+    Args:
+        quantization: Override for QDRANT_QUANTIZATION
+        on_disk: Override for QDRANT_ON_DISK_VECTORS
+    """
+    return models.VectorParams(
+        size=settings.DENSE_VECTOR_SIZE,
+        distance=models.Distance.COSINE,
+        on_disk=settings.QDRANT_ON_DISK_VECTORS if on_disk is None else on_disk,
+        quantization_config=quantization_config(quantization),
+    )
+
+
+def small_vector_params() -> Optional[models.VectorParams]:
+    """Params of the truncated first-stage vector, or None when two-stage search is off."""
+    if not settings.DENSE_PREFETCH_VECTOR_SIZE:
+        return None
+    # Small enough to always stay in RAM, unquantized
+    return models.VectorParams(
+        size=settings.DENSE_PREFETCH_VECTOR_SIZE, distance=models.Distance.COSINE, on_disk=False
+    )
+
+
+def dense_vectors_config() -> Dict[str, models.VectorParams]:
+    """All named dense vectors of a new collection."""
+    config = {DENSE_VECTOR_NAME: dense_vector_params()}
+    small = small_vector_params()
+    if small is not None:
+        config[DENSE_SMALL_VECTOR_NAME] = small
+    return config
+
+
+def truncate_dense(vector: Sequence[float], dim: int) -> List[float]:
+    """
+    Matryoshka truncation: keep the leading `dim` components and re-normalize.
+
+    Voyage embeddings are trained so that prefixes of the full vector are
+    themselves usable lower-dimensional embeddings.
+    """
+    head = [float(x) for x in vector[:dim]]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+def dense_vectors(vector: Sequence[float]) -> Dict[str, List[float]]:
+    """Named dense vectors stored for one embedding (full, plus small when enabled)."""
+    vectors = {DENSE_VECTOR_NAME: list(vector)}
+    if settings.DENSE_PREFETCH_VECTOR_SIZE:
+        vectors[DENSE_SMALL_VECTOR_NAME] = truncate_dense(vector, settings.DENSE_PREFETCH_VECTOR_SIZE)
+    return vectors
+
+
+def dense_search_params(oversampling: Optional[float] = None) -> models.SearchParams:
+    """
+    Query-time search params for the dense prefetch.
+
+    Args:
+        oversampling: Quantized candidates fetched per requested result before
+            rescoring with the original vectors; defaults to
+            QDRANT_QUANTIZATION_OVERSAMPLING. Ignored by collections without
+            quantization.
+    """
+    return models.SearchParams(
+        hnsw_ef=settings.QDRANT_HNSW_EF or None,
+        quantization=models.QuantizationSearchParams(
+            rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=oversampling or settings.QDRANT_QUANTIZATION_OVERSAMPLING,
+        ),
+    )
+
+
+def resolve_alias(client: QdrantClient, alias: str) -> Optional[str]:
+    """Return the collection an alias points to, or None if the alias does not exist."""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def swap_alias(client: QdrantClient, alias: str, collection_name: str) -> Optional[str]:
+    """
+    Atomically point an alias at a collection.
+
+    The delete and create operations are sent in a single request, so readers
+    see either the old or the new collection, never a missing alias.
+
+    Returns:
+        The collection the alias pointed to before the swap
+    """
+    previous = resolve_alias(client, alias)
+    operations = []
+    if previous is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=collection_name, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info(f"Alias {alias}: {previous} -> {collection_name}")
+    return previous
+
+
+class CollectionManager:
+    """Bootstrap and inspect the RAG collection."""
+
+    def __init__(self, client: QdrantClient, collection_name: Optional[str] = None) -> None:
+        self.client = client
+        self.collection_name = collection_name or settings.search_collection
+
+    def ensure_payload_indexes(self, wait: bool = False) -> List[str]:
+        """
+        Create keyword payload indexes for every filter key that lacks one.
+
+        Args:
+            wait: Block until the index is built (index builds on large
+                collections run in the background otherwise)
+
+        Returns:
+            Payload fields for which an index was created
+        """
+        info = self.client.get_collection(self.collection_name)
+        existing = info.payload_schema or {}
+        created = []
+        for key in FILTER_KEYS:
+            field = filter_field(key)
+            if field in existing:
+                continue
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+                wait=wait,
+            )
+            created.append(field)
+            logger.info(f"Created keyword payload index on {self.collection_name}.{field}")
+        return created
+
+    def apply_storage_config(self) -> bool:
+        """
+        Apply the configured quantization, on-disk and HNSW settings to an existing collection.
+
+        Qdrant rebuilds the quantized vectors and HNSW graph in the background;
+        the collection keeps serving queries meanwhile.
+
+        Returns:
+            True if the update was accepted
+        """
+        params = dense_vector_params()
+        applied = self.client.update_collection(
+            collection_name=self.collection_name,
+            vectors_config={
+                DENSE_VECTOR_NAME: models.VectorParamsDiff(
+                    on_disk=params.on_disk,
+                    quantization_config=params.quantization_config or models.Disabled.DISABLED,
+                )
+            },
+            hnsw_config=hnsw_config(),
+        )
+        logger.info(
+            f"Collection {self.collection_name}: quantization={settings.QDRANT_QUANTIZATION}, "
+            f"on_disk={params.on_disk}, hnsw m={settings.QDRANT_HNSW_M} "
+            f"ef_construct={settings.QDRANT_HNSW_EF_CONSTRUCT}"
+        )
+        return applied
+
+    def validate_vectors(self) -> List[str]:
+        """
+        Check that the collection has the named vectors the retriever queries.
+
+        Returns:
+            A list of problems (empty when the vector config is valid)
+        """
+        params = self.client.get_collection(self.collection_name).config.params
+        dense = params.vectors if isinstance(params.vectors, dict) else {}
+        sparse = params.sparse_vectors or {}
+        problems = []
+
+        if DENSE_VECTOR_NAME not in dense:
+            problems.append(f"missing dense vector '{DENSE_VECTOR_NAME}'")
+        elif dense[DENSE_VECTOR_NAME].size != settings.DENSE_VECTOR_SIZE:
+            problems.append(
+                f"'{DENSE_VECTOR_NAME}' has size {dense[DENSE_VECTOR_NAME].size}, "
+                f"expected {settings.DENSE_VECTOR_SIZE}"
+            )
+        small_size = settings.DENSE_PREFETCH_VECTOR_SIZE
+        if small_size:
+            if small_size >= settings.DENSE_VECTOR_SIZE:
+                problems.append(
+                    f"DENSE_PREFETCH_VECTOR_SIZE {small_size} must be smaller than "
+                    f"DENSE_VECTOR_SIZE {settings.DENSE_VECTOR_SIZE}"
+                )
+            if DENSE_SMALL_VECTOR_NAME not in dense:
+                problems.append(f"missing dense vector '{DENSE_SMALL_VECTOR_NAME}'")
+            elif dense[DENSE_SMALL_VECTOR_NAME].size != small_size:
+                problems.append(
+                    f"'{DENSE_SMALL_VECTOR_NAME}' has size {dense[DENSE_SMALL_VECTOR_NAME].size}, "
+                    f"expected {small_size}"
+                )
+        if SPARSE_VECTOR_NAME not in sparse:
+            problems.append(f"missing sparse vector '{SPARSE_VECTOR_NAME}'")
+        return problems
+
+    def status(self) -> Dict[str, Any]:
+        """Summarize collection health, vector validation and index coverage."""
+        info = self.client.get_collection(self.collection_name)
+        schema = info.payload_schema or {}
+        indexed = {}
+        for key in FILTER_KEYS:
+            field_info = schema.get(filter_field(key))
+            indexed[filter_field(key)] = str(field_info.data_type.value) if field_info else None
+
+        problems = self.validate_vectors()
+        dense = info.config.params.vectors
+        dense = dense.get(DENSE_VECTOR_NAME) if isinstance(dense, dict) else None
+        quantization = (dense.quantization_config if dense else None) or info.config.quantization_config
+        return {
+            "collection": self.collection_name,
+            "status": str(info.status.value) if info.status else None,
+            "points_count": info.points_count,
+            "payload_indexes": indexed,
+            "missing_indexes": [field for field, kind in indexed.items() if kind is None],
+            "vectors_valid": not problems,
+            "vector_problems": problems,
+            "quantization": type(quantization).__name__ if quantization else None,
+            "vectors_on_disk": bool(dense and dense.on_disk),
+            "hnsw_m": info.config.hnsw_config.m,
+        }
+
+    def bootstrap(self) -> Dict[str, Any]:
+        """
+        Validate vectors, create missing payload indexes and report status.
+
+        Called on startup; problems are logged rather than raised so the API
+        can still serve non-RAG endpoints.
+        """
+        problems = self.validate_vectors()
+        for problem in problems:
+            logger.error(f"Collection {self.collection_name}: {problem}")
+        self.ensure_payload_indexes()
+        status = self.status()
+        logger.info(
+            f"Collection {self.collection_name}: {status['points_count']} points, "
+            f"status={status['status']}, indexes={status['payload_indexes']}"
+        )
+        return status
+
+
+# For inspecting / bootstrapping the collection from the command line
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from Backend.app.db.vector_store import create_qdrant_client
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description="Bootstrap and inspect the RAG collection")
+    parser.add_argument(
+        "--apply-storage-config",
+        action="store_true",
+        help="Apply QDRANT_QUANTIZATION / QDRANT_ON_DISK_VECTORS / QDRANT_HNSW_* to the collection"
+    )
+    args = parser.parse_args()
+
+    manager = CollectionManager(create_qdrant_client())
+    if args.apply_storage_config:
+        manager.apply_storage_config()
+    manager.ensure_payload_indexes(wait=True)
+    print(json.dumps(manager.status(), indent=2, ensure_ascii=False))
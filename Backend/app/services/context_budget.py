@@ -0,0 +1,216 @@
+"""
+Context budget management for retrieval results.
+Bounds the text sent to the reranker and the context assembled into the LLM prompt.
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in a text.
+
+    Uses a characters-per-token ratio (CONTEXT_CHARS_PER_TOKEN) which is
+    cheap enough to run on every chunk of every request.
+    """
+    if not text:
+        return 0
+    return max(1, int(len(text) / settings.CONTEXT_CHARS_PER_TOKEN))
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = _words(text)
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _pages(meta: Dict[str, Any]) -> Set[str]:
+    pages = meta.get("pages", [])
+    if not isinstance(pages, list):
+        pages = [pages]
+    return {str(p) for p in pages}
+
+
+def window_text(text: str, query: str, max_tokens: int) -> str:
+    """
+    Cut a chunk down to max_tokens, keeping the window most relevant to the query.
+
+    Windows slide over the text with 50% overlap; the one containing the most
+    query words wins (ties go to the earliest window).
+
+    Args:
+        text: Chunk text
+        query: The search query
+        max_tokens: Token budget for the returned text
+
+    Returns:
+        The original text if it fits, otherwise the best window
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = int(max_tokens * settings.CONTEXT_CHARS_PER_TOKEN)
+    query_words = set(_words(query))
+    stride = max(1, max_chars // 2)
+
+    best_start, best_score = 0, -1
+    for start in range(0, max(1, len(text) - max_chars + stride), stride):
+        window = text[start:start + max_chars]
+        score = sum(1 for w in _words(window) if w in query_words)
+        if score > best_score:
+            best_start, best_score = start, score
+
+    window = text[best_start:best_start + max_chars]
+    # Avoid cutting words in half at the window edges
+    if best_start > 0 and " " in window:
+        window = window[window.index(" ") + 1:]
+    if best_start + max_chars < len(text) and " " in window:
+        window = window[:window.rindex(" ")]
+    return window
+
+
+class ContextBudgetManager:
+    """
+    Applies token budgets to retrieved chunks.
+
+    - Windows each candidate before reranking (RERANK_MAX_CHUNK_TOKENS)
+    - Drops near-duplicate chunks (same book with overlapping pages, or
+      near-identical text)
+    - Caps the assembled prompt context (CONTEXT_TOKEN_BUDGET)
+
+    Tokens removed at every stage are reported to the metrics registry.
+    """
+
+    def __init__(
+        self,
+        rerank_max_tokens: Optional[int] = None,
+        context_budget: Optional[int] = None,
+        similarity_threshold: Optional[float] = None,
+    ) -> None:
+        self.rerank_max_tokens = rerank_max_tokens or settings.RERANK_MAX_CHUNK_TOKENS
+        self.context_budget = context_budget or settings.CONTEXT_TOKEN_BUDGET
+        self.similarity_threshold = similarity_threshold or settings.CONTEXT_DEDUP_SIMILARITY
+
+    def is_near_duplicate(self, a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        """
+        Check whether two payloads carry the same content.
+
+        Args:
+            a: Qdrant payload with 'page_content' and 'metadata'
+            b: Qdrant payload with 'page_content' and 'metadata'
+
+        Returns:
+            True if they come from overlapping pages of the same book or
+            their text shingles are nearly identical
+        """
+        return self._near_duplicate(
+            a.get("metadata", {}), _shingles(a.get("page_content", "")),
+            b.get("metadata", {}), _shingles(b.get("page_content", "")),
+        )
+
+    def dedupe(self, payloads: Sequence[Dict[str, Any]]) -> List[int]:
+        """
+        Drop near-duplicate chunks, keeping the earliest (best ranked) one.
+
+        Args:
+            payloads: Payloads in rank order
+
+        Returns:
+            Indices of the payloads that were kept
+        """
+        # Shingled once per chunk, not once per compared pair
+        shingles = [_shingles(payload.get("page_content", "")) for payload in payloads]
+        kept: List[int] = []
+        saved = 0
+        for i, payload in enumerate(payloads):
+            meta = payload.get("metadata", {})
+            if any(
+                self._near_duplicate(payloads[j].get("metadata", {}), shingles[j], meta, shingles[i])
+                for j in kept
+            ):
+                saved += estimate_tokens(payload.get("page_content", ""))
+                continue
+            kept.append(i)
+
+        if saved:
+            metrics.increment("context_tokens_saved", saved, {"stage": "dedupe"})
+            metrics.increment("context_chunks_deduped", len(payloads) - len(kept))
+        return kept
+
+    def _near_duplicate(
+        self, meta_a: Dict[str, Any], shingles_a: Set[tuple], meta_b: Dict[str, Any], shingles_b: Set[tuple]
+    ) -> bool:
+        same_book = all(
+            meta_a.get(k) is not None and meta_a.get(k) == meta_b.get(k)
+            for k in ("discipline", "grade", "publisher")
+        )
+        if same_book and _pages(meta_a) & _pages(meta_b):
+            return True
+        if not shingles_a or not shingles_b:
+            return False
+        jaccard = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+        return jaccard >= self.similarity_threshold
+
+    def prepare_rerank_texts(self, query: str, texts: Sequence[str]) -> List[str]:
+        """
+        Window every candidate text to the rerank token cap.
+
+        Args:
+            query: The search query
+            texts: Candidate chunk texts
+
+        Returns:
+            Texts no longer than RERANK_MAX_CHUNK_TOKENS each
+        """
+        windowed = [window_text(t, query, self.rerank_max_tokens) for t in texts]
+        saved = sum(estimate_tokens(t) for t in texts) - sum(estimate_tokens(t) for t in windowed)
+        if saved > 0:
+            metrics.increment("context_tokens_saved", saved, {"stage": "rerank"})
+        return windowed
+
+    def assemble(self, docs: Sequence[str], separator: str = "\n\n") -> str:
+        """
+        Join formatted documents without exceeding the context token budget.
+
+        Documents are added in rank order; the first one that does not fit is
+        truncated to the remaining budget and everything after it is dropped.
+
+        Args:
+            docs: Formatted documents in rank order
+            separator: Joiner between documents
+
+        Returns:
+            The assembled context text
+        """
+        parts: List[str] = []
+        used = 0
+        for doc in docs:
+            tokens = estimate_tokens(doc)
+            remaining = self.context_budget - used
+            if tokens <= remaining:
+                parts.append(doc)
+                used += tokens
+                continue
+            if remaining > 0:
+                parts.append(doc[:int(remaining * settings.CONTEXT_CHARS_PER_TOKEN)])
+                used = self.context_budget
+            break
+
+        total = sum(estimate_tokens(d) for d in docs)
+        if total > used:
+            metrics.increment("context_tokens_saved", total - used, {"stage": "budget"})
+        metrics.observe("context_tokens", used)
+        return separator.join(parts)
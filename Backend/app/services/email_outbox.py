@@ -0,0 +1,192 @@
+"""
+Transactional email outbox.
+
+Requests never talk to Resend: they add an EmailOutbox row in the same
+transaction as the change that triggers the email (the new user, the new
+verification token) and return once it commits. EmailOutboxWorker, started
+from the app lifespan, claims due rows in batches of EMAIL_BATCH_SIZE, sends
+each batch with one Resend batch call and records the outcome. Failed
+deliveries are retried with exponential backoff up to EMAIL_MAX_ATTEMPTS.
+
+Delivery is at-least-once: rows are claimed by pushing next_attempt_at
+forward, so several worker processes can share the table, and a row whose
+worker died is picked up again once its claim lapses.
+"""
+import asyncio
+import hashlib
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.models.email import EmailOutbox
+from Backend.app.services.email_service import EmailService, email_service
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed batch is reserved for the worker that is sending it
+CLAIM_SECONDS = 120
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, html: str) -> EmailOutbox:
+    """
+    Add an email to the outbox; it is delivered only if the caller commits.
+
+    Args:
+        db: Session of the transaction the email belongs to
+        to_email: Recipient email address
+        subject: Subject line
+        html: HTML body
+
+    Returns:
+        The pending outbox row
+    """
+    email = EmailOutbox(to_email=to_email, subject=subject, html=html)
+    db.add(email)
+    return email
+
+
+def enqueue_verification_email(db: Session, to_email: str, token: str, user_name: Optional[str] = None) -> EmailOutbox:
+    """Add the email verification message for a user to the outbox."""
+    subject, html = email_service.render_verification_email(token, user_name)
+    return enqueue_email(db, to_email, subject, html)
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next attempt after `attempts` failed ones: exponential, jittered over its upper half."""
+    delay = min(settings.EMAIL_RETRY_MAX_SECONDS, settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay / 2 + random.random() * delay / 2
+
+
+class EmailOutboxWorker:
+    """Delivers pending outbox emails in batches from a background task."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        sender: Optional[EmailService] = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.sender = sender or email_service
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def session(self) -> Session:
+        if self.session_factory is None:
+            from Backend.app.db.database import SessionLocal
+
+            self.session_factory = SessionLocal
+        return self.session_factory()
+
+    def claim_batch(self, db: Session) -> List[EmailOutbox]:
+        """Reserve up to EMAIL_BATCH_SIZE due emails for this worker."""
+        now = datetime.now(timezone.utc)
+        batch = (
+            db.query(EmailOutbox)
+            .filter(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(settings.EMAIL_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for email in batch:
+            email.next_attempt_at = now + timedelta(seconds=CLAIM_SECONDS)
+        db.commit()
+        return batch
+
+    def deliver_batch(self) -> int:
+        """
+        Send one batch of due emails and record the results.
+
+        Returns:
+            Number of emails claimed (0 when nothing is due or email is not configured)
+        """
+        if not self.sender.is_configured():
+            return 0
+        db = self.session()
+        try:
+            batch = self.claim_batch(db)
+            if not batch:
+                return 0
+            messages = [{"to": e.to_email, "subject": e.subject, "html": e.html} for e in batch]
+            # Same emails, same key: a retry after a lost response is not sent twice
+            key = hashlib.sha256("".join(str(e.id) for e in batch).encode()).hexdigest()
+            try:
+                results = self.sender.send_batch(messages, idempotency_key=key)
+            except Exception as e:
+                results = [e] * len(batch)
+                logger.warning(f"Email batch of {len(batch)} failed: {e}")
+
+            now = datetime.now(timezone.utc)
+            for email, result in zip(batch, results):
+                email.attempts += 1
+                if not isinstance(result, Exception):
+                    email.status = "sent"
+                    email.provider_id = str(result)
+                    email.sent_at = now
+                    email.last_error = None
+                    metrics.increment("emails_sent")
+                elif email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                    email.status = "failed"
+                    email.last_error = str(result)
+                    metrics.increment("emails_failed")
+                    logger.error(f"Giving up on email {email.id} to {email.to_email}: {result}")
+                else:
+                    email.next_attempt_at = now + timedelta(seconds=retry_delay(email.attempts))
+                    email.last_error = str(result)
+                    metrics.increment("email_send_retries")
+            db.commit()
+            metrics.observe("email_batch_size", len(batch))
+            return len(batch)
+        finally:
+            db.close()
+
+    def notify(self) -> None:
+        """Wake the worker now instead of at the next poll (safe from any thread)."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self) -> None:
+        """Deliver until cancelled (started from the app lifespan)."""
+        while True:
+            self._wake.clear()
+            try:
+                claimed = await run_in_threadpool(self.deliver_batch)
+            except Exception as e:
+                logger.error(f"Email outbox delivery failed: {e}")
+                claimed = 0
+            if claimed >= settings.EMAIL_BATCH_SIZE:
+                continue  # More are probably due
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.EMAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            if not self.sender.is_configured():
+                logger.warning("Email service not configured, outbox emails stay pending")
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the delivery task; undelivered emails stay in the outbox."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+
+
+# Global outbox worker (per worker process)
+email_outbox = EmailOutboxWorker()
@@ -4,9 +4,7 @@ Email service for sending verification and notification emails using Resend.
 import logging
 import secrets
 from datetime import datetime, timedelta, timezone
-from typing import Optional
-
-import resend
+from typing import Any, Dict, List, Optional, Tuple
 
 from Backend.app.core.config import settings
 
@@ -20,9 +18,6 @@ class EmailService:
         self.api_key = settings.RESEND_API_KEY
         self.from_email = settings.RESEND_FROM_EMAIL
         self.frontend_url = settings.FRONTEND_URL
-        
-        if self.api_key:
-            resend.api_key = self.api_key
     
     def is_configured(self) -> bool:
         """Check if email service is properly configured."""
@@ -40,27 +35,17 @@ class EmailService:
             hours=settings.EMAIL_VERIFICATION_EXPIRE_HOURS
         )
     
-    def send_verification_email(
-        self,
-        to_email: str,
-        token: str,
-        user_name: Optional[str] = None
-    ) -> bool:
+    def render_verification_email(self, token: str, user_name: Optional[str] = None) -> Tuple[str, str]:
         """
-        Send email verification link to user.
+        Build the email verification message.
         
         Args:
-            to_email: Recipient email address
             token: Verification token
             user_name: Optional user name for personalization
             
         Returns:
-            True if email sent successfully, False otherwise
+            (subject, html body)
         """
-        if not self.is_configured():
-            logger.warning("Email service not configured, skipping verification email")
-            return False
-        
         verification_url = f"{self.frontend_url}/verify-email?token={token}"
         greeting = f"Привет, {user_name}!" if user_name else "Привет!"
         
@@ -116,21 +101,83 @@ class EmailService:
         </html>
         """
         
-        try:
-            params = {
-                "from": f"JauapAI <{self.from_email}>",
-                "to": [to_email],
-                "subject": "Подтвердите ваш email - JauapAI",
-                "html": html_content,
-            }
+        return "Подтвердите ваш email - JauapAI", html_content
+    
+    def send_verification_email(
+        self,
+        to_email: str,
+        token: str,
+        user_name: Optional[str] = None
+    ) -> bool:
+        """
+        Send email verification link to user right away.
+        
+        Requests enqueue the email on the outbox instead (see email_outbox).
+        
+        Args:
+            to_email: Recipient email address
+            token: Verification token
+            user_name: Optional user name for personalization
             
-            response = resend.Emails.send(params)
-            logger.info(f"Verification email sent to {to_email}, id: {response.get('id')}")
+        Returns:
+            True if email sent successfully, False otherwise
+        """
+        if not self.is_configured():
+            logger.warning("Email service not configured, skipping verification email")
+            return False
+        
+        subject, html_content = self.render_verification_email(token, user_name)
+        try:
+            results = self.send_batch([{"to": to_email, "subject": subject, "html": html_content}])
+            logger.info(f"Verification email sent to {to_email}, id: {results[0]}")
             return True
             
         except Exception as e:
             logger.error(f"Failed to send verification email to {to_email}: {e}")
             return False
+    
+    def send_batch(self, messages: List[Dict[str, str]], idempotency_key: Optional[str] = None) -> List[Any]:
+        """
+        Send up to 100 emails with one Resend batch call.
+        
+        Args:
+            messages: Dicts with "to", "subject" and "html"
+            idempotency_key: Makes a retried call with the same key a no-op at Resend
+            
+        Returns:
+            Per message, in order: the Resend email id, or the rejection as an
+            Exception when Resend refused that message alone
+            
+        Raises:
+            Exception: The call failed as a whole (network, auth, rate limit, 5xx)
+        """
+        # Imported on first send: the resend SDK (and its HTTP stack) is
+        # not needed to start the API
+        import resend
+
+        resend.api_key = self.api_key
+        resend.api_url = settings.RESEND_API_URL
+        params = [
+            {
+                "from": f"JauapAI <{self.from_email}>",
+                "to": [message["to"]],
+                "subject": message["subject"],
+                "html": message["html"],
+            }
+            for message in messages
+        ]
+        # Permissive validation: an invalid address fails alone, not the batch
+        options: Dict[str, Any] = {"batch_validation": "permissive"}
+        if idempotency_key:
+            options["idempotency_key"] = idempotency_key
+        response = resend.Batch.send(params, options)
+        
+        rejected = {error["index"]: error.get("message", "rejected") for error in response.get("errors") or []}
+        ids = iter(item["id"] for item in response["data"])
+        return [
+            ValueError(rejected[i]) if i in rejected else next(ids)
+            for i in range(len(messages))
+        ]
 
 
 # Global email service instance
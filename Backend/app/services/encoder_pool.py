@@ -0,0 +1,219 @@
+"""
+Retrieval worker processes for CPU-bound query encoding.
+
+BGE-M3 sparse encoding (and the local cross-encoder reranker) is CPU heavy and
+holds the GIL for parts of each call, so inside the API process it stalls the
+event loop that also serves auth and conversation CRUD. EncoderPool runs these
+jobs in spawned processes that each load their own model once. Jobs travel as
+pickled arguments over the pool's pipes: a query (or query plus candidate
+texts) in, a few hundred (token id, weight) pairs or (index, score) pairs out.
+
+Admission is bounded: at most ENCODER_WORKERS + ENCODER_MAX_PENDING jobs are
+in flight; beyond that callers get EncoderPoolFull immediately instead of
+queueing without limit (retrieval then uses the BM25 fallback if loaded).
+"""
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.services.reranker import BaseReranker, RerankResult, build_reranker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPARSE_LOADER = "Backend.app.services.encoder_pool:load_bge_m3"
+
+
+class EncoderPoolFull(RuntimeError):
+    """Every encoder is busy and the pending queue is full."""
+
+
+def load_bge_m3() -> Any:
+    """Load the BGE-M3 model used for sparse query vectors."""
+    from FlagEmbedding import BGEM3FlagModel
+
+    return BGEM3FlagModel('BAAI/bge-m3', use_fp16=True)
+
+
+def resolve_loader(spec: str) -> Callable[[], Any]:
+    """Import a model loader given as 'package.module:function'."""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def encode_sparse(model: Any, query: str) -> Tuple[List[int], List[float]]:
+    """
+    Sparse (lexical weights) representation of a query with a BGE-M3 model.
+
+    Args:
+        model: BGEM3FlagModel (or anything with the same encode signature)
+        query: The search query text
+
+    Returns:
+        Tuple of (token indices, token weights)
+    """
+    output = model.encode(
+        query,
+        return_dense=False,
+        return_sparse=True,
+        return_colbert_vecs=False
+    )
+    lex_weights = output['lexical_weights']
+
+    # Handle list output (batch encoding)
+    if isinstance(lex_weights, list):
+        lex_weights = lex_weights[0]
+
+    keys = [int(k) for k in lex_weights.keys()]
+    vals = [float(v) for v in lex_weights.values()]
+    return keys, vals
+
+
+# Per-process models, loaded once by the pool initializer
+_worker_sparse_model: Any = None
+_worker_reranker: Optional[BaseReranker] = None
+
+
+def _init_worker(sparse_loader: str, local_rerank: bool) -> None:
+    global _worker_sparse_model, _worker_reranker
+    _worker_sparse_model = resolve_loader(sparse_loader)()
+    if local_rerank:
+        _worker_reranker = build_reranker("local")
+
+
+def _ping_in_worker() -> int:
+    return os.getpid()
+
+
+def _encode_in_worker(query: str) -> Tuple[List[int], List[float]]:
+    return encode_sparse(_worker_sparse_model, query)
+
+
+def _rerank_in_worker(query: str, documents: Sequence[str], top_k: int) -> List[Tuple[int, float]]:
+    return [(r.index, r.relevance_score) for r in _worker_reranker.rerank(query, documents, top_k)]
+
+
+class EncoderPool:
+    """Runs sparse encoding (and optionally local reranking) in worker processes."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeout: Optional[float] = None,
+        sparse_loader: str = DEFAULT_SPARSE_LOADER,
+        local_rerank: Optional[bool] = None,
+    ) -> None:
+        """
+        Args:
+            workers: Encoder processes (defaults to ENCODER_WORKERS)
+            max_pending: Jobs allowed to wait for a busy worker (ENCODER_MAX_PENDING)
+            timeout: Max seconds per job (ENCODER_TIMEOUT)
+            sparse_loader: 'module:function' that loads the sparse model in a worker
+            local_rerank: Also load the local reranker in the workers (ENCODER_LOCAL_RERANK)
+        """
+        self.workers = workers or settings.ENCODER_WORKERS or 1
+        self.max_pending = settings.ENCODER_MAX_PENDING if max_pending is None else max_pending
+        self.timeout = timeout or settings.ENCODER_TIMEOUT
+        self.sparse_loader = sparse_loader
+        self.local_rerank = settings.ENCODER_LOCAL_RERANK if local_rerank is None else local_rerank
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.pool = self._create_pool()
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that holds model weights and client threads is unsafe
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.sparse_loader, self.local_rerank),
+        )
+
+    def warm_up(self) -> None:
+        """Start the workers (each loads its models in the initializer) and wait until they answer."""
+        for future in [self.pool.submit(_ping_in_worker) for _ in range(self.workers)]:
+            future.result()
+
+    def encode_sparse(self, query: str) -> Tuple[List[int], List[float]]:
+        """BGE-M3 sparse query vector computed in a worker (see encode_sparse)."""
+        return self._run("encode", _encode_in_worker, query)
+
+    def rerank(self, query: str, documents: Sequence[str], top_k: int) -> List[RerankResult]:
+        """Local cross-encoder rerank in a worker (requires local_rerank)."""
+        if not self.local_rerank:
+            raise RuntimeError("Encoder pool was started without the local reranker")
+        pairs = self._run("rerank", _rerank_in_worker, query, list(documents), top_k)
+        return [RerankResult(index=index, relevance_score=score) for index, score in pairs]
+
+    def _run(self, op: str, fn: Callable, *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            metrics.increment("encoder_pool_rejected", labels={"op": op})
+            raise EncoderPoolFull(f"{self.workers} encoders busy and {self.max_pending} jobs pending")
+
+        start = time.perf_counter()
+        pool = self.pool
+        try:
+            future = pool.submit(fn, *args)
+        except Exception as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._restart(pool)
+            raise
+        with self._lock:
+            self._in_flight += 1
+            metrics.set_gauge("encoder_pool_in_flight", self._in_flight)
+        # The slot is held until the worker is done, even if the caller times out
+        future.add_done_callback(self._release)
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            self._restart(pool)
+            raise
+        metrics.observe("encoder_job_ms", (time.perf_counter() - start) * 1000, {"op": op})
+        return result
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            metrics.set_gauge("encoder_pool_in_flight", self._in_flight)
+        self._slots.release()
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a pool whose worker died (e.g. OOM-killed); later jobs go to fresh workers."""
+        with self._lock:
+            if self.pool is not broken:
+                return
+            self.pool = self._create_pool()
+        logger.error("Encoder worker died, restarted the encoder pool")
+        metrics.increment("encoder_pool_restarts")
+        # Outside the lock: cancelled futures run _release synchronously
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.workers, "in_flight": self._in_flight, "max_pending": self.max_pending}
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PooledReranker(BaseReranker):
+    """Local cross-encoder reranker running in the encoder processes."""
+
+    name = "local"
+
+    def __init__(self, pool: EncoderPool) -> None:
+        self.pool = pool
+
+    def rerank(self, query: str, documents: Sequence[str], top_k: int) -> List[RerankResult]:
+        return self.pool.rerank(query, documents, top_k)
@@ -0,0 +1,256 @@
+"""
+Admission control and priority queueing for LLM generation slots.
+
+At most GENERATION_MAX_CONCURRENT answers are generated at once per worker
+process. Extra requests wait in a priority queue (pro before free before
+guest, FIFO within a tier). When the queue is full, or too many guests are
+already waiting, the lowest-priority request is shed with a 503 and a
+Retry-After estimate.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import math
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+from starlette.concurrency import iterate_in_threadpool
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first; unknown tiers are treated as guests
+TIER_PRIORITY = {"pro": 0, "free": 1, "guest": 2}
+GUEST_TIER = "guest"
+
+
+class SchedulerFull(Exception):
+    """Raised when a generation request is shed; maps to 503 with Retry-After."""
+
+    def __init__(self, retry_after: int, reason: str = "Server is busy, please retry") -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class GenerationTicket:
+    """A request's place in the generation queue (or its granted slot)."""
+
+    def __init__(self, scheduler: "GenerationScheduler", tier: str, seq: int) -> None:
+        self.scheduler = scheduler
+        self.tier = tier if tier in TIER_PRIORITY else GUEST_TIER
+        self.priority = TIER_PRIORITY[self.tier]
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.released = False
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "GenerationTicket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def queued(self) -> bool:
+        """Whether the ticket is still waiting for a slot."""
+        return self.granted_at is None
+
+    @property
+    def position(self) -> int:
+        """1-based position in the queue (0 once a slot is granted)."""
+        if not self.queued:
+            return 0
+        return 1 + sum(1 for other in self.scheduler.queue if other < self)
+
+    async def wait(self) -> float:
+        """
+        Wait for a slot.
+
+        Returns:
+            Seconds spent queued
+
+        Raises:
+            SchedulerFull: The ticket was shed or waited longer than GENERATION_QUEUE_TIMEOUT
+        """
+        if self.queued:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.future), timeout=self.scheduler.queue_timeout)
+            except asyncio.TimeoutError:
+                self.scheduler.shed(self, "timeout")
+                raise SchedulerFull(self.scheduler.retry_after()) from None
+            except asyncio.CancelledError:
+                # Client went away while queued
+                self.scheduler.remove(self)
+                raise
+        waited = self.granted_at - self.enqueued_at
+        metrics.observe("generation_queue_wait_ms", waited * 1000, {"tier": self.tier})
+        return waited
+
+    def release(self) -> None:
+        """Free the slot (or leave the queue). Safe to call more than once."""
+        self.scheduler.release(self)
+
+
+class GenerationScheduler:
+    """Per-process cap on in-flight LLM streams with a tiered priority queue."""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_guest_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ) -> None:
+        self.max_concurrent = max_concurrent or settings.GENERATION_MAX_CONCURRENT
+        self.max_queue = settings.GENERATION_MAX_QUEUE if max_queue is None else max_queue
+        self.max_guest_queue = settings.GENERATION_GUEST_MAX_QUEUE if max_guest_queue is None else max_guest_queue
+        self.queue_timeout = queue_timeout or settings.GENERATION_QUEUE_TIMEOUT
+        self.in_flight = 0
+        self.queue: List[GenerationTicket] = []
+        self._seq = itertools.count()
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._avg_slot_seconds = settings.GENERATION_EXPECTED_SECONDS
+
+    def admit(self, tier: str) -> GenerationTicket:
+        """
+        Grant a slot now or enqueue the request.
+
+        Must be called from the event loop (e.g. in an async endpoint) before
+        the response starts, so shedding can still return a 503.
+
+        Raises:
+            SchedulerFull: The request is shed
+        """
+        ticket = GenerationTicket(self, tier, next(self._seq))
+        if self.in_flight < self.max_concurrent and not self.queue:
+            self._grant(ticket)
+            return ticket
+
+        if ticket.tier == GUEST_TIER:
+            guests = sum(1 for t in self.queue if t.tier == GUEST_TIER)
+            if guests >= self.max_guest_queue:
+                self._record_shed(ticket.tier, "guest_limit")
+                raise SchedulerFull(self.retry_after())
+
+        if len(self.queue) >= self.max_queue:
+            victim = max(self.queue)
+            if not ticket < victim:
+                self._record_shed(ticket.tier, "queue_full")
+                raise SchedulerFull(self.retry_after())
+            # Make room by shedding the lowest-priority, most recent waiter
+            self.shed(victim, "preempted")
+
+        heapq.heappush(self.queue, ticket)
+        self._publish()
+        return ticket
+
+    def release(self, ticket: GenerationTicket) -> None:
+        """Return a granted slot (or drop a queued ticket) and admit the next waiter."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.queued:
+            self.remove(ticket)
+            return
+        self.in_flight -= 1
+        held = time.monotonic() - ticket.granted_at
+        self._avg_slot_seconds = 0.8 * self._avg_slot_seconds + 0.2 * held
+        self._dispatch()
+
+    def shed(self, ticket: GenerationTicket, reason: str) -> None:
+        """Drop a queued ticket, failing its waiter with SchedulerFull."""
+        self.remove(ticket)
+        ticket.released = True
+        self._record_shed(ticket.tier, reason)
+        if not ticket.future.done():
+            ticket.future.set_exception(SchedulerFull(self.retry_after()))
+
+    def remove(self, ticket: GenerationTicket) -> None:
+        """Take a ticket out of the queue if it is still there."""
+        if ticket in self.queue:
+            self.queue.remove(ticket)
+            heapq.heapify(self.queue)
+            self._publish()
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: queued work spread over all slots."""
+        backlog = len(self.queue) + 1
+        return max(1, math.ceil(self._avg_slot_seconds * backlog / self.max_concurrent))
+
+    def _grant(self, ticket: GenerationTicket) -> None:
+        self.in_flight += 1
+        ticket.granted_at = time.monotonic()
+        if not ticket.future.done():
+            ticket.future.set_result(None)
+        self._publish()
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.max_concurrent and self.queue:
+            self._grant(heapq.heappop(self.queue))
+        self._publish()
+
+    def _record_shed(self, tier: str, reason: str) -> None:
+        metrics.increment("generation_shed", labels={"tier": tier, "reason": reason})
+
+    def _publish(self) -> None:
+        metrics.set_gauge("generation_in_flight", self.in_flight)
+        metrics.set_gauge("generation_queue_depth", len(self.queue))
+
+
+async def scheduled_stream(
+    ticket: GenerationTicket,
+    produce: Callable[[], Iterator[str]],
+    queue_events: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Wait for the ticket's slot, then stream a sync generator from the threadpool.
+
+    Args:
+        ticket: Ticket from GenerationScheduler.admit
+        produce: Creates the sync chunk generator once the slot is granted
+        queue_events: Emit a JSON line {"event": "queued", ...} first when the request has to wait
+
+    Raises:
+        SchedulerFull: The request was shed while queued
+    """
+    try:
+        if ticket.queued and queue_events:
+            yield json.dumps({
+                "event": "queued",
+                "position": ticket.position,
+                "retry_after": ticket.scheduler.retry_after(),
+            }) + "\n"
+        await ticket.wait()
+        # Run retrieval and the LLM stream off the event loop
+        async for chunk in iterate_in_threadpool(produce()):
+            yield chunk
+    finally:
+        ticket.release()
+
+
+class ScheduledStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that frees its generation slot when the response ends.
+
+    scheduled_stream releases the ticket only if the body runs; a client that
+    disconnects before the response starts never runs it, so the response
+    releases the ticket too, however it finishes.
+    """
+
+    def __init__(self, content: Any, ticket: GenerationTicket, **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.ticket.release()
+
+
+# Global scheduler instance (per worker process)
+generation_scheduler = GenerationScheduler()
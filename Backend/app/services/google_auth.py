@@ -0,0 +1,153 @@
+"""
+Google sign-in credential verification.
+
+Google ID tokens (from the Sign in with Google button or One Tap) are RS256
+JWTs. They are verified locally against Google's public keys (JWKS). The keys
+are cached for the max-age Google sends and refreshed early only when a
+token names an unknown key id, so a sign-in normally makes no outbound call.
+OAuth access tokens (the implicit flow) cannot be checked locally and are
+resolved through the userinfo endpoint on the shared pooled client.
+"""
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
+from jose import JWTError, jwt
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.services.http_client import SharedHttpClient, http_client
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Key cache lifetime when Google sends no max-age
+DEFAULT_KEYS_TTL_SECONDS = 3600
+# Unknown key ids trigger at most one early refresh per this many seconds
+MIN_REFRESH_SECONDS = 60
+
+
+class GoogleCredentialError(Exception):
+    """Raised when a Google credential is invalid, expired or for another client."""
+
+
+def is_id_token(credential: str) -> bool:
+    """ID tokens are JWTs (three dot-separated parts); access tokens are opaque."""
+    return credential.count(".") == 2
+
+
+class GoogleKeyCache:
+    """Google's signing keys by key id, refreshed per Cache-Control max-age."""
+
+    def __init__(self, client: Optional[SharedHttpClient] = None, url: str = GOOGLE_JWKS_URL) -> None:
+        self.http = client or http_client
+        self.url = url
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, kid: str) -> Dict[str, Any]:
+        """
+        The JWK with the given key id.
+
+        Raises:
+            GoogleCredentialError: Google does not (or no longer) publish the key
+        """
+        key = self._keys.get(kid) if time.monotonic() < self._expires_at else None
+        if key is None:
+            async with self._lock:  # Concurrent sign-ins share one fetch
+                key = self._keys.get(kid) if time.monotonic() < self._expires_at else None
+                if key is None and (
+                    time.monotonic() >= self._expires_at
+                    or time.monotonic() - self._fetched_at >= MIN_REFRESH_SECONDS
+                ):
+                    await self.refresh()
+                    key = self._keys.get(kid)
+        if key is None:
+            raise GoogleCredentialError("Unknown Google signing key")
+        return key
+
+    async def refresh(self) -> None:
+        response = await self.http.client.get(self.url)
+        response.raise_for_status()
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        ttl = int(max_age.group(1)) if max_age else DEFAULT_KEYS_TTL_SECONDS
+        self._keys = {key["kid"]: key for key in response.json()["keys"]}
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + ttl
+        metrics.increment("google_jwks_refreshes")
+        logger.info(f"Fetched {len(self._keys)} Google signing keys, cached for {ttl}s")
+
+
+async def verify_id_token(id_token: str, keys: Optional[GoogleKeyCache] = None) -> Dict[str, Any]:
+    """
+    Verify a Google ID token locally.
+
+    Args:
+        id_token: The JWT from Google Identity Services
+        keys: Key cache to use (defaults to the process-wide one)
+
+    Returns:
+        The token claims (sub, email, name, ...)
+
+    Raises:
+        GoogleCredentialError: Bad signature, expired, wrong audience/issuer or unverified email
+    """
+    if not settings.GOOGLE_CLIENT_ID:
+        raise GoogleCredentialError("Google sign-in is not configured")
+    try:
+        header = jwt.get_unverified_header(id_token)
+        key = await (keys or google_keys).get(header.get("kid", ""))
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=settings.GOOGLE_CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            options={"verify_at_hash": False},
+        )
+    except JWTError as e:
+        raise GoogleCredentialError(f"Invalid Google token: {e}")
+    if not claims.get("email_verified"):
+        raise GoogleCredentialError("Google account email is not verified")
+    return claims
+
+
+async def fetch_userinfo(access_token: str, client: Optional[SharedHttpClient] = None) -> Dict[str, Any]:
+    """
+    Resolve an OAuth access token to the user's Google profile.
+
+    Raises:
+        GoogleCredentialError: Google rejected the token
+        httpx.HTTPError: Google could not be reached
+    """
+    response = await (client or http_client).client.get(
+        GOOGLE_USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    if response.status_code != 200:
+        raise GoogleCredentialError("Invalid Google token")
+    return response.json()
+
+
+async def resolve_google_identity(credential: str) -> Dict[str, Any]:
+    """
+    Google profile claims (sub, email, name) of a sign-in credential.
+
+    ID tokens are verified locally; access tokens go through userinfo.
+    """
+    if is_id_token(credential):
+        metrics.increment("google_sign_ins", labels={"credential": "id_token"})
+        return await verify_id_token(credential)
+    metrics.increment("google_sign_ins", labels={"credential": "access_token"})
+    return await fetch_userinfo(credential)
+
+
+# Global key cache (per worker process)
+google_keys = GoogleKeyCache()
@@ -0,0 +1,358 @@
+"""
+In-process read-only index for the most-queried textbooks.
+
+Chunks of selected disciplines are copied out of Qdrant into a local
+directory: a memory-mapped NumPy matrix of normalized dense vectors and an
+inverted index (CSR-style postings) of the BGE-M3 sparse weights. Hybrid
+search over the shard scores both with vectorized NumPy operations and fuses
+the two rankings with the same RRF formula as Qdrant, so filtered queries
+for these disciplines skip the remote round-trip.
+
+The shard is rebuilt periodically (or on request, e.g. after an alias swap)
+in a background thread into a fresh directory and swapped in atomically.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+from qdrant_client.http.models import QueryResponse
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.services.collection_manager import (
+    DENSE_VECTOR_NAME,
+    FILTER_KEYS,
+    SPARSE_VECTOR_NAME,
+    filter_field,
+)
+
+logger = logging.getLogger(__name__)
+
+# Qdrant's default RRF constant: score = sum(1 / (rank + RRF_K)), rank from 0
+RRF_K = 2
+
+
+def rrf_fuse(rankings: Sequence[Sequence[int]], limit: int) -> List[tuple]:
+    """
+    Reciprocal Rank Fusion of several rankings of document indices.
+
+    Returns:
+        (doc index, fused score) pairs, best first; ties keep first-seen order
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (rank + RRF_K)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def top_k(scores: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best-scoring candidates, best first."""
+    if len(candidates) > k:
+        part = np.argpartition(-scores[candidates], k - 1)[:k]
+        candidates = candidates[part]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class HotShardIndex:
+    """Immutable local index loaded from a shard directory."""
+
+    def __init__(self, directory: str) -> None:
+        path = Path(directory)
+        self.directory = directory
+        self.dense = np.load(path / "dense.npy", mmap_mode="r")
+        self.tokens = np.load(path / "sparse_tokens.npy", mmap_mode="r")
+        self.offsets = np.load(path / "sparse_offsets.npy", mmap_mode="r")
+        self.posting_docs = np.load(path / "sparse_docs.npy", mmap_mode="r")
+        self.posting_weights = np.load(path / "sparse_weights.npy", mmap_mode="r")
+        with open(path / "points.json", encoding="utf-8") as f:
+            points = json.load(f)
+        self.ids: List[Any] = points["ids"]
+        self.payloads: List[Dict[str, Any]] = points["payloads"]
+        self.disciplines = set(points["disciplines"])
+        self.fields = {
+            key: np.array([str(p.get("metadata", {}).get(key, "")) for p in self.payloads], dtype=object)
+            for key in FILTER_KEYS
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls,
+        client: QdrantClient,
+        collection_name: str,
+        disciplines: Sequence[str],
+        directory: str,
+        payload_fields: Sequence[str],
+        batch_size: int = 256,
+    ) -> "HotShardIndex":
+        """
+        Scroll the chunks of the given disciplines out of Qdrant and write a shard.
+
+        Args:
+            client: Qdrant client
+            collection_name: Collection (or alias) to copy from
+            disciplines: metadata.discipline values to include
+            directory: Empty or missing directory to write the shard into
+            payload_fields: Payload projection stored with each chunk
+            batch_size: Points per scroll request
+        """
+        ids, payloads, dense_rows = [], [], []
+        postings: Dict[int, List[tuple]] = {}
+        scroll_filter = models.Filter(must=[
+            models.FieldCondition(key=filter_field("discipline"), match=models.MatchAny(any=list(disciplines)))
+        ])
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                scroll_filter=scroll_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=models.PayloadSelectorInclude(include=list(payload_fields)),
+                with_vectors=[DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME],
+            )
+            for point in points:
+                doc = len(ids)
+                ids.append(point.id)
+                payloads.append(point.payload or {})
+                dense_rows.append(point.vector[DENSE_VECTOR_NAME])
+                sparse = point.vector.get(SPARSE_VECTOR_NAME)
+                if sparse is not None:
+                    for token, weight in zip(sparse.indices, sparse.values):
+                        postings.setdefault(token, []).append((doc, weight))
+            if offset is None:
+                break
+
+        if not ids:
+            raise ValueError(f"No chunks in {collection_name} for disciplines {list(disciplines)}")
+
+        dense = np.asarray(dense_rows, dtype=np.float32)
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        dense /= np.where(norms == 0, 1.0, norms)
+
+        tokens = np.array(sorted(postings), dtype=np.int64)
+        lengths = np.array([len(postings[t]) for t in tokens], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        flat = [entry for t in tokens for entry in postings[t]]
+        docs = np.array([d for d, _ in flat], dtype=np.int32)
+        weights = np.array([w for _, w in flat], dtype=np.float32)
+
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "dense.npy", dense)
+        np.save(path / "sparse_tokens.npy", tokens)
+        np.save(path / "sparse_offsets.npy", offsets)
+        np.save(path / "sparse_docs.npy", docs)
+        np.save(path / "sparse_weights.npy", weights)
+        with open(path / "points.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "payloads": payloads, "disciplines": list(disciplines)}, f, ensure_ascii=False)
+
+        logger.info(f"Built hot shard {directory}: {len(ids)} chunks, {len(tokens)} sparse tokens")
+        return cls(directory)
+
+    def filter_mask(self, metadata_filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Boolean mask of chunks matching the filter keys (same semantics as RAGService.build_filter)."""
+        mask = np.ones(len(self), dtype=bool)
+        for key in FILTER_KEYS:
+            value = (metadata_filter or {}).get(key)
+            if value:
+                mask &= self.fields[key] == str(value)
+        return mask
+
+    def dense_scores(self, query_dense: Sequence[float]) -> np.ndarray:
+        """Cosine similarity of the query with every chunk."""
+        query = np.asarray(query_dense, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return self.dense @ (query / norm if norm else query)
+
+    def sparse_scores(self, indices: Sequence[int], values: Sequence[float]) -> tuple:
+        """
+        Dot product of the sparse query with every chunk.
+
+        Returns:
+            (scores, matched) arrays; chunks sharing no token are not matched
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = np.zeros(len(self), dtype=bool)
+        positions = np.searchsorted(self.tokens, indices)
+        for pos, token, value in zip(positions, indices, values):
+            if pos >= len(self.tokens) or self.tokens[pos] != token:
+                continue
+            start, end = self.offsets[pos], self.offsets[pos + 1]
+            docs = self.posting_docs[start:end]
+            np.add.at(scores, docs, self.posting_weights[start:end] * np.float32(value))
+            matched[docs] = True
+        return scores, matched
+
+    def search(
+        self,
+        query_dense: Sequence[float],
+        query_sparse: models.SparseVector,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        prefetch_limit: int = 30,
+        limit: int = 50,
+    ) -> QueryResponse:
+        """
+        Hybrid search: top dense and top sparse candidates fused with RRF.
+
+        Mirrors RAGService.hybrid_query_kwargs, returning the same response type.
+        """
+        mask = self.filter_mask(metadata_filter)
+        candidates = np.flatnonzero(mask)
+        dense = self.dense_scores(query_dense)
+        sparse, matched = self.sparse_scores(query_sparse.indices, query_sparse.values)
+
+        dense_top = top_k(dense, candidates, prefetch_limit)
+        sparse_top = top_k(sparse, np.flatnonzero(mask & matched), prefetch_limit)
+        fused = rrf_fuse([dense_top.tolist(), sparse_top.tolist()], limit)
+        return QueryResponse(points=[
+            models.ScoredPoint(id=self.ids[doc], version=0, score=score, payload=self.payloads[doc])
+            for doc, score in fused
+        ])
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+
+def remove_stale_builds(directory: Path) -> None:
+    """Delete the shard directories of processes that are gone (and builds from before per-process directories)."""
+    for path in directory.glob("*"):
+        if path.name.isdigit():
+            if int(path.name) == os.getpid() or _pid_alive(int(path.name)):
+                continue
+        elif not path.name.startswith("v"):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class HotShard:
+    """
+    Routes filtered queries to a local HotShardIndex and keeps it fresh.
+
+    Queries whose discipline filter names a hot discipline are served locally
+    once the index is built; until then they go to Qdrant. start() builds the
+    index in a daemon thread and rebuilds it every refresh_seconds.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        disciplines: Sequence[str],
+        directory: str,
+        payload_fields: Sequence[str],
+        collection_name: Optional[str] = None,
+        refresh_seconds: Optional[int] = None,
+    ) -> None:
+        self.client = client
+        self.disciplines = set(disciplines)
+        # Per process: API workers share HOT_SHARD_DIR but each builds its own shard
+        self.directory = Path(directory) / str(os.getpid())
+        self.payload_fields = list(payload_fields)
+        self.collection_name = collection_name or settings.search_collection
+        self.refresh_seconds = refresh_seconds or settings.HOT_SHARD_REFRESH_SECONDS
+        self.index: Optional[HotShardIndex] = None
+        self._refresh_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def matches(self, metadata_filter: Optional[Dict[str, Any]]) -> bool:
+        """Whether a query with this filter can be served from the shard."""
+        discipline = (metadata_filter or {}).get("discipline")
+        return self.index is not None and discipline in self.index.disciplines
+
+    def search(
+        self,
+        query_dense: Sequence[float],
+        query_sparse: models.SparseVector,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        prefetch_limit: int = 30,
+        limit: int = 50,
+    ) -> QueryResponse:
+        """Hybrid search on the current index snapshot."""
+        index = self.index
+        start = time.perf_counter()
+        response = index.search(query_dense, query_sparse, metadata_filter, prefetch_limit, limit)
+        metrics.observe("hot_shard_search_ms", (time.perf_counter() - start) * 1000)
+        return response
+
+    def refresh(self) -> HotShardIndex:
+        """Rebuild the shard into a new directory, swap it in and delete the build it replaces."""
+        with self._refresh_lock:
+            if self.index is None:
+                # Builds left by an earlier process with the same pid (e.g. a restarted container)
+                for old in self.directory.glob("v*"):
+                    shutil.rmtree(old, ignore_errors=True)
+            target = self.directory / f"v{time.time_ns()}"
+            try:
+                index = HotShardIndex.build(
+                    self.client, self.collection_name, sorted(self.disciplines), str(target), self.payload_fields
+                )
+            except Exception:
+                shutil.rmtree(target, ignore_errors=True)
+                raise
+            if self._stopped.is_set():
+                # stop() ran during the build and has removed our directory
+                shutil.rmtree(self.directory, ignore_errors=True)
+                return index
+            previous, self.index = self.index, index
+            # Open memory maps of the old build stay valid after its files are unlinked
+            if previous is not None:
+                shutil.rmtree(previous.directory, ignore_errors=True)
+            metrics.set_gauge("hot_shard_chunks", len(index))
+            logger.info(f"Hot shard serving {sorted(self.disciplines)} ({len(index)} chunks)")
+            return index
+
+    def request_refresh(self) -> None:
+        """Wake the background thread to rebuild now (e.g. after an alias swap)."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the background thread: build the index now, then refresh it periodically."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="hot-shard-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and delete this process's shard directory."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        # Memory maps of the current index stay valid for searches in flight
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _run(self) -> None:
+        remove_stale_builds(self.directory.parent)
+        while not self._stopped.is_set():
+            if self.index is not None:
+                self._wakeup.wait(self.refresh_seconds)
+                self._wakeup.clear()
+                if self._stopped.is_set():
+                    break
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the previous snapshot (or Qdrant, before the first build)
+                logger.error(f"Hot shard refresh failed: {e}")
+                if self.index is None:
+                    self._wakeup.wait(self.refresh_seconds)
+                    self._wakeup.clear()
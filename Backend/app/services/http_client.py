@@ -0,0 +1,59 @@
+"""
+App-wide pooled httpx.AsyncClient for outbound HTTP.
+
+One client per worker process keeps connections to the same hosts alive
+(HTTP/2 when h2 is installed), so requests after the first skip the TCP and
+TLS handshakes. It is opened in the app lifespan and closed on shutdown;
+code running without the lifespan (scripts, tests) gets one on first use.
+"""
+import importlib.util
+import logging
+from typing import Optional
+
+import httpx
+
+from Backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the pooled outbound client from the OUTBOUND_* settings."""
+    http2 = settings.OUTBOUND_HTTP2 and importlib.util.find_spec("h2") is not None
+    if settings.OUTBOUND_HTTP2 and not http2:
+        logger.warning("h2 is not installed, outbound HTTP falls back to HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.OUTBOUND_POOL_SIZE,
+            max_keepalive_connections=settings.OUTBOUND_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OUTBOUND_KEEPALIVE_SECONDS,
+        ),
+        timeout=settings.OUTBOUND_TIMEOUT,
+    )
+
+
+class SharedHttpClient:
+    """Holder of the process's outbound client."""
+
+    def __init__(self) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client()
+        return self._client
+
+    def start(self) -> httpx.AsyncClient:
+        """Open the client (called from the app lifespan)."""
+        return self.client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global outbound client (per worker process)
+http_client = SharedHttpClient()
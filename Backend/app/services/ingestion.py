@@ -0,0 +1,434 @@
+"""
+Offline textbook ingestion into Qdrant.
+
+Streams pages from PDF/text files, chunks them with book metadata, embeds
+chunks in batches (Voyage dense and BGE-M3 sparse encoding run side by side)
+and upserts them in parallel batches with deterministic point ids. Every
+chunk carries a content hash, so a re-run only re-embeds chunks whose text
+(or embedding configuration) changed, and a build into a new collection can
+copy unchanged vectors from the previous one.
+
+Usage:
+    python -m Backend.app.services.ingestion --path books/tarih_10.pdf \
+        --discipline "Қазақстан тарихы" --grade 10 --publisher "Атамұра"
+    python -m Backend.app.services.ingestion --manifest books.jsonl
+"""
+import hashlib
+import json
+import logging
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from qdrant_client import QdrantClient, models
+
+from Backend.app.core.config import settings
+from Backend.app.services.collection_manager import (
+    SPARSE_VECTOR_NAME,
+    CollectionManager,
+    dense_vectors,
+    dense_vectors_config,
+    hnsw_config,
+)
+
+logger = logging.getLogger(__name__)
+
+# Namespace for deterministic chunk point ids
+CHUNK_NAMESPACE = uuid.UUID("6f1c2a4e-0b7d-4d53-9a51-5f4f2e7c9b10")
+
+
+def embedding_signature() -> str:
+    """Identify the embedding setup; changing it invalidates every content hash."""
+    dense = f"{settings.VOYAGE_EMBED_MODEL}:{settings.DENSE_VECTOR_SIZE}"
+    if settings.DENSE_PREFETCH_VECTOR_SIZE:
+        dense += f"/{settings.DENSE_PREFETCH_VECTOR_SIZE}"
+    return f"{dense}|bge-m3"
+
+
+class DenseEmbedder(Protocol):
+    """Anything with a LangChain-style embed_documents (e.g. VoyageAIEmbeddings)."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]: ...
+
+
+class SparseEncoder(Protocol):
+    """Anything with a BGEM3FlagModel-style encode."""
+
+    def encode(self, sentences: List[str], **kwargs: Any) -> Dict[str, Any]: ...
+
+
+@dataclass
+class BookSource:
+    """A textbook file and the metadata attached to all of its chunks."""
+    path: str
+    discipline: str
+    grade: str
+    publisher: str
+
+
+@dataclass
+class Chunk:
+    """A chunk of textbook text ready for embedding."""
+    text: str
+    metadata: Dict[str, Any]
+    index: int
+    signature: str = ""
+    point_id: str = field(init=False)
+    content_hash: str = field(init=False)
+
+    def __post_init__(self) -> None:
+        meta = self.metadata
+        key = f"{meta['discipline']}|{meta['grade']}|{meta['publisher']}|{meta['source']}|{self.index}"
+        self.point_id = str(uuid.uuid5(CHUNK_NAMESPACE, key))
+        hashed = json.dumps([self.signature, self.text, meta], ensure_ascii=False, sort_keys=True)
+        self.content_hash = hashlib.sha256(hashed.encode("utf-8")).hexdigest()
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """Qdrant payload in the page_content/metadata layout read by RAGService."""
+        return {"page_content": self.text, "metadata": self.metadata, "content_hash": self.content_hash}
+
+
+@dataclass
+class IngestionStats:
+    """Counters reported at the end of an ingestion run."""
+    chunks: int = 0
+    skipped: int = 0
+    reused: int = 0
+    upserted: int = 0
+
+    @property
+    def embedded(self) -> int:
+        """Chunks that went through the embedding models."""
+        return self.upserted - self.reused
+
+
+def iter_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Stream (page_number, text) pairs from a book file.
+
+    PDFs are read page by page with pypdf; text files are split into pages
+    on form feeds (a file without form feeds is a single page).
+    """
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        reader = PdfReader(path)
+        for number, page in enumerate(reader.pages, start=1):
+            yield number, page.extract_text() or ""
+        return
+
+    with open(path, encoding="utf-8") as f:
+        for number, text in enumerate(f.read().split("\f"), start=1):
+            yield number, text
+
+
+def chunk_pages(
+    pages: Iterable[Tuple[int, str]],
+    chunk_size: int = 1500,
+    overlap: int = 200,
+) -> Iterator[Tuple[str, List[int]]]:
+    """
+    Split a page stream into overlapping chunks of roughly chunk_size chars.
+
+    Chunks prefer to end at a paragraph or sentence boundary and carry the
+    list of pages they span. Only the unconsumed tail of the text is kept in
+    memory.
+
+    Yields:
+        (chunk_text, pages) tuples
+    """
+    buffer = ""
+    buffer_offset = 0  # absolute offset of buffer[0] in the book text
+    page_starts: List[Tuple[int, int]] = []  # (absolute offset, page number)
+
+    def spanned_pages(start: int, end: int) -> List[int]:
+        spanned = []
+        for i, (offset, number) in enumerate(page_starts):
+            next_offset = page_starts[i + 1][0] if i + 1 < len(page_starts) else float("inf")
+            if offset < end and next_offset > start:
+                spanned.append(number)
+        return spanned
+
+    def emit(final: bool) -> Iterator[Tuple[str, List[int]]]:
+        nonlocal buffer, buffer_offset, page_starts
+        while len(buffer) > chunk_size or (final and buffer.strip()):
+            end = min(len(buffer), chunk_size)
+            if end < len(buffer):
+                for sep in ("\n\n", ". ", "\n", " "):
+                    cut = buffer.rfind(sep, chunk_size // 2, end)
+                    if cut != -1:
+                        end = cut + len(sep)
+                        break
+            text = buffer[:end].strip()
+            if text:
+                yield text, spanned_pages(buffer_offset, buffer_offset + end)
+            if end >= len(buffer):
+                buffer_offset += len(buffer)
+                buffer = ""
+                break
+
+            consumed = max(end - overlap, 1)
+            buffer = buffer[consumed:]
+            buffer_offset += consumed
+            # Drop pages that ended before the new buffer start
+            while len(page_starts) > 1 and page_starts[1][0] <= buffer_offset:
+                page_starts.pop(0)
+
+    for number, text in pages:
+        text = text.strip()
+        if not text:
+            continue
+        if buffer:
+            buffer += "\n\n"
+        page_starts.append((buffer_offset + len(buffer), number))
+        buffer += text
+        yield from emit(final=False)
+    yield from emit(final=True)
+
+
+def sparse_vectors(encoder: SparseEncoder, texts: List[str], batch_size: int) -> List[models.SparseVector]:
+    """Encode texts into BGE-M3 lexical-weight sparse vectors."""
+    output = encoder.encode(
+        texts,
+        batch_size=batch_size,
+        return_dense=False,
+        return_sparse=True,
+        return_colbert_vecs=False
+    )
+    return [
+        models.SparseVector(
+            indices=[int(k) for k in weights.keys()],
+            values=[float(v) for v in weights.values()]
+        )
+        for weights in output["lexical_weights"]
+    ]
+
+
+class IngestionPipeline:
+    """Chunk, embed and upsert textbooks into a Qdrant collection."""
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        dense_model: DenseEmbedder,
+        sparse_model: SparseEncoder,
+        collection_name: Optional[str] = None,
+        chunk_size: int = 1500,
+        chunk_overlap: int = 200,
+        batch_size: int = 64,
+        upsert_workers: int = 4,
+        reuse_from: Optional[str] = None,
+    ) -> None:
+        self.client = client
+        self.dense_model = dense_model
+        self.sparse_model = sparse_model
+        self.collection_name = collection_name or settings.COLLECTION_NAME
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.upsert_workers = upsert_workers
+        # Collection to copy vectors from when a chunk's content hash is unchanged
+        self.reuse_from = reuse_from if reuse_from != self.collection_name else None
+        self.signature = embedding_signature()
+
+    def ensure_collection(self) -> None:
+        """Create the collection with the retriever's named vectors if missing, then index filters."""
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=dense_vectors_config(),
+                sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams()},
+                hnsw_config=hnsw_config(),
+            )
+            logger.info(f"Created collection {self.collection_name}")
+        CollectionManager(self.client, self.collection_name).ensure_payload_indexes()
+
+    def iter_chunks(self, book: BookSource) -> Iterator[Chunk]:
+        """Stream chunks of one book with discipline/grade/publisher/pages metadata."""
+        source = Path(book.path).name
+        for index, (text, pages) in enumerate(
+            chunk_pages(iter_pages(book.path), self.chunk_size, self.chunk_overlap)
+        ):
+            yield Chunk(
+                text=text,
+                index=index,
+                signature=self.signature,
+                metadata={
+                    "discipline": book.discipline,
+                    "grade": str(book.grade),
+                    "publisher": book.publisher,
+                    "pages": pages,
+                    "source": source,
+                },
+            )
+
+    def existing_hashes(self, ids: List[str]) -> Dict[str, Optional[str]]:
+        """Map point ids already stored in the collection to their content hash."""
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=["content_hash"],
+            with_vectors=False
+        )
+        return {str(p.id): (p.payload or {}).get("content_hash") for p in points}
+
+    def reusable_points(self, chunks: List[Chunk]) -> Dict[str, models.PointStruct]:
+        """
+        Copy vectors of unchanged chunks from the reuse_from collection.
+
+        Returns:
+            Points keyed by id for chunks whose content hash matches
+        """
+        if not self.reuse_from or not self.client.collection_exists(self.reuse_from):
+            return {}
+        by_id = {c.point_id: c for c in chunks}
+        points = self.client.retrieve(
+            collection_name=self.reuse_from,
+            ids=list(by_id),
+            with_payload=["content_hash"],
+            with_vectors=True
+        )
+        reusable = {}
+        for p in points:
+            chunk = by_id[str(p.id)]
+            if (p.payload or {}).get("content_hash") == chunk.content_hash and isinstance(p.vector, dict):
+                reusable[chunk.point_id] = models.PointStruct(id=chunk.point_id, vector=p.vector, payload=chunk.payload)
+        return reusable
+
+    def embed(self, chunks: List[Chunk], executor: ThreadPoolExecutor) -> List[models.PointStruct]:
+        """Embed a batch, running the Voyage request alongside BGE-M3 encoding."""
+        texts = [c.text for c in chunks]
+        dense_future = executor.submit(self.dense_model.embed_documents, texts)
+        sparse = sparse_vectors(self.sparse_model, texts, self.batch_size)
+        dense = dense_future.result()
+        return [
+            models.PointStruct(
+                id=chunk.point_id,
+                vector={**dense_vectors(dense_vec), SPARSE_VECTOR_NAME: sparse_vec},
+                payload=chunk.payload,
+            )
+            for chunk, dense_vec, sparse_vec in zip(chunks, dense, sparse)
+        ]
+
+    def _batches(self, chunks: Iterable[Chunk]) -> Iterator[List[Chunk]]:
+        batch: List[Chunk] = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def ingest(self, books: Iterable[BookSource]) -> IngestionStats:
+        """
+        Ingest books, embedding only new or changed chunks.
+
+        Chunks whose stored content hash matches are skipped; chunks found
+        unchanged in reuse_from are copied without re-embedding. Upserts run on a worker pool while the next batch is being embedded;
+        at most upsert_workers batches are in flight at once.
+        """
+        self.ensure_collection()
+        stats = IngestionStats()
+        pending: List[Future] = []
+
+        with ThreadPoolExecutor(max_workers=1) as dense_executor, \
+                ThreadPoolExecutor(max_workers=self.upsert_workers) as upsert_executor:
+            for book in books:
+                logger.info(f"Ingesting {book.path} ({book.discipline}, {book.grade}, {book.publisher})")
+                for batch in self._batches(self.iter_chunks(book)):
+                    stats.chunks += len(batch)
+                    existing = self.existing_hashes([c.point_id for c in batch])
+                    todo = [c for c in batch if existing.get(c.point_id) != c.content_hash]
+                    stats.skipped += len(batch) - len(todo)
+                    if not todo:
+                        continue
+
+                    reused = self.reusable_points(todo)
+                    to_embed = [c for c in todo if c.point_id not in reused]
+                    points = list(reused.values())
+                    if to_embed:
+                        points += self.embed(to_embed, dense_executor)
+                    stats.reused += len(reused)
+                    pending.append(upsert_executor.submit(
+                        self.client.upsert, collection_name=self.collection_name, points=points, wait=True
+                    ))
+                    stats.upserted += len(points)
+
+                    # Bound memory: wait for the oldest upsert once the pool is saturated
+                    while len(pending) >= self.upsert_workers:
+                        pending.pop(0).result()
+
+            for future in pending:
+                future.result()
+
+        logger.info(
+            f"Ingestion into {self.collection_name} done: {stats.chunks} chunks, "
+            f"{stats.embedded} embedded, {stats.reused} reused, {stats.skipped} unchanged"
+        )
+        return stats
+
+
+def load_manifest(path: str) -> List[BookSource]:
+    """Read a JSONL manifest of {"path", "discipline", "grade", "publisher"} rows."""
+    with open(path, encoding="utf-8") as f:
+        return [BookSource(**json.loads(line)) for line in f if line.strip()]
+
+
+# For running ingestion from the command line
+if __name__ == "__main__":
+    import argparse
+
+    from FlagEmbedding import BGEM3FlagModel
+    from langchain_voyageai import VoyageAIEmbeddings
+
+    from Backend.app.db.vector_store import create_qdrant_client
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", help="JSONL file with path/discipline/grade/publisher rows")
+    parser.add_argument("--path", help="Single PDF or text file to ingest")
+    parser.add_argument("--discipline")
+    parser.add_argument("--grade")
+    parser.add_argument("--publisher")
+    parser.add_argument("--collection", default=settings.COLLECTION_NAME)
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--upsert-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.manifest:
+        sources = load_manifest(args.manifest)
+    elif args.path and args.discipline and args.grade and args.publisher:
+        sources = [BookSource(args.path, args.discipline, args.grade, args.publisher)]
+    else:
+        parser.error("either --manifest or --path with --discipline/--grade/--publisher is required")
+
+    pipeline = IngestionPipeline(
+        client=create_qdrant_client(),
+        dense_model=VoyageAIEmbeddings(
+            voyage_api_key=settings.VOYAGE_API,
+            model=settings.VOYAGE_EMBED_MODEL,
+            output_dimension=settings.DENSE_VECTOR_SIZE,
+            batch_size=args.batch_size
+        ),
+        sparse_model=BGEM3FlagModel("BAAI/bge-m3", use_fp16=True),
+        collection_name=args.collection,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        upsert_workers=args.upsert_workers,
+    )
+    result = pipeline.ingest(sources)
+    print(
+        f"chunks={result.chunks} embedded={result.embedded} "
+        f"reused={result.reused} unchanged={result.skipped}"
+    )
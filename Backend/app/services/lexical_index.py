@@ -0,0 +1,356 @@
+"""
+On-disk BM25 index over the RAG chunks, used as degraded-mode retrieval.
+
+When Qdrant is unavailable, RAGService answers from this index instead of
+returning no context. The index is built from the same chunks (scrolled out
+of the collection) and stored compactly: a term vocabulary, CSR-style
+postings of (doc, term frequency) as memory-mapped NumPy arrays, document
+lengths and the retrieval payloads. Searches run in a process pool so BM25
+scoring never blocks the API worker.
+
+Each build is written to its own version directory next to the index path,
+and the index path is a symlink switched atomically to the new version, so
+readers never see a missing or half-written index. Processes pin the
+version they loaded; the previous version is kept until the next build.
+ensure_lexical_index lets one process build while the others wait for it.
+
+Usage (run after each (re)index, while Qdrant is up):
+    python -m Backend.app.services.lexical_index --dir /tmp/jauapai_lexical
+"""
+import contextlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+from qdrant_client.http.models import QueryResponse
+
+from Backend.app.core.config import settings
+from Backend.app.services.collection_manager import FILTER_KEYS
+from Backend.app.services.hot_shard import top_k
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Records which collection an index directory was built from
+META_FILE = "meta.json"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens (Cyrillic/Kazakh letters included), dropping 1-char tokens."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1]
+
+
+def build_lexical_index(
+    client: QdrantClient,
+    directory: str,
+    payload_fields: Sequence[str],
+    collection_name: Optional[str] = None,
+    batch_size: int = 256,
+) -> int:
+    """
+    Scroll every chunk out of Qdrant and write a BM25 index.
+
+    Args:
+        client: Qdrant client
+        directory: Directory to write the index files into
+        payload_fields: Payload projection stored with each chunk
+        collection_name: Collection (or alias) to read (defaults to search_collection)
+        batch_size: Points per scroll request
+
+    Returns:
+        Number of indexed chunks
+    """
+    collection_name = collection_name or settings.search_collection
+    vocab: Dict[str, int] = {}
+    postings: List[Dict[int, int]] = []
+    ids, payloads, lengths = [], [], []
+
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=models.PayloadSelectorInclude(include=list(payload_fields)),
+            with_vectors=False,
+        )
+        for point in points:
+            doc = len(ids)
+            payload = point.payload or {}
+            tokens = tokenize(payload.get("page_content", ""))
+            ids.append(point.id)
+            payloads.append(payload)
+            lengths.append(len(tokens))
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                term = vocab.setdefault(token, len(vocab))
+                counts[term] = counts.get(term, 0) + 1
+            postings.extend({} for _ in range(len(vocab) - len(postings)))
+            for term, tf in counts.items():
+                postings[term][doc] = tf
+        if offset is None:
+            break
+
+    if not ids:
+        raise ValueError(f"No chunks in {collection_name}")
+
+    offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    docs = np.fromiter((d for p in postings for d in p), dtype=np.int32, count=int(offsets[-1]))
+    tfs = np.fromiter((tf for p in postings for tf in p.values()), dtype=np.uint16, count=int(offsets[-1]))
+
+    path = Path(directory)
+    version = path.with_name(f"{path.name}.v{time.time_ns()}")
+    version.mkdir(parents=True)
+    try:
+        np.save(version / "offsets.npy", offsets)
+        np.save(version / "docs.npy", docs)
+        np.save(version / "tfs.npy", tfs)
+        np.save(version / "doc_lengths.npy", np.asarray(lengths, dtype=np.uint32))
+        with open(version / "vocab.json", "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        with open(version / "points.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "payloads": payloads}, f, ensure_ascii=False)
+        with open(version / META_FILE, "w", encoding="utf-8") as f:
+            json.dump({"collection": collection_name}, f)
+        publish_version(path, version)
+    except Exception:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+
+    logger.info(f"Built lexical index {directory}: {len(ids)} chunks, {len(vocab)} terms")
+    return len(ids)
+
+
+def publish_version(path: Path, version: Path) -> None:
+    """
+    Point the index symlink at a new version directory.
+
+    The link is replaced atomically (os.replace), so the index path always
+    resolves to a complete index. The version it replaces is kept for
+    processes still loading it; older ones are deleted.
+    """
+    if path.is_dir() and not path.is_symlink():
+        # Index written before versioned publishing
+        path.rename(path.with_name(f"{path.name}.v0"))
+    previous = Path(os.path.realpath(path)) if path.is_symlink() else None
+    link = path.with_name(f"{path.name}.link-{os.getpid()}")
+    link.unlink(missing_ok=True)
+    link.symlink_to(version.name)
+    os.replace(link, path)
+    for old in path.parent.glob(f"{path.name}.v*"):
+        if old.name not in (version.name, previous.name if previous else None):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def build_lock(directory: str) -> Iterator[None]:
+    """Exclusive lock across processes for building the index at `directory`."""
+    import fcntl
+
+    path = Path(directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f"{path.name}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def ensure_lexical_index(
+    client: QdrantClient,
+    directory: str,
+    payload_fields: Sequence[str],
+    collection_name: str,
+) -> bool:
+    """
+    Build the index unless `directory` already holds one of collection_name.
+
+    Worker processes that call this together (startup, the same alias swap)
+    queue on build_lock: the first builds, the others find its index.
+
+    Returns:
+        True if this call built the index
+    """
+    with build_lock(directory):
+        if index_collection(directory) == collection_name:
+            return False
+        build_lexical_index(client, directory, payload_fields, collection_name)
+        return True
+
+
+def index_collection(directory: str) -> Optional[str]:
+    """Collection the index in `directory` was built from, or None if unknown or missing."""
+    try:
+        with open(Path(directory) / META_FILE, encoding="utf-8") as f:
+            return json.load(f).get("collection")
+    except (OSError, ValueError):
+        return None
+
+
+class LexicalIndex:
+    """BM25 search over an index directory written by build_lexical_index."""
+
+    def __init__(self, directory: str) -> None:
+        path = Path(directory)
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        self.docs = np.load(path / "docs.npy", mmap_mode="r")
+        self.tfs = np.load(path / "tfs.npy", mmap_mode="r")
+        self.doc_lengths = np.load(path / "doc_lengths.npy").astype(np.float32)
+        with open(path / "vocab.json", encoding="utf-8") as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        with open(path / "points.json", encoding="utf-8") as f:
+            points = json.load(f)
+        self.ids: List[Any] = points["ids"]
+        self.payloads: List[Dict[str, Any]] = points["payloads"]
+        self.fields = {
+            key: np.array([str(p.get("metadata", {}).get(key, "")) for p in self.payloads], dtype=object)
+            for key in FILTER_KEYS
+        }
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for the query."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        if not len(self):
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / (self.avg_length or 1.0))
+        for token in set(tokenize(query)):
+            term = self.vocab.get(token)
+            if term is None:
+                continue
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.docs[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            idf = math.log(1 + (len(self) - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+    def search(
+        self,
+        query: str,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top chunks by BM25 among those matching the filter keys.
+
+        Returns:
+            Dicts with 'id', 'score' and 'payload', best first
+        """
+        scores = self.scores(query)
+        mask = scores > 0
+        for key in FILTER_KEYS:
+            value = (metadata_filter or {}).get(key)
+            if value:
+                mask &= self.fields[key] == str(value)
+        return [
+            {"id": self.ids[doc], "score": float(scores[doc]), "payload": self.payloads[doc]}
+            for doc in top_k(scores, np.flatnonzero(mask), limit)
+        ]
+
+
+# Per-process index, loaded once by the pool initializer
+_worker_index: Optional[LexicalIndex] = None
+
+
+def _init_worker(directory: str) -> None:
+    global _worker_index
+    _worker_index = LexicalIndex(directory)
+
+
+def _worker_ready(_: int) -> int:
+    return len(_worker_index)
+
+
+def _search_in_worker(query: str, metadata_filter: Optional[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    return _worker_index.search(query, metadata_filter, limit)
+
+
+class LexicalFallback:
+    """Runs LexicalIndex searches in a process pool for degraded-mode retrieval."""
+
+    def __init__(self, directory: str, workers: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        # Pin the version the index path resolves to now; later builds publish new ones
+        self.directory = os.path.realpath(directory)
+        if not (Path(self.directory) / "points.json").exists():
+            raise FileNotFoundError(f"No lexical index in {directory}")
+        self.timeout = timeout or settings.LEXICAL_FALLBACK_TIMEOUT
+        workers = workers or settings.LEXICAL_FALLBACK_WORKERS
+        # spawn: forking a process that holds model weights and client threads is unsafe
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.directory,),
+        )
+        # Start the workers and load the index now, not within the first
+        # degraded-mode search's timeout during an outage
+        try:
+            list(self.pool.map(_worker_ready, range(workers)))
+        except Exception:
+            self.close()
+            raise
+
+    def search(
+        self,
+        query: str,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        limit: int = 50,
+    ) -> QueryResponse:
+        """BM25 search in a worker process, returned in the same shape as query_points."""
+        hits = self.pool.submit(_search_in_worker, query, metadata_filter, limit).result(timeout=self.timeout)
+        return QueryResponse(points=[
+            models.ScoredPoint(id=hit["id"], version=0, score=hit["score"], payload=hit["payload"])
+            for hit in hits
+        ])
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# For building the index from the command line
+if __name__ == "__main__":
+    import argparse
+
+    from Backend.app.db.vector_store import create_qdrant_client
+    from Backend.app.services.rag_service import RETRIEVAL_PAYLOAD_FIELDS
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=settings.LEXICAL_INDEX_DIR)
+    parser.add_argument("--collection", default=settings.search_collection)
+    args = parser.parse_args()
+
+    from Backend.app.services.collection_manager import resolve_alias
+
+    client = create_qdrant_client()
+    # Record the concrete collection, so API workers see the index is current
+    collection = resolve_alias(client, args.collection) or args.collection
+    with build_lock(args.dir):
+        count = build_lexical_index(client, args.dir, RETRIEVAL_PAYLOAD_FIELDS, collection)
+    print(f"Indexed {count} chunks into {args.dir}")
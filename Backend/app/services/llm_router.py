@@ -0,0 +1,239 @@
+"""
+LLM model routing with a failover chain.
+
+Picks the model for each request from the user's tier, the question length and
+the optional 'model' key in the message filters, then streams from a chain of
+models: when a model times out, is rate limited (429), is unavailable or has
+its circuit open, the next model in the chain takes over. If the failure
+happens mid-answer, the next model is asked to continue from the partial text
+so the client's stream is never dropped.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages.base import BaseMessage
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.core.resilience import CircuitOpenError, DependencyGuard
+
+logger = logging.getLogger(__name__)
+
+CONTINUE_PROMPT = "Жауапты дәл тоқтаған жерінен жалғастыр, алдыңғы мәтінді қайталама."
+
+# Status codes (or exception class names) that move the request to the next model
+FAILOVER_STATUS_CODES = {429, 500, 502, 503, 504}
+FAILOVER_ERROR_NAMES = {"ResourceExhausted", "RateLimitError", "ServiceUnavailable", "DeadlineExceeded", "APITimeoutError"}
+
+
+@dataclass
+class ModelRoute:
+    """Models to try for a request, in order."""
+    chain: List[str]
+    reason: str
+
+    @property
+    def primary(self) -> str:
+        return self.chain[0]
+
+
+def provider_for(model: str) -> str:
+    """Provider serving a model id: 'openai' for gpt-*/o* models, otherwise 'gemini'."""
+    if model.startswith(("gpt-", "o1", "o3", "o4")):
+        return "openai"
+    return "gemini"
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """Whether an LLM error should move the request to the next model in the chain."""
+    if isinstance(error, (TimeoutError, CircuitOpenError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in FAILOVER_STATUS_CODES:
+        return True
+    if type(error).__name__ in FAILOVER_ERROR_NAMES:
+        return True
+    return "429" in str(error) or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def chunk_text(chunk: Any) -> str:
+    """Text of a streamed chunk (Gemini may return a list of dicts with 'text' keys)."""
+    if not hasattr(chunk, "content"):
+        return str(chunk)
+    content = chunk.content
+    if isinstance(content, list):
+        return "".join(item["text"] for item in content if isinstance(item, dict) and "text" in item)
+    if isinstance(content, str):
+        return content
+    return str(content)
+
+
+def build_chat_model(model: str) -> BaseChatModel:
+    """Create the LangChain chat model for a model id."""
+    if provider_for(model) == "openai":
+        if not settings.OPENAI_API_KEY:
+            raise ValueError(f"OPENAI_API_KEY is required for {model}")
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            model=model,
+            temperature=settings.LLM_TEMPERATURE,
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.GEMINI_TIMEOUT,
+            stream_usage=True
+        )
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=settings.LLM_TEMPERATURE,
+        google_api_key=settings.GEMINI_API_KEY,
+        timeout=settings.GEMINI_TIMEOUT
+    )
+
+
+class LLMRouter:
+    """Routes requests to chat models and streams with per-model guards and failover."""
+
+    def __init__(
+        self,
+        guard_factory: Callable[[str, float], DependencyGuard],
+        clients: Optional[Dict[str, BaseChatModel]] = None,
+    ) -> None:
+        """
+        Args:
+            guard_factory: Creates the timeout/circuit breaker guard for a model
+                (e.g. RAGService.create_guard)
+            clients: Pre-built chat models by model id (others are created on first use)
+        """
+        self.guard_factory = guard_factory
+        self.clients: Dict[str, BaseChatModel] = dict(clients or {})
+        self.guards: Dict[str, DependencyGuard] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def default_model(self) -> str:
+        return settings.LLM_DEFAULT_MODEL
+
+    def allowed_models(self, tier: str) -> List[str]:
+        """Models a tier may request through filters['model']."""
+        models = [settings.LLM_DEFAULT_MODEL]
+        if tier == "pro" and settings.LLM_PRO_MODEL:
+            models.append(settings.LLM_PRO_MODEL)
+        return models
+
+    def route(self, tier: str, question: str, requested: Optional[str] = None) -> ModelRoute:
+        """
+        Choose the model chain for a request.
+
+        Args:
+            tier: Subscription tier (pro, free or guest)
+            question: The user question
+            requested: Model id from filters['model'], honoured if the tier allows it
+
+        Returns:
+            Primary model followed by the failover models
+        """
+        if requested and requested in self.allowed_models(tier):
+            primary, reason = requested, "requested"
+        elif tier == "pro" and settings.LLM_PRO_MODEL and len(question) >= settings.LLM_LONG_QUESTION_CHARS:
+            primary, reason = settings.LLM_PRO_MODEL, "long_question"
+        else:
+            primary, reason = settings.LLM_DEFAULT_MODEL, "default"
+
+        chain = [primary, settings.LLM_DEFAULT_MODEL]
+        if settings.LLM_FALLBACK_MODEL and (
+            provider_for(settings.LLM_FALLBACK_MODEL) != "openai" or settings.OPENAI_API_KEY
+        ):
+            chain.append(settings.LLM_FALLBACK_MODEL)
+        return ModelRoute(chain=list(dict.fromkeys(chain)), reason=reason)
+
+    def client(self, model: str) -> BaseChatModel:
+        """Chat model for a model id, created on first use."""
+        with self._lock:
+            if model not in self.clients:
+                self.clients[model] = build_chat_model(model)
+            return self.clients[model]
+
+    def guard(self, model: str) -> DependencyGuard:
+        """Timeout + circuit breaker + bulkhead guard for a model, created on first use."""
+        with self._lock:
+            if model not in self.guards:
+                self.guards[model] = self.guard_factory(f"llm:{model}", settings.GEMINI_TIMEOUT)
+            return self.guards[model]
+
+    def close(self) -> None:
+        """Shut down the models' guard thread pools."""
+        with self._lock:
+            for guard in self.guards.values():
+                guard.close()
+
+    def stream(
+        self,
+        route: ModelRoute,
+        prepare: Callable[[str], Tuple[List[BaseMessage], Dict[str, Any]]],
+        first_timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Stream from the route's models, failing over on timeouts and rate limits.
+
+        Args:
+            route: Result of route()
+            prepare: Returns (messages, stream kwargs) for a model, so provider
+                specific options like cached_content are only sent where valid
+            first_timeout: Max seconds until a model's first chunk
+            idle_timeout: Max seconds between chunks
+
+        Yields:
+            (model id, chunk) pairs
+        """
+        partial = ""
+        for position, model in enumerate(route.chain):
+            last = position == len(route.chain) - 1
+            start = time.perf_counter()
+            input_tokens = output_tokens = 0
+            try:
+                messages, kwargs = prepare(model)
+                if partial:
+                    # Continue the interrupted answer instead of starting over
+                    messages = messages + [AIMessage(content=partial), HumanMessage(content=CONTINUE_PROMPT)]
+                for chunk in self.guard(model).stream(
+                    self.client(model).stream,
+                    messages,
+                    first_timeout=first_timeout,
+                    idle_timeout=idle_timeout,
+                    **kwargs
+                ):
+                    usage = getattr(chunk, "usage_metadata", None) or {}
+                    # LangChain reports per-chunk usage deltas
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+                    partial += chunk_text(chunk)
+                    yield model, chunk
+            except Exception as e:
+                outcome = "failover" if not last and is_failover_error(e) else "error"
+                self.record(model, outcome, start, input_tokens, output_tokens)
+                if outcome == "error":
+                    raise
+                metrics.increment("llm_failover", labels={"from": model, "to": route.chain[position + 1]})
+                logger.warning(f"LLM {model} failed ({e}), failing over to {route.chain[position + 1]}")
+                continue
+            self.record(model, "ok", start, input_tokens, output_tokens)
+            return
+
+    @staticmethod
+    def record(model: str, outcome: str, start: float, input_tokens: int, output_tokens: int) -> None:
+        """Per-model request, latency and token metrics."""
+        metrics.increment("llm_requests", labels={"model": model, "outcome": outcome})
+        metrics.observe("llm_latency_ms", (time.perf_counter() - start) * 1000, {"model": model})
+        if input_tokens:
+            metrics.increment("llm_input_tokens", input_tokens, {"model": model})
+        if output_tokens:
+            metrics.increment("llm_output_tokens", output_tokens, {"model": model})
@@ -0,0 +1,95 @@
+"""
+Per-client-IP login throttling.
+
+Every login attempt costs a bcrypt verification, so attempts are limited per
+client IP (LOGIN_ATTEMPTS_PER_MINUTE, sliding window) before any hashing
+happens. This bounds both password guessing and the CPU one client can burn.
+Counters live in process memory, so the limit applies per worker process.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+from starlette.requests import Request
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Oldest clients are forgotten beyond this many tracked IPs
+MAX_TRACKED_CLIENTS = 100_000
+
+
+class LoginThrottled(Exception):
+    """Raised when a client exceeded its login attempts; maps to 429 with Retry-After."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Too many login attempts, please retry later")
+        self.retry_after = retry_after
+
+
+def client_ip(request: Request) -> str:
+    """
+    Client IP of a request.
+
+    Behind a proxy (TRUST_PROXY_HEADERS) this is the last X-Forwarded-For hop,
+    the address the proxy itself saw; earlier hops are client-controlled.
+    """
+    if settings.TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if hops:
+            return hops[-1]
+    return request.client.host if request.client else "unknown"
+
+
+class LoginThrottle:
+    """Sliding-window attempt counter per client key."""
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        window_seconds: float = 60.0,
+        max_clients: int = MAX_TRACKED_CLIENTS,
+    ) -> None:
+        self.limit = limit or settings.LOGIN_ATTEMPTS_PER_MINUTE
+        self.window_seconds = window_seconds
+        self.max_clients = max_clients
+        self._attempts: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> None:
+        """
+        Count an attempt for the client.
+
+        Raises:
+            LoginThrottled: The client already used its attempts in the window
+        """
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts is None:
+                attempts = self._attempts[key] = deque()
+                if len(self._attempts) > self.max_clients:
+                    self._attempts.popitem(last=False)
+            else:
+                self._attempts.move_to_end(key)
+            while attempts and attempts[0] <= now - self.window_seconds:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                retry_after = max(1, math.ceil(attempts[0] + self.window_seconds - now))
+                metrics.increment("login_throttled")
+                raise LoginThrottled(retry_after)
+            attempts.append(now)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._attempts.clear()
+
+
+# Global throttle instance (per worker process)
+login_throttle = LoginThrottle()
@@ -0,0 +1,101 @@
+"""
+bcrypt hashing and verification on a dedicated, bounded thread pool.
+
+bcrypt deliberately costs 100-300 ms of CPU per call. Run inside sync
+endpoints it occupies the threadpool shared with every other sync handler, so
+a burst of logins starves conversation CRUD. PasswordHasher runs it on
+PASSWORD_HASH_WORKERS threads of its own (the bcrypt extension releases the
+GIL while hashing, so they use separate cores) and admits at most
+PASSWORD_HASH_MAX_PENDING waiting jobs; beyond that callers get
+PasswordHasherBusy, mapped to 503 with a Retry-After estimate.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.core.security import hash_password, verify_and_update_password
+
+logger = logging.getLogger(__name__)
+
+# Initial estimate of one hash/verify, refined by a moving average
+EXPECTED_HASH_SECONDS = 0.25
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hash queue is full; maps to 503 with Retry-After."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Too many sign-in requests, please retry")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Async bcrypt hash/verify with a bounded queue."""
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None) -> None:
+        """
+        Args:
+            workers: Threads running bcrypt (defaults to PASSWORD_HASH_WORKERS)
+            max_pending: Jobs allowed to wait for a thread (PASSWORD_HASH_MAX_PENDING)
+        """
+        self.workers = workers or settings.PASSWORD_HASH_WORKERS
+        self.max_pending = settings.PASSWORD_HASH_MAX_PENDING if max_pending is None else max_pending
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self._avg_seconds = EXPECTED_HASH_SECONDS
+        self._lock = threading.Lock()
+
+    async def hash(self, password: str) -> str:
+        """bcrypt hash of a password with the configured cost."""
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password against its stored hash.
+
+        Returns:
+            (matches, new hash to store when the stored cost differs from BCRYPT_ROUNDS)
+        """
+        return await self._run("verify", verify_and_update_password, password, hashed)
+
+    async def _run(self, op: str, fn: Callable, *args: Any) -> Any:
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_pending:
+                metrics.increment("password_hash_rejected", labels={"op": op})
+                raise PasswordHasherBusy(self.retry_after())
+            self.in_flight += 1
+        future = self.executor.submit(self._timed, op, fn, *args)
+        # Counted until the thread finishes, even if the request is cancelled
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _timed(self, op: str, fn: Callable, *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.observe("password_hash_ms", elapsed * 1000, {"op": op})
+            with self._lock:
+                self._avg_seconds = 0.9 * self._avg_seconds + 0.1 * elapsed
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        return max(1, math.ceil(self.in_flight / self.workers * self._avg_seconds))
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global hasher instance (per worker process)
+password_hasher = PasswordHasher()
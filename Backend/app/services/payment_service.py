@@ -0,0 +1,232 @@
+"""
+Telegram Stars payment state machine.
+
+A payment is created pending and moves to completed (or failed); a completed
+payment can later be refunded. Every transition is a conditional UPDATE on the
+expected current status, so when two handlers race (Telegram retrying a
+successful_payment, the same update reaching two workers) exactly one of them
+performs it and the other learns that it did not.
+
+Completing a payment and upgrading its user happen in one transaction, keyed
+on Telegram's charge id: a charge that is already recorded is reported as a
+duplicate instead of being applied again (telegram_payment_charge_id is
+unique). Opening a purchase locks the user row (SELECT ... FOR UPDATE) and
+reuses the user's pending payment, so repeated /start commands share one
+invoice; the partial unique index on pending payments backs this up on
+databases without row locks.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from Backend.app.core.metrics import metrics
+from Backend.app.models.payment import Payment
+from Backend.app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+REFUNDED = "refunded"
+
+# Allowed status changes; completed and failed are final except for refunds
+TRANSITIONS = {
+    PENDING: (COMPLETED, FAILED),
+    COMPLETED: (REFUNDED,),
+    FAILED: (),
+    REFUNDED: (),
+}
+
+
+class InvalidPaymentTransition(ValueError):
+    """Raised for a status change the state machine does not allow."""
+
+
+def _as_uuid(value: Any) -> Optional[uuid.UUID]:
+    """Parse an id taken from a deep link or invoice payload; None if malformed."""
+    try:
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def transition(db: Session, payment_id: uuid.UUID, from_status: str, to_status: str, **values: Any) -> bool:
+    """
+    Move a payment from one status to another if it is still in the first.
+
+    The caller commits; until then the payment row stays locked, so
+    concurrent transitions of the same payment wait and then find nothing to do.
+
+    Args:
+        db: Database session
+        payment_id: Payment to update
+        from_status: Status the payment must currently have
+        to_status: New status
+        **values: Further Payment columns to set with the transition
+
+    Returns:
+        True if this call made the transition
+
+    Raises:
+        InvalidPaymentTransition: to_status cannot follow from_status
+    """
+    if to_status not in TRANSITIONS.get(from_status, ()):
+        raise InvalidPaymentTransition(f"Payment cannot go from {from_status} to {to_status}")
+    changes = {getattr(Payment, name): value for name, value in values.items()}
+    changes[Payment.status] = to_status
+    updated = (
+        db.query(Payment)
+        .filter(Payment.id == payment_id, Payment.status == from_status)
+        .update(changes, synchronize_session=False)
+    )
+    return updated == 1
+
+
+def _pending_payment(db: Session, user_id: uuid.UUID) -> Optional[Payment]:
+    return (
+        db.query(Payment)
+        .filter(Payment.user_id == user_id, Payment.status == PENDING)
+        .order_by(Payment.created_at.desc())
+        .first()
+    )
+
+
+def open_payment(db: Session, user_id: Any, amount_stars: int) -> Tuple[str, Optional[Payment]]:
+    """
+    The pending Pro payment of a user, created if the user has none.
+
+    A pending payment for another amount (the price changed since it was
+    created) is failed and replaced.
+
+    Args:
+        db: Database session
+        user_id: Backend user id from the purchase deep link
+        amount_stars: Current price in Telegram Stars
+
+    Returns:
+        ("created" or "reused", payment), ("not_found", None) or ("already_pro", None)
+    """
+    user_uuid = _as_uuid(user_id)
+    if user_uuid is None:
+        return "not_found", None
+    try:
+        # Serializes concurrent /start commands of the same user
+        user = db.query(User).filter(User.id == user_uuid).with_for_update().first()
+        if user is None:
+            return "not_found", None
+        if user.subscription_tier == "pro":
+            return "already_pro", None
+
+        payment = _pending_payment(db, user_uuid)
+        if payment is not None and payment.amount_stars == amount_stars:
+            db.commit()
+            metrics.increment("payments_opened", labels={"outcome": "reused"})
+            return "reused", payment
+        if payment is not None:
+            transition(db, payment.id, PENDING, FAILED)
+
+        payment = Payment(
+            user_id=user_uuid,
+            amount_stars=amount_stars,
+            payload=f"pro_subscription_{user_uuid}",
+            status=PENDING,
+        )
+        db.add(payment)
+        db.commit()
+        db.refresh(payment)
+        metrics.increment("payments_opened", labels={"outcome": "created"})
+        return "created", payment
+    except IntegrityError:
+        # A concurrent /start created the pending payment first
+        db.rollback()
+        payment = _pending_payment(db, user_uuid)
+        if payment is None:
+            raise
+        metrics.increment("payments_opened", labels={"outcome": "reused"})
+        return "reused", payment
+    finally:
+        if db.in_transaction():
+            db.rollback()  # Release the user row lock on early returns
+
+
+def payment_status(db: Session, payment_id: Any) -> Optional[str]:
+    """Status of a payment, or None if it does not exist."""
+    payment_uuid = _as_uuid(payment_id)
+    if payment_uuid is None:
+        return None
+    return db.query(Payment.status).filter(Payment.id == payment_uuid).scalar()
+
+
+def complete_payment(
+    db: Session,
+    payment_id: Any,
+    telegram_charge_id: str,
+    provider_charge_id: Optional[str] = None,
+) -> str:
+    """
+    Record a successful charge and upgrade the paying user to Pro, once.
+
+    Args:
+        db: Database session
+        payment_id: Payment id from the invoice payload
+        telegram_charge_id: Telegram's charge id, the idempotency key
+        provider_charge_id: Provider charge id (empty for Stars)
+
+    Returns:
+        "completed"; "duplicate" if this charge was already recorded;
+        "not_found"; or "conflict" if the payment was no longer pending
+    """
+    payment_uuid = _as_uuid(payment_id)
+    outcome = "not_found"
+    if payment_uuid is not None:
+        try:
+            outcome = _complete(db, payment_uuid, telegram_charge_id, provider_charge_id)
+        except IntegrityError:
+            # The unique charge id was recorded by a concurrent transaction
+            db.rollback()
+            outcome = "duplicate"
+    metrics.increment("payment_completions", labels={"outcome": outcome})
+    if outcome in ("not_found", "conflict"):
+        logger.error(f"Charge {telegram_charge_id} for payment {payment_id} not applied: {outcome}")
+    elif outcome == "duplicate":
+        logger.info(f"Charge {telegram_charge_id} for payment {payment_id} already recorded")
+    return outcome
+
+
+def _complete(db: Session, payment_id: uuid.UUID, telegram_charge_id: str, provider_charge_id: Optional[str]) -> str:
+    if db.query(Payment.id).filter(Payment.telegram_payment_charge_id == telegram_charge_id).first():
+        return "duplicate"
+
+    now = datetime.now(timezone.utc)
+    if not transition(
+        db, payment_id, PENDING, COMPLETED,
+        completed_at=now,
+        telegram_payment_charge_id=telegram_charge_id,
+        provider_payment_charge_id=provider_charge_id,
+    ):
+        db.rollback()
+        payment = db.query(Payment).filter(Payment.id == payment_id).first()
+        if payment is None:
+            return "not_found"
+        if payment.telegram_payment_charge_id == telegram_charge_id:
+            return "duplicate"
+        return "conflict"
+
+    # The payment row, not the invoice payload, says who paid
+    user_id = db.query(Payment.user_id).filter(Payment.id == payment_id).scalar()
+    db.query(User).filter(User.id == user_id).update(
+        {
+            User.subscription_tier: "pro",
+            User.message_count: 0,
+            User.message_count_reset_at: now,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    logger.info(f"User {user_id} upgraded to Pro via Telegram Stars")
+    return "completed"
@@ -0,0 +1,249 @@
+"""
+Static prompt prefix and provider-side context caching.
+
+The tutoring instructions are identical for every request, so the prompt is
+assembled as a stable prefix (system instructions, then conversation history)
+followed by a variable suffix (retrieved context and the question) in the last
+user turn. The stable prefix is what Gemini's implicit prefix cache matches on;
+with PROMPT_CACHE_BACKEND=gemini the instructions are additionally stored as
+explicit cached content and referenced by name instead of being resent.
+
+Usage (token accounting for a sample request):
+    python -m Backend.app.services.prompt_cache --context-tokens 4000 --history-tokens 600
+"""
+import hashlib
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.services.context_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TUTOR_INSTRUCTIONS = """
+Сен Қазақстандағы ҰБТ (Бірыңғай ұлттық тестілеу) бойынша репетиторсын, оқушыларды күрделі ЕНТ-ға дайындауға маманданғансын.
+Сенің мақсатың - тек жауап беру емес, сонымен қатар оқушыға берілген мәтінге сүйене отырып, сұрақтар қойып материалды түсінуге көмектесу.
+
+Нұсқаулықтар:
+1. Жауапты нақты фактілермен (жылдар, есімдер, оқиғалар) негізде.
+2. Жауапты тек контекст негізінде беру керек, жаңа ақпаратты ойлап табуға болмайды.
+3. Егер контекстте ақпарат болмаса, "Мәтінде бұл сұраққа жауап жоқ" деп айт, бірақ "мен ЕНТ-ға дайындауға көмектесе аламын" деп айт.
+4. Жауаптың соңында міндетті түрде пайдаланылған дереккөздерді көрсет. (Кітап атауы, Сыныбы, Баспасы, Кытап беттерінің нөмірлері)
+5. Контекст соңғы хабарламада "Контекст:" бөлімінде беріледі, сұрақ "Сұрақ:" бөлімінде.
+"""
+
+
+def format_question_turn(context_text: str, question: str) -> str:
+    """Variable suffix of the prompt: retrieved context and the current question."""
+    return f"Контекст:\n{context_text}\n\nСұрақ:\n{question}"
+
+
+@dataclass
+class PromptTokenReport:
+    """Estimated input tokens of one request, split by prompt part."""
+    static_tokens: int
+    history_tokens: int
+    variable_tokens: int
+    cached: bool
+
+    @property
+    def input_tokens(self) -> int:
+        return self.static_tokens + self.history_tokens + self.variable_tokens
+
+    @property
+    def saved_tokens(self) -> int:
+        """Input tokens served from the provider cache instead of being resent."""
+        return self.static_tokens if self.cached else 0
+
+    @property
+    def billed_tokens(self) -> int:
+        return self.input_tokens - self.saved_tokens
+
+    def record(self) -> None:
+        """Report the split and the savings to the metrics registry."""
+        metrics.observe("prompt_input_tokens", self.input_tokens)
+        metrics.observe("prompt_static_tokens", self.static_tokens)
+        metrics.observe("prompt_variable_tokens", self.variable_tokens)
+        if self.saved_tokens:
+            metrics.increment("prompt_cache_saved_tokens", self.saved_tokens)
+            metrics.increment("prompt_cache_hits")
+        else:
+            metrics.increment("prompt_cache_misses")
+
+
+class BasePromptCache(ABC):
+    """Interface for caching the static instructions on the provider side."""
+
+    name: str = "base"
+
+    # Seconds before creating a cache entry is tried again after a failure
+    RETRY_SECONDS = 60
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[int] = None,
+        min_tokens: Optional[int] = None,
+        create_timeout: Optional[float] = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds or settings.PROMPT_CACHE_TTL_SECONDS
+        self.min_tokens = settings.PROMPT_CACHE_MIN_TOKENS if min_tokens is None else min_tokens
+        self.create_timeout = create_timeout or settings.PROMPT_CACHE_CREATE_TIMEOUT
+        # (model, instructions digest) -> (cache name, expires at)
+        self._entries: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        # Per-key creation locks and the time of the last failed creation
+        self._creating: Dict[Tuple[str, str], threading.Lock] = {}
+        self._failed_at: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def cached_content(self, model: str, instructions: str) -> Optional[str]:
+        """
+        Name of the cached content holding the instructions for this model.
+
+        Creates (or re-creates before expiry) the cache entry on demand. One
+        request per model does the (time-bounded) provider call, outside the
+        shared lock; requests arriving meanwhile, or within RETRY_SECONDS of
+        a failed creation, get None. None means the instructions are sent
+        inline as a system message.
+
+        Args:
+            model: Model the cache is bound to
+            instructions: Static system instructions
+
+        Returns:
+            Cache name to pass as cached_content, or None
+        """
+        if estimate_tokens(instructions) < self.min_tokens:
+            return None
+        key = (model, hashlib.sha256(instructions.encode("utf-8")).hexdigest())
+        with self._lock:
+            name = self._fresh(key)
+            if name is not None:
+                return name
+            if time.time() - self._failed_at.get(key, 0.0) < self.RETRY_SECONDS:
+                return None
+            creating = self._creating.setdefault(key, threading.Lock())
+
+        if not creating.acquire(blocking=False):
+            metrics.increment("prompt_cache_create_busy", labels={"backend": self.name})
+            return None
+        try:
+            with self._lock:
+                # Another request may have published the entry in the meantime
+                name = self._fresh(key)
+            if name is not None:
+                return name
+            try:
+                name = self.create(model, instructions)
+            except Exception as e:
+                logger.error(f"Failed to create prompt cache ({self.name}): {e}")
+                metrics.increment("prompt_cache_errors", labels={"backend": self.name})
+                with self._lock:
+                    self._failed_at[key] = time.time()
+                return None
+            with self._lock:
+                self._entries[key] = (name, time.time() + self.ttl_seconds)
+                self._failed_at.pop(key, None)
+        finally:
+            creating.release()
+        metrics.increment("prompt_cache_created", labels={"backend": self.name})
+        logger.info(f"Created prompt cache {name} for {model}")
+        return name
+
+    def _fresh(self, key: Tuple[str, str]) -> Optional[str]:
+        entry = self._entries.get(key)
+        # Refresh a little early so in-flight requests never reference an expired cache
+        if entry is not None and entry[1] - 60 > time.time():
+            return entry[0]
+        return None
+
+    @abstractmethod
+    def create(self, model: str, instructions: str) -> str:
+        """Store the instructions with the provider within create_timeout seconds and return the cache name."""
+
+
+class GeminiPromptCache(BasePromptCache):
+    """Explicit Gemini context caching through the Generative Language cache service."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        from google.ai import generativelanguage_v1beta as genai
+
+        self.genai = genai
+        self.client = genai.CacheServiceClient(client_options={"api_key": api_key})
+
+    def create(self, model: str, instructions: str) -> str:
+        genai = self.genai
+        cached = self.client.create_cached_content(
+            cached_content=genai.CachedContent(
+                model=model if model.startswith("models/") else f"models/{model}",
+                display_name="jauapai-tutor-instructions",
+                system_instruction=genai.Content(parts=[genai.Part(text=instructions)]),
+                ttl={"seconds": self.ttl_seconds},
+            ),
+            timeout=self.create_timeout,
+        )
+        return cached.name
+
+
+class LocalPromptCache(BasePromptCache):
+    """In-process stand-in for the provider cache, for tests and local development."""
+
+    name = "local"
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.contents: Dict[str, str] = {}
+
+    def create(self, model: str, instructions: str) -> str:
+        name = f"cachedContents/local-{hashlib.sha256(instructions.encode('utf-8')).hexdigest()[:12]}"
+        self.contents[name] = instructions
+        return name
+
+
+def create_prompt_cache() -> Optional[BasePromptCache]:
+    """Build the prompt cache configured by PROMPT_CACHE_BACKEND (None when disabled)."""
+    backend = settings.PROMPT_CACHE_BACKEND
+    if backend == "gemini":
+        return GeminiPromptCache(api_key=settings.GEMINI_API_KEY)
+    if backend == "local":
+        return LocalPromptCache()
+    if backend != "none":
+        raise ValueError(f"Unknown prompt cache backend: {backend}")
+    return None
+
+
+# For printing the token accounting of a sample request
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--context-tokens", type=int, default=settings.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--history-tokens", type=int, default=0)
+    parser.add_argument("--question-tokens", type=int, default=30)
+    args = parser.parse_args()
+
+    static = estimate_tokens(TUTOR_INSTRUCTIONS)
+    cacheable = static >= settings.PROMPT_CACHE_MIN_TOKENS
+    for cached in (False, True):
+        report = PromptTokenReport(
+            static_tokens=static,
+            history_tokens=args.history_tokens,
+            variable_tokens=args.context_tokens + args.question_tokens,
+            cached=cached and cacheable,
+        )
+        print(
+            f"{'cached' if cached else 'inline':<7} input={report.input_tokens:>6} "
+            f"billed={report.billed_tokens:>6} saved={report.saved_tokens:>6}"
+        )
+    if not cacheable:
+        print(
+            f"Static prefix ({static} tokens) is below PROMPT_CACHE_MIN_TOKENS "
+            f"({settings.PROMPT_CACHE_MIN_TOKENS}); only implicit prefix caching applies."
+        )
@@ -2,22 +2,73 @@
 RAG (Retrieval-Augmented Generation) Service.
 Handles hybrid search with dense and sparse vectors, reranking, and LLM generation.
 """
-from sympy import content
 from langchain_core.messages.base import BaseMessage
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 import logging
-from typing import List, Optional, Dict, Any, Generator
-from qdrant_client import QdrantClient, models
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_voyageai import VoyageAIEmbeddings
-import voyageai
-from FlagEmbedding import BGEM3FlagModel
-
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Generator, Tuple
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from qdrant_client.http.models import QueryResponse
 
 from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.core.resilience import CircuitBreaker, DependencyGuard, aretry_call, retry_call
+from Backend.app.db.vector_store import (
+    create_async_qdrant_client,
+    create_qdrant_client,
+    is_retryable_qdrant_error,
+)
+from Backend.app.services.reranker import BaseReranker, create_reranker
+from Backend.app.services.encoder_pool import EncoderPool, PooledReranker, encode_sparse
+from Backend.app.services.context_budget import ContextBudgetManager, estimate_tokens
+from Backend.app.services.collection_manager import (
+    DENSE_SMALL_VECTOR_NAME,
+    DENSE_VECTOR_NAME,
+    FILTER_KEYS,
+    SPARSE_VECTOR_NAME,
+    CollectionManager,
+    dense_search_params,
+    filter_field,
+    resolve_alias,
+    truncate_dense,
+)
+from Backend.app.services.retrieval_cache import RetrievalCache
+from Backend.app.services.single_flight import SingleFlight, StreamFlight
+from Backend.app.services.llm_router import LLMRouter, ModelRoute, chunk_text, provider_for
+from Backend.app.services.usage_service import UsageRecord
+from Backend.app.services.prompt_cache import (
+    TUTOR_INSTRUCTIONS,
+    BasePromptCache,
+    PromptTokenReport,
+    create_prompt_cache,
+    format_question_turn,
+)
+from Backend.app.services.hot_shard import HotShard
+from Backend.app.services.lexical_index import LexicalFallback, ensure_lexical_index, index_collection
+
+# The embedding stacks (voyageai, FlagEmbedding/torch/transformers) are
+# imported in init_models so that importing this module stays cheap
+if TYPE_CHECKING:
+    from FlagEmbedding import BGEM3FlagModel
+    from langchain_voyageai import VoyageAIEmbeddings
 
 logger = logging.getLogger(__name__)
 
+# Metadata keys read by format_hit and ContextBudgetManager.dedupe
+CONTEXT_METADATA_KEYS = ("discipline", "grade", "publisher", "pages")
+
+# Payload projection for retrieval: the reranker needs page_content, the
+# formatter and deduplication need the metadata keys above. Other payload
+# fields and the stored vectors stay on the Qdrant server.
+RETRIEVAL_PAYLOAD_FIELDS = ["page_content"] + [f"metadata.{key}" for key in CONTEXT_METADATA_KEYS]
+
+# Per-branch candidates and fused results of the hybrid query
+HYBRID_PREFETCH_LIMIT = 30
+HYBRID_RESULT_LIMIT = 50
+
 
 class RAGService:
     """
@@ -27,148 +78,356 @@ class RAGService:
     - Voyage AI for dense embeddings
     - BGE-M3 for sparse embeddings
     - Qdrant for vector storage with RRF fusion
-    - Voyage reranker for precision
-    - Google Gemini for generation
+    - Pluggable reranker (Voyage API or local cross-encoder) for precision
+    - Google Gemini for generation, routed per tier with OpenAI failover
     """
     
     def __init__(self) -> None:
         """Initialize RAG service with all required models and connections."""
         self.client: Optional[QdrantClient] = None
-        self.dense_model: Optional[VoyageAIEmbeddings] = None
-        self.sparse_model: Optional[BGEM3FlagModel] = None
-        self.voyage_client: Optional[voyageai.Client] = None
-        self.llm: Optional[ChatGoogleGenerativeAI] = None
+        self.async_client: Optional[AsyncQdrantClient] = None
+        self.dense_model: Optional["VoyageAIEmbeddings"] = None
+        self.sparse_model: Optional["BGEM3FlagModel"] = None
+        self.encoder_pool: Optional[EncoderPool] = None
+        self.reranker: Optional[BaseReranker] = None
+        self.llm_router: Optional[LLMRouter] = None
+        self.prompt_cache: Optional[BasePromptCache] = None
+        self.context_budget = ContextBudgetManager()
+        self.collection_status: Optional[Dict[str, Any]] = None
+        self.retrieval_cache = RetrievalCache(
+            max_size=settings.RETRIEVAL_CACHE_SIZE,
+            ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS
+        )
+        # Identical concurrent retrievals / history-free answers run once
+        self.retrieval_flight = SingleFlight("retrieval")
+        self.generation_flight = StreamFlight("generation")
+        self.alias_target: Optional[str] = None
+        self._alias_checked_at = 0.0
+        self.hot_shard: Optional[HotShard] = None
+        self.lexical_fallback: Optional[LexicalFallback] = None
+        self._lexical_build_lock = threading.Lock()
+        self._lexical_stale = threading.Event()
+        
+        # Timeouts, circuit breakers, bulkheads and hedging for external dependencies
+        self.qdrant_breaker = self.create_breaker("qdrant")
+        self.embed_guard = self.create_guard(
+            "voyage_embed", settings.VOYAGE_EMBED_TIMEOUT, hedge=settings.HEDGE_EMBEDDINGS
+        )
+        self.rerank_guard = self.create_guard(
+            "rerank",
+            settings.RERANK_TIMEOUT,
+            # Hedging a local cross-encoder would only double the CPU work
+            hedge=settings.HEDGE_RERANK and settings.RERANKER_BACKEND == "voyage"
+        )
         
         self.connect_qdrant()
+        self.bootstrap_collection()
+        self.init_hot_shard()
+        self.init_lexical_fallback()
         self.init_models()
         self.init_chain()
 
+    @staticmethod
+    def create_breaker(name: str) -> CircuitBreaker:
+        """Circuit breaker for a dependency, configured from BREAKER_* settings."""
+        return CircuitBreaker(
+            name,
+            failure_rate=settings.BREAKER_FAILURE_RATE,
+            min_calls=settings.BREAKER_MIN_CALLS,
+            window_size=settings.BREAKER_WINDOW_SIZE,
+            recovery_timeout=settings.BREAKER_RECOVERY_SECONDS
+        )
+
+    def create_guard(self, name: str, timeout: float, hedge: bool = False) -> DependencyGuard:
+        """Timeout + circuit breaker + bulkhead (+ optional hedging) guard for a dependency."""
+        return DependencyGuard(
+            name,
+            timeout,
+            breaker=self.create_breaker(name),
+            hedge=hedge,
+            hedge_min_delay=settings.HEDGE_MIN_DELAY_MS / 1000,
+            hedge_percentile=settings.HEDGE_PERCENTILE,
+            max_concurrent=settings.DEPENDENCY_POOL_SIZE
+        )
+
     def connect_qdrant(self) -> None:
-        """Establish connection to Qdrant vector database."""
+        """Establish sync and async connections to Qdrant vector database."""
         try:
-            self.client = QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API)
-            logger.info(f"Connected to Qdrant at {settings.QDRANT_URL}")
+            self.client = create_qdrant_client()
+            self.async_client = create_async_qdrant_client()
+            transport = "gRPC" if settings.QDRANT_PREFER_GRPC else "REST"
+            logger.info(f"Connected to Qdrant at {settings.QDRANT_URL} ({transport})")
         except Exception as e:
             logger.error(f"Failed to connect to Qdrant: {e}")
             raise
 
+    def bootstrap_collection(self) -> None:
+        """Validate named vectors and ensure filter payload indexes exist."""
+        if not settings.QDRANT_BOOTSTRAP_COLLECTION:
+            return
+        try:
+            self.collection_status = CollectionManager(self.client).bootstrap()
+        except Exception as e:
+            # Retrieval may still work without indexes (just slower), so don't fail startup
+            logger.error(f"Failed to bootstrap collection {settings.search_collection}: {e}")
+            self.collection_status = {"collection": settings.search_collection, "error": str(e)}
+
+    def init_hot_shard(self) -> None:
+        """Start building the local index for HOT_SHARD_DISCIPLINES and refreshing it, in the background."""
+        disciplines = settings.hot_shard_disciplines_list
+        if not disciplines:
+            return
+        shard = HotShard(self.client, disciplines, settings.HOT_SHARD_DIR, RETRIEVAL_PAYLOAD_FIELDS)
+        # Queries for these disciplines go to Qdrant until the first build is in
+        shard.start()
+        self.hot_shard = shard
+
+    def init_lexical_fallback(self) -> None:
+        """
+        Load the BM25 index used while Qdrant is down, in the background.
+        
+        Loading starts the search processes and, with LEXICAL_INDEX_BUILD_ON_STARTUP,
+        a missing or outdated index is first built from Qdrant; neither may
+        hold up the service, which meanwhile runs without degraded mode.
+        """
+        directory = settings.LEXICAL_INDEX_DIR
+        if not settings.LEXICAL_INDEX_BUILD_ON_STARTUP and not Path(directory, "points.json").exists():
+            logger.warning(f"No lexical index in {directory}, degraded mode disabled")
+            return
+        self.sync_lexical_fallback()
+
+    def current_collection(self) -> str:
+        """Collection searches hit: the COLLECTION_ALIAS target, else COLLECTION_NAME."""
+        if not settings.COLLECTION_ALIAS:
+            return settings.search_collection
+        if self.alias_target is None:
+            self.refresh_alias_target(force=True)
+        return self.alias_target or settings.COLLECTION_ALIAS
+
+    def sync_lexical_fallback(self) -> None:
+        """
+        Bring degraded mode up to date with current_collection in a daemon thread.
+        
+        With LEXICAL_INDEX_BUILD_ON_STARTUP a missing or outdated index is
+        built first; of several worker processes only one builds it
+        (ensure_lexical_index), the others wait and load its result. A
+        request made while a sync runs is handled when that sync finishes.
+        """
+        self._lexical_stale.set()
+        if not self._lexical_build_lock.acquire(blocking=False):
+            return
+
+        def run() -> None:
+            try:
+                while self._lexical_stale.is_set():
+                    self._lexical_stale.clear()
+                    try:
+                        self._sync_lexical_index()
+                    except Exception as e:
+                        logger.error(f"Failed to update lexical fallback index: {e}")
+            finally:
+                self._lexical_build_lock.release()
+            if self._lexical_stale.is_set():
+                self.sync_lexical_fallback()  # Requested just before the release
+
+        threading.Thread(target=run, name="lexical-index-sync", daemon=True).start()
+
+    def _sync_lexical_index(self) -> None:
+        directory = settings.LEXICAL_INDEX_DIR
+        collection = self.current_collection()
+        if settings.LEXICAL_INDEX_BUILD_ON_STARTUP:
+            ensure_lexical_index(self.client, directory, RETRIEVAL_PAYLOAD_FIELDS, collection)
+        elif index_collection(directory) != collection:
+            logger.warning(f"Lexical index in {directory} is not of {collection}, rebuild it with the lexical_index CLI")
+        loaded = self.lexical_fallback
+        if loaded is None or loaded.directory != os.path.realpath(directory):
+            self.load_lexical_fallback()
+
+    def load_lexical_fallback(self) -> None:
+        """Serve degraded mode from the index version LEXICAL_INDEX_DIR points to, replacing the loaded one."""
+        try:
+            fallback = LexicalFallback(settings.LEXICAL_INDEX_DIR)
+        except Exception as e:
+            logger.error(f"Failed to load lexical fallback index: {e}")
+            return
+        previous, self.lexical_fallback = self.lexical_fallback, fallback
+        if previous is not None:
+            previous.close()
+        logger.info(f"Lexical fallback serving {fallback.directory}")
+
+    def close(self) -> None:
+        """Stop background workers (hot shard refresh, BM25 and encoder process pools, dependency threads)."""
+        if self.hot_shard is not None:
+            self.hot_shard.stop()
+        if self.lexical_fallback is not None:
+            self.lexical_fallback.close()
+        if self.encoder_pool is not None:
+            self.encoder_pool.close()
+        self.embed_guard.close()
+        self.rerank_guard.close()
+        if self.llm_router is not None:
+            self.llm_router.close()
+
+    def refresh_alias_target(self, force: bool = False) -> None:
+        """
+        Detect when COLLECTION_ALIAS moves to a new build and invalidate cached retrievals.
+        
+        The alias is resolved at most once per ALIAS_CHECK_INTERVAL_SECONDS.
+        """
+        if not settings.COLLECTION_ALIAS:
+            return
+        now = time.monotonic()
+        if not force and now - self._alias_checked_at < settings.ALIAS_CHECK_INTERVAL_SECONDS:
+            return
+        self._alias_checked_at = now
+        
+        try:
+            target = resolve_alias(self.client, settings.COLLECTION_ALIAS)
+        except Exception as e:
+            logger.warning(f"Failed to resolve alias {settings.COLLECTION_ALIAS}: {e}")
+            return
+        
+        if target != self.alias_target:
+            previous, self.alias_target = self.alias_target, target
+            if previous is not None:
+                logger.info(f"Alias {settings.COLLECTION_ALIAS} swapped: {previous} -> {target}")
+                self.retrieval_cache.clear()
+                if self.hot_shard is not None:
+                    self.hot_shard.request_refresh()
+                if self.lexical_fallback is not None or settings.LEXICAL_INDEX_BUILD_ON_STARTUP:
+                    # Degraded mode would otherwise serve the previous build's chunks
+                    self.sync_lexical_fallback()
+
     def init_models(self) -> None:
         """Initialize all ML models required for RAG pipeline."""
         # 1. Voyage Embeddings (Dense)
         try:
+            from langchain_voyageai import VoyageAIEmbeddings
+
             self.dense_model = VoyageAIEmbeddings(
                 voyage_api_key=settings.VOYAGE_API, 
-                model="voyage-4-lite",
-                output_dimension=1024
+                model=settings.VOYAGE_EMBED_MODEL,
+                output_dimension=settings.DENSE_VECTOR_SIZE
             )
         except Exception as e:
             logger.error(f"Failed to load Voyage Dense model: {e}")
             raise
 
-        # 2. BGE M3 (Sparse) - Note: This is heavy to load
+        # 2. BGE M3 (Sparse) - Note: This is heavy to load. With ENCODER_WORKERS
+        # it is loaded by each encoder process instead of the API process.
         try:
-            self.sparse_model = BGEM3FlagModel('BAAI/bge-m3', use_fp16=True)
+            if settings.ENCODER_WORKERS:
+                self.encoder_pool = EncoderPool()
+                self.encoder_pool.warm_up()
+                logger.info(f"Sparse encoding in {self.encoder_pool.workers} encoder processes")
+            else:
+                from FlagEmbedding import BGEM3FlagModel
+
+                self.sparse_model = BGEM3FlagModel('BAAI/bge-m3', use_fp16=True)
         except Exception as e:
             logger.error(f"Failed to load BGE Sparse model: {e}")
             raise
 
-        # 3. Voyage Reranker Client
+        # 3. Reranker (Voyage API or local cross-encoder, see RERANKER_BACKEND)
         try:
-            self.voyage_client = voyageai.Client(api_key=settings.VOYAGE_API)
+            pooled = None
+            if self.encoder_pool is not None and self.encoder_pool.local_rerank:
+                pooled = PooledReranker(self.encoder_pool)
+            self.reranker = create_reranker(local=pooled)
+            logger.info(f"Using reranker backend: {self.reranker.name}")
         except Exception as e:
-            logger.error(f"Failed to init Voyage Client: {e}")
+            logger.error(f"Failed to init reranker: {e}")
             raise
 
-        # 4. LLM - Google Gemini
+        # 4. LLM router - Gemini models per tier, failover chain (see LLM_* settings)
         try:
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-3-flash-preview",
-                temperature=1,
-                google_api_key=settings.GEMINI_API_KEY
-            )
+            self.llm_router = LLMRouter(self.create_guard)
+            self.llm_router.client(settings.LLM_DEFAULT_MODEL)
         except Exception as e:
             logger.error(f"Failed to init Gemini: {e}")
             raise
 
+        # 5. Provider-side cache for the static instructions (optional)
+        try:
+            self.prompt_cache = create_prompt_cache()
+        except Exception as e:
+            logger.error(f"Failed to init prompt cache, sending instructions inline: {e}")
+
     def sparse_query(self, query: str) -> tuple[List[int], List[float]]:
         """
         Generate sparse vector representation using BGE-M3.
         
+        Runs in an encoder process when ENCODER_WORKERS is set, so the
+        CPU-bound encode never competes with the API event loop for the GIL.
+        
         Args:
             query: The search query text
             
         Returns:
             Tuple of (token indices, token weights)
         """
-        output = self.sparse_model.encode(
-            query, 
-            return_dense=False, 
-            return_sparse=True, 
-            return_colbert_vecs=False
-        )
-        
-        lex_weights = output['lexical_weights']
-        
-        # Handle list output (batch encoding)
-        if isinstance(lex_weights, list):
-            lex_weights = lex_weights[0]
-             
-        keys = [int(k) for k in lex_weights.keys()]
-        vals = [float(v) for v in lex_weights.values()]
-        return keys, vals
+        if self.encoder_pool is not None:
+            return self.encoder_pool.encode_sparse(query)
+        return encode_sparse(self.sparse_model, query)
 
     def hybrid_retriever_func(
         self, 
         query: str, 
-        metadata_filter: Optional[Dict[str, Any]] = None
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        oversampling: Optional[float] = None,
+        usage: Optional[UsageRecord] = None
     ) -> Dict[str, Any]:
         """
         Perform hybrid search in Qdrant and return formatted context.
         
         Uses RRF (Reciprocal Rank Fusion) to combine dense and sparse results,
-        then reranks with Voyage reranker for precision.
+        then reranks with the configured reranker for precision. Successful
+        results are cached until they expire or the collection alias moves,
+        and identical concurrent queries share a single search.
         
         Args:
             query: The search query
             metadata_filter: Optional filters for discipline, grade, publisher
+            oversampling: Quantization oversampling for the dense prefetch
+                (defaults to QDRANT_QUANTIZATION_OVERSAMPLING)
+            usage: Collects embedding/rerank tokens and latencies (only the
+                request that actually runs the search is charged)
             
         Returns:
             Dict with 'context_text' containing formatted search results
         """
-        # Build Qdrant filter from metadata
-        qdrant_filter = None
-        if metadata_filter:
-            conditions = []
-            for key, value in metadata_filter.items():
-                if value:  # Only add if value is not None/Empty
-                    conditions.append(
-                        models.FieldCondition(
-                            key=f"metadata.{key}", 
-                            match=models.MatchValue(value=value)
-                        )
-                    )
-            if conditions:
-                qdrant_filter = models.Filter(must=conditions)
-
-        # Generate Dense Vector
-        query_dense = self.dense_model.embed_query(query)
-        
-        # Generate Sparse Vector
-        keys, vals = self.sparse_query(query)
-        query_sparse = models.SparseVector(indices=keys, values=vals)
-
-        # Perform Hybrid Search using RRF
+        self.refresh_alias_target()
+        cache_key = RetrievalCache.make_key(
+            query,
+            {
+                **{key: (metadata_filter or {}).get(key) for key in FILTER_KEYS},
+                "oversampling": oversampling,
+            }
+        )
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if not settings.COALESCE_RETRIEVAL:
+            return self.retrieve_context(query, metadata_filter, oversampling, cache_key, usage)
+        return self.retrieval_flight.do(
+            cache_key, lambda: self.retrieve_context(query, metadata_filter, oversampling, cache_key, usage)
+        )
+
+    def retrieve_context(
+        self,
+        query: str,
+        metadata_filter: Optional[Dict[str, Any]],
+        oversampling: Optional[float],
+        cache_key: Any,
+        usage: Optional[UsageRecord] = None
+    ) -> Dict[str, Any]:
+        """Search, rerank and format context for a cache miss (see hybrid_retriever_func)."""
+        usage = usage if usage is not None else UsageRecord()
+        
+        # Perform Hybrid Search using RRF (or BM25 in degraded mode)
         try:
-            search_results = self.client.query_points(
-                collection_name=settings.COLLECTION_NAME,
-                prefetch=[
-                    models.Prefetch(query=query_dense, using="voyage-dense", limit=30, filter=qdrant_filter),
-                    models.Prefetch(query=query_sparse, using="bge-sparse", limit=30, filter=qdrant_filter),
-                ],
-                query=models.FusionQuery(fusion=models.Fusion.RRF),
-                limit=50,
-                with_payload=True
-            )
+            search_results, route = self.search_context(query, metadata_filter, oversampling, usage)
         except Exception as e:
             logger.error(f"Error querying Qdrant: {e}")
             return {"context_text": "Error searching database.", "images": []}
@@ -176,85 +435,316 @@ class RAGService:
         if not search_results.points:
             return {"context_text": "Информация не найдена.", "images": []}
         
-        # Rerank with Voyage
-        candidate_texts = [hit.payload['page_content'] for hit in search_results.points]
+        # Drop near-duplicate chunks (overlapping pages of the same book)
+        kept = self.context_budget.dedupe([hit.payload for hit in search_results.points])
+        candidates = [search_results.points[i] for i in kept]
         
+        # Rerank candidates, windowing oversized chunks to the rerank token cap
+        candidate_texts = self.context_budget.prepare_rerank_texts(
+            query, [hit.payload['page_content'] for hit in candidates]
+        )
+        top_k = settings.RERANK_TOP_K
+        
+        reranked = True
         try:
-            rerank_results = self.voyage_client.rerank(
-                query=query, 
-                documents=candidate_texts, 
-                model="rerank-2.5", 
-                top_k=5
-            )
+            with usage.timed("rerank"):
+                rerank_results = self.rerank_guard.call(self.reranker.rerank, query, candidate_texts, top_k)
+            usage.rerank_tokens += getattr(rerank_results, "total_tokens", 0)
+            top_hits = [candidates[r.index] for r in rerank_results]
         except Exception as e:
             logger.error(f"Error reranking: {e}")
-            # Fallback to top 5 from initial search
-            reranked_docs_fallback = []
-            for hit in search_results.points[:5]:
-                reranked_docs_fallback.append(f"""
-{hit.payload.get('metadata', {})}
-{hit.payload['page_content']}""")
-            return {"context_text": "\n\n".join(reranked_docs_fallback)}
-
-        # Format results
-        reranked_docs = []
-        for r in rerank_results.results:
-            idx = r.index
-            hit = search_results.points[idx]
-            
-            # Metadata safe access
-            meta = hit.payload.get('metadata', {})
-            discipline = meta.get('discipline', 'Unknown')
-            grade = meta.get('grade', 'Unknown')
-            publisher = meta.get('publisher', 'Unknown')
-            pages = meta.get('pages', [])
+            # Fallback to top results from the fused initial search
+            top_hits = candidates[:top_k]
+            reranked = False
+
+        reranked_docs = [self.format_hit(hit.payload) for hit in top_hits]
+        result = {"context_text": self.context_budget.assemble(reranked_docs)}
+        if reranked and route != "lexical":
+            # Degraded (un-reranked or BM25) results are not cached
+            self.retrieval_cache.put(cache_key, result)
+        return result
+
+    def embed_dense(self, query: str) -> Tuple[List[float], int]:
+        """
+        Voyage query embedding and the tokens Voyage billed for it.
+        
+        Calls the Voyage client directly because VoyageAIEmbeddings.embed_query
+        discards the usage of the response.
+        """
+        client = getattr(self.dense_model, "_client", None)
+        if client is None or self.dense_model._is_context_model():
+            return self.dense_model.embed_query(query), 0
+        response = client.embed(
+            [query],
+            model=self.dense_model.model,
+            input_type="query",
+            truncation=self.dense_model.truncation,
+            output_dimension=self.dense_model.output_dimension
+        )
+        return response.embeddings[0], response.total_tokens
+
+    def encode_query(
+        self, query: str, usage: Optional[UsageRecord] = None
+    ) -> Tuple[List[float], models.SparseVector]:
+        """Dense (Voyage, guarded and hedged) and sparse (BGE-M3) query vectors."""
+        usage = usage if usage is not None else UsageRecord()
+        with usage.timed("embed"):
+            query_dense, tokens = self.embed_guard.call(self.embed_dense, query)
+        usage.embedding_tokens += tokens
+        with usage.timed("sparse"):
+            keys, vals = self.sparse_query(query)
+        return query_dense, models.SparseVector(indices=keys, values=vals)
+
+    def search_context(
+        self,
+        query: str,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        oversampling: Optional[float] = None,
+        usage: Optional[UsageRecord] = None
+    ) -> Tuple[QueryResponse, str]:
+        """
+        Retrieve fused candidates from the best available source.
+        
+        The hot shard serves queries whose discipline filter it covers. Other
+        queries go to Qdrant while its circuit breaker is closed; once it
+        opens (or a query fails) they are answered from the BM25 fallback
+        until a probe query to Qdrant succeeds again.
+        
+        Returns:
+            Tuple of (response, route) where route is hot_shard, qdrant or lexical
+        """
+        use_hot_shard = self.hot_shard is not None and self.hot_shard.matches(metadata_filter)
+        if not use_hot_shard and self.qdrant_breaker.state == CircuitBreaker.OPEN:
+            # Skip the embedding calls, Qdrant would not be queried anyway
+            return self.lexical_search(query, metadata_filter), "lexical"
+        
+        try:
+            query_dense, query_sparse = self.encode_query(query, usage)
+        except Exception as e:
+            if self.lexical_fallback is None:
+                raise
+            logger.warning(f"Query embedding failed, using lexical fallback: {e}")
+            return self.lexical_search(query, metadata_filter), "lexical"
+        
+        if use_hot_shard:
+            try:
+                response = self.hot_shard.search(
+                    query_dense, query_sparse, metadata_filter, HYBRID_PREFETCH_LIMIT, HYBRID_RESULT_LIMIT
+                )
+                metrics.increment("hybrid_queries", labels={"route": "hot_shard"})
+                return response, "hot_shard"
+            except Exception as e:
+                logger.warning(f"Hot shard search failed, querying Qdrant: {e}")
+        
+        if not self.qdrant_breaker.allow():
+            return self.lexical_search(query, metadata_filter), "lexical"
+        try:
+            response = self.query_hybrid(query_dense, query_sparse, self.build_filter(metadata_filter), oversampling)
+        except Exception as e:
+            self.qdrant_breaker.record_failure()
+            if self.lexical_fallback is None:
+                raise
+            logger.warning(f"Qdrant query failed, using lexical fallback: {e}")
+            return self.lexical_search(query, metadata_filter), "lexical"
+        self.qdrant_breaker.record_success()
+        metrics.increment("hybrid_queries", labels={"route": "qdrant"})
+        return response, "qdrant"
+
+    def lexical_search(self, query: str, metadata_filter: Optional[Dict[str, Any]] = None) -> QueryResponse:
+        """BM25 search on the on-disk fallback index (degraded mode)."""
+        if self.lexical_fallback is None:
+            raise RuntimeError("Qdrant is unavailable and no lexical fallback index is loaded")
+        metrics.increment("hybrid_queries", labels={"route": "lexical"})
+        return self.lexical_fallback.search(query, metadata_filter, HYBRID_RESULT_LIMIT)
+
+    @property
+    def retrieval_mode(self) -> str:
+        """'normal' while Qdrant serves queries, 'degraded' while the circuit is open or probing."""
+        return "normal" if self.qdrant_breaker.state == CircuitBreaker.CLOSED else "degraded"
+
+    @staticmethod
+    def build_filter(metadata_filter: Optional[Dict[str, Any]] = None) -> Optional[models.Filter]:
+        """
+        Build a Qdrant filter from user-selected metadata.
+        
+        Only indexed filter keys (discipline, grade, publisher) are used; other
+        keys such as 'model' are request options, not payload fields.
+        """
+        if not metadata_filter:
+            return None
+        conditions = [
+            models.FieldCondition(key=filter_field(key), match=models.MatchValue(value=metadata_filter[key]))
+            for key in FILTER_KEYS
+            if metadata_filter.get(key)  # Only add if value is not None/Empty
+        ]
+        return models.Filter(must=conditions) if conditions else None
+
+    @staticmethod
+    def dense_prefetch(
+        query_dense: List[float],
+        qdrant_filter: Optional[models.Filter] = None,
+        oversampling: Optional[float] = None,
+        limit: int = HYBRID_PREFETCH_LIMIT
+    ) -> models.Prefetch:
+        """
+        Build the dense branch of the hybrid query.
+        
+        With DENSE_PREFETCH_VECTOR_SIZE set, candidates are first retrieved
+        with the truncated small vector and only those are rescored with the
+        full dense vector (two-stage search).
+        """
+        small_size = settings.DENSE_PREFETCH_VECTOR_SIZE
+        if not small_size:
+            return models.Prefetch(
+                query=query_dense,
+                using=DENSE_VECTOR_NAME,
+                limit=limit,
+                filter=qdrant_filter,
+                params=dense_search_params(oversampling),
+            )
+        # The filter and HNSW/quantization params apply to the first stage; the
+        # second stage only rescores its candidates with the full vector
+        return models.Prefetch(
+            prefetch=models.Prefetch(
+                query=truncate_dense(query_dense, small_size),
+                using=DENSE_SMALL_VECTOR_NAME,
+                limit=max(limit, settings.DENSE_PREFETCH_LIMIT),
+                filter=qdrant_filter,
+                params=dense_search_params(oversampling),
+            ),
+            query=query_dense,
+            using=DENSE_VECTOR_NAME,
+            limit=limit,
+        )
+
+    @staticmethod
+    def hybrid_query_kwargs(
+        query_dense: List[float],
+        query_sparse: models.SparseVector,
+        qdrant_filter: Optional[models.Filter] = None,
+        oversampling: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Build query_points arguments for dense+sparse prefetch fused with RRF.
+        
+        Shared by the sync and async query paths. The dense branch comes from
+        dense_prefetch and carries the HNSW ef and quantization search params.
+        """
+        return {
+            "collection_name": settings.search_collection,
+            "prefetch": [
+                RAGService.dense_prefetch(query_dense, qdrant_filter, oversampling),
+                models.Prefetch(
+                    query=query_sparse, using=SPARSE_VECTOR_NAME, limit=HYBRID_PREFETCH_LIMIT, filter=qdrant_filter
+                ),
+            ],
+            "query": models.FusionQuery(fusion=models.Fusion.RRF),
+            "limit": HYBRID_RESULT_LIMIT,
+            "with_payload": models.PayloadSelectorInclude(include=RETRIEVAL_PAYLOAD_FIELDS),
+            "with_vectors": False,
+            "timeout": settings.QDRANT_QUERY_TIMEOUT,
+        }
+
+    def query_hybrid(
+        self,
+        query_dense: List[float],
+        query_sparse: models.SparseVector,
+        qdrant_filter: Optional[models.Filter] = None,
+        oversampling: Optional[float] = None
+    ) -> QueryResponse:
+        """Run the hybrid query, retrying transient Qdrant errors with jittered backoff."""
+        return retry_call(
+            self.client.query_points,
+            retries=settings.QDRANT_MAX_RETRIES,
+            base_delay=settings.QDRANT_RETRY_BASE_DELAY,
+            max_delay=settings.QDRANT_RETRY_MAX_DELAY,
+            is_retryable=is_retryable_qdrant_error,
+            **self.hybrid_query_kwargs(query_dense, query_sparse, qdrant_filter, oversampling)
+        )
+
+    async def aquery_hybrid(
+        self,
+        query_dense: List[float],
+        query_sparse: models.SparseVector,
+        qdrant_filter: Optional[models.Filter] = None,
+        oversampling: Optional[float] = None
+    ) -> QueryResponse:
+        """Async variant of query_hybrid using the AsyncQdrantClient."""
+        return await aretry_call(
+            self.async_client.query_points,
+            retries=settings.QDRANT_MAX_RETRIES,
+            base_delay=settings.QDRANT_RETRY_BASE_DELAY,
+            max_delay=settings.QDRANT_RETRY_MAX_DELAY,
+            is_retryable=is_retryable_qdrant_error,
+            **self.hybrid_query_kwargs(query_dense, query_sparse, qdrant_filter, oversampling)
+        )
+
+    @staticmethod
+    def format_hit(payload: Dict[str, Any]) -> str:
+        """
+        Format a retrieved chunk with its source metadata for the prompt.
+        
+        Args:
+            payload: Qdrant point payload with 'page_content' and 'metadata'
             
-            reranked_docs.append(f"""
+        Returns:
+            Chunk text prefixed with book title, grade, publisher and pages
+        """
+        # Metadata safe access
+        meta = payload.get('metadata', {})
+        discipline = meta.get('discipline', 'Unknown')
+        grade = meta.get('grade', 'Unknown')
+        publisher = meta.get('publisher', 'Unknown')
+        pages = meta.get('pages', [])
+        
+        return f"""
 Кітап атауы: {discipline}
 Сынып: {grade}
 Баспа: {publisher}
 Беттер: {', '.join(map(str, pages)) if isinstance(pages, list) else str(pages)}
 
-{hit.payload['page_content']}""")
-            
-        return {"context_text": "\n\n".join(reranked_docs)}
+{payload['page_content']}"""
 
-    def build_prompt_with_context(self, input_dict: Dict[str, Any]) -> List[HumanMessage]:
+    def build_prompt_with_context(
+        self,
+        input_dict: Dict[str, Any],
+        cached_content: Optional[str] = None
+    ) -> List[BaseMessage]:
         """
         Build prompt with conversation history for context.
         
+        The prompt is a stable prefix (tutor instructions, then history) and a
+        variable suffix (retrieved context and the question) in the last user
+        turn, so the prefix can be served from the provider cache.
+        
         Args:
             input_dict: Dict containing 'context_messages', 'question', 'context_data'
+            cached_content: Cache name holding the instructions; when set they
+                are not sent as a system message
             
         Returns:
-            List containing HumanMessage with formatted prompt
+            List of messages ending with the context + question HumanMessage
         """
         context_messages = input_dict.get("context_messages", [])
         question = input_dict["question"]
         context_data = input_dict["context_data"]
-        print(context_data)
         
-        prompt = f"""
-Сен Қазақстандағы ҰБТ (Бірыңғай ұлттық тестілеу) бойынша репетиторсын, оқушыларды күрделі ЕНТ-ға дайындауға маманданғансын.
-Сенің мақсатың - тек жауап беру емес, сонымен қатар оқушыға берілген мәтінге сүйене отырып, сұрақтар қойып материалды түсінуге көмектесу. 
-
-Нұсқаулықтар:
-1. Жауапты нақты фактілермен (жылдар, есімдер, оқиғалар) негізде.
-2. Жауапты тек контекст негізінде беру керек, жаңа ақпаратты ойлап табуға болмайды.
-3. Егер контекстте ақпарат болмаса, "Мәтінде бұл сұраққа жауап жоқ" деп айт, бірақ "мен ЕНТ-ға дайындауға көмектесе аламын" деп айт.
-4. Жауаптың соңында міндетті түрде пайдаланылған дереккөздерді көрсет. (Кітап атауы, Сыныбы, Баспасы, Кытап беттерінің нөмірлері)
-
-Контекст:
-{context_data["context_text"]}
-"""
-        messages: List[BaseMessage] = [SystemMessage(content=prompt)]
+        messages: List[BaseMessage] = []
+        if not cached_content:
+            messages.append(SystemMessage(content=TUTOR_INSTRUCTIONS))
         for msg in context_messages:
             if msg["role"] == "user":
                 messages.append(HumanMessage(content=msg["content"]))
             else:
                 messages.append(AIMessage(content=msg["content"]))
-        messages.append(HumanMessage(content=question))
+        messages.append(HumanMessage(content=format_question_turn(context_data["context_text"], question)))
         
+        PromptTokenReport(
+            static_tokens=estimate_tokens(TUTOR_INSTRUCTIONS),
+            history_tokens=sum(estimate_tokens(msg["content"]) for msg in context_messages),
+            variable_tokens=estimate_tokens(messages[-1].content),
+            cached=bool(cached_content)
+        ).record()
         return messages
 
     def init_chain(self) -> None:
@@ -265,7 +755,9 @@ class RAGService:
         self, 
         context_messages: List[Dict[str, str]], 
         question: str, 
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        tier: str = "free",
+        usage: Optional[UsageRecord] = None
     ) -> Generator[str, None, None]:
         """
         Stream chat with conversation context.
@@ -273,13 +765,41 @@ class RAGService:
         Args:
             context_messages: List of previous messages with 'role' and 'content'
             question: Current user question
-            filters: Optional filters for RAG search
+            filters: Optional filters for RAG search (and 'model' for the LLM router)
+            tier: Subscription tier of the asker (pro, free or guest), used for model routing
+            usage: Filled with tokens and stage latencies of this answer (left
+                empty when the answer is shared with an identical request)
             
         Yields:
             String chunks of the generated response
         """
+        route = self.llm_router.route(tier, question, (filters or {}).get("model"))
+        if settings.COALESCE_GENERATION and not context_messages:
+            # Without history the answer depends only on question, filters
+            # and model, so identical in-flight questions share one LLM stream
+            key = RetrievalCache.make_key(question, {**(filters or {}), "model": route.primary})
+            yield from self.generation_flight.stream(
+                key, lambda: self.generate_answer(context_messages, question, filters, route, usage)
+            )
+            return
+        yield from self.generate_answer(context_messages, question, filters, route, usage)
+
+    def generate_answer(
+        self,
+        context_messages: List[Dict[str, str]],
+        question: str,
+        filters: Optional[Dict[str, Any]] = None,
+        route: Optional[ModelRoute] = None,
+        usage: Optional[UsageRecord] = None
+    ) -> Generator[str, None, None]:
+        """Retrieve context and stream the LLM answer (see stream_chat_with_context)."""
+        route = route or self.llm_router.route("free", question)
+        usage = usage if usage is not None else UsageRecord()
+        start = time.perf_counter()
+        
         # Get context from RAG
-        context_data = self.hybrid_retriever_func(question, filters)
+        with usage.timed("retrieval"):
+            context_data = self.hybrid_retriever_func(question, filters, usage=usage)
         
         # Build prompt with context
         input_dict = {
@@ -288,21 +808,35 @@ class RAGService:
             "context_data": context_data
         }
         
-        messages = self.build_prompt_with_context(input_dict)
-        
-        # Stream from LLM
-        for chunk in self.llm.stream(messages):
-            # Handle different response formats
-            if hasattr(chunk, 'content'):
-                content = chunk.content
-                # Gemini may return list of dicts with 'text' key
-                if isinstance(content, list):
-                    for item in content:
-                        if isinstance(item, dict) and 'text' in item:
-                            yield item['text']
-                elif isinstance(content, str):
-                    yield content
-                else:
-                    yield str(content)
-            else:
-                yield str(chunk)
+        def prepare(model: str) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+            # Cached instructions only exist on Gemini, bound to one model
+            cached_content = None
+            if self.prompt_cache and provider_for(model) == "gemini":
+                cached_content = self.prompt_cache.cached_content(model, TUTOR_INSTRUCTIONS)
+            messages = self.build_prompt_with_context(input_dict, cached_content)
+            return messages, ({"cached_content": cached_content} if cached_content else {})
+        
+        # Stream from the routed models (bounded time to first chunk and between chunks)
+        generation_start = time.perf_counter()
+        try:
+            for model, chunk in self.llm_router.stream(
+                route,
+                prepare,
+                first_timeout=settings.GEMINI_FIRST_TOKEN_TIMEOUT,
+                idle_timeout=settings.GEMINI_STREAM_IDLE_TIMEOUT
+            ):
+                chunk_usage = getattr(chunk, "usage_metadata", None) or {}
+                if chunk_usage:
+                    usage.add_llm_usage(model, chunk_usage)
+                    # Input tokens actually read from the (explicit or implicit) cache
+                    cache_read = (chunk_usage.get("input_token_details") or {}).get("cache_read")
+                    if cache_read:
+                        metrics.increment("prompt_cached_input_tokens", cache_read)
+                text = chunk_text(chunk)
+                if text:
+                    if "first_token" not in usage.latencies_ms:
+                        usage.add_latency("first_token", (time.perf_counter() - generation_start) * 1000)
+                    yield text
+        finally:
+            usage.add_latency("generation", (time.perf_counter() - generation_start) * 1000)
+            usage.add_latency("total", (time.perf_counter() - start) * 1000)
@@ -0,0 +1,143 @@
+"""
+Zero-downtime re-indexing through versioned collections and an alias.
+
+Each build goes into a new collection named '{alias}_v{timestamp}'. Chunks
+whose content hash is unchanged are copied from the collection the alias
+currently points to, so only new or changed chunks are re-embedded. Once
+the build finishes, the alias is switched atomically and old versions beyond
+the retention count are dropped.
+
+Usage:
+    python -m Backend.app.services.reindex --manifest books.jsonl --keep 2
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from qdrant_client import QdrantClient
+
+from Backend.app.core.config import settings
+from Backend.app.services.collection_manager import resolve_alias, swap_alias
+from Backend.app.services.ingestion import (
+    BookSource,
+    DenseEmbedder,
+    IngestionPipeline,
+    IngestionStats,
+    SparseEncoder,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def versioned_collection_name(alias: str, now: Optional[datetime] = None) -> str:
+    """Name of a new build collection for an alias."""
+    now = now or datetime.now(timezone.utc)
+    return f"{alias}_v{now:%Y%m%d%H%M%S%f}"
+
+
+def list_versions(client: QdrantClient, alias: str) -> List[str]:
+    """Versioned collections built for an alias, oldest first."""
+    prefix = f"{alias}_v"
+    return sorted(c.name for c in client.get_collections().collections if c.name.startswith(prefix))
+
+
+def prune_versions(client: QdrantClient, alias: str, keep: int) -> List[str]:
+    """
+    Delete old versioned collections, keeping the newest `keep` and the alias target.
+
+    Returns:
+        Names of the deleted collections
+    """
+    active = resolve_alias(client, alias)
+    versions = list_versions(client, alias)
+    stale = [name for name in versions[:max(0, len(versions) - keep)] if name != active]
+    for name in stale:
+        client.delete_collection(name)
+        logger.info(f"Deleted old collection version {name}")
+    return stale
+
+
+def rebuild_collection(
+    client: QdrantClient,
+    dense_model: DenseEmbedder,
+    sparse_model: SparseEncoder,
+    books: Iterable[BookSource],
+    alias: Optional[str] = None,
+    keep_versions: int = 2,
+    **pipeline_kwargs,
+) -> Tuple[str, IngestionStats]:
+    """
+    Build a new collection version and switch the alias to it.
+
+    Args:
+        client: Qdrant client
+        dense_model: Dense embedder used for new or changed chunks
+        sparse_model: Sparse encoder used for new or changed chunks
+        books: Books making up the full corpus of the new version
+        alias: Alias to switch (defaults to COLLECTION_ALIAS)
+        keep_versions: Number of versioned collections to retain
+        **pipeline_kwargs: Extra IngestionPipeline options (chunk size, batch size...)
+
+    Returns:
+        Tuple of (new collection name, ingestion stats)
+    """
+    alias = alias or settings.COLLECTION_ALIAS
+    if not alias:
+        raise ValueError("COLLECTION_ALIAS is not set")
+
+    previous = resolve_alias(client, alias)
+    new_collection = versioned_collection_name(alias)
+    logger.info(f"Building {new_collection} (reusing unchanged chunks from {previous})")
+
+    pipeline = IngestionPipeline(
+        client,
+        dense_model,
+        sparse_model,
+        collection_name=new_collection,
+        reuse_from=previous,
+        **pipeline_kwargs,
+    )
+    stats = pipeline.ingest(books)
+
+    swap_alias(client, alias, new_collection)
+    prune_versions(client, alias, keep_versions)
+    return new_collection, stats
+
+
+# For running a rebuild from the command line
+if __name__ == "__main__":
+    import argparse
+
+    from FlagEmbedding import BGEM3FlagModel
+    from langchain_voyageai import VoyageAIEmbeddings
+
+    from Backend.app.db.vector_store import create_qdrant_client
+    from Backend.app.services.ingestion import load_manifest
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", required=True, help="JSONL file describing the full corpus")
+    parser.add_argument("--alias", default=settings.COLLECTION_ALIAS)
+    parser.add_argument("--keep", type=int, default=2, help="Versioned collections to retain")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    name, result = rebuild_collection(
+        create_qdrant_client(),
+        VoyageAIEmbeddings(
+            voyage_api_key=settings.VOYAGE_API,
+            model=settings.VOYAGE_EMBED_MODEL,
+            output_dimension=settings.DENSE_VECTOR_SIZE,
+            batch_size=args.batch_size
+        ),
+        BGEM3FlagModel("BAAI/bge-m3", use_fp16=True),
+        load_manifest(args.manifest),
+        alias=args.alias,
+        keep_versions=args.keep,
+        batch_size=args.batch_size,
+    )
+    print(f"alias {args.alias} -> {name}: embedded={result.embedded} reused={result.reused}")
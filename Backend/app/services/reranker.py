@@ -0,0 +1,230 @@
+"""
+Reranker backends for the RAG pipeline.
+Provides a common interface over the Voyage rerank API and a local CPU cross-encoder.
+"""
+import logging
+import math
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from Backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RerankResult:
+    """Single reranked candidate: position in the input list and its relevance score."""
+    index: int
+    relevance_score: float
+
+
+class RerankResults(list):
+    """Reranked candidates plus the tokens billed for the call (0 for local backends)."""
+
+    def __init__(self, results=(), total_tokens: int = 0) -> None:
+        super().__init__(results)
+        self.total_tokens = total_tokens
+
+
+class BaseReranker(ABC):
+    """Interface implemented by every reranker backend."""
+
+    name: str = "base"
+
+    @abstractmethod
+    def rerank(self, query: str, documents: Sequence[str], top_k: int) -> List[RerankResult]:
+        """
+        Rank documents by relevance to the query.
+
+        Args:
+            query: The search query
+            documents: Candidate document texts
+            top_k: Number of results to return
+
+        Returns:
+            Up to top_k results ordered by descending relevance
+        """
+
+
+class VoyageReranker(BaseReranker):
+    """Remote reranking through the Voyage AI rerank API."""
+
+    name = "voyage"
+
+    def __init__(self, api_key: str, model: str = "rerank-2.5") -> None:
+        import voyageai
+
+        self.client = voyageai.Client(api_key=api_key)
+        self.model = model
+
+    def rerank(self, query: str, documents: Sequence[str], top_k: int) -> List[RerankResult]:
+        response = self.client.rerank(
+            query=query,
+            documents=list(documents),
+            model=self.model,
+            top_k=top_k
+        )
+        return RerankResults(
+            [RerankResult(index=r.index, relevance_score=r.relevance_score) for r in response.results],
+            total_tokens=getattr(response, "total_tokens", 0)
+        )
+
+
+class CrossEncoderReranker(BaseReranker):
+    """
+    Local cross-encoder reranker (bge-reranker-v2-m3 by default) running on CPU.
+
+    With an ONNX export directory the model is served through onnxruntime,
+    otherwise FlagEmbedding's FlagReranker is used. Pairs are scored in
+    batches and truncated to max_length tokens.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-v2-m3",
+        onnx_path: Optional[str] = None,
+        max_length: int = 512,
+        batch_size: int = 16,
+    ) -> None:
+        self.model_name = model_name
+        self.onnx_path = onnx_path
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.session = None
+        self.tokenizer = None
+        self.model = None
+
+        if onnx_path:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+
+            self.tokenizer = AutoTokenizer.from_pretrained(onnx_path)
+            self.session = ort.InferenceSession(
+                f"{onnx_path.rstrip('/')}/model.onnx",
+                providers=["CPUExecutionProvider"]
+            )
+            self.input_names = {i.name for i in self.session.get_inputs()}
+        else:
+            from FlagEmbedding import FlagReranker
+
+            self.model = FlagReranker(
+                model_name,
+                use_fp16=False,
+                devices="cpu",
+                batch_size=batch_size,
+                max_length=max_length
+            )
+
+    def _score_batch_onnx(self, query: str, documents: Sequence[str]) -> List[float]:
+        """Score one batch of (query, document) pairs with onnxruntime."""
+        encoded = self.tokenizer(
+            [query] * len(documents),
+            list(documents),
+            padding=True,
+            truncation="only_second",
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        feeds = {name: value.astype("int64") for name, value in encoded.items() if name in self.input_names}
+        logits = self.session.run(None, feeds)[0]
+        return [float(row[0]) if hasattr(row, "__len__") else float(row) for row in logits]
+
+    def score(self, query: str, documents: Sequence[str]) -> List[float]:
+        """
+        Compute relevance scores for every document.
+
+        Args:
+            query: The search query
+            documents: Candidate document texts
+
+        Returns:
+            Sigmoid-normalized scores in input order
+        """
+        if not documents:
+            return []
+
+        logits: List[float] = []
+        if self.session is not None:
+            for start in range(0, len(documents), self.batch_size):
+                logits.extend(self._score_batch_onnx(query, documents[start:start + self.batch_size]))
+        else:
+            # FlagReranker batches internally using the batch_size/max_length given at init
+            scores = self.model.compute_score([(query, doc) for doc in documents])
+            if not isinstance(scores, list):
+                scores = [scores]
+            logits = [float(s) for s in scores]
+        return [1.0 / (1.0 + math.exp(-x)) for x in logits]
+
+    def rerank(self, query: str, documents: Sequence[str], top_k: int) -> List[RerankResult]:
+        scores = self.score(query, documents)
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return [RerankResult(index=i, relevance_score=scores[i]) for i in order[:top_k]]
+
+
+class FallbackReranker(BaseReranker):
+    """Try each backend in order, moving to the next one when a backend raises."""
+
+    def __init__(self, backends: List[BaseReranker]) -> None:
+        if not backends:
+            raise ValueError("FallbackReranker needs at least one backend")
+        self.backends = backends
+        self.name = "+".join(b.name for b in backends)
+
+    def rerank(self, query: str, documents: Sequence[str], top_k: int) -> List[RerankResult]:
+        last_error: Optional[Exception] = None
+        for backend in self.backends:
+            try:
+                return backend.rerank(query, documents, top_k)
+            except Exception as e:
+                logger.warning(f"Reranker '{backend.name}' failed, trying next backend: {e}")
+                last_error = e
+        raise last_error
+
+
+def build_reranker(backend: str, local: Optional[BaseReranker] = None) -> BaseReranker:
+    """
+    Instantiate a single reranker backend by name.
+
+    Args:
+        backend: voyage or local
+        local: Ready-made backend to use for "local" (e.g. the encoder pool's PooledReranker)
+    """
+    if backend == "voyage":
+        return VoyageReranker(api_key=settings.VOYAGE_API, model=settings.VOYAGE_RERANK_MODEL)
+    if backend == "local" and local is not None:
+        return local
+    if backend == "local":
+        return CrossEncoderReranker(
+            model_name=settings.LOCAL_RERANKER_MODEL,
+            onnx_path=settings.LOCAL_RERANKER_ONNX_PATH or None,
+            max_length=settings.LOCAL_RERANKER_MAX_LENGTH,
+            batch_size=settings.LOCAL_RERANKER_BATCH_SIZE,
+        )
+    raise ValueError(f"Unknown reranker backend: {backend}")
+
+
+def create_reranker(local: Optional[BaseReranker] = None) -> BaseReranker:
+    """
+    Build the reranker configured in settings.
+
+    RERANKER_BACKEND selects the primary backend; when RERANKER_FALLBACK_BACKEND
+    is set, failures of the primary are retried on the fallback backend.
+
+    Args:
+        local: Ready-made backend to use for "local" (see build_reranker)
+    """
+    primary = build_reranker(settings.RERANKER_BACKEND, local)
+    fallback_name = settings.RERANKER_FALLBACK_BACKEND
+    if not fallback_name or fallback_name == settings.RERANKER_BACKEND:
+        return primary
+
+    try:
+        fallback = build_reranker(fallback_name, local)
+    except Exception as e:
+        logger.error(f"Failed to init fallback reranker '{fallback_name}': {e}")
+        return primary
+    return FallbackReranker([primary, fallback])
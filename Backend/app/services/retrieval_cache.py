@@ -0,0 +1,60 @@
+"""
+Retrieval result cache.
+Bounded LRU with TTL for formatted hybrid search results, keyed on query and filters.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from Backend.app.core.metrics import metrics
+
+
+class RetrievalCache:
+    """Thread-safe LRU cache of retrieval results with per-entry expiry."""
+
+    def __init__(self, max_size: int, ttl_seconds: float) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, metadata_filter: Optional[Dict[str, Any]] = None) -> Hashable:
+        """Build a cache key from the normalized query and the non-empty filters."""
+        filters = tuple(sorted((k, str(v)) for k, v in (metadata_filter or {}).items() if v))
+        return " ".join(query.split()).lower(), filters
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Return a cached result, or None when missing or expired."""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                metrics.increment("retrieval_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.increment("retrieval_cache_hits")
+        return entry[1]
+
+    def put(self, key: Hashable, value: Dict[str, Any]) -> None:
+        """Store a result, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries (e.g. after the collection alias moved to a new build)."""
+        with self._lock:
+            self._entries.clear()
+        metrics.increment("retrieval_cache_invalidations")
+
+    def __len__(self) -> int:
+        return len(self._entries)
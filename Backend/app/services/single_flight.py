@@ -0,0 +1,172 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+During class hours many students ask the same question with the same filters
+within seconds. Instead of running embed -> Qdrant -> rerank -> Gemini once
+per request, the first caller (the leader) does the work and every identical
+request that arrives while it is in flight subscribes to the same result, or,
+for generation, to the same token stream.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, TypeVar
+
+from Backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    """One in-flight call shared by the leader and its followers."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs a function at most once per key at a time; concurrent callers share the result."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """
+        Run func, or wait for an identical call already in flight.
+
+        Args:
+            key: Identity of the work (e.g. normalized query and filters)
+            func: Zero-argument callable doing the work
+
+        Returns:
+            The leader's result (followers re-raise the leader's exception)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.increment("single_flight_shared", labels={"name": self.name})
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class _Broadcast:
+    """Chunks of one producer stream, replayable by any number of subscribers."""
+
+    def __init__(self) -> None:
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+
+class StreamFlight:
+    """
+    Fans out one generator to every identical concurrent request.
+
+    The generator runs in its own thread and appends chunks to a shared
+    buffer; subscribers (including the first) read the buffer from the start,
+    so late joiners still receive the whole answer. The producer stops early
+    once every subscriber has gone away.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def stream(self, key: Hashable, produce: Callable[[], Iterator[T]]) -> Iterator[T]:
+        """
+        Subscribe to the in-flight stream for key, starting it if needed.
+
+        Args:
+            key: Identity of the request (e.g. normalized question and filters)
+            produce: Creates the chunk generator; only called by the leader
+
+        Yields:
+            Chunks of the shared stream, from the first one
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast()
+            with broadcast.cond:
+                broadcast.subscribers += 1
+
+        if leader:
+            threading.Thread(
+                target=self._produce, args=(key, broadcast, produce), name=f"{self.name}-flight", daemon=True
+            ).start()
+        else:
+            metrics.increment("single_flight_shared", labels={"name": self.name})
+
+        position = 0
+        try:
+            while True:
+                with broadcast.cond:
+                    while position >= len(broadcast.chunks) and not broadcast.finished:
+                        broadcast.cond.wait()
+                    pending = broadcast.chunks[position:]
+                    finished = broadcast.finished
+                for chunk in pending:
+                    yield chunk
+                position += len(pending)
+                if finished and position >= len(broadcast.chunks):
+                    break
+            if broadcast.error is not None:
+                raise broadcast.error
+        finally:
+            with broadcast.cond:
+                broadcast.subscribers -= 1
+
+    def _produce(self, key: Hashable, broadcast: _Broadcast, produce: Callable[[], Iterator[Any]]) -> None:
+        generator = None
+        try:
+            generator = produce()
+            for chunk in generator:
+                with broadcast.cond:
+                    if broadcast.subscribers == 0:
+                        break
+                    broadcast.chunks.append(chunk)
+                    broadcast.cond.notify_all()
+        except BaseException as e:
+            logger.error(f"Shared stream {self.name} failed: {e}")
+            broadcast.error = e
+        finally:
+            if generator is not None and hasattr(generator, "close"):
+                generator.close()
+            # Unregister before finishing so new requests start a fresh stream
+            with self._lock:
+                del self._streams[key]
+            with broadcast.cond:
+                broadcast.finished = True
+                broadcast.cond.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._streams)
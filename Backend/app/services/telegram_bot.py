@@ -7,27 +7,26 @@ This module implements the payment flow:
 3. User pays with Telegram Stars
 4. Bot confirms payment and updates user subscription
 """
+import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import Optional
-
-from telegram import Update, LabeledPrice
-from telegram.ext import (
-    Application,
-    CommandHandler,
-    PreCheckoutQueryHandler,
-    MessageHandler,
-    filters,
-    ContextTypes,
-)
+import time
+from typing import TYPE_CHECKING, Optional, Tuple
 
 from Backend.app.core.config import settings
 from Backend.app.db.database import SessionLocal
 # Import all models to ensure SQLAlchemy relationships are properly resolved
 # The order matters: base models first, then models with relationships
 from Backend.app.models.chat import Conversation, Message  # noqa: F401
-from Backend.app.models.user import User
-from Backend.app.models.payment import Payment
+from Backend.app.models.user import User  # noqa: F401
+from Backend.app.models.payment import Payment  # noqa: F401
+from Backend.app.services import payment_service
+from Backend.app.services.telegram_updates import record_pre_checkout_answer
+
+# python-telegram-bot is imported on first use (create_application / handlers)
+# so the API process does not load it unless Telegram payments are used
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import Application, ContextTypes
 
 logger = logging.getLogger(__name__)
 
@@ -39,13 +38,56 @@ class TelegramBotService:
         self.token = settings.TELEGRAM_BOT_TOKEN
         self.bot_username = settings.TELEGRAM_BOT_USERNAME
         self.price_stars = settings.PRO_PLAN_PRICE_STARS
-        self.application: Optional[Application] = None
+        self.application: Optional["Application"] = None
     
     def _get_db(self):
         """Get database session."""
         return SessionLocal()
     
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Database work of the handlers; run in threads, off the event loop
+    # (asyncio.to_thread: the polling service does not install starlette)
+    
+    def _start_purchase(self, backend_user_id: str) -> Tuple[str, Optional[str]]:
+        """
+        Open (or reuse) the pending payment of a user.
+        
+        Returns:
+            ("created" or "reused", payment id), ("not_found", None) or ("already_pro", None)
+        """
+        db = self._get_db()
+        try:
+            outcome, payment = payment_service.open_payment(db, backend_user_id, self.price_stars)
+            return outcome, str(payment.id) if payment else None
+        finally:
+            db.close()
+    
+    def _payment_status(self, payment_id: str) -> Optional[str]:
+        """Status of a payment, or None if it does not exist."""
+        db = self._get_db()
+        try:
+            return payment_service.payment_status(db, payment_id)
+        finally:
+            db.close()
+    
+    def _complete_payment(
+        self,
+        payment_id: str,
+        telegram_charge_id: str,
+        provider_charge_id: Optional[str]
+    ) -> str:
+        """
+        Complete a payment and upgrade its user to Pro (idempotent per charge).
+        
+        Returns:
+            "completed", "duplicate", "not_found" or "conflict"
+        """
+        db = self._get_db()
+        try:
+            return payment_service.complete_payment(db, payment_id, telegram_charge_id, provider_charge_id)
+        finally:
+            db.close()
+    
+    async def start_command(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE") -> None:
         """
         Handle /start command with optional deep link for payment.
         
@@ -81,37 +123,19 @@ class TelegramBotService:
             )
             return
         
-        # Create pending payment record
-        db = self._get_db()
-        try:
-            # Verify user exists
-            db_user = db.query(User).filter(User.id == backend_user_id).first()
-            if not db_user:
-                await update.message.reply_text(
-                    "❌ Пользователь не найден. Пожалуйста, войдите в систему на сайте."
-                )
-                return
-            
-            # Check if user already has pro subscription
-            if db_user.subscription_tier == "pro":
-                await update.message.reply_text(
-                    "✅ У вас уже есть Pro подписка! Спасибо за поддержку."
-                )
-                return
-            
-            # Create pending payment
-            payment = Payment(
-                user_id=backend_user_id,
-                amount_stars=self.price_stars,
-                payload=f"pro_subscription_{backend_user_id}",
-                status="pending"
+        # Open a pending payment record, reusing the one from an earlier /start
+        outcome, payment_id = await asyncio.to_thread(self._start_purchase, backend_user_id)
+        if outcome == "not_found":
+            await update.message.reply_text(
+                "❌ Пользователь не найден. Пожалуйста, войдите в систему на сайте."
             )
-            db.add(payment)
-            db.commit()
-            db.refresh(payment)
-            payment_id = str(payment.id)
-        finally:
-            db.close()
+            return
+        
+        if outcome == "already_pro":
+            await update.message.reply_text(
+                "✅ У вас уже есть Pro подписка! Спасибо за поддержку."
+            )
+            return
         
         # Send invoice
         title = "JauapAI Pro Подписка"
@@ -122,6 +146,8 @@ class TelegramBotService:
             "✅ Доступ ко всем функциям"
         )
         
+        from telegram import LabeledPrice
+
         # Create price (amount in Telegram Stars)
         prices = [LabeledPrice("Pro подписка", self.price_stars)]
         
@@ -135,7 +161,7 @@ class TelegramBotService:
             prices=prices,
         )
     
-    async def pre_checkout_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    async def pre_checkout_callback(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE") -> None:
         """
         Handle pre-checkout query - validate payment before processing.
         
@@ -143,6 +169,7 @@ class TelegramBotService:
         You have 10 seconds to respond.
         """
         query = update.pre_checkout_query
+        started_at = time.time()
         
         try:
             # Parse payload
@@ -150,29 +177,38 @@ class TelegramBotService:
             payment_id = payload_parts[0]
             
             # Verify payment exists and is pending
-            db = self._get_db()
-            try:
-                payment = db.query(Payment).filter(Payment.id == payment_id).first()
-                
-                if not payment:
-                    await query.answer(ok=False, error_message="Платёж не найден. Попробуйте снова.")
-                    return
-                
-                if payment.status != "pending":
-                    await query.answer(ok=False, error_message="Этот платёж уже обработан.")
-                    return
-                
-                # Payment is valid, approve checkout
-                await query.answer(ok=True)
-                
-            finally:
-                db.close()
+            payment_status = await asyncio.to_thread(self._payment_status, payment_id)
+            
+            if payment_status is None:
+                await self._answer_pre_checkout(query, started_at, False, "Платёж не найден. Попробуйте снова.")
+                return
+            
+            if payment_status != payment_service.PENDING:
+                await self._answer_pre_checkout(query, started_at, False, "Этот платёж уже обработан.")
+                return
+            
+            # Payment is valid, approve checkout
+            await self._answer_pre_checkout(query, started_at, True)
                 
         except Exception as e:
             logger.error(f"Pre-checkout error: {e}")
-            await query.answer(ok=False, error_message="Произошла ошибка. Попробуйте позже.")
+            await self._answer_pre_checkout(query, started_at, False, "Произошла ошибка. Попробуйте позже.")
     
-    async def successful_payment_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    async def _answer_pre_checkout(
+        self,
+        query,
+        started_at: float,
+        ok: bool,
+        error_message: Optional[str] = None
+    ) -> None:
+        """Answer a pre-checkout query and record the answer latency."""
+        if ok:
+            await query.answer(ok=True)
+        else:
+            await query.answer(ok=False, error_message=error_message)
+        record_pre_checkout_answer(ok, started_at)
+    
+    async def successful_payment_callback(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE") -> None:
         """
         Handle successful payment - update user subscription.
         
@@ -181,33 +217,26 @@ class TelegramBotService:
         payment_info = update.message.successful_payment
         
         try:
-            # Parse payload to get payment ID and user ID
-            payload_parts = payment_info.invoice_payload.split("_")
-            payment_id = payload_parts[0]
-            user_id = "_".join(payload_parts[1:])  # Handle UUIDs with underscores
+            # Parse payload to get payment ID; the payment row knows the user
+            payment_id = payment_info.invoice_payload.split("_")[0]
             
-            db = self._get_db()
-            try:
-                # Update payment record
-                payment = db.query(Payment).filter(Payment.id == payment_id).first()
-                if payment:
-                    payment.status = "completed"
-                    payment.completed_at = datetime.now(timezone.utc)
-                    payment.telegram_payment_charge_id = payment_info.telegram_payment_charge_id
-                    payment.provider_payment_charge_id = payment_info.provider_payment_charge_id
-                
-                # Upgrade user to Pro
-                user = db.query(User).filter(User.id == user_id).first()
-                if user:
-                    user.subscription_tier = "pro"
-                    user.message_count = 0  # Reset message count
-                    user.message_count_reset_at = datetime.now(timezone.utc)
-                    logger.info(f"User {user_id} upgraded to Pro via Telegram Stars")
-                
-                db.commit()
-                
-            finally:
-                db.close()
+            outcome = await asyncio.to_thread(
+                self._complete_payment,
+                payment_id,
+                payment_info.telegram_payment_charge_id,
+                payment_info.provider_payment_charge_id,
+            )
+            
+            if outcome == "duplicate":
+                # Redelivered update: the user has already been told
+                return
+            
+            if outcome != "completed":
+                await update.message.reply_text(
+                    "⚠️ Платёж получен, но произошла ошибка активации.\n"
+                    "Пожалуйста, обратитесь в поддержку с этим сообщением."
+                )
+                return
             
             # Send confirmation message
             await update.message.reply_text(
@@ -227,10 +256,18 @@ class TelegramBotService:
                 "Пожалуйста, обратитесь в поддержку с этим сообщением."
             )
     
-    def create_application(self) -> Application:
+    def create_application(self) -> "Application":
         """Create and configure the Telegram bot application."""
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN is not set")
+
+        from telegram.ext import (
+            Application,
+            CommandHandler,
+            PreCheckoutQueryHandler,
+            MessageHandler,
+            filters,
+        )
         
         application = Application.builder().token(self.token).build()
         
@@ -248,7 +285,9 @@ class TelegramBotService:
         """Process a webhook update from Telegram."""
         if not self.application:
             self.create_application()
-        
+
+        from telegram import Update
+
         update = Update.de_json(update_data, self.application.bot)
         await self.application.process_update(update)
 
@@ -293,6 +332,7 @@ def get_payment_link(user_id: str) -> str:
 # For running the bot in polling mode (development)
 if __name__ == "__main__":
     import asyncio
+    from telegram import Update
     
     logging.basicConfig(
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -0,0 +1,309 @@
+"""
+Idempotent queue for Telegram webhook updates.
+
+In webhook mode (TELEGRAM_WEBHOOK_ASYNC) the webhook only records the update
+and acknowledges it; TELEGRAM_UPDATE_WORKERS tasks started from the app
+lifespan run the bot handlers. Pre-checkout queries, which Telegram expires
+after 10 seconds, are taken before any other queued update.
+
+Every update is first inserted into telegram_updates keyed on update_id, so a
+redelivered update (Telegram retries on timeouts, possibly to another worker
+process) is acknowledged without being processed twice. Workers claim a row
+before handling it; updates still pending after a restart are replayed, as
+are those left processing for TELEGRAM_UPDATE_LEASE_SECONDS by a worker that
+died. Handlers must therefore tolerate a repeat (payments are idempotent).
+Database calls run in threads (asyncio.to_thread) so they never block the
+event loop; the polling bot service imports this module without starlette.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.models.telegram import TelegramUpdate
+
+logger = logging.getLogger(__name__)
+
+PRE_CHECKOUT = "pre_checkout_query"
+# Telegram drops pre-checkout answers sent later than this
+PRE_CHECKOUT_EXPIRY_SECONDS = 10
+# Processed updates are kept this long for deduplication
+RETENTION_DAYS = 7
+
+# Wall-clock time the update being handled reached the webhook
+update_received_at: ContextVar[Optional[float]] = ContextVar("telegram_update_received_at", default=None)
+
+
+class UpdateQueueFull(Exception):
+    """Raised when TELEGRAM_UPDATE_QUEUE_SIZE updates are waiting; the webhook answers 503."""
+
+
+def update_kind(update_data: Dict[str, Any]) -> str:
+    """The update type, i.e. its field besides update_id (message, pre_checkout_query, ...)."""
+    return next((key for key in update_data if key != "update_id"), "unknown")
+
+
+def record_pre_checkout_answer(ok: bool, started_at: float) -> None:
+    """
+    Record the latency of a pre-checkout answer against TELEGRAM_PRE_CHECKOUT_SLO_MS.
+
+    Measured from the webhook receipt, or from `started_at` (handler start,
+    time.time()) for updates that did not come through the webhook (polling).
+    """
+    received_at = update_received_at.get() or started_at
+    elapsed_ms = (time.time() - received_at) * 1000
+    metrics.observe("telegram_pre_checkout_answer_ms", elapsed_ms, {"ok": ok})
+    within = elapsed_ms <= settings.TELEGRAM_PRE_CHECKOUT_SLO_MS
+    metrics.increment("telegram_pre_checkout_answers", labels={"slo": "met" if within else "breached"})
+    if not within:
+        logger.warning(f"Pre-checkout answered after {elapsed_ms:.0f} ms")
+
+
+@dataclass(order=True)
+class UpdateJob:
+    """A queued update; pre-checkout queries sort first."""
+    priority: int
+    seq: int
+    update_id: int = field(compare=False)
+    kind: str = field(compare=False)
+    payload: Dict[str, Any] = field(compare=False)
+    received_at: float = field(compare=False)  # time.time()
+
+
+class TelegramUpdateQueue:
+    """Deduplicating update queue processed by background workers."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        processor: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        workers: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            session_factory: Sessions for the telegram_updates table (defaults to SessionLocal)
+            processor: Runs the handlers for an update (defaults to the bot service)
+            workers: Concurrent handlers (TELEGRAM_UPDATE_WORKERS)
+            max_size: Waiting updates before submit refuses (TELEGRAM_UPDATE_QUEUE_SIZE)
+        """
+        self.session_factory = session_factory
+        self._processor = processor
+        self.workers = workers or settings.TELEGRAM_UPDATE_WORKERS
+        self.max_size = max_size or settings.TELEGRAM_UPDATE_QUEUE_SIZE
+        self._queue: Optional["asyncio.PriorityQueue[UpdateJob]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self._seq = itertools.count()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def processor(self) -> Callable[[Dict[str, Any]], Awaitable[None]]:
+        if self._processor is None:
+            from Backend.app.services.telegram_bot import telegram_bot_service
+
+            self._processor = telegram_bot_service.process_update
+        return self._processor
+
+    def session(self) -> Session:
+        if self.session_factory is None:
+            from Backend.app.db.database import SessionLocal
+
+            self.session_factory = SessionLocal
+        return self.session_factory()
+
+    async def submit(self, update_data: Dict[str, Any]) -> bool:
+        """
+        Record an update and queue it for the workers.
+
+        Returns:
+            False if the update_id was seen before (nothing is queued)
+
+        Raises:
+            UpdateQueueFull: Too many updates are waiting; Telegram should redeliver later
+        """
+        if self._queue.qsize() >= self.max_size:
+            metrics.increment("telegram_updates_rejected")
+            raise UpdateQueueFull()
+        received_at = time.time()
+        kind = update_kind(update_data)
+        if not await asyncio.to_thread(self.store, update_data, kind):
+            metrics.increment("telegram_updates_duplicate")
+            logger.info(f"Ignoring redelivered Telegram update {update_data.get('update_id')}")
+            return False
+        self._put(update_data["update_id"], kind, update_data, received_at)
+        metrics.increment("telegram_updates_received", labels={"kind": kind})
+        return True
+
+    def _put(self, update_id: int, kind: str, payload: Dict[str, Any], received_at: float) -> None:
+        priority = 0 if kind == PRE_CHECKOUT else 1
+        self._queue.put_nowait(UpdateJob(priority, next(self._seq), update_id, kind, payload, received_at))
+        metrics.set_gauge("telegram_update_queue_depth", self._queue.qsize())
+
+    def store(self, update_data: Dict[str, Any], kind: str) -> bool:
+        """Insert the update unless its update_id exists; True if inserted."""
+        db = self.session()
+        try:
+            if db.bind.dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+
+            table = TelegramUpdate.__table__
+            statement = insert(table).values(
+                update_id=update_data["update_id"],
+                kind=kind,
+                payload=update_data,
+                status="pending",
+                received_at=datetime.now(timezone.utc),
+            ).on_conflict_do_nothing(index_elements=[table.c.update_id])
+            inserted = db.execute(statement).rowcount == 1
+            db.commit()
+            return inserted
+        finally:
+            db.close()
+
+    def claim(self, update_id: int) -> bool:
+        """Move a pending update to processing; False if another worker has it."""
+        db = self.session()
+        try:
+            claimed = (
+                db.query(TelegramUpdate)
+                .filter(TelegramUpdate.update_id == update_id, TelegramUpdate.status == "pending")
+                .update(
+                    {TelegramUpdate.status: "processing", TelegramUpdate.processed_at: datetime.now(timezone.utc)},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            return claimed == 1
+        finally:
+            db.close()
+
+    def finish(self, update_id: int, status: str, error: Optional[str] = None) -> None:
+        db = self.session()
+        try:
+            db.query(TelegramUpdate).filter(TelegramUpdate.update_id == update_id).update(
+                {
+                    TelegramUpdate.status: status,
+                    TelegramUpdate.last_error: error,
+                    TelegramUpdate.processed_at: datetime.now(timezone.utc),
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def load_pending(self) -> List[TelegramUpdate]:
+        """
+        Pending updates left by a previous run, after pruning old processed ones.
+
+        Updates claimed longer than TELEGRAM_UPDATE_LEASE_SECONDS ago and still
+        processing (their worker was killed) are made pending again first.
+        """
+        db = self.session()
+        try:
+            now = datetime.now(timezone.utc)
+            cutoff = now - timedelta(days=RETENTION_DAYS)
+            db.query(TelegramUpdate).filter(
+                TelegramUpdate.status.notin_(("pending", "processing")), TelegramUpdate.received_at < cutoff
+            ).delete(synchronize_session=False)
+            lease_expired = now - timedelta(seconds=settings.TELEGRAM_UPDATE_LEASE_SECONDS)
+            reclaimed = db.query(TelegramUpdate).filter(
+                TelegramUpdate.status == "processing",
+                or_(TelegramUpdate.processed_at.is_(None), TelegramUpdate.processed_at < lease_expired),
+            ).update({TelegramUpdate.status: "pending"}, synchronize_session=False)
+            db.commit()
+            if reclaimed:
+                metrics.increment("telegram_updates_reclaimed", reclaimed)
+                logger.warning(f"Reclaimed {reclaimed} Telegram updates left processing")
+            rows = db.query(TelegramUpdate).filter(TelegramUpdate.status == "pending").order_by(TelegramUpdate.update_id).all()
+            db.expunge_all()
+            return rows
+        finally:
+            db.close()
+
+    async def handle(self, job: UpdateJob) -> None:
+        """Run the handlers for one queued update and record the outcome."""
+        if job.kind == PRE_CHECKOUT and time.time() - job.received_at > PRE_CHECKOUT_EXPIRY_SECONDS:
+            # Telegram has already failed the checkout; answering now is pointless
+            await asyncio.to_thread(self.finish, job.update_id, "expired")
+            metrics.increment("telegram_updates_expired")
+            return
+        if not await asyncio.to_thread(self.claim, job.update_id):
+            return
+
+        status, error = "done", None
+        token = update_received_at.set(job.received_at)
+        try:
+            await self.processor(job.payload)
+        except asyncio.CancelledError:
+            # Stopped mid-update (deploy): hand it back for the next start
+            await asyncio.to_thread(self.finish, job.update_id, "pending")
+            raise
+        except Exception as e:
+            status, error = "failed", str(e)
+            logger.error(f"Telegram update {job.update_id} ({job.kind}) failed: {e}")
+        finally:
+            update_received_at.reset(token)
+        await asyncio.to_thread(self.finish, job.update_id, status, error)
+        metrics.observe("telegram_update_ms", (time.time() - job.received_at) * 1000, {"kind": job.kind})
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self.handle(job)
+            except Exception as e:
+                logger.error(f"Telegram update worker error on {job.update_id}: {e}")
+            finally:
+                self._queue.task_done()
+                metrics.set_gauge("telegram_update_queue_depth", self._queue.qsize())
+
+    async def _recover(self) -> None:
+        try:
+            rows = await asyncio.to_thread(self.load_pending)
+        except Exception as e:
+            logger.error(f"Failed to load pending Telegram updates: {e}")
+            return
+        for row in rows:
+            received_at = row.received_at.replace(tzinfo=row.received_at.tzinfo or timezone.utc).timestamp()
+            self._put(row.update_id, row.kind, row.payload, received_at)
+        if rows:
+            logger.info(f"Replaying {len(rows)} pending Telegram updates")
+
+    def start(self) -> None:
+        """Start the workers and replay pending updates (called from the app lifespan)."""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._recover()))
+
+    async def join(self) -> None:
+        """Wait until every queued update has been handled."""
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        """Stop the workers; queued and in-flight updates are left pending and replayed on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Global update queue (per worker process)
+telegram_updates = TelegramUpdateQueue()
@@ -0,0 +1,169 @@
+"""
+Caches for access token verification.
+
+VerifiedTokenCache keeps the claims of recently verified JWTs, keyed by the
+token's SHA-256 digest, until the token expires, so the repeated requests of
+a session skip the HMAC check and claim parsing. Only tokens that verified
+are stored; a modified token has another digest and is verified again.
+
+Token versions implement revocation: every token carries the user's version
+as `ver`, and revoke_user_tokens bumps it. Versions are read through
+TokenVersionCache, so a revocation reaches other worker processes within
+TOKEN_VERSION_TTL_SECONDS. Both caches live in process memory.
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.models.user import UserTokenVersion
+
+logger = logging.getLogger(__name__)
+
+# Most user ids whose token version is cached
+MAX_CACHED_VERSIONS = 100_000
+
+
+class VerifiedTokenCache:
+    """Thread-safe LRU of token digest -> verified claims, expiring with the token."""
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self.max_size = settings.TOKEN_CACHE_SIZE if max_size is None else max_size
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a previously verified token, or None when unknown or expired."""
+        if self.max_size <= 0:
+            return None
+        key = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                metrics.increment("token_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.increment("token_cache_hits")
+        return entry[1]
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        """Store the claims of a verified token until its `exp`."""
+        expires_at = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        with self._lock:
+            self._entries[self.digest(token)] = (float(expires_at), payload)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TokenVersionCache:
+    """Thread-safe map of user id -> token version, each entry valid for a TTL."""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_size: int = MAX_CACHED_VERSIONS) -> None:
+        self.ttl_seconds = settings.TOKEN_VERSION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[uuid.UUID, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: uuid.UUID) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            return entry[1]
+
+    def put(self, user_id: uuid.UUID, version: int) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def get_token_version(db: Session, user_id: uuid.UUID) -> int:
+    """
+    Current token version of a user, from the cache or the database.
+
+    Args:
+        db: Database session
+        user_id: The user's id
+
+    Returns:
+        The version new tokens are issued with (0 if never revoked)
+    """
+    version = token_versions.get(user_id)
+    if version is None:
+        version = (
+            db.query(UserTokenVersion.version)
+            .filter(UserTokenVersion.user_id == user_id)
+            .scalar()
+        ) or 0
+        token_versions.put(user_id, version)
+    return version
+
+
+def revoke_user_tokens(db: Session, user_id: uuid.UUID) -> int:
+    """
+    Revoke every access token issued to a user so far.
+
+    Args:
+        db: Database session
+        user_id: The user's id
+
+    Returns:
+        The new token version
+    """
+    updated = (
+        db.query(UserTokenVersion)
+        .filter(UserTokenVersion.user_id == user_id)
+        .update({UserTokenVersion.version: UserTokenVersion.version + 1}, synchronize_session=False)
+    )
+    if not updated:
+        try:
+            db.add(UserTokenVersion(user_id=user_id, version=1))
+            db.flush()
+        except IntegrityError:
+            # A concurrent revocation created the row first
+            db.rollback()
+            db.query(UserTokenVersion).filter(UserTokenVersion.user_id == user_id).update(
+                {UserTokenVersion.version: UserTokenVersion.version + 1}, synchronize_session=False
+            )
+    db.commit()
+    version = db.query(UserTokenVersion.version).filter(UserTokenVersion.user_id == user_id).scalar()
+    token_versions.put(user_id, version)
+    metrics.increment("token_revocations")
+    logger.info(f"Revoked access tokens of user {user_id} (version {version})")
+    return version
+
+
+# Global cache instances (per worker process)
+verified_tokens = VerifiedTokenCache()
+token_versions = TokenVersionCache()
@@ -0,0 +1,245 @@
+"""
+Token usage accounting.
+
+A UsageRecord travels with one answer through retrieval and generation and
+collects the provider-reported tokens (Gemini/OpenAI prompt and completion,
+Voyage embedding and rerank) and per-stage latencies. Conversation answers
+persist it as a MessageUsage row next to the assistant message; every
+authenticated answer is also added to the in-memory UsageAggregator, which
+folds them into per-user/day totals and writes them to usage_daily in batches.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.models.usage import MessageUsage, UsageDaily
+
+logger = logging.getLogger(__name__)
+
+# UsageRecord token fields, mirrored by MessageUsage and UsageDaily columns
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens", "embedding_tokens", "rerank_tokens")
+
+
+@dataclass
+class UsageRecord:
+    """Tokens and stage latencies of one answer."""
+    model: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    embedding_tokens: int = 0
+    rerank_tokens: int = 0
+    latencies_ms: Dict[str, float] = field(default_factory=dict)
+
+    def add_llm_usage(self, model: str, usage: Dict[str, Any]) -> None:
+        """
+        Add the usage_metadata of a streamed LLM chunk.
+
+        LangChain reports per-chunk deltas, so summing every chunk gives the
+        request total; a failed-over answer adds up every model that contributed.
+        """
+        self.model = model
+        self.prompt_tokens += usage.get("input_tokens", 0)
+        self.completion_tokens += usage.get("output_tokens", 0)
+        self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+    def add_latency(self, stage: str, ms: float) -> None:
+        self.latencies_ms[stage] = round(self.latencies_ms.get(stage, 0.0) + ms, 1)
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """Add the wall time of the block to a stage latency."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_latency(stage, (time.perf_counter() - start) * 1000)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(getattr(self, name) for name in TOKEN_FIELDS)
+
+    def record_metrics(self) -> None:
+        """Add the record's tokens to the metrics registry."""
+        for name in TOKEN_FIELDS:
+            value = getattr(self, name)
+            if value:
+                metrics.increment(f"usage_{name}", value)
+
+
+def save_message_usage(db: Session, message_id: UUID, user_id: UUID, record: UsageRecord) -> MessageUsage:
+    """
+    Add the usage row for an assistant message to the session (committed by the caller).
+
+    Args:
+        db: Database session holding the assistant message
+        message_id: The assistant message id
+        user_id: Owner of the conversation
+        record: Usage collected while generating the message
+
+    Returns:
+        The pending MessageUsage row
+    """
+    row = MessageUsage(
+        message_id=message_id,
+        user_id=user_id,
+        model=record.model,
+        latencies_ms=record.latencies_ms or None,
+        **{name: getattr(record, name) for name in TOKEN_FIELDS}
+    )
+    db.add(row)
+    return row
+
+
+class UsageAggregator:
+    """
+    Buffers per-user/day usage increments and upserts them into usage_daily.
+
+    Answers only touch an in-memory dict; a background task flushes every
+    USAGE_FLUSH_SECONDS with one upsert per pair. Once USAGE_FLUSH_MAX_KEYS
+    distinct user/day pairs are pending, add() wakes the task to flush early
+    rather than writing to the database from the caller (often the event loop).
+    """
+
+    COLUMNS = ("messages",) + TOKEN_FIELDS + ("generation_ms",)
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None) -> None:
+        self.session_factory = session_factory
+        self._pending: Dict[Tuple[UUID, date], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(self.COLUMNS, 0))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def add(self, user_id: UUID, record: UsageRecord, day: Optional[date] = None) -> None:
+        """Count one answer for the user on the given (default: current UTC) day."""
+        key = (user_id, day or datetime.now(timezone.utc).date())
+        with self._lock:
+            totals = self._pending[key]
+            totals["messages"] += 1
+            for name in TOKEN_FIELDS:
+                totals[name] += getattr(record, name)
+            totals["generation_ms"] += record.latencies_ms.get("total", 0.0)
+            full = len(self._pending) >= settings.USAGE_FLUSH_MAX_KEYS
+        if full:
+            self.notify()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Write the buffered increments to usage_daily.
+
+        Returns:
+            Number of user/day rows upserted (buffer is restored on failure)
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, defaultdict(lambda: dict.fromkeys(self.COLUMNS, 0))
+            if not batch:
+                return 0
+            db = self.session()
+            try:
+                for (user_id, day), totals in batch.items():
+                    self.upsert(db, user_id, day, totals)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to flush usage rollups, keeping {len(batch)} in buffer: {e}")
+                self._restore(batch)
+                return 0
+            finally:
+                db.close()
+        metrics.increment("usage_rollup_rows_flushed", len(batch))
+        return len(batch)
+
+    def notify(self) -> None:
+        """Wake the flush task now instead of at the next interval (safe from any thread)."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def session(self) -> Session:
+        if self.session_factory is None:
+            from Backend.app.db.database import SessionLocal
+
+            self.session_factory = SessionLocal
+        return self.session_factory()
+
+    @classmethod
+    def upsert(cls, db: Session, user_id: UUID, day: date, totals: Dict[str, float]) -> None:
+        """Add totals to the user's row for the day, creating it if needed."""
+        if db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        table = UsageDaily.__table__
+        statement = insert(table).values(user_id=user_id, day=day, updated_at=datetime.now(timezone.utc), **totals)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day],
+            set_={
+                **{name: table.c[name] + statement.excluded[name] for name in cls.COLUMNS},
+                "updated_at": statement.excluded.updated_at,
+            }
+        )
+        db.execute(statement)
+
+    def _restore(self, batch: Dict[Tuple[UUID, date], Dict[str, float]]) -> None:
+        with self._lock:
+            for key, totals in batch.items():
+                pending = self._pending[key]
+                for name, value in totals.items():
+                    pending[name] += value
+
+    async def run(self) -> None:
+        """Flush periodically until cancelled (started from the app lifespan)."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.USAGE_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await run_in_threadpool(self.flush)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+        await run_in_threadpool(self.flush)
+
+
+def record_answer_usage(user_id: Optional[UUID], record: UsageRecord) -> None:
+    """Report an answer's usage to metrics and, for signed-in users, the daily rollup."""
+    record.record_metrics()
+    if user_id is not None:
+        usage_aggregator.add(user_id, record)
+
+
+# Global aggregator instance (per worker process)
+usage_aggregator = UsageAggregator()
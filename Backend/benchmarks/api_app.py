@@ -0,0 +1,101 @@
+"""
+The real FastAPI app wired to a throwaway SQLite database, for API benchmarks.
+
+Requests go through httpx's in-process ASGI transport, so the benchmark
+measures the app's own event loop and threadpool without network noise.
+The lifespan (RAG models, Telegram webhook) is not run.
+"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from Backend.benchmarks.import_time_benchmark import IMPORT_ENV_DEFAULTS
+
+
+def configure_env() -> None:
+    """Placeholder DATABASE_URL/SECRET_KEY so the app imports without a .env (call before importing it)."""
+    for key, value in IMPORT_ENV_DEFAULTS.items():
+        if not os.environ.get(key) or os.environ[key].startswith("sqlite"):
+            os.environ[key] = value
+
+
+def build_session_factory() -> "sessionmaker":
+    """Session factory of a temporary SQLite file holding the user and email outbox tables."""
+    configure_env()
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from Backend.app.db.database import Base
+    from Backend.app.models import chat  # noqa: F401  (resolves User.conversations)
+    from Backend.app.models.email import EmailOutbox
+    from Backend.app.models.user import User, UserTokenVersion
+
+    path = os.path.join(tempfile.mkdtemp(prefix="jauapai_bench_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, UserTokenVersion.__table__, EmailOutbox.__table__])
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def build_app_client() -> Tuple["httpx.AsyncClient", "sessionmaker"]:
+    """
+    The app with get_db on a temporary SQLite file (see build_session_factory).
+
+    Returns:
+        (async client for the app, session factory of the benchmark database)
+    """
+    session_factory = build_session_factory()
+    import httpx
+
+    from Backend.app.db.database import get_db
+    from Backend.app.main import app
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    return client, session_factory
+
+
+def create_user(session_factory, email: str, password_hash: Optional[str] = None) -> uuid.UUID:
+    """Insert an active, verified user and return its id."""
+    from Backend.app.models.user import User
+
+    db = session_factory()
+    try:
+        user = User(email=email, full_name="Bench", password_hash=password_hash, is_active=True, is_email_verified=True)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def bearer_headers(user_id: uuid.UUID) -> Dict[str, str]:
+    from Backend.app.core.security import create_access_token
+
+    token = create_access_token({"sub": str(user_id), "tier": "free", "active": True, "ver": 0})
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def measure_me(client, headers: Dict[str, str], requests: int, concurrency: int) -> List[float]:
+    """Latencies (ms) of /api/auth/me with a fixed number of concurrent callers."""
+    latencies: List[float] = []
+    remaining = iter(range(requests))
+
+    async def caller() -> None:
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get("/api/auth/me", headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return latencies
@@ -0,0 +1,95 @@
+"""
+Shared helpers for benchmarks: latency summaries and synthetic Qdrant collections.
+"""
+import random
+import statistics
+from typing import Any, Dict, List, Optional
+
+from qdrant_client import QdrantClient, models
+
+DISCIPLINES = ["Қазақстан тарихы", "Дүниежүзі тарихы", "География", "Математика", "Физика"]
+PUBLISHERS = ["Атамұра", "Мектеп", "Арман-ПВ"]
+GRADES = ["7", "8", "9", "10", "11"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean of a list of latencies in milliseconds."""
+    return {
+        "p50": percentile(latencies_ms, 50),
+        "p95": percentile(latencies_ms, 95),
+        "p99": percentile(latencies_ms, 99),
+        "mean": statistics.mean(latencies_ms),
+    }
+
+
+def random_dense(dim: int, rng: random.Random) -> List[float]:
+    """Random unit-ish dense vector."""
+    return [rng.gauss(0, 1) for _ in range(dim)]
+
+
+def random_sparse(rng: random.Random, vocab: int = 250_000, nnz: int = 40) -> models.SparseVector:
+    """Random sparse vector resembling BGE-M3 lexical weights."""
+    indices = sorted(rng.sample(range(vocab), nnz))
+    return models.SparseVector(indices=indices, values=[rng.random() for _ in indices])
+
+
+def synthetic_payload(i: int, rng: random.Random, text_words: int = 200) -> Dict[str, Any]:
+    """Payload shaped like an ingested textbook chunk."""
+    page = i % 300 + 1
+    return {
+        "page_content": " ".join(f"сөз{rng.randint(0, 5000)}" for _ in range(text_words)),
+        "metadata": {
+            "discipline": DISCIPLINES[i % len(DISCIPLINES)],
+            "grade": GRADES[(i // len(DISCIPLINES)) % len(GRADES)],
+            "publisher": PUBLISHERS[i % len(PUBLISHERS)],
+            "pages": [page, page + 1],
+            "source": f"book_{i % 25}.pdf",
+        },
+    }
+
+
+def create_synthetic_collection(
+    client: QdrantClient,
+    name: str,
+    n_points: int,
+    dim: int = 1024,
+    seed: int = 42,
+    batch_size: int = 256,
+    vectors_config: Optional[Dict[str, models.VectorParams]] = None,
+    **collection_kwargs: Any,
+) -> None:
+    """
+    (Re)create a collection with the production vector layout and fill it.
+
+    Uses the named vectors 'voyage-dense' (cosine) and 'bge-sparse', with
+    payloads spread over several disciplines, grades and publishers.
+    Extra keyword arguments are passed to create_collection.
+    """
+    rng = random.Random(seed)
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        collection_name=name,
+        vectors_config=vectors_config or {
+            "voyage-dense": models.VectorParams(size=dim, distance=models.Distance.COSINE)
+        },
+        sparse_vectors_config={"bge-sparse": models.SparseVectorParams()},
+        **collection_kwargs,
+    )
+    for start in range(0, n_points, batch_size):
+        points = [
+            models.PointStruct(
+                id=i,
+                vector={"voyage-dense": random_dense(dim, rng), "bge-sparse": random_sparse(rng)},
+                payload=synthetic_payload(i, rng),
+            )
+            for i in range(start, min(start + batch_size, n_points))
+        ]
+        client.upsert(collection_name=name, points=points, wait=True)
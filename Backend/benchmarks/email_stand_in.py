@@ -0,0 +1,102 @@
+"""
+Local stand-in for Resend's batch email API.
+
+Serves POST /emails/batch on 127.0.0.1 the way Resend does (permissive
+validation: addresses ending in "@invalid" are rejected individually) and
+records what it accepted. Point RESEND_API_URL at `url` to send the outbox
+there; `latency_ms` and `fail_next` emulate a slow or failing provider.
+
+Usage (for manual runs against a local API):
+    python -m Backend.benchmarks.email_stand_in --port 8025
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+
+class ResendStandIn:
+    """In-process HTTP server emulating POST /emails/batch."""
+
+    def __init__(self, port: int = 0, latency_ms: float = 0.0) -> None:
+        self.latency_ms = latency_ms
+        self.fail_next = 0  # Answer this many calls with a 500
+        self.calls = 0
+        self.emails: List[Dict[str, Any]] = []
+        self.received_at: List[float] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(stand_in.latency_ms / 1000)
+                status, response = stand_in.handle(self.path, body)
+                payload = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+    def handle(self, path: str, body: List[Dict[str, Any]]):
+        with self._lock:
+            self.calls += 1
+            if path != "/emails/batch":
+                return 404, {"statusCode": 404, "name": "not_found", "message": path}
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 500, {"statusCode": 500, "name": "internal_server_error", "message": "stand-in failure"}
+            data, errors = [], []
+            for index, email in enumerate(body):
+                if any(to.endswith("@invalid") for to in email["to"]):
+                    errors.append({"index": index, "message": "Invalid `to` field"})
+                    continue
+                self.emails.append(email)
+                self.received_at.append(time.perf_counter())
+                data.append({"id": str(uuid.uuid4())})
+            return 200, {"data": data, "errors": errors}
+
+    def __enter__(self) -> "ResendStandIn":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with ResendStandIn(args.port, args.latency_ms) as stand_in:
+        print(f"Resend stand-in on {stand_in.url} (set RESEND_API_URL); Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(5)
+                print(f"{len(stand_in.emails)} emails accepted in {stand_in.calls} calls")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+API latency under sparse-encoding load: in-process encoding vs encoder processes.
+
+Serves GET /api/auth/me from the real app (see api_app) while background
+threads saturate the sparse encoder, and reports the endpoint's latency
+percentiles for three scenarios:
+
+    idle     no encoding load
+    inline   encodes run in API-process threads (ENCODER_WORKERS=0)
+    pool     encodes run in EncoderPool processes (ENCODER_WORKERS>0)
+
+With inline encoding the encode threads compete with the event loop for the
+GIL and /auth/me p99 grows with the load; with the pool it should stay close
+to idle.
+
+By default a synthetic CPU-bound encoder (pure Python, holds the GIL) is used
+so the benchmark runs without model weights; --real loads BGE-M3.
+
+Usage:
+    python -m Backend.benchmarks.encoder_isolation_benchmark --load-threads 8 --workers 2 --requests 300
+    python -m Backend.benchmarks.encoder_isolation_benchmark --real --encode-cost-ms 0
+"""
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from Backend.benchmarks.api_app import bearer_headers, build_app_client, create_user, measure_me
+from Backend.benchmarks.common import summarize
+
+# Read by the loader in the worker processes as well as in this process
+ENCODE_COST_ENV = "ENCODER_BENCH_COST_MS"
+SYNTHETIC_LOADER = "Backend.benchmarks.encoder_isolation_benchmark:load_synthetic_encoder"
+
+
+class SyntheticEncoder:
+    """BGEM3FlagModel stand-in that burns CPU in Python for a fixed time per encode."""
+
+    def __init__(self, cost_ms: float) -> None:
+        self.cost_ms = cost_ms
+
+    def encode(self, query: str, **kwargs) -> Dict[str, Any]:
+        deadline = time.perf_counter() + self.cost_ms / 1000
+        weights: Dict[str, float] = {}
+        rng = random.Random(query)
+        while time.perf_counter() < deadline:
+            token = str(rng.randrange(250_000))
+            weights[token] = weights.get(token, 0.0) + rng.random()
+        return {"lexical_weights": dict(list(weights.items())[:40])}
+
+
+def load_synthetic_encoder() -> SyntheticEncoder:
+    return SyntheticEncoder(float(os.environ.get(ENCODE_COST_ENV, "20")))
+
+
+def start_load(encode: Callable[[str], Any], threads: int) -> Tuple[threading.Event, List[threading.Thread], Dict[str, int]]:
+    """Threads that call encode back to back until the returned event is set."""
+    stop = threading.Event()
+    counts = {"encodes": 0, "rejected": 0}
+
+    def loop(worker: int) -> None:
+        i = 0
+        while not stop.is_set():
+            try:
+                encode(f"Абай Құнанбаев шығармалары {worker}-{i}")
+                counts["encodes"] += 1
+            except Exception:
+                counts["rejected"] += 1
+                time.sleep(0.005)
+            i += 1
+
+    workers = [threading.Thread(target=loop, args=(n,), daemon=True) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    return stop, workers, counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="/auth/me requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent /auth/me callers")
+    parser.add_argument("--load-threads", type=int, default=8, help="Threads issuing encodes")
+    parser.add_argument("--workers", type=int, default=2, help="Encoder processes for the pool scenario")
+    parser.add_argument("--encode-cost-ms", type=float, default=20.0, help="CPU time per synthetic encode")
+    parser.add_argument("--real", action="store_true", help="Use BGE-M3 instead of the synthetic encoder")
+    args = parser.parse_args()
+
+    os.environ[ENCODE_COST_ENV] = str(args.encode_cost_ms)
+    client, session_factory = build_app_client()
+    headers = bearer_headers(create_user(session_factory, "bench@example.com"))
+
+    from Backend.app.services.encoder_pool import DEFAULT_SPARSE_LOADER, EncoderPool, encode_sparse, resolve_loader
+
+    loader = DEFAULT_SPARSE_LOADER if args.real else SYNTHETIC_LOADER
+    loop = asyncio.new_event_loop()
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def run_scenario(name: str, encode: Callable[[str], Any] = None) -> None:
+        # Warm-up request so the first-request overhead is not measured
+        loop.run_until_complete(measure_me(client, headers, 5, 1))
+        load = start_load(encode, args.load_threads) if encode else None
+        latencies = loop.run_until_complete(measure_me(client, headers, args.requests, args.concurrency))
+        counts = {"encodes": 0, "rejected": 0}
+        if load:
+            stop, threads, counts = load
+            stop.set()
+            for thread in threads:
+                thread.join()
+        results[name] = {**summarize(latencies), **counts}
+
+    run_scenario("idle")
+
+    model = resolve_loader(loader)()
+    run_scenario("inline", lambda query: encode_sparse(model, query))
+
+    pool = EncoderPool(workers=args.workers, max_pending=args.load_threads, sparse_loader=loader, local_rerank=False)
+    pool.warm_up()
+    try:
+        run_scenario("pool", pool.encode_sparse)
+    finally:
+        pool.close()
+    loop.run_until_complete(client.aclose())
+    loop.close()
+
+    print(f"{'scenario':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'encodes':>9} {'rejected':>9}")
+    for name, row in results.items():
+        print(
+            f"{name:<8} {row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f} "
+            f"{row['encodes']:>9} {row['rejected']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
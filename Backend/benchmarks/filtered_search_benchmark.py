@@ -0,0 +1,78 @@
+"""
+Filtered vs unfiltered hybrid query latency on a synthetic multi-book collection.
+
+Measures the RAG hybrid query with no filter, a single discipline filter and
+a discipline+grade+publisher filter, first without payload indexes and then
+after CollectionManager.ensure_payload_indexes().
+
+Start a local Qdrant first:
+    docker run -p 6333:6333 qdrant/qdrant
+
+Usage:
+    python -m Backend.benchmarks.filtered_search_benchmark --points 50000 --queries 200
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Optional
+
+from qdrant_client import QdrantClient, models
+
+from Backend.app.services.collection_manager import CollectionManager
+from Backend.app.services.rag_service import RAGService
+from Backend.benchmarks.common import (
+    DISCIPLINES,
+    GRADES,
+    PUBLISHERS,
+    create_synthetic_collection,
+    random_dense,
+    random_sparse,
+    summarize,
+)
+
+FILTERS: Dict[str, Optional[dict]] = {
+    "unfiltered": None,
+    "discipline": {"discipline": DISCIPLINES[0]},
+    "disc+grade+pub": {"discipline": DISCIPLINES[0], "grade": GRADES[0], "publisher": PUBLISHERS[0]},
+}
+
+
+def run(client: QdrantClient, collection: str, dim: int, queries: int, metadata_filter: Optional[dict]) -> List[float]:
+    """Time the hybrid query for a fixed query set under one filter."""
+    rng = random.Random(3)
+    qdrant_filter = RAGService.build_filter(metadata_filter)
+    latencies = []
+    for _ in range(queries):
+        kwargs = RAGService.hybrid_query_kwargs(random_dense(dim, rng), random_sparse(rng), qdrant_filter)
+        kwargs["collection_name"] = collection
+        start = time.perf_counter()
+        client.query_points(**kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--collection", default="bench_filtered")
+    parser.add_argument("--points", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url, timeout=60)
+    create_synthetic_collection(client, args.collection, args.points, args.dim)
+    manager = CollectionManager(client, args.collection)
+
+    print(f"{'indexes':<8} {'filter':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for phase in ("none", "keyword"):
+        if phase == "keyword":
+            manager.ensure_payload_indexes(wait=True)
+        for name, metadata_filter in FILTERS.items():
+            stats = summarize(run(client, args.collection, args.dim, args.queries, metadata_filter))
+            print(f"{phase:<8} {name:<16} {stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f}")
+    print(manager.status())
+
+
+if __name__ == "__main__":
+    main()
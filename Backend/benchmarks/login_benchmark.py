@@ -0,0 +1,112 @@
+"""
+Login throughput under concurrency, and its effect on other endpoints.
+
+Sends POST /api/auth/login from many concurrent clients (each with its own
+X-Forwarded-For address, so the per-IP throttle does not interfere) for each
+PASSWORD_HASH_WORKERS value, while a prober measures GET /api/auth/me. Reports
+logins per second, login latency, 503s from the bounded hash queue and the
+/auth/me p99 during the storm.
+
+--stored-rounds stores the users' hashes with a different bcrypt cost than
+BCRYPT_ROUNDS, so the first login of every user also exercises rehashing.
+
+Usage:
+    python -m Backend.benchmarks.login_benchmark --logins 200 --concurrency 32 --workers 1 2 4
+    python -m Backend.benchmarks.login_benchmark --stored-rounds 10
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from Backend.benchmarks.api_app import bearer_headers, build_app_client, create_user, measure_me
+from Backend.benchmarks.common import summarize
+
+PASSWORD = "benchmark-password"
+
+
+async def login_storm(client, emails: List[str], logins: int, concurrency: int) -> Dict[str, Any]:
+    """Run `logins` logins with `concurrency` callers; returns latencies and status counts."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = iter(range(logins))
+
+    async def caller() -> None:
+        for i in remaining:
+            body = {"email": emails[i % len(emails)], "password": PASSWORD}
+            headers = {"X-Forwarded-For": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"}
+            start = time.perf_counter()
+            response = await client.post("/api/auth/login", json=body, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return {"elapsed": time.perf_counter() - start, "latencies": latencies, "statuses": statuses}
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    client, session_factory = build_app_client()
+
+    from passlib.context import CryptContext
+
+    from Backend.app.api.endpoints import auth
+    from Backend.app.core.config import settings
+    from Backend.app.services.password_hasher import PasswordHasher
+
+    stored = CryptContext(schemes=["bcrypt"], bcrypt__rounds=args.stored_rounds or settings.BCRYPT_ROUNDS)
+    emails = [f"student{i}@example.com" for i in range(args.users)]
+    probe_headers = bearer_headers(create_user(session_factory, "probe@example.com"))
+
+    rows = []
+    for workers in args.workers:
+        # Fresh users per run so every run sees the same share of rehashes
+        stored_hash = stored.hash(PASSWORD)
+        run_emails = [f"w{workers}-{email}" for email in emails]
+        for email in run_emails:
+            create_user(session_factory, email, stored_hash)
+
+        auth.password_hasher = PasswordHasher(workers=workers, max_pending=args.max_pending)
+        storm = asyncio.create_task(login_storm(client, run_emails, args.logins, args.concurrency))
+        probe: List[float] = []
+        while not storm.done():
+            probe.extend(await measure_me(client, probe_headers, 10, 1))
+        result = storm.result()
+        auth.password_hasher.close()
+
+        ok = result["statuses"].get(200, 0)
+        rows.append({
+            "workers": workers,
+            "logins_per_s": ok / result["elapsed"],
+            "ok": ok,
+            "busy": result["statuses"].get(503, 0),
+            "login": summarize(result["latencies"]),
+            "me": summarize(probe),
+        })
+    await client.aclose()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent login callers")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="PASSWORD_HASH_WORKERS values")
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--stored-rounds", type=int, default=0, help="bcrypt cost of stored hashes (0 = BCRYPT_ROUNDS)")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print(
+        f"{'workers':>7} {'logins/s':>9} {'ok':>5} {'503':>5} {'login p50':>10} {'login p99':>10} {'me p99':>8}"
+    )
+    for row in rows:
+        print(
+            f"{row['workers']:>7} {row['logins_per_s']:>9.1f} {row['ok']:>5} {row['busy']:>5} "
+            f"{row['login']['p50']:>10.0f} {row['login']['p99']:>10.0f} {row['me']['p99']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
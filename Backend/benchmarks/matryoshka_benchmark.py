@@ -0,0 +1,122 @@
+"""
+Two-stage dense search with a truncated (Matryoshka) vector: latency and memory vs recall.
+
+For each DENSE_PREFETCH_VECTOR_SIZE (0 = single-stage full vector) the
+benchmark builds a collection with the production named vectors, then runs
+held-out queries through RAGService.dense_prefetch: candidates come from the
+small vector and are rescored with the full one. Recall@k is measured
+against exact search on the full vector.
+
+The synthetic corpus has decaying per-dimension variance, mimicking
+Matryoshka-trained embeddings whose leading dimensions carry most of the
+signal. Held-out queries are drawn from the same distribution and never
+inserted.
+
+Start a local Qdrant first:
+    docker run -p 6333:6333 qdrant/qdrant
+
+Usage:
+    python -m Backend.benchmarks.matryoshka_benchmark --points 50000 --sizes 0 256 512
+"""
+import argparse
+import random
+import time
+from typing import List
+
+from qdrant_client import QdrantClient, models
+
+from Backend.app.core.config import settings
+from Backend.app.services.collection_manager import (
+    DENSE_VECTOR_NAME,
+    SPARSE_VECTOR_NAME,
+    dense_vectors,
+    dense_vectors_config,
+    hnsw_config,
+)
+from Backend.app.services.rag_service import RAGService
+from Backend.benchmarks.common import summarize
+from Backend.benchmarks.quantization_benchmark import recall_at_k, wait_until_indexed
+
+
+def matryoshka_vector(dim: int, rng: random.Random, decay: float = 0.004) -> List[float]:
+    """Random vector whose component scale decays with the dimension index."""
+    return [rng.gauss(0, 1) / (1 + decay * i) for i in range(dim)]
+
+
+def build(client: QdrantClient, name: str, corpus: List[List[float]], batch_size: int = 256) -> None:
+    """(Re)create a collection with the configured dense vectors and fill it."""
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        collection_name=name,
+        vectors_config=dense_vectors_config(),
+        sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams()},
+        hnsw_config=hnsw_config(),
+    )
+    for start in range(0, len(corpus), batch_size):
+        client.upsert(
+            collection_name=name,
+            points=[
+                models.PointStruct(id=i, vector=dense_vectors(corpus[i]))
+                for i in range(start, min(start + batch_size, len(corpus)))
+            ],
+            wait=True,
+        )
+    wait_until_indexed(client, name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 256, 512])
+    args = parser.parse_args()
+
+    dim = settings.DENSE_VECTOR_SIZE
+    rng = random.Random(5)
+    corpus = [matryoshka_vector(dim, rng) for _ in range(args.points)]
+    held_out = [matryoshka_vector(dim, rng) for _ in range(args.queries)]
+    client = QdrantClient(url=args.url, timeout=120)
+    truth = None
+
+    print(f"{'small dim':>9} {'RAM MB':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for size in args.sizes:
+        settings.DENSE_PREFETCH_VECTOR_SIZE = size
+        collection = f"bench_matryoshka_{size}"
+        build(client, collection, corpus)
+
+        if truth is None:
+            truth = [
+                [p.id for p in client.query_points(
+                    collection, query=q, using=DENSE_VECTOR_NAME, limit=args.k,
+                    search_params=models.SearchParams(exact=True), with_payload=False
+                ).points]
+                for q in held_out
+            ]
+
+        ids, latencies = [], []
+        for query in held_out:
+            start = time.perf_counter()
+            response = client.query_points(
+                collection_name=collection,
+                prefetch=[RAGService.dense_prefetch(query, limit=args.k)],
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=args.k,
+                with_payload=False,
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            ids.append([p.id for p in response.points])
+
+        stats = summarize(latencies)
+        ram = args.points * (dim + size) * 4 / 1024 ** 2
+        print(
+            f"{size or dim:>9} {ram:>8.1f} {recall_at_k(ids, truth):>7.3f} "
+            f"{stats['p50']:>8.1f} {stats['p95']:>8.1f}"
+        )
+        client.delete_collection(collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Payload projection benchmark for the hybrid query.
+
+Compares the production projection (RETRIEVAL_PAYLOAD_FIELDS, no vectors)
+against with_payload=True and with_payload=True + with_vectors=True,
+reporting response bytes and JSON/model deserialization time per query.
+
+Start a local Qdrant first:
+    docker run -p 6333:6333 qdrant/qdrant
+
+Usage:
+    python -m Backend.benchmarks.payload_projection_benchmark --points 20000 --queries 200
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import httpx
+from qdrant_client import QdrantClient, models
+
+from Backend.app.services.rag_service import RETRIEVAL_PAYLOAD_FIELDS
+from Backend.benchmarks.common import create_synthetic_collection, random_dense, random_sparse, summarize
+
+
+def query_body(dim: int, rng: random.Random, with_payload, with_vector: bool) -> dict:
+    """REST body for /points/query matching RAGService.hybrid_query_kwargs."""
+    sparse = random_sparse(rng)
+    return {
+        "prefetch": [
+            {"query": random_dense(dim, rng), "using": "voyage-dense", "limit": 30},
+            {"query": {"indices": sparse.indices, "values": sparse.values}, "using": "bge-sparse", "limit": 30},
+        ],
+        "query": {"fusion": "rrf"},
+        "limit": 50,
+        "with_payload": with_payload,
+        "with_vector": with_vector,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--collection", default="bench_projection")
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--skip-build", action="store_true", help="Reuse an existing benchmark collection")
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        create_synthetic_collection(QdrantClient(url=args.url), args.collection, args.points, args.dim)
+
+    variants = {
+        "projected": ({"include": RETRIEVAL_PAYLOAD_FIELDS}, False),
+        "full_payload": (True, False),
+        "full+vectors": (True, True),
+    }
+    endpoint = f"{args.url}/collections/{args.collection}/points/query"
+
+    print(f"{'variant':<14} {'bytes/query':>12} {'decode p50 ms':>14} {'decode p95 ms':>14} {'total p50 ms':>13}")
+    with httpx.Client(timeout=30) as http:
+        for name, (with_payload, with_vector) in variants.items():
+            rng = random.Random(11)  # same queries for every variant
+            sizes, decode_ms, total_ms = [], [], []
+            for _ in range(args.queries):
+                body = query_body(args.dim, rng, with_payload, with_vector)
+                start = time.perf_counter()
+                response = http.post(endpoint, json=body)
+                response.raise_for_status()
+                decode_start = time.perf_counter()
+                data = json.loads(response.content)
+                models.QueryResponse.model_validate(data["result"])
+                end = time.perf_counter()
+                sizes.append(len(response.content))
+                decode_ms.append((end - decode_start) * 1000)
+                total_ms.append((end - start) * 1000)
+            decode = summarize(decode_ms)
+            print(
+                f"{name:<14} {statistics.mean(sizes):>12.0f} {decode['p50']:>14.2f} "
+                f"{decode['p95']:>14.2f} {summarize(total_ms)['p50']:>13.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+REST vs gRPC latency benchmark for the hybrid query_points call.
+
+Builds a synthetic collection with the production vector layout on a local
+Qdrant stand-in, then issues the RAG hybrid query (dense + sparse prefetch,
+RRF fusion) over both transports at increasing concurrency.
+
+Start a local Qdrant first:
+    docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant
+
+Usage:
+    python -m Backend.benchmarks.qdrant_transport_benchmark --points 20000 \
+        --concurrency 1 4 16 64 --requests 400
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from Backend.benchmarks.common import create_synthetic_collection, random_dense, random_sparse, summarize
+
+
+def hybrid_kwargs(collection: str, dim: int, rng: random.Random) -> dict:
+    """query_points arguments matching RAGService.hybrid_query_kwargs."""
+    return {
+        "collection_name": collection,
+        "prefetch": [
+            models.Prefetch(query=random_dense(dim, rng), using="voyage-dense", limit=30),
+            models.Prefetch(query=random_sparse(rng), using="bge-sparse", limit=30),
+        ],
+        "query": models.FusionQuery(fusion=models.Fusion.RRF),
+        "limit": 50,
+        "with_payload": True,
+    }
+
+
+async def run_level(client: AsyncQdrantClient, queries: List[dict], concurrency: int) -> tuple:
+    """Issue all queries with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(kwargs: dict) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await client.query_points(**kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    return latencies, time.perf_counter() - wall_start
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    rng = random.Random(7)
+    queries = [hybrid_kwargs(args.collection, args.dim, rng) for _ in range(args.requests)]
+
+    transports = {
+        "rest": AsyncQdrantClient(
+            host=args.host, port=6333, http2=True,
+            limits=httpx.Limits(max_connections=args.pool_size, max_keepalive_connections=args.pool_size),
+        ),
+        "grpc": AsyncQdrantClient(host=args.host, grpc_port=6334, prefer_grpc=True, pool_size=args.pool_size),
+    }
+
+    print(f"{'transport':<9} {'conc':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'qps':>8}")
+    for name, client in transports.items():
+        await client.query_points(**queries[0])  # warm-up: open connections/channels
+        for level in args.concurrency:
+            latencies, wall = await run_level(client, queries, level)
+            stats = summarize(latencies)
+            print(
+                f"{name:<9} {level:>5} {stats['p50']:>8.1f} {stats['p95']:>8.1f} "
+                f"{stats['p99']:>8.1f} {len(latencies) / wall:>8.0f}"
+            )
+        await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--collection", default="bench_transport")
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--skip-build", action="store_true", help="Reuse an existing benchmark collection")
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        create_synthetic_collection(QdrantClient(host=args.host, port=6333), args.collection, args.points, args.dim)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
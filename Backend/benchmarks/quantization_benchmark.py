@@ -0,0 +1,134 @@
+"""
+Dense vector memory footprint vs recall@k and latency for storage configs.
+
+Builds the same synthetic collection with each storage config (float in RAM,
+float on disk, scalar int8, binary), then runs dense queries with several
+quantization oversampling factors. Recall@k is measured against exact
+(brute-force) search on the float collection. RAM is estimated from the
+vector layout: float32 originals unless on disk, quantized vectors, and HNSW
+links.
+
+Start a local Qdrant first (local mode ignores quantization and HNSW):
+    docker run -p 6333:6333 qdrant/qdrant
+
+Usage:
+    python -m Backend.benchmarks.quantization_benchmark --points 50000 --queries 200 --k 10
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Tuple
+
+from qdrant_client import QdrantClient, models
+
+from Backend.app.core.config import settings
+from Backend.app.services.collection_manager import (
+    DENSE_VECTOR_NAME,
+    dense_search_params,
+    dense_vector_params,
+    hnsw_config,
+)
+from Backend.benchmarks.common import create_synthetic_collection, random_dense, summarize
+
+# (label, quantization, originals on disk)
+CONFIGS: List[Tuple[str, str, bool]] = [
+    ("float-ram", "none", False),
+    ("float-disk", "none", True),
+    ("scalar", "scalar", True),
+    ("binary", "binary", True),
+]
+
+# Bytes per dimension of the vectors kept in RAM for each quantization
+QUANTIZED_BYTES_PER_DIM = {"none": 0.0, "scalar": 1.0, "binary": 1 / 8}
+
+
+def estimate_ram_mb(points: int, dim: int, quantization: str, on_disk: bool) -> float:
+    """Estimated RAM for dense vectors and the HNSW graph in megabytes."""
+    originals = 0 if on_disk else points * dim * 4
+    quantized = points * dim * QUANTIZED_BYTES_PER_DIM[quantization]
+    graph = points * settings.QDRANT_HNSW_M * 2 * 4
+    return (originals + quantized + graph) / 1024 ** 2
+
+
+def wait_until_indexed(client: QdrantClient, collection: str, timeout: float = 600) -> None:
+    """Block until the collection has finished optimizing (status green)."""
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{collection} still optimizing after {timeout}s")
+        time.sleep(1)
+
+
+def search(
+    client: QdrantClient,
+    collection: str,
+    queries: List[List[float]],
+    k: int,
+    params: models.SearchParams,
+) -> Tuple[List[List[int]], List[float]]:
+    """Run dense queries and return result ids and latencies in ms."""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = client.query_points(
+            collection_name=collection,
+            query=query,
+            using=DENSE_VECTOR_NAME,
+            limit=k,
+            search_params=params,
+            with_payload=False,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([point.id for point in response.points])
+    return ids, latencies
+
+
+def recall_at_k(results: List[List[int]], truth: List[List[int]]) -> float:
+    """Mean fraction of exact top-k neighbours found."""
+    return sum(len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)) / len(truth)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=settings.DENSE_VECTOR_SIZE)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 4.0])
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url, timeout=120)
+    rng = random.Random(11)
+    queries = [random_dense(args.dim, rng) for _ in range(args.queries)]
+    truth = None
+
+    print(f"{'config':<12} {'oversamp':>8} {'RAM MB':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, quantization, on_disk in CONFIGS:
+        collection = f"bench_quant_{label.replace('-', '_')}"
+        vector = dense_vector_params(quantization, on_disk)
+        vector.size = args.dim
+        create_synthetic_collection(
+            client, collection, args.points, args.dim,
+            vectors_config={DENSE_VECTOR_NAME: vector},
+            hnsw_config=hnsw_config(),
+        )
+        wait_until_indexed(client, collection)
+
+        if truth is None:
+            truth, _ = search(client, collection, queries, args.k, models.SearchParams(exact=True))
+
+        ram = estimate_ram_mb(args.points, args.dim, quantization, on_disk)
+        factors = args.oversampling if quantization != "none" else [1.0]
+        for factor in factors:
+            ids, latencies = search(client, collection, queries, args.k, dense_search_params(factor))
+            stats = summarize(latencies)
+            print(
+                f"{label:<12} {factor:>8.1f} {ram:>8.1f} {recall_at_k(ids, truth):>7.3f} "
+                f"{stats['p50']:>8.1f} {stats['p95']:>8.1f}"
+            )
+        client.delete_collection(collection)
+
+
+if __name__ == "__main__":
+    main()
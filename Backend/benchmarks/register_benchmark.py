@@ -0,0 +1,101 @@
+"""
+Registration latency with the email outbox, against a slow email provider.
+
+Registers users through POST /api/auth/register while the outbox worker
+delivers to a local Resend stand-in that answers after --provider-latency-ms.
+Reports register latency (which should not include the provider latency),
+the lag from a register response to its email reaching the stand-in, and
+how many emails each batch call carried.
+
+bcrypt is set to its minimum cost so the timings show the email path.
+
+Usage:
+    python -m Backend.benchmarks.register_benchmark --registrations 200 --concurrency 16 --provider-latency-ms 400
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+from Backend.benchmarks.api_app import build_app_client
+from Backend.benchmarks.common import summarize
+from Backend.benchmarks.email_stand_in import ResendStandIn
+
+
+async def register_storm(client, registrations: int, concurrency: int) -> Dict[str, Any]:
+    """Register `registrations` users with `concurrency` callers; returns latencies and response times."""
+    latencies: List[float] = []
+    done_at: Dict[str, float] = {}
+    remaining = iter(range(registrations))
+
+    async def caller() -> None:
+        for i in remaining:
+            email = f"student{i}@example.com"
+            body = {"email": email, "password": "benchmark-password", "full_name": "Bench"}
+            start = time.perf_counter()
+            response = await client.post("/api/auth/register", json=body)
+            done_at[email] = time.perf_counter()
+            latencies.append((done_at[email] - start) * 1000)
+            response.raise_for_status()
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return {"latencies": latencies, "done_at": done_at}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    os.environ["BCRYPT_ROUNDS"] = "4"
+    os.environ["RESEND_API_KEY"] = "re_benchmark"
+    client, session_factory = build_app_client()
+
+    from Backend.app.api.endpoints import auth
+    from Backend.app.core.config import settings
+    from Backend.app.services.email_outbox import EmailOutboxWorker
+    from Backend.app.services.email_service import EmailService
+
+    with ResendStandIn(latency_ms=args.provider_latency_ms) as stand_in:
+        settings.RESEND_API_URL = stand_in.url
+        worker = EmailOutboxWorker(session_factory, EmailService())
+        auth.email_outbox = worker
+        worker.start()
+
+        result = await register_storm(client, args.registrations, args.concurrency)
+        deadline = time.perf_counter() + 60
+        while len(stand_in.emails) < args.registrations and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        await worker.stop()
+        await client.aclose()
+
+        lags = [
+            (received - result["done_at"][email["to"][0]]) * 1000
+            for email, received in zip(stand_in.emails, stand_in.received_at)
+        ]
+        return {
+            "register": summarize(result["latencies"]),
+            "lag": summarize(lags) if lags else None,
+            "delivered": len(stand_in.emails),
+            "calls": stand_in.calls,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registrations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--provider-latency-ms", type=float, default=400.0)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    register, lag = result["register"], result["lag"]
+    print(f"provider latency: {args.provider_latency_ms:.0f} ms")
+    print(f"register        p50 {register['p50']:.0f} ms  p99 {register['p99']:.0f} ms")
+    if lag:
+        print(f"delivery lag    p50 {lag['p50']:.0f} ms  p99 {lag['p99']:.0f} ms")
+    print(
+        f"delivered {result['delivered']}/{args.registrations} in {result['calls']} batch calls "
+        f"({result['delivered'] / max(1, result['calls']):.1f} per call)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Reranker parity and latency benchmark.
+
+Runs every configured reranker backend over the same (query, candidates) set
+and reports latency percentiles plus top-k agreement with the reference backend.
+
+Dataset format (JSONL, one line per query):
+    {"query": "...", "documents": ["chunk 1", "chunk 2", ...]}
+
+Usage:
+    python -m Backend.benchmarks.rerank_benchmark --dataset rerank_eval.jsonl \
+        --backends voyage local --reference voyage --top-k 5
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+from Backend.app.services.reranker import BaseReranker, build_reranker
+from Backend.benchmarks.common import percentile
+
+
+def load_dataset(path: str) -> List[Dict]:
+    """Load benchmark queries and their candidate documents."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_backend(reranker: BaseReranker, dataset: List[Dict], top_k: int) -> Dict:
+    """Rerank every dataset entry, collecting latencies and ranked indices."""
+    latencies: List[float] = []
+    rankings: List[List[int]] = []
+    for row in dataset:
+        start = time.perf_counter()
+        results = reranker.rerank(row["query"], row["documents"], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rankings.append([r.index for r in results])
+    return {"latencies": latencies, "rankings": rankings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", required=True, help="JSONL file with query/documents rows")
+    parser.add_argument("--backends", nargs="+", default=["voyage", "local"])
+    parser.add_argument("--reference", default="voyage", help="Backend used as the parity baseline")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.dataset)
+    results: Dict[str, Dict] = {}
+    for name in args.backends:
+        reranker = build_reranker(name)
+        # Warm-up call so model loading / connection setup is not measured
+        run_backend(reranker, dataset[:1], args.top_k)
+        results[name] = run_backend(reranker, dataset, args.top_k)
+
+    reference = results.get(args.reference)
+    print(f"{'backend':<10} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'overlap@k':>10} {'top1 agree':>11}")
+    for name, res in results.items():
+        lat = res["latencies"]
+        overlap = top1 = float("nan")
+        if reference is not None:
+            overlaps = [
+                len(set(a) & set(b)) / max(1, len(b))
+                for a, b in zip(res["rankings"], reference["rankings"])
+            ]
+            agrees = [
+                bool(a) and bool(b) and a[0] == b[0]
+                for a, b in zip(res["rankings"], reference["rankings"])
+            ]
+            overlap = statistics.mean(overlaps)
+            top1 = sum(agrees) / len(agrees)
+        print(
+            f"{name:<10} {percentile(lat, 50):>9.1f} {percentile(lat, 95):>9.1f} "
+            f"{statistics.mean(lat):>9.1f} {overlap:>10.3f} {top1:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Tests for collection storage settings (quantization, on-disk vectors, HNSW)
+and two-stage search with a truncated dense vector.
+"""
+import pytest
+from qdrant_client import QdrantClient, models
+
+from Backend.app.core.config import settings
+from Backend.app.services.collection_manager import (
+    DENSE_SMALL_VECTOR_NAME,
+    DENSE_VECTOR_NAME,
+    CollectionManager,
+    dense_search_params,
+    dense_vectors,
+    quantization_config,
+    truncate_dense,
+)
+from Backend.app.services.ingestion import IngestionPipeline, embedding_signature
+from Backend.app.services.rag_service import RAGService
+from Backend.tests.test_ingestion import FakeDenseModel, FakeSparseModel
+
+
+class TestStorageConfig:
+    """Tests for quantization and search parameter builders."""
+
+    def test_quantization_kinds(self):
+        """Test that each quantization kind maps to the matching Qdrant config."""
+        assert quantization_config("none") is None
+        assert isinstance(quantization_config("scalar"), models.ScalarQuantization)
+        assert isinstance(quantization_config("binary"), models.BinaryQuantization)
+        with pytest.raises(ValueError):
+            quantization_config("product")
+
+    def test_per_query_oversampling(self, monkeypatch):
+        """Test that the dense prefetch uses per-query oversampling over the default."""
+        monkeypatch.setattr(settings, "QDRANT_QUANTIZATION_OVERSAMPLING", 2.0)
+        assert dense_search_params().quantization.oversampling == 2.0
+
+        kwargs = RAGService.hybrid_query_kwargs([0.1] * 4, models.SparseVector(indices=[1], values=[1.0]),
+                                                oversampling=3.5)
+        dense_prefetch = kwargs["prefetch"][0]
+        assert dense_prefetch.using == DENSE_VECTOR_NAME
+        assert dense_prefetch.params.quantization.oversampling == 3.5
+        assert dense_prefetch.params.hnsw_ef == settings.QDRANT_HNSW_EF
+
+    def test_ingestion_creates_configured_collection(self, monkeypatch):
+        """Test that new collections store dense originals on disk when configured."""
+        monkeypatch.setattr(settings, "QDRANT_ON_DISK_VECTORS", True)
+        monkeypatch.setattr(settings, "QDRANT_QUANTIZATION", "scalar")
+        client = QdrantClient(":memory:")
+        IngestionPipeline(client, FakeDenseModel(), FakeSparseModel(), collection_name="test_books").ensure_collection()
+
+        dense = client.get_collection("test_books").config.params.vectors[DENSE_VECTOR_NAME]
+        assert dense.on_disk is True
+        assert dense.size == settings.DENSE_VECTOR_SIZE
+        assert CollectionManager(client, "test_books").validate_vectors() == []
+
+
+class TestTwoStageSearch:
+    """Tests for the Matryoshka small vector and nested prefetch rescoring."""
+
+    def test_truncate_dense_normalizes(self):
+        """Test that truncation keeps the leading dims and re-normalizes them."""
+        assert truncate_dense([3.0, 4.0, 12.0], 2) == pytest.approx([0.6, 0.8])
+
+    def test_small_vector_ingest_and_query(self, monkeypatch):
+        """Test that both dense vectors are stored and the nested query rescores them."""
+        monkeypatch.setattr(settings, "DENSE_PREFETCH_VECTOR_SIZE", 256)
+        client = QdrantClient(":memory:")
+        pipeline = IngestionPipeline(client, FakeDenseModel(), FakeSparseModel(), collection_name="test_books")
+        pipeline.ensure_collection()
+        assert CollectionManager(client, "test_books").validate_vectors() == []
+
+        points = [
+            models.PointStruct(
+                id=i,
+                vector={**dense_vectors(full), "bge-sparse": models.SparseVector(indices=[i], values=[1.0])},
+                payload={"page_content": f"chunk {i}", "metadata": {"discipline": "Физика"}},
+            )
+            for i, full in enumerate([[1.0] + [0.0] * 1023, [0.0, 1.0] + [0.0] * 1022, [0.5] * 1024])
+        ]
+        client.upsert("test_books", points)
+
+        prefetch = RAGService.dense_prefetch([1.0] + [0.0] * 1023)
+        assert prefetch.using == DENSE_VECTOR_NAME
+        assert prefetch.prefetch.using == DENSE_SMALL_VECTOR_NAME
+        assert len(prefetch.prefetch.query) == 256
+
+        kwargs = RAGService.hybrid_query_kwargs([1.0] + [0.0] * 1023, models.SparseVector(indices=[0], values=[1.0]))
+        kwargs["collection_name"] = "test_books"
+        result = client.query_points(**kwargs)
+        assert result.points[0].id == 0
+
+    def test_signature_tracks_small_vector(self, monkeypatch):
+        """Test that enabling the small vector invalidates existing content hashes."""
+        before = embedding_signature()
+        monkeypatch.setattr(settings, "DENSE_PREFETCH_VECTOR_SIZE", 512)
+        assert embedding_signature() != before
@@ -0,0 +1,97 @@
+"""
+Tests for retrieval context budgeting.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from Backend.app.core.metrics import metrics
+from Backend.app.services import context_budget
+from Backend.app.services.context_budget import ContextBudgetManager, estimate_tokens, window_text
+
+
+def make_payload(text: str, pages, discipline="Қазақстан тарихы", grade="10", publisher="Атамұра") -> dict:
+    return {
+        "page_content": text,
+        "metadata": {"discipline": discipline, "grade": grade, "publisher": publisher, "pages": pages},
+    }
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestDedupe:
+    """Tests for near-duplicate chunk removal."""
+
+    def test_overlapping_pages_same_book(self):
+        """Test that chunks sharing a page of the same book are collapsed."""
+        manager = ContextBudgetManager()
+        payloads = [
+            make_payload("Абылай хан туралы", [12, 13]),
+            make_payload("Басқа мәтін мүлдем", [13, 14]),
+            make_payload("Үшінші бөлім", [40]),
+        ]
+
+        assert manager.dedupe(payloads) == [0, 2]
+        assert metrics.snapshot()["counters"]["context_tokens_saved{stage=dedupe}"] > 0
+
+    def test_same_pages_different_book_kept(self):
+        """Test that identical page numbers from another book are not duplicates."""
+        manager = ContextBudgetManager()
+        payloads = [
+            make_payload("Бірінші кітап мәтіні", [5]),
+            make_payload("Екінші кітап мәтіні басқа", [5], publisher="Мектеп"),
+        ]
+
+        assert manager.dedupe(payloads) == [0, 1]
+
+    def test_near_identical_text(self):
+        """Test that near-identical text is a duplicate regardless of metadata."""
+        manager = ContextBudgetManager(similarity_threshold=0.8)
+        text = " ".join(f"сөз{i}" for i in range(50))
+        payloads = [
+            make_payload(text, [1]),
+            make_payload(text + " қосымша", [99], publisher="Мектеп"),
+        ]
+
+        assert manager.dedupe(payloads) == [0]
+
+    def test_shingles_each_chunk_once(self):
+        """Test that dedupe shingles every chunk once rather than once per compared pair."""
+        manager = ContextBudgetManager()
+        payloads = [make_payload(f"бөлім {i} " + "мәтін " * i, [i], publisher=f"Баспа {i}") for i in range(10)]
+
+        with patch.object(context_budget, "_shingles", wraps=context_budget._shingles) as shingles:
+            assert manager.dedupe(payloads) == list(range(10))
+        assert shingles.call_count == len(payloads)
+
+
+class TestBudget:
+    """Tests for rerank windowing and context budget enforcement."""
+
+    def test_window_prefers_query_terms(self):
+        """Test that windowing keeps the part of the chunk matching the query."""
+        text = "толтырғыш " * 200 + "Абылай хан шайқас " * 5 + "толтырғыш " * 200
+        window = window_text(text, "Абылай хан", max_tokens=30)
+
+        assert "Абылай" in window
+        assert estimate_tokens(window) <= 30
+
+    def test_short_text_unchanged(self):
+        """Test that chunks under the cap are passed through."""
+        assert window_text("қысқа мәтін", "мәтін", max_tokens=100) == "қысқа мәтін"
+
+    def test_assemble_respects_budget(self):
+        """Test that assembled context never exceeds the token budget."""
+        manager = ContextBudgetManager(context_budget=50)
+        docs = ["а" * 90, "б" * 90, "в" * 90]
+
+        context = manager.assemble(docs)
+
+        assert estimate_tokens(context) <= 50 + 1
+        assert "в" not in context
+        assert metrics.snapshot()["counters"]["context_tokens_saved{stage=budget}"] > 0
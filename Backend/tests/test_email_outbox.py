@@ -0,0 +1,118 @@
+"""
+Tests for the transactional email outbox and its batch delivery worker.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Backend.app.api.endpoints import auth
+from Backend.app.core.config import settings
+from Backend.app.db.database import Base
+from Backend.app.models import chat  # noqa: F401  (resolves User.conversations)
+from Backend.app.models.email import EmailOutbox
+from Backend.app.models.user import User, UserTokenVersion
+from Backend.app.schemas.auth import RegisterRequest
+from Backend.app.services.email_outbox import EmailOutboxWorker, enqueue_email
+from Backend.app.services.email_service import EmailService
+from Backend.app.services.password_hasher import PasswordHasher
+from Backend.benchmarks.email_stand_in import ResendStandIn
+
+TABLES = [User.__table__, UserTokenVersion.__table__, EmailOutbox.__table__]
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine, tables=TABLES)
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    monkeypatch.setattr(settings, "RESEND_API_KEY", "re_test")
+    with ResendStandIn() as server:
+        monkeypatch.setattr(settings, "RESEND_API_URL", server.url)
+        yield server
+
+
+def pending(session_factory, count, domain="example.com"):
+    db = session_factory()
+    for i in range(count):
+        enqueue_email(db, f"student{i}@{domain}", "Subject", "<p>Hi</p>")
+    db.commit()
+    db.close()
+
+
+def outbox(session_factory):
+    return session_factory().query(EmailOutbox).order_by(EmailOutbox.to_email).all()
+
+
+class TestRegistrationOutbox:
+    """Tests for enqueueing emails with the registering transaction."""
+
+    def test_register_queues_email_without_sending(self, session_factory, monkeypatch):
+        """Test that registration commits the user and its email, and sends nothing inline."""
+        monkeypatch.setattr(auth, "password_hasher", PasswordHasher(workers=1))
+        monkeypatch.setattr(settings, "RESEND_API_KEY", "re_test")
+        monkeypatch.setattr(settings, "RESEND_API_URL", "http://127.0.0.1:9")  # Nothing listens
+        db = session_factory()
+
+        request = RegisterRequest(email="new@example.com", password="secret-pass", full_name="Aru")
+        response = asyncio.run(auth.register(request, db))
+
+        assert response.requires_verification
+        user = session_factory().query(User).filter(User.email == "new@example.com").one()
+        [email] = outbox(session_factory)
+        assert email.to_email == "new@example.com" and email.status == "pending"
+        assert user.email_verification_token in email.html
+        auth.password_hasher.close()
+        db.close()
+
+
+class TestOutboxWorker:
+    """Tests for batched delivery with retries."""
+
+    def test_delivers_in_batches(self, session_factory, stand_in, monkeypatch):
+        """Test that due emails go out EMAIL_BATCH_SIZE per call and are marked sent."""
+        monkeypatch.setattr(settings, "EMAIL_BATCH_SIZE", 2)
+        pending(session_factory, 5)
+        worker = EmailOutboxWorker(session_factory, EmailService())
+
+        assert [worker.deliver_batch() for _ in range(4)] == [2, 2, 1, 0]
+        assert stand_in.calls == 3 and len(stand_in.emails) == 5
+        assert all(e.status == "sent" and e.provider_id and e.attempts == 1 for e in outbox(session_factory))
+
+    def test_failed_batch_is_retried_with_backoff(self, session_factory, stand_in):
+        """Test that a provider error reschedules the batch, which is sent once due again."""
+        pending(session_factory, 2)
+        worker = EmailOutboxWorker(session_factory, EmailService())
+        stand_in.fail_next = 1
+
+        assert worker.deliver_batch() == 2
+        emails = outbox(session_factory)
+        now = datetime.now(timezone.utc)
+        assert all(e.status == "pending" and e.attempts == 1 and e.last_error for e in emails)
+        assert all(e.next_attempt_at.replace(tzinfo=timezone.utc) > now for e in emails)
+        assert worker.deliver_batch() == 0  # Backing off
+
+        db = session_factory()
+        db.query(EmailOutbox).update({EmailOutbox.next_attempt_at: now - timedelta(seconds=1)})
+        db.commit()
+        assert worker.deliver_batch() == 2
+        assert all(e.status == "sent" and e.attempts == 2 for e in outbox(session_factory))
+
+    def test_rejected_address_fails_alone(self, session_factory, stand_in, monkeypatch):
+        """Test that an invalid recipient does not hold back the rest of its batch."""
+        monkeypatch.setattr(settings, "EMAIL_MAX_ATTEMPTS", 1)
+        pending(session_factory, 1)
+        pending(session_factory, 1, domain="invalid")
+        worker = EmailOutboxWorker(session_factory, EmailService())
+
+        assert worker.deliver_batch() == 2
+        statuses = {e.to_email: e.status for e in outbox(session_factory)}
+        assert statuses == {"student0@example.com": "sent", "student0@invalid": "failed"}
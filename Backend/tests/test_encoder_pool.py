@@ -0,0 +1,80 @@
+"""
+Tests for the encoder process pool used for BGE-M3 query encoding.
+"""
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from Backend.app.core.config import settings
+from Backend.app.services.encoder_pool import EncoderPool, EncoderPoolFull, PooledReranker, encode_sparse
+from Backend.app.services.rag_service import RAGService
+from Backend.app.services.reranker import create_reranker
+from Backend.benchmarks.encoder_isolation_benchmark import ENCODE_COST_ENV, SYNTHETIC_LOADER, SyntheticEncoder
+
+
+class TestEncoderPool:
+    """Tests for worker-process encoding and bounded admission."""
+
+    def test_encode_in_worker(self, monkeypatch):
+        """Test that workers return the same sparse vector as in-process encoding."""
+        monkeypatch.setenv(ENCODE_COST_ENV, "1")
+        pool = EncoderPool(workers=1, max_pending=0, timeout=60, sparse_loader=SYNTHETIC_LOADER, local_rerank=False)
+        try:
+            keys, vals = pool.encode_sparse("Абылай хан")
+        finally:
+            pool.close()
+        assert (keys, vals) == encode_sparse(SyntheticEncoder(1), "Абылай хан")
+        assert len(keys) == len(vals) > 0
+
+    def test_rejects_when_full(self, monkeypatch):
+        """Test that jobs beyond workers + max_pending fail fast instead of queueing."""
+        monkeypatch.setenv(ENCODE_COST_ENV, "1500")
+        pool = EncoderPool(workers=1, max_pending=0, timeout=60, sparse_loader=SYNTHETIC_LOADER, local_rerank=False)
+        try:
+            pool.warm_up()
+            busy = threading.Thread(target=pool.encode_sparse, args=("бірінші",))
+            busy.start()
+            while pool.stats()["in_flight"] == 0:
+                busy.join(0.01)
+            with pytest.raises(EncoderPoolFull):
+                pool.encode_sparse("екінші")
+            busy.join()
+            assert pool.stats()["in_flight"] == 0
+        finally:
+            pool.close()
+
+    def test_rerank_requires_local_rerank(self):
+        """Test that rerank jobs are refused when the workers have no reranker."""
+        pool = EncoderPool(workers=1, sparse_loader=SYNTHETIC_LOADER, local_rerank=False)
+        try:
+            with pytest.raises(RuntimeError):
+                pool.rerank("сұрақ", ["құжат"], 1)
+        finally:
+            pool.close()
+
+
+class TestRAGServiceDispatch:
+    """Tests for routing RAGService work to the encoder pool."""
+
+    def test_sparse_query_uses_pool(self):
+        """Test that sparse_query goes to the pool instead of the in-process model."""
+        with patch.object(RAGService, "connect_qdrant"), \
+                patch.object(RAGService, "bootstrap_collection"), \
+                patch.object(RAGService, "init_lexical_fallback"), \
+                patch.object(RAGService, "init_models"):
+            service = RAGService()
+        try:
+            service.encoder_pool = MagicMock()
+            service.encoder_pool.encode_sparse.return_value = ([7], [0.5])
+            assert service.sparse_query("Каспий") == ([7], [0.5])
+            service.encoder_pool.encode_sparse.assert_called_once_with("Каспий")
+        finally:
+            service.close()
+
+    def test_local_reranker_from_pool(self, monkeypatch):
+        """Test that the 'local' backend is served by the pool when provided."""
+        monkeypatch.setattr(settings, "RERANKER_BACKEND", "local")
+        monkeypatch.setattr(settings, "RERANKER_FALLBACK_BACKEND", "")
+        pooled = PooledReranker(MagicMock())
+        assert create_reranker(local=pooled) is pooled
@@ -0,0 +1,207 @@
+"""
+Tests for generation admission control and the tiered priority queue.
+"""
+import asyncio
+
+import pytest
+
+from Backend.app.core.metrics import metrics
+from Backend.app.services.generation_scheduler import GenerationScheduler, SchedulerFull, scheduled_stream
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestGenerationScheduler:
+    """Tests for slot granting, priority order and shedding."""
+
+    def test_pro_served_before_free_and_guest(self):
+        """Test that queued requests are granted by tier, FIFO within a tier."""
+        async def scenario():
+            scheduler = GenerationScheduler(max_concurrent=1, max_queue=10, max_guest_queue=10, queue_timeout=5)
+            running = scheduler.admit("free")
+            assert not running.queued
+
+            guest = scheduler.admit("guest")
+            free = scheduler.admit("free")
+            pro_1 = scheduler.admit("pro")
+            pro_2 = scheduler.admit("pro")
+            assert [pro_1.position, pro_2.position, free.position, guest.position] == [1, 2, 3, 4]
+
+            order = []
+            for ticket in (pro_1, pro_2, free, guest):
+                running.release()
+                await ticket.wait()
+                order.append(ticket)
+                running = ticket
+            assert order == [pro_1, pro_2, free, guest]
+            running.release()
+            assert scheduler.in_flight == 0
+
+        run(scenario())
+
+    def test_guest_queue_limit(self):
+        """Test that guests are shed once their share of the queue is used up."""
+        async def scenario():
+            scheduler = GenerationScheduler(max_concurrent=1, max_queue=10, max_guest_queue=1, queue_timeout=5)
+            scheduler.admit("pro")
+            scheduler.admit("guest")
+            with pytest.raises(SchedulerFull) as exc:
+                scheduler.admit("guest")
+            assert exc.value.retry_after >= 1
+            # Paying tiers still queue
+            assert scheduler.admit("free").queued
+
+        run(scenario())
+
+    def test_full_queue_preempts_lower_tier(self):
+        """Test that a full queue sheds the lowest-priority waiter for a higher tier and rejects equals."""
+        async def scenario():
+            scheduler = GenerationScheduler(max_concurrent=1, max_queue=2, max_guest_queue=5, queue_timeout=5)
+            scheduler.admit("pro")
+            free = scheduler.admit("free")
+            guest = scheduler.admit("guest")
+
+            pro = scheduler.admit("pro")
+            assert scheduler.queue and guest not in scheduler.queue
+            with pytest.raises(SchedulerFull):
+                await guest.wait()
+
+            with pytest.raises(SchedulerFull):
+                scheduler.admit("free")
+            assert sorted(scheduler.queue) == [pro, free]
+
+        run(scenario())
+
+    def test_queue_timeout_sheds(self):
+        """Test that a request waiting longer than the queue timeout is shed."""
+        async def scenario():
+            scheduler = GenerationScheduler(max_concurrent=1, queue_timeout=0.05)
+            scheduler.admit("pro")
+            waiting = scheduler.admit("free")
+            before = metrics.snapshot()["counters"].get("generation_shed{reason=timeout,tier=free}", 0)
+            with pytest.raises(SchedulerFull):
+                await waiting.wait()
+            assert not scheduler.queue
+            assert metrics.snapshot()["counters"]["generation_shed{reason=timeout,tier=free}"] == before + 1
+
+        run(scenario())
+
+    def test_retry_after_scales_with_backlog(self):
+        """Test that Retry-After grows with queued work per slot."""
+        async def scenario():
+            scheduler = GenerationScheduler(max_concurrent=2, max_queue=10, queue_timeout=5)
+            scheduler._avg_slot_seconds = 10
+            scheduler.admit("pro")
+            scheduler.admit("pro")
+            assert scheduler.retry_after() == 5
+            for _ in range(3):
+                scheduler.admit("free")
+            assert scheduler.retry_after() == 20
+
+        run(scenario())
+
+
+class TestScheduledStream:
+    """Tests for streaming under a granted slot."""
+
+    def test_stream_releases_slot_and_reports_queue(self):
+        """Test that queued streams announce their position, run after release and free their slot."""
+        async def scenario():
+            scheduler = GenerationScheduler(max_concurrent=1, queue_timeout=5)
+            first = scheduler.admit("free")
+            second = scheduler.admit("pro")
+
+            chunks = []
+
+            async def consume():
+                async for chunk in scheduled_stream(second, lambda: iter(["a", "b"]), queue_events=True):
+                    chunks.append(chunk)
+
+            task = asyncio.create_task(consume())
+            await asyncio.sleep(0.01)
+            assert len(chunks) == 1 and '"position": 1' in chunks[0]
+
+            first.release()
+            await task
+            assert chunks[1:] == ["a", "b"]
+            assert scheduler.in_flight == 0
+            assert "generation_queue_wait_ms{tier=pro}" in metrics.snapshot()["histograms"]
+
+        run(scenario())
+
+
+class TestEndpointAdmission:
+    """Tests for releasing the slot when an endpoint fails before streaming."""
+
+    def test_send_message_releases_slot_on_db_error(self, monkeypatch):
+        """Test that a DB error after admission does not keep the slot in flight."""
+        from types import SimpleNamespace
+
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+
+        from Backend.app.api.endpoints import conversations
+        from Backend.app.db.database import Base
+        from Backend.app.models.chat import Conversation
+        from Backend.app.models.user import User
+        from Backend.app.schemas.chat import MessageCreate
+
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine, tables=[User.__table__, Conversation.__table__])
+        db = sessionmaker(bind=engine)()
+        user = User(email="student@example.com", subscription_tier="free", is_active=True)
+        db.add(user)
+        db.flush()
+        conversation = Conversation(user_id=user.id, title="New chat")
+        db.add(conversation)
+        db.commit()
+
+        scheduler = GenerationScheduler(max_concurrent=1)
+        monkeypatch.setattr(conversations, "admit_generation", scheduler.admit)
+
+        def fail(user, db):
+            raise RuntimeError("database unavailable")
+
+        monkeypatch.setattr(conversations, "increment_message_count", fail)
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(rag_service=object())))
+
+        with pytest.raises(RuntimeError):
+            run(conversations.send_message(conversation.id, request, MessageCreate(message="hi"), db, user))
+        assert scheduler.in_flight == 0
+        db.close()
+
+    @pytest.mark.parametrize("spec_version", ["2.4", "2.0"])
+    def test_disconnect_before_response_start_releases_slot(self, spec_version):
+        """Test that a client gone before http.response.start frees the slot and admits the next waiter."""
+        from starlette.requests import ClientDisconnect
+
+        from Backend.app.services.generation_scheduler import ScheduledStreamingResponse
+
+        async def scenario():
+            scheduler = GenerationScheduler(max_concurrent=1, queue_timeout=5)
+            ticket = scheduler.admit("free")
+            waiting = scheduler.admit("pro")
+            response = ScheduledStreamingResponse(scheduled_stream(ticket, lambda: iter(["a"])), ticket)
+
+            async def receive():
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if spec_version == "2.4":
+                    raise OSError("connection reset")
+                await asyncio.sleep(5)  # Cancelled by the disconnect listener
+
+            scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+            try:
+                await response(scope, receive, send)
+            except ClientDisconnect:
+                pass
+
+            assert not waiting.queued and scheduler.in_flight == 1
+            waiting.release()
+            assert scheduler.in_flight == 0
+
+        run(scenario())
@@ -0,0 +1,141 @@
+"""
+Tests for Google sign-in: local ID-token verification and the pooled client.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from jose import jwk, jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Backend.app.api.endpoints.auth import google_auth
+from Backend.app.core.config import settings
+from Backend.app.core.security import decode_token
+from Backend.app.db.database import Base
+from Backend.app.models import chat  # noqa: F401  (resolves User.conversations)
+from Backend.app.models.user import User, UserTokenVersion
+from Backend.app.schemas.auth import GoogleAuthRequest
+from Backend.app.services import google_auth as google
+from Backend.app.services.http_client import SharedHttpClient
+
+CLIENT_ID = "jauapai-test.apps.googleusercontent.com"
+
+
+class FakeGoogle:
+    """Google's JWKS and userinfo endpoints on an httpx mock transport."""
+
+    def __init__(self) -> None:
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        public_pem = self.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": "key-1", "use": "sig"}
+        self.requests = []
+        self.http = SharedHttpClient()
+        self.http._client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.path)
+        if request.url.path == "/oauth2/v3/certs":
+            return httpx.Response(200, json={"keys": [self.jwk]}, headers={"Cache-Control": "public, max-age=600"})
+        if request.headers.get("Authorization") == "Bearer good-access-token":
+            return httpx.Response(200, json={"sub": "g-2", "email": "implicit@example.com", "name": "Dana"})
+        return httpx.Response(401, json={"error": "invalid_token"})
+
+    def id_token(self, kid: str = "key-1", **claims) -> str:
+        pem = self.private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": CLIENT_ID,
+            "sub": "g-1",
+            "email": "google@example.com",
+            "email_verified": True,
+            "name": "Aru",
+            "exp": int(time.time()) + 600,
+            **claims,
+        }
+        return jwt.encode(payload, pem, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def fake_google(monkeypatch):
+    fake = FakeGoogle()
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    monkeypatch.setattr(google, "http_client", fake.http)
+    monkeypatch.setattr(google, "google_keys", google.GoogleKeyCache(client=fake.http))
+    return fake
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [User.__table__, UserTokenVersion.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine, tables=tables)
+
+
+class TestIdTokenVerification:
+    """Tests for verifying ID tokens against cached Google keys."""
+
+    def test_keys_fetched_once_for_many_sign_ins(self, fake_google):
+        """Test that valid tokens verify locally after a single JWKS fetch."""
+        async def scenario():
+            return [await google.resolve_google_identity(fake_google.id_token()) for _ in range(3)]
+
+        claims = asyncio.run(scenario())
+        assert [c["email"] for c in claims] == ["google@example.com"] * 3
+        assert fake_google.requests == ["/oauth2/v3/certs"]
+
+    @pytest.mark.parametrize("claims", [
+        {"aud": "someone-else.apps.googleusercontent.com"},
+        {"iss": "https://evil.example.com"},
+        {"exp": int(time.time()) - 10},
+        {"email_verified": False},
+    ])
+    def test_rejects_invalid_claims(self, fake_google, claims):
+        """Test that audience, issuer, expiry and email verification are enforced."""
+        with pytest.raises(google.GoogleCredentialError):
+            asyncio.run(google.verify_id_token(fake_google.id_token(**claims)))
+
+    def test_unknown_key_refreshes_at_most_once_per_interval(self, fake_google):
+        """Test that unknown key ids do not turn into a JWKS request each."""
+        async def scenario():
+            await google.verify_id_token(fake_google.id_token())
+            for _ in range(3):
+                with pytest.raises(google.GoogleCredentialError):
+                    await google.verify_id_token(fake_google.id_token(kid="rotated-away"))
+
+        asyncio.run(scenario())
+        assert fake_google.requests == ["/oauth2/v3/certs"]
+
+
+class TestGoogleAuthEndpoint:
+    """Tests for POST /auth/google with both credential types."""
+
+    def test_id_token_sign_in_skips_userinfo(self, fake_google, session_factory):
+        """Test that an ID token signs the user in without calling userinfo."""
+        response = asyncio.run(google_auth(GoogleAuthRequest(credential=fake_google.id_token()), session_factory()))
+
+        user = session_factory().query(User).filter(User.email == "google@example.com").one()
+        assert decode_token(response.access_token)["sub"] == str(user.id)
+        assert user.google_id == "g-1" and user.is_email_verified
+        assert "/oauth2/v3/userinfo" not in fake_google.requests
+
+    def test_access_token_uses_userinfo(self, fake_google, session_factory):
+        """Test that access tokens are resolved through userinfo and bad ones get 401."""
+        response = asyncio.run(google_auth(GoogleAuthRequest(credential="good-access-token"), session_factory()))
+        assert response.access_token
+        assert fake_google.requests == ["/oauth2/v3/userinfo"]
+
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(google_auth(GoogleAuthRequest(credential="revoked-token"), session_factory()))
+        assert exc.value.status_code == 401
@@ -0,0 +1,140 @@
+"""
+Tests for the in-process hot shard index, checked for parity against an in-memory Qdrant.
+"""
+import os
+import random
+import time
+
+import pytest
+from qdrant_client import QdrantClient, models
+
+from Backend.app.services.hot_shard import HotShard, HotShardIndex
+from Backend.app.services.rag_service import (
+    HYBRID_PREFETCH_LIMIT,
+    HYBRID_RESULT_LIMIT,
+    RETRIEVAL_PAYLOAD_FIELDS,
+    RAGService,
+)
+
+DIM = 32
+DISCIPLINES = ["Физика", "География", "Қазақстан тарихы"]
+GRADES = ["9", "10", "11"]
+
+
+def random_sparse(rng):
+    indices = sorted(rng.sample(range(60), 6))
+    return models.SparseVector(indices=indices, values=[rng.random() for _ in indices])
+
+
+@pytest.fixture
+def client():
+    rng = random.Random(7)
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        "books",
+        vectors_config={"voyage-dense": models.VectorParams(size=DIM, distance=models.Distance.COSINE)},
+        sparse_vectors_config={"bge-sparse": models.SparseVectorParams()},
+    )
+    client.upsert("books", [
+        models.PointStruct(
+            id=i,
+            vector={"voyage-dense": [rng.gauss(0, 1) for _ in range(DIM)], "bge-sparse": random_sparse(rng)},
+            payload={
+                "page_content": f"chunk {i}",
+                "content_hash": "x",
+                "metadata": {
+                    "discipline": DISCIPLINES[i % 3],
+                    "grade": GRADES[(i // 3) % 3],
+                    "publisher": "Атамұра",
+                    "pages": [i],
+                    "source": "book.pdf",
+                },
+            },
+        )
+        for i in range(300)
+    ])
+    return client
+
+
+class TestHotShardParity:
+    """Tests that local hybrid search matches Qdrant's RRF results."""
+
+    @pytest.mark.parametrize("metadata_filter", [
+        {"discipline": "Физика"},
+        {"discipline": "Физика", "grade": "10"},
+        {"discipline": "География", "grade": "11", "publisher": "Атамұра"},
+    ])
+    def test_matches_qdrant(self, client, tmp_path, metadata_filter):
+        """Test that ids, order and payloads match query_points for the same query."""
+        index = HotShardIndex.build(
+            client, "books", ["Физика", "География"], str(tmp_path / "shard"), RETRIEVAL_PAYLOAD_FIELDS
+        )
+        rng = random.Random(99)
+        for _ in range(5):
+            dense = [rng.gauss(0, 1) for _ in range(DIM)]
+            sparse = random_sparse(rng)
+
+            kwargs = RAGService.hybrid_query_kwargs(dense, sparse, RAGService.build_filter(metadata_filter))
+            kwargs["collection_name"] = "books"
+            expected = client.query_points(**kwargs).points
+            local = index.search(dense, sparse, metadata_filter, HYBRID_PREFETCH_LIMIT, HYBRID_RESULT_LIMIT).points
+
+            assert [p.id for p in local] == [p.id for p in expected]
+            assert [p.score for p in local] == pytest.approx([p.score for p in expected])
+            assert [p.payload for p in local] == [p.payload for p in expected]
+
+
+class TestHotShardRouting:
+    """Tests for routing and refresh."""
+
+    def test_matches_only_hot_disciplines(self, client, tmp_path):
+        """Test that only filters naming a hot discipline are routed locally."""
+        shard = HotShard(client, ["Физика"], str(tmp_path), RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+        assert not shard.matches({"discipline": "Физика"})
+
+        shard.refresh()
+        assert shard.matches({"discipline": "Физика", "grade": "10"})
+        assert not shard.matches({"discipline": "География"})
+        assert not shard.matches(None)
+        assert len(shard.index) == 100
+
+    def test_refresh_replaces_old_build(self, client, tmp_path):
+        """Test that a refresh swaps in a new build and removes the previous one."""
+        shard = HotShard(client, ["Физика"], str(tmp_path), RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+        first = shard.refresh()
+        second = shard.refresh()
+
+        assert shard.index is second
+        builds = tmp_path / str(os.getpid())
+        assert [p.name for p in builds.iterdir()] == [second.directory.rsplit("/", 1)[-1]]
+        # The old snapshot stays readable for in-flight queries
+        assert len(first.search([1.0] * DIM, random_sparse(random.Random(1)), {"discipline": "Физика"}).points) > 0
+
+    def test_processes_keep_their_own_builds(self, client, tmp_path, monkeypatch):
+        """Test that a refresh never deletes the shard of another process sharing the directory."""
+        other = HotShard(client, ["Физика"], str(tmp_path), RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+        other_index = other.refresh()
+
+        monkeypatch.setattr(os, "getpid", lambda: 1)
+        shard = HotShard(client, ["Физика"], str(tmp_path), RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+        shard.refresh()
+        shard.refresh()
+
+        assert os.path.isdir(other_index.directory)
+        assert len(list((tmp_path / "1").iterdir())) == 1
+
+    def test_background_build_and_cleanup(self, client, tmp_path):
+        """Test that start() builds off the caller's thread, stale builds are swept and stop() deletes ours."""
+        dead, alive, legacy = tmp_path / "999999999", tmp_path / str(os.getppid()), tmp_path / "v1"
+        for path in (dead, alive, legacy):
+            path.mkdir()
+        shard = HotShard(client, ["Физика"], str(tmp_path), RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+        shard.start()
+        deadline = time.monotonic() + 30
+        while shard.index is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert shard.matches({"discipline": "Физика"})
+        assert not dead.exists() and not legacy.exists() and alive.exists()
+        shard.stop()
+        assert not (tmp_path / str(os.getpid())).exists()
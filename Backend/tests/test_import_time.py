@@ -0,0 +1,35 @@
+"""
+Tests for the lazy imports that keep the API's cold start cheap.
+"""
+from pathlib import Path
+
+from Backend.benchmarks.import_time_benchmark import lazy_violations, measure_import, parse_importtime
+
+REPO_ROOT = str(Path(__file__).resolve().parents[2])
+
+
+class TestImportTime:
+    """Importing the API must not load the ML, bot or email SDKs."""
+
+    def test_parse_importtime(self):
+        """Self and cumulative times are parsed per module."""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     telegram.ext\n"
+            "import time:       300 |        420 |   telegram\n"
+        )
+        timings = parse_importtime(output)
+        assert timings["telegram"].cumulative_us == 420
+        assert timings["telegram.ext"].self_us == 120
+        assert lazy_violations(timings) == ["telegram"]
+
+    def test_main_skips_lazy_modules(self):
+        """Backend.app.main imports without torch, FlagEmbedding, telegram etc."""
+        _, timings = measure_import("Backend.app.main", cwd=REPO_ROOT)
+        assert lazy_violations(timings) == []
+
+    def test_rag_service_defers_embedding_models(self):
+        """rag_service itself only needs qdrant; the embedding stacks load in init_models."""
+        _, timings = measure_import("Backend.app.services.rag_service", cwd=REPO_ROOT)
+        violations = lazy_violations(timings)
+        assert not {"torch", "FlagEmbedding", "sympy", "voyageai", "langchain_voyageai"} & set(violations)
@@ -0,0 +1,85 @@
+"""
+Tests for the textbook ingestion pipeline against an in-memory Qdrant.
+"""
+import pytest
+from qdrant_client import QdrantClient
+
+from Backend.app.services.ingestion import BookSource, IngestionPipeline, chunk_pages
+
+
+class FakeDenseModel:
+    """Deterministic stand-in for VoyageAIEmbeddings."""
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(t) % 7 + 1)] + [0.0] * (self.dim - 1) for t in texts]
+
+
+class FakeSparseModel:
+    """Deterministic stand-in for BGEM3FlagModel."""
+
+    def encode(self, sentences, **kwargs):
+        return {"lexical_weights": [{str(len(s) % 100): 0.5, "7": 0.1} for s in sentences]}
+
+
+@pytest.fixture
+def book(tmp_path) -> BookSource:
+    pages = [f"Бет {i}. " + "Абылай хан туралы мәтін. " * 40 for i in range(1, 6)]
+    path = tmp_path / "tarih_10.txt"
+    path.write_text("\f".join(pages), encoding="utf-8")
+    return BookSource(path=str(path), discipline="Қазақстан тарихы", grade="10", publisher="Атамұра")
+
+
+class TestChunking:
+    """Tests for page-aware chunking."""
+
+    def test_chunks_track_pages(self):
+        """Test that chunks report the pages they span, in order."""
+        pages = [(i, f"page{i} " * 60) for i in range(1, 4)]
+        chunks = list(chunk_pages(pages, chunk_size=500, overlap=100))
+
+        assert chunks[0][1] == [1]
+        assert all(len(text) <= 500 for text, _ in chunks)
+        assert chunks[-1][1][-1] == 3
+        assert all(p == sorted(p) for _, p in chunks)
+
+
+class TestIngestionPipeline:
+    """Tests for embedding, upserting and resuming ingestion."""
+
+    def test_ingest_and_resume(self, book):
+        """Test that a re-run skips chunks that are already indexed."""
+        client = QdrantClient(":memory:")
+        dense = FakeDenseModel()
+        pipeline = IngestionPipeline(
+            client, dense, FakeSparseModel(), collection_name="test_books",
+            chunk_size=400, chunk_overlap=50, batch_size=4, upsert_workers=2,
+        )
+
+        first = pipeline.ingest([book])
+        assert first.upserted == first.chunks > 0
+        assert client.count("test_books").count == first.chunks
+
+        calls_after_first = dense.calls
+        second = pipeline.ingest([book])
+        assert second.upserted == 0
+        assert second.skipped == first.chunks
+        assert dense.calls == calls_after_first
+
+    def test_payload_layout(self, book):
+        """Test that payloads match the layout read by RAGService."""
+        client = QdrantClient(":memory:")
+        pipeline = IngestionPipeline(client, FakeDenseModel(), FakeSparseModel(), collection_name="test_books")
+        pipeline.ingest([book])
+
+        points, _ = client.scroll("test_books", limit=1)
+        payload = points[0].payload
+        assert payload["page_content"]
+        assert payload["metadata"]["discipline"] == "Қазақстан тарихы"
+        assert payload["metadata"]["grade"] == "10"
+        assert payload["metadata"]["publisher"] == "Атамұра"
+        assert payload["metadata"]["pages"]
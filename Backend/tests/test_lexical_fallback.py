@@ -0,0 +1,195 @@
+"""
+Tests for the BM25 fallback index and degraded-mode retrieval routing.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+from qdrant_client import QdrantClient, models
+
+from Backend.app.core.config import settings
+from Backend.app.core.resilience import CircuitBreaker
+from Backend.app.services.collection_manager import swap_alias
+from Backend.app.services.lexical_index import (
+    LexicalFallback,
+    LexicalIndex,
+    build_lexical_index,
+    ensure_lexical_index,
+    index_collection,
+)
+from Backend.app.services.rag_service import RETRIEVAL_PAYLOAD_FIELDS, RAGService
+
+TEXTS = [
+    ("Абылай хан Орта жүздің ханы болды", "Қазақстан тарихы"),
+    ("Абылай хан Қытаймен келіссөз жүргізді", "Дүниежүзі тарихы"),
+    ("Ньютонның екінші заңы күш пен үдеуді байланыстырады", "Физика"),
+    ("Каспий теңізі әлемдегі ең үлкен көл", "География"),
+]
+
+
+def create_books(client, name, texts):
+    client.create_collection(name, vectors_config={})
+    client.upsert(name, [
+        models.PointStruct(
+            id=i,
+            vector={},
+            payload={"page_content": text, "metadata": {"discipline": discipline, "grade": "10", "pages": [i]}},
+        )
+        for i, (text, discipline) in enumerate(texts)
+    ])
+
+
+def wait_for_build(service):
+    assert service._lexical_build_lock.acquire(timeout=30)
+    service._lexical_build_lock.release()
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    client = QdrantClient(":memory:")
+    create_books(client, "books", TEXTS)
+    directory = str(tmp_path / "lexical")
+    build_lexical_index(client, directory, RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+    return directory
+
+
+class TestLexicalIndex:
+    """Tests for BM25 scoring and filtering."""
+
+    def test_ranks_matching_chunks(self, index_dir):
+        """Test that chunks containing the query terms are returned, best first."""
+        hits = LexicalIndex(index_dir).search("Абылай ханның саясаты")
+        assert {hit["id"] for hit in hits} == {0, 1}
+        assert hits[0]["payload"]["page_content"].startswith("Абылай")
+
+    def test_filter_applies(self, index_dir):
+        """Test that metadata filters restrict results like the Qdrant filter."""
+        hits = LexicalIndex(index_dir).search("Абылай хан", {"discipline": "Қазақстан тарихы"})
+        assert [hit["id"] for hit in hits] == [0]
+
+    def test_process_pool_search(self, index_dir):
+        """Test that the fallback returns query_points-shaped responses from worker processes."""
+        fallback = LexicalFallback(index_dir, workers=1, timeout=30)
+        try:
+            response = fallback.search("Каспий теңізі")
+        finally:
+            fallback.close()
+        assert response.points[0].id == 3
+        assert response.points[0].payload["metadata"]["discipline"] == "География"
+
+
+class TestPublishing:
+    """Tests for versioned publishing and single builds across processes."""
+
+    def test_rebuild_never_removes_the_live_index(self, tmp_path):
+        """Test that builds swap a symlink and a pinned fallback keeps serving its version."""
+        client = QdrantClient(":memory:")
+        create_books(client, "books", TEXTS)
+        directory = str(tmp_path / "lexical")
+        build_lexical_index(client, directory, RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+        fallback = LexicalFallback(directory, workers=1, timeout=30)
+        try:
+            first = fallback.directory
+            for _ in range(2):
+                build_lexical_index(client, directory, RETRIEVAL_PAYLOAD_FIELDS, collection_name="books")
+                assert os.path.islink(directory) and len(LexicalIndex(directory)) == len(TEXTS)
+
+            # Two builds later the first version is gone, but its workers loaded it at start
+            versions = sorted(p.name for p in tmp_path.iterdir() if ".v" in p.name)
+            assert len(versions) == 2 and not os.path.exists(first)
+            assert fallback.search("Каспий").points[0].id == 3
+        finally:
+            fallback.close()
+
+    def test_concurrent_ensure_builds_once(self, tmp_path):
+        """Test that workers asking for the same collection together build it once."""
+        client = QdrantClient(":memory:")
+        create_books(client, "books_v1", TEXTS)
+        directory = str(tmp_path / "lexical")
+        start = threading.Barrier(4)
+
+        def ensure(_):
+            start.wait()
+            return ensure_lexical_index(client, directory, RETRIEVAL_PAYLOAD_FIELDS, "books_v1")
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            built = list(pool.map(ensure, range(4)))
+        assert sorted(built) == [False, False, False, True]
+        assert index_collection(directory) == "books_v1"
+
+
+class TestDegradedMode:
+    """Tests for the Qdrant circuit breaker and failover to BM25."""
+
+    def test_failover_and_recovery(self, index_dir):
+        """Test that failures trip the breaker to BM25 and a successful probe restores Qdrant."""
+        with patch.object(RAGService, "connect_qdrant"), \
+                patch.object(RAGService, "bootstrap_collection"), \
+                patch.object(RAGService, "init_lexical_fallback"), \
+                patch.object(RAGService, "init_models"):
+            service = RAGService()
+        service.qdrant_breaker = CircuitBreaker("qdrant", failure_rate=1.0, min_calls=2, recovery_timeout=0.2)
+        service.lexical_fallback = LexicalFallback(index_dir, workers=1, timeout=30)
+        service.encode_query = MagicMock(return_value=([0.1], models.SparseVector(indices=[1], values=[1.0])))
+        service.query_hybrid = MagicMock(side_effect=ConnectionError("qdrant down"))
+
+        try:
+            for _ in range(2):
+                response, route = service.search_context("Абылай хан")
+                assert route == "lexical"
+                assert response.points[0].payload["page_content"].startswith("Абылай")
+            assert service.retrieval_mode == "degraded"
+
+            # Circuit open: Qdrant and the embedding APIs are skipped entirely
+            service.encode_query.reset_mock()
+            service.query_hybrid.reset_mock()
+            _, route = service.search_context("Абылай хан")
+            assert route == "lexical"
+            service.encode_query.assert_not_called()
+            service.query_hybrid.assert_not_called()
+
+            time.sleep(0.25)
+            service.query_hybrid.side_effect = None
+            service.query_hybrid.return_value = MagicMock(points=[])
+            _, route = service.search_context("Абылай хан")
+            assert route == "qdrant"
+            assert service.retrieval_mode == "normal"
+        finally:
+            service.close()
+
+    def test_background_build_and_alias_swap(self, tmp_path, monkeypatch):
+        """Test that a missing index is built in the background and rebuilt when the alias moves."""
+        client = QdrantClient(":memory:")
+        create_books(client, "books_v1", TEXTS)
+        create_books(client, "books_v2", [("Алтын Орда Жошы ұлысы", "Қазақстан тарихы")])
+        directory = str(tmp_path / "lexical")
+        monkeypatch.setattr(settings, "LEXICAL_INDEX_DIR", directory)
+        monkeypatch.setattr(settings, "LEXICAL_INDEX_BUILD_ON_STARTUP", True)
+        monkeypatch.setattr(settings, "COLLECTION_ALIAS", "books")
+        monkeypatch.setattr(settings, "LEXICAL_FALLBACK_WORKERS", 1)
+        monkeypatch.setattr(settings, "LEXICAL_FALLBACK_TIMEOUT", 30.0)
+
+        with patch.object(RAGService, "connect_qdrant"), \
+                patch.object(RAGService, "bootstrap_collection"), \
+                patch.object(RAGService, "init_lexical_fallback"), \
+                patch.object(RAGService, "init_models"):
+            service = RAGService()
+        service.client = client
+        try:
+            swap_alias(client, "books", "books_v1")
+            service.refresh_alias_target(force=True)
+            service.init_lexical_fallback()
+            wait_for_build(service)
+            assert service.lexical_search("Каспий").points[0].id == 3
+
+            swap_alias(client, "books", "books_v2")
+            service.refresh_alias_target(force=True)
+            wait_for_build(service)
+            assert index_collection(directory) == "books_v2"
+            assert [point.id for point in service.lexical_search("Алтын Орда").points] == [0]
+            assert service.lexical_search("Каспий").points == []
+        finally:
+            service.close()
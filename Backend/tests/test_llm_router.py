@@ -0,0 +1,132 @@
+"""
+Tests for tier-aware model routing and streaming failover.
+"""
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from Backend.app.core.config import settings
+from Backend.app.core.metrics import metrics
+from Backend.app.core.resilience import CircuitBreaker, DependencyGuard
+from Backend.app.services.llm_router import CONTINUE_PROMPT, LLMRouter, ModelRoute
+
+FLASH = "gemini-3-flash-preview"
+PRO = "gemini-3-pro-preview"
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def make(**clients):
+        def guard_factory(name, timeout):
+            return DependencyGuard(name, timeout, breaker=CircuitBreaker(name), max_concurrent=4)
+        router = LLMRouter(guard_factory, clients=clients)
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        router.close()
+
+
+def fake_model(*chunks, error=None, stall=0.0):
+    """Chat model stub streaming the given texts, then optionally stalling or raising."""
+    model = MagicMock()
+
+    def stream(messages, **kwargs):
+        for text in chunks:
+            yield AIMessageChunk(content=text)
+        if stall:
+            time.sleep(stall)
+        if error:
+            raise error
+        yield AIMessageChunk(content="", usage_metadata={
+            "input_tokens": 100, "output_tokens": len(chunks), "total_tokens": 100 + len(chunks),
+        })
+
+    model.stream.side_effect = stream
+    return model
+
+
+def prepare(model):
+    return [HumanMessage(content="Сұрақ")], {}
+
+
+class TestRouting:
+    """Tests for choosing the model chain."""
+
+    @pytest.fixture(autouse=True)
+    def models(self):
+        with patch.object(settings, "LLM_DEFAULT_MODEL", FLASH), \
+                patch.object(settings, "LLM_PRO_MODEL", PRO), \
+                patch.object(settings, "LLM_FALLBACK_MODEL", "gpt-4o-mini"), \
+                patch.object(settings, "LLM_LONG_QUESTION_CHARS", 50), \
+                patch.object(settings, "OPENAI_API_KEY", ""):
+            yield
+
+    def test_tier_and_length(self, make_router):
+        """Test that only long Pro questions go to the Pro model."""
+        router = make_router()
+        long_question = "Абылай хан " * 10
+        assert router.route("pro", long_question).chain == [PRO, FLASH]
+        assert router.route("pro", "Қысқа?").primary == FLASH
+        assert router.route("free", long_question).primary == FLASH
+
+    def test_requested_model(self, make_router):
+        """Test that filters['model'] is honoured only when the tier allows it."""
+        router = make_router()
+        assert router.route("pro", "Қысқа?", PRO).reason == "requested"
+        assert router.route("free", "Қысқа?", PRO).primary == FLASH
+        assert router.route("guest", "Қысқа?", "gemini-1.5-flash").primary == FLASH
+
+    def test_openai_fallback_needs_key(self, make_router):
+        """Test that the OpenAI fallback joins the chain only when a key is configured."""
+        router = make_router()
+        assert "gpt-4o-mini" not in router.route("free", "Сұрақ").chain
+        with patch.object(settings, "OPENAI_API_KEY", "sk-test"):
+            assert router.route("free", "Сұрақ").chain == [FLASH, "gpt-4o-mini"]
+
+
+class TestFailover:
+    """Tests for streaming through the chain."""
+
+    def test_rate_limit_fails_over(self, make_router):
+        """Test that a 429 before the first chunk moves the request to the next model."""
+        router = make_router(primary=fake_model(error=RateLimited("quota")), backup=fake_model("Жауап"))
+        before = metrics.snapshot()["counters"].get("llm_failover{from=primary,to=backup}", 0)
+
+        chunks = list(router.stream(ModelRoute(["primary", "backup"], "test"), prepare))
+        assert [(model, chunk.content) for model, chunk in chunks if chunk.content] == [("backup", "Жауап")]
+        counters = metrics.snapshot()["counters"]
+        assert counters["llm_failover{from=primary,to=backup}"] == before + 1
+        assert counters["llm_output_tokens{model=backup}"] >= 1
+
+    def test_mid_stream_timeout_continues(self, make_router):
+        """Test that a stalled stream is continued by the next model from the partial answer."""
+        backup = fake_model(" 1771 жылы")
+        router = make_router(primary=fake_model("Абылай хан", stall=1.0), backup=backup)
+
+        text = "".join(
+            chunk.content for _, chunk in router.stream(
+                ModelRoute(["primary", "backup"], "test"), prepare, first_timeout=0.5, idle_timeout=0.1
+            )
+        )
+        assert text == "Абылай хан 1771 жылы"
+        messages = backup.stream.call_args.args[0]
+        assert messages[-2] == AIMessage(content="Абылай хан")
+        assert messages[-1] == HumanMessage(content=CONTINUE_PROMPT)
+
+    def test_other_errors_are_raised(self, make_router):
+        """Test that non-transient errors are not retried on other models."""
+        backup = fake_model("x")
+        router = make_router(primary=fake_model(error=ValueError("bad request")), backup=backup)
+        with pytest.raises(ValueError):
+            list(router.stream(ModelRoute(["primary", "backup"], "test"), prepare))
+        backup.stream.assert_not_called()
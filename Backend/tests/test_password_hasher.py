@@ -0,0 +1,122 @@
+"""
+Tests for the bcrypt pool, rehash-on-login and per-IP login throttling.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+from Backend.app.api.endpoints.auth import login
+from Backend.app.core.config import settings
+from Backend.app.db.database import Base
+from Backend.app.models.user import User, UserTokenVersion
+from Backend.app.schemas.auth import LoginRequest
+from Backend.app.services.login_throttle import LoginThrottle, LoginThrottled, client_ip
+from Backend.app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+# Cheap cost for stored test hashes; differs from BCRYPT_ROUNDS so logins rehash
+LOW_COST = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [User.__table__, UserTokenVersion.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine, tables=tables)
+
+
+def make_request(headers=None, host="203.0.113.9"):
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw_headers, "client": (host, 1234)})
+
+
+class TestPasswordHasher:
+    """Tests for the bounded bcrypt executor."""
+
+    def test_verify_reports_rehash(self):
+        """Test that a hash with another cost verifies and comes back rehashed."""
+        hasher = PasswordHasher(workers=1)
+        try:
+            valid, new_hash = asyncio.run(hasher.verify("secret-pass", LOW_COST.hash("secret-pass")))
+            wrong, _ = asyncio.run(hasher.verify("wrong-pass", LOW_COST.hash("secret-pass")))
+        finally:
+            hasher.close()
+        assert valid and not wrong
+        assert new_hash.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+    def test_rejects_when_queue_full(self):
+        """Test that jobs beyond workers + max_pending fail fast with a Retry-After."""
+        hasher = PasswordHasher(workers=1, max_pending=0)
+        release = threading.Event()
+
+        async def scenario():
+            first = asyncio.ensure_future(hasher._run("verify", release.wait))
+            await asyncio.sleep(0.05)
+            with pytest.raises(PasswordHasherBusy) as exc:
+                await hasher._run("verify", release.wait)
+            release.set()
+            await first
+            return exc.value
+
+        try:
+            busy = asyncio.run(scenario())
+        finally:
+            hasher.close()
+        assert busy.retry_after >= 1
+        assert hasher.in_flight == 0
+
+
+class TestRehashOnLogin:
+    """Tests for upgrading stored hashes during login."""
+
+    def test_login_upgrades_hash(self, session_factory, monkeypatch):
+        """Test that a successful login stores a hash with the configured cost."""
+        from Backend.app.api.endpoints import auth
+
+        monkeypatch.setattr(auth, "password_hasher", PasswordHasher(workers=1))
+        db = session_factory()
+        db.add(User(email="student@example.com", password_hash=LOW_COST.hash("secret-pass"), is_email_verified=True))
+        db.commit()
+
+        response = asyncio.run(login(LoginRequest(email="student@example.com", password="secret-pass"), db))
+        assert response.access_token
+
+        stored = session_factory().query(User).filter(User.email == "student@example.com").one().password_hash
+        assert stored.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+        auth.password_hasher.close()
+        db.close()
+
+
+class TestLoginThrottle:
+    """Tests for per-IP login attempt limits."""
+
+    def test_limit_and_window(self):
+        """Test that attempts over the limit are refused until the window passes."""
+        throttle = LoginThrottle(limit=2, window_seconds=0.2)
+        throttle.hit("198.51.100.1")
+        throttle.hit("198.51.100.1")
+        with pytest.raises(LoginThrottled) as exc:
+            throttle.hit("198.51.100.1")
+        assert exc.value.retry_after >= 1
+        throttle.hit("198.51.100.2")  # Other clients are unaffected
+
+        time.sleep(0.25)
+        throttle.hit("198.51.100.1")
+
+    def test_client_ip_uses_last_forwarded_hop(self, monkeypatch):
+        """Test that only the proxy-appended X-Forwarded-For hop is trusted."""
+        monkeypatch.setattr(settings, "TRUST_PROXY_HEADERS", True)
+        request = make_request({"X-Forwarded-For": "1.2.3.4, 198.51.100.7"})
+        assert client_ip(request) == "198.51.100.7"
+        assert client_ip(make_request()) == "203.0.113.9"
+
+        monkeypatch.setattr(settings, "TRUST_PROXY_HEADERS", False)
+        assert client_ip(request) == "203.0.113.9"
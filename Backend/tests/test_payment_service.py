@@ -0,0 +1,158 @@
+"""
+Tests for the payment state machine and duplicate Telegram payment updates.
+"""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from Backend.app.db.database import Base
+from Backend.app.models import chat  # noqa: F401  (resolves User.conversations)
+from Backend.app.models.payment import Payment
+from Backend.app.models.user import User
+from Backend.app.services import payment_service
+from Backend.app.services.telegram_bot import TelegramBotService
+
+PARALLEL = 8
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A file database with a pool, so parallel handlers use separate connections
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'payments.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=PARALLEL,
+    )
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA journal_mode=WAL"))
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, Payment.__table__])
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def user_id(session_factory):
+    db = session_factory()
+    user = User(email="payer@example.com", subscription_tier="free", message_count=42, is_active=True)
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+
+@pytest.fixture
+def bot(session_factory):
+    service = TelegramBotService()
+    service._get_db = session_factory
+    service.price_stars = 100
+    return service
+
+
+def payments(session_factory):
+    db = session_factory()
+    try:
+        return db.query(Payment).all()
+    finally:
+        db.close()
+
+
+def payment_update(payment_id, user_id, replies, charge_id="charge-1"):
+    async def reply_text(text):
+        replies.append(text)
+
+    successful_payment = SimpleNamespace(
+        invoice_payload=f"{payment_id}_{user_id}",
+        telegram_payment_charge_id=charge_id,
+        provider_payment_charge_id=None,
+    )
+    return SimpleNamespace(message=SimpleNamespace(successful_payment=successful_payment, reply_text=reply_text))
+
+
+class TestPaymentTransitions:
+    """Tests for the allowed status changes."""
+
+    def test_transitions_are_conditional(self, session_factory, user_id):
+        """Test that a transition applies once and disallowed ones raise."""
+        db = session_factory()
+        payment = Payment(user_id=user_id, amount_stars=100, payload="p", status="pending")
+        db.add(payment)
+        db.commit()
+
+        assert payment_service.transition(db, payment.id, "pending", "failed")
+        assert not payment_service.transition(db, payment.id, "pending", "completed")
+        db.commit()
+        with pytest.raises(payment_service.InvalidPaymentTransition):
+            payment_service.transition(db, payment.id, "failed", "completed")
+        db.refresh(payment)
+        assert payment.status == "failed"
+        db.close()
+
+
+class TestOpenPayment:
+    """Tests for reusing the pending payment across /start commands."""
+
+    def test_parallel_starts_share_one_payment(self, bot, session_factory, user_id):
+        """Test that duplicate /start commands in parallel open a single pending payment."""
+        async def scenario():
+            calls = [asyncio.to_thread(bot._start_purchase, str(user_id)) for _ in range(PARALLEL)]
+            return await asyncio.gather(*calls)
+
+        results = asyncio.run(scenario())
+
+        rows = payments(session_factory)
+        assert len(rows) == 1 and rows[0].status == "pending"
+        assert {payment_id for _, payment_id in results} == {str(rows[0].id)}
+        assert sorted(outcome for outcome, _ in results) == ["created"] + ["reused"] * (PARALLEL - 1)
+
+    def test_price_change_replaces_pending_payment(self, bot, session_factory, user_id):
+        """Test that a pending payment for an old price is failed and replaced."""
+        _, old_id = bot._start_purchase(str(user_id))
+        bot.price_stars = 150
+        outcome, new_id = bot._start_purchase(str(user_id))
+
+        assert outcome == "created" and new_id != old_id
+        statuses = {str(row.id): (row.status, row.amount_stars) for row in payments(session_factory)}
+        assert statuses == {old_id: ("failed", 100), new_id: ("pending", 150)}
+
+    def test_unknown_user(self, bot):
+        """Test that a malformed or unknown user id is reported as not found."""
+        assert bot._start_purchase("not-a-uuid") == ("not_found", None)
+        assert bot._start_purchase(str(uuid.uuid4())) == ("not_found", None)
+
+
+class TestCompletePayment:
+    """Tests for idempotent completion of duplicate successful_payment updates."""
+
+    def test_parallel_duplicates_complete_once(self, bot, session_factory, user_id):
+        """Test that the same successful payment delivered in parallel upgrades the user once."""
+        _, payment_id = bot._start_purchase(str(user_id))
+        replies = []
+
+        async def scenario():
+            updates = [payment_update(payment_id, user_id, replies) for _ in range(PARALLEL)]
+            await asyncio.gather(*(bot.successful_payment_callback(update, None) for update in updates))
+
+        asyncio.run(scenario())
+
+        assert len(replies) == 1 and replies[0].startswith("🎉")
+        [payment] = payments(session_factory)
+        assert payment.status == "completed" and payment.telegram_payment_charge_id == "charge-1"
+        db = session_factory()
+        user = db.query(User).filter(User.id == user_id).one()
+        assert user.subscription_tier == "pro" and user.message_count == 0
+        db.close()
+
+    def test_second_charge_on_completed_payment_is_a_conflict(self, bot, session_factory, user_id):
+        """Test that another charge for a completed payment is not applied and is reported."""
+        _, payment_id = bot._start_purchase(str(user_id))
+        assert bot._complete_payment(payment_id, "charge-1", None) == "completed"
+        assert bot._complete_payment(payment_id, "charge-1", None) == "duplicate"
+        assert bot._complete_payment(payment_id, "charge-2", None) == "conflict"
+        assert bot._complete_payment(str(uuid.uuid4()), "charge-3", None) == "not_found"
+
+        # A Pro user no longer gets a new invoice
+        assert bot._start_purchase(str(user_id)) == ("already_pro", None)
@@ -0,0 +1,145 @@
+"""
+Tests for the static prompt prefix, provider-side caching and token accounting.
+"""
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.messages import AIMessageChunk, SystemMessage
+
+from Backend.app.core.metrics import metrics
+from Backend.app.core.config import settings
+from Backend.app.services.context_budget import estimate_tokens
+from Backend.app.services.llm_router import LLMRouter
+from Backend.app.services.prompt_cache import LocalPromptCache, PromptTokenReport, TUTOR_INSTRUCTIONS
+from Backend.app.services.rag_service import RAGService
+
+
+@pytest.fixture
+def service():
+    with patch.object(RAGService, "connect_qdrant"), \
+            patch.object(RAGService, "bootstrap_collection"), \
+            patch.object(RAGService, "init_lexical_fallback"), \
+            patch.object(RAGService, "init_models"):
+        service = RAGService()
+    yield service
+    service.close()
+
+
+def prompt_input(question, context_text, history=()):
+    return {
+        "context_messages": list(history),
+        "question": question,
+        "context_data": {"context_text": context_text},
+    }
+
+
+class TestPromptCache:
+    """Tests for creating and reusing cached instructions."""
+
+    def test_reuses_cache_entry(self):
+        """Test that the instructions are stored once per model and then referenced by name."""
+        cache = LocalPromptCache(min_tokens=0)
+        name = cache.cached_content("gemini-3-flash-preview", TUTOR_INSTRUCTIONS)
+        assert cache.cached_content("gemini-3-flash-preview", TUTOR_INSTRUCTIONS) == name
+        assert cache.contents == {name: TUTOR_INSTRUCTIONS}
+        assert cache.cached_content("gemini-2.5-pro", TUTOR_INSTRUCTIONS) == name
+        assert len(cache._entries) == 2
+
+    def test_below_minimum_is_not_cached(self):
+        """Test that prefixes under the provider minimum are sent inline."""
+        cache = LocalPromptCache(min_tokens=estimate_tokens(TUTOR_INSTRUCTIONS) + 1)
+        assert cache.cached_content("gemini-3-flash-preview", TUTOR_INSTRUCTIONS) is None
+        assert not cache.contents
+
+    def test_creation_failure_falls_back_inline(self):
+        """Test that a provider error returns None instead of failing the request."""
+        cache = LocalPromptCache(min_tokens=0)
+        cache.create = MagicMock(side_effect=ConnectionError("quota"))
+        assert cache.cached_content("gemini-3-flash-preview", TUTOR_INSTRUCTIONS) is None
+
+        # Not retried on every request while the provider keeps failing
+        assert cache.cached_content("gemini-3-flash-preview", TUTOR_INSTRUCTIONS) is None
+        assert cache.create.call_count == 1
+
+    def test_slow_creation_does_not_block_requests(self):
+        """Test that requests arriving during a create go inline and other models are not held up."""
+        cache = LocalPromptCache(min_tokens=0)
+        started, release = threading.Event(), threading.Event()
+        create = cache.create
+
+        def slow_create(model, instructions):
+            if model == "gemini-3-pro-preview":
+                started.set()
+                release.wait(5)
+            return create(model, instructions)
+
+        cache.create = slow_create
+        creator = threading.Thread(target=cache.cached_content, args=("gemini-3-pro-preview", TUTOR_INSTRUCTIONS))
+        creator.start()
+        assert started.wait(5)
+
+        start = time.perf_counter()
+        assert cache.cached_content("gemini-3-pro-preview", TUTOR_INSTRUCTIONS) is None
+        assert cache.cached_content("gemini-3-flash-preview", TUTOR_INSTRUCTIONS) is not None
+        assert time.perf_counter() - start < 1.0
+
+        release.set()
+        creator.join(5)
+        assert cache.cached_content("gemini-3-pro-preview", TUTOR_INSTRUCTIONS) is not None
+
+
+class TestPromptAssembly:
+    """Tests for the stable prefix / variable suffix layout."""
+
+    def test_prefix_is_stable_across_requests(self, service):
+        """Test that only the last message depends on the retrieved context and question."""
+        history = [{"role": "user", "content": "Абылай хан кім?"}, {"role": "assistant", "content": "Хан."}]
+        first = service.build_prompt_with_context(prompt_input("Қашан туған?", "Контекст А", history))
+        second = service.build_prompt_with_context(prompt_input("Қай жүздің ханы?", "Контекст Б", history))
+
+        assert first[:-1] == second[:-1]
+        assert first[0] == SystemMessage(content=TUTOR_INSTRUCTIONS)
+        assert "Контекст А" in first[-1].content and "Қашан туған?" in first[-1].content
+
+    def test_cached_prompt_omits_instructions(self, service):
+        """Test that a cached prefix drops the system message and is counted as saved tokens."""
+        before = metrics.snapshot()["counters"].get("prompt_cache_saved_tokens", 0)
+        messages = service.build_prompt_with_context(prompt_input("Сұрақ", "Контекст"), "cachedContents/x")
+        assert not any(isinstance(m, SystemMessage) for m in messages)
+        saved = metrics.snapshot()["counters"]["prompt_cache_saved_tokens"] - before
+        assert saved == estimate_tokens(TUTOR_INSTRUCTIONS)
+
+    def test_stream_references_cached_content(self, service):
+        """Test that generation passes the cache name to the LLM and records cache reads."""
+        service.prompt_cache = LocalPromptCache(min_tokens=0)
+        service.hybrid_retriever_func = MagicMock(return_value={"context_text": "Контекст"})
+        llm = MagicMock()
+        service.llm_router = LLMRouter(service.create_guard, clients={settings.LLM_DEFAULT_MODEL: llm})
+        llm.stream.return_value = iter([
+            AIMessageChunk(content="Жауап"),
+            AIMessageChunk(content="", usage_metadata={
+                "input_tokens": 500, "output_tokens": 3, "total_tokens": 503,
+                "input_token_details": {"cache_read": 300},
+            }),
+        ])
+
+        before = metrics.snapshot()["counters"].get("prompt_cached_input_tokens", 0)
+        assert "".join(service.generate_answer([], "Сұрақ")) == "Жауап"
+        args, kwargs = llm.stream.call_args
+        assert kwargs["cached_content"].startswith("cachedContents/local-")
+        assert not any(isinstance(m, SystemMessage) for m in args[0])
+        assert metrics.snapshot()["counters"]["prompt_cached_input_tokens"] == before + 300
+
+
+class TestTokenReport:
+    """Tests for per-request input token accounting."""
+
+    def test_saved_and_billed(self):
+        """Test that cached requests bill everything except the static prefix."""
+        report = PromptTokenReport(static_tokens=1200, history_tokens=300, variable_tokens=4000, cached=True)
+        assert report.input_tokens == 5500
+        assert report.saved_tokens == 1200
+        assert report.billed_tokens == 4300
+        assert PromptTokenReport(1200, 300, 4000, cached=False).saved_tokens == 0
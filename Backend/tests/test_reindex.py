@@ -0,0 +1,98 @@
+"""
+Tests for incremental re-indexing and alias swaps against an in-memory Qdrant.
+"""
+from unittest.mock import patch
+
+import pytest
+from qdrant_client import QdrantClient
+
+from Backend.app.core.config import settings
+from Backend.app.services.collection_manager import resolve_alias, swap_alias
+from Backend.app.services.ingestion import BookSource
+from Backend.app.services.rag_service import RAGService
+from Backend.app.services.reindex import list_versions, rebuild_collection
+from Backend.tests.test_ingestion import FakeDenseModel, FakeSparseModel
+
+ALIAS = "books"
+
+
+def write_book(path, pages) -> BookSource:
+    path.write_text("\f".join(pages), encoding="utf-8")
+    return BookSource(path=str(path), discipline="Қазақстан тарихы", grade="10", publisher="Атамұра")
+
+
+@pytest.fixture
+def pages():
+    return [f"Бет {i}. " + f"Тарау {i} мазмұны. " * 30 for i in range(1, 7)]
+
+
+class TestIncrementalRebuild:
+    """Tests for content-hash reuse across collection versions."""
+
+    def test_rebuild_reembeds_only_changed_chunks(self, tmp_path, pages):
+        """Test that a rebuild copies unchanged chunks and embeds the edited ones."""
+        client = QdrantClient(":memory:")
+        options = {"chunk_size": 600, "chunk_overlap": 0, "batch_size": 4}
+
+        book = write_book(tmp_path / "tarih.txt", pages)
+        first_name, first = rebuild_collection(
+            client, FakeDenseModel(), FakeSparseModel(), [book], alias=ALIAS, **options
+        )
+        assert resolve_alias(client, ALIAS) == first_name
+        assert first.embedded == first.chunks
+
+        pages[-1] = "Бет 6. Жаңартылған мәтін. " * 30
+        book = write_book(tmp_path / "tarih.txt", pages)
+        dense = FakeDenseModel()
+        second_name, second = rebuild_collection(
+            client, dense, FakeSparseModel(), [book], alias=ALIAS, keep_versions=1, **options
+        )
+
+        assert second_name != first_name
+        assert resolve_alias(client, ALIAS) == second_name
+        assert 0 < second.embedded < second.chunks
+        assert second.reused == second.chunks - second.embedded
+        assert client.count(ALIAS).count == second.chunks
+        assert list_versions(client, ALIAS) == [second_name]
+
+    def test_hash_tracks_embedding_config(self, tmp_path, pages, monkeypatch):
+        """Test that changing the embedding model invalidates every chunk."""
+        client = QdrantClient(":memory:")
+        book = write_book(tmp_path / "tarih.txt", pages)
+        rebuild_collection(client, FakeDenseModel(), FakeSparseModel(), [book], alias=ALIAS)
+
+        monkeypatch.setattr(settings, "VOYAGE_EMBED_MODEL", "voyage-next")
+        _, stats = rebuild_collection(client, FakeDenseModel(), FakeSparseModel(), [book], alias=ALIAS)
+
+        assert stats.reused == 0
+        assert stats.embedded == stats.chunks
+
+
+class TestAliasCacheInvalidation:
+    """Tests for retrieval cache invalidation on alias swap."""
+
+    def test_cache_cleared_on_swap(self, monkeypatch):
+        """Test that RAGService drops cached retrievals when the alias moves."""
+        client = QdrantClient(":memory:")
+        for name in ("books_v1", "books_v2"):
+            client.create_collection(name, vectors_config={})
+        swap_alias(client, ALIAS, "books_v1")
+        monkeypatch.setattr(settings, "COLLECTION_ALIAS", ALIAS)
+
+        with patch.object(RAGService, "connect_qdrant"), \
+                patch.object(RAGService, "init_models"), \
+                patch.object(RAGService, "bootstrap_collection"):
+            service = RAGService()
+        service.client = client
+
+        service.refresh_alias_target(force=True)
+        key = service.retrieval_cache.make_key("Абылай хан", {"grade": "10"})
+        service.retrieval_cache.put(key, {"context_text": "cached"})
+
+        service.refresh_alias_target(force=True)
+        assert service.retrieval_cache.get(key) == {"context_text": "cached"}
+
+        swap_alias(client, ALIAS, "books_v2")
+        service.refresh_alias_target(force=True)
+        assert service.alias_target == "books_v2"
+        assert service.retrieval_cache.get(key) is None
@@ -0,0 +1,49 @@
+"""
+Tests for reranker backends.
+"""
+import pytest
+
+from Backend.app.services.reranker import BaseReranker, FallbackReranker, RerankResult
+
+
+class FailingReranker(BaseReranker):
+    """Backend that always raises, simulating an unavailable API."""
+    name = "failing"
+
+    def rerank(self, query, documents, top_k):
+        raise ConnectionError("rerank API unavailable")
+
+
+class LengthReranker(BaseReranker):
+    """Deterministic backend ranking documents by length."""
+    name = "length"
+
+    def rerank(self, query, documents, top_k):
+        order = sorted(range(len(documents)), key=lambda i: len(documents[i]), reverse=True)
+        return [RerankResult(index=i, relevance_score=float(len(documents[i]))) for i in order[:top_k]]
+
+
+class TestFallbackReranker:
+    """Tests for the fallback reranker chain."""
+
+    def test_uses_primary_when_healthy(self):
+        """Test that the first backend's results are returned when it succeeds."""
+        reranker = FallbackReranker([LengthReranker(), FailingReranker()])
+        results = reranker.rerank("q", ["a", "ccc", "bb"], top_k=2)
+
+        assert [r.index for r in results] == [1, 2]
+
+    def test_falls_back_on_error(self):
+        """Test that a failing backend hands over to the next one."""
+        reranker = FallbackReranker([FailingReranker(), LengthReranker()])
+        results = reranker.rerank("q", ["a", "ccc", "bb"], top_k=1)
+
+        assert reranker.name == "failing+length"
+        assert [r.index for r in results] == [1]
+
+    def test_raises_when_all_backends_fail(self):
+        """Test that the last error is raised when no backend succeeds."""
+        reranker = FallbackReranker([FailingReranker(), FailingReranker()])
+
+        with pytest.raises(ConnectionError):
+            reranker.rerank("q", ["a"], top_k=1)
@@ -0,0 +1,191 @@
+"""
+Tests for circuit breakers, guarded timeouts and hedged requests.
+"""
+import threading
+import time
+
+import pytest
+
+from Backend.app.core.metrics import metrics
+from Backend.app.core.resilience import BulkheadFullError, CircuitBreaker, CircuitOpenError, DependencyGuard
+
+
+@pytest.fixture
+def make_guard():
+    guards = []
+
+    def make(name, **kwargs):
+        guard = DependencyGuard(name, **kwargs)
+        guards.append(guard)
+        return guard
+
+    yield make
+    for guard in guards:
+        guard.close()
+
+
+class TestCircuitBreaker:
+    """Tests for the failure-rate circuit breaker."""
+
+    def test_opens_on_failure_rate(self):
+        """Test that the circuit opens once the failure ratio reaches the threshold."""
+        breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, window_size=4)
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_half_open_admits_one_probe(self):
+        """Test that after the recovery timeout a single probe decides the state."""
+        breaker = CircuitBreaker("test", failure_rate=1.0, min_calls=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        time.sleep(0.06)
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestDependencyGuard:
+    """Tests for timeouts, hedging and streaming under a guard."""
+
+    def test_timeout_trips_breaker(self, make_guard):
+        """Test that slow calls time out, count as failures and open the circuit."""
+        guard = make_guard("slow", timeout=0.05,
+            breaker=CircuitBreaker("slow", failure_rate=1.0, min_calls=2),
+        )
+        for _ in range(2):
+            with pytest.raises(TimeoutError):
+                guard.call(time.sleep, 0.5)
+        with pytest.raises(CircuitOpenError):
+            guard.call(lambda: "ok")
+
+    def test_hedged_request_wins(self, make_guard):
+        """Test that a duplicate request is sent after the latency percentile and the fastest wins."""
+        guard = make_guard("embed", timeout=2.0, hedge=True, hedge_min_delay=0.01)
+        guard.latencies.extend([0.01] * DependencyGuard.HEDGE_MIN_SAMPLES)
+        calls = []
+        lock = threading.Lock()
+
+        def flaky():
+            with lock:
+                calls.append(len(calls))
+                first = len(calls) == 1
+            time.sleep(1.0 if first else 0.01)
+            return "hedged" if not first else "primary"
+
+        before = metrics.snapshot()["counters"].get("hedge_wins{name=embed}", 0)
+        start = time.perf_counter()
+        assert guard.call(flaky) == "hedged"
+        assert time.perf_counter() - start < 0.5
+        assert len(calls) == 2
+        assert metrics.snapshot()["counters"]["hedge_wins{name=embed}"] == before + 1
+
+    def test_no_hedging_without_samples(self, make_guard):
+        """Test that hedging waits for enough latency samples."""
+        guard = make_guard("embed", timeout=1.0, hedge=True)
+        assert guard.hedge_delay() is None
+
+    def test_stream_idle_timeout(self, make_guard):
+        """Test that a stream stalling between chunks raises after the idle timeout."""
+        guard = make_guard("llm", timeout=1.0, breaker=CircuitBreaker("llm"))
+
+        def stalls():
+            yield "a"
+            time.sleep(0.5)
+            yield "b"
+
+        received = []
+        with pytest.raises(TimeoutError):
+            for chunk in guard.stream(stalls, first_timeout=0.2, idle_timeout=0.05):
+                received.append(chunk)
+        assert received == ["a"]
+        assert list(guard.stream(lambda: iter(["x", "y"]))) == ["x", "y"]
+
+    def test_stream_closed_early_resolves_probe(self, make_guard):
+        """Test that a half-open probe stream closed by the consumer still closes the circuit."""
+        breaker = CircuitBreaker("llm", failure_rate=1.0, min_calls=1, recovery_timeout=0.05)
+        guard = make_guard("llm", timeout=1.0, breaker=breaker)
+        breaker.record_failure()
+        time.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+        stream = guard.stream(lambda: iter(["a", "b", "c"]))
+        assert next(stream) == "a"
+        stream.close()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+
+def wait_until_idle(guard, timeout=1.0):
+    """Wait for abandoned calls to finish and give their threads back."""
+    deadline = time.monotonic() + timeout
+    while guard.bulkhead.available < guard.bulkhead.max_concurrent and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestBulkhead:
+    """Tests for the per-dependency thread limit."""
+
+    def test_saturated_dependency_fails_fast(self, make_guard):
+        """Test that calls beyond the pool size are rejected while timed-out calls still run."""
+        release = threading.Event()
+        guard = make_guard("hung", timeout=0.05, max_concurrent=2)
+        other = make_guard("healthy", timeout=1.0, max_concurrent=2)
+
+        for _ in range(2):
+            with pytest.raises(TimeoutError):
+                guard.call(release.wait)
+        start = time.perf_counter()
+        with pytest.raises(BulkheadFullError):
+            guard.call(lambda: "ok")
+        assert time.perf_counter() - start < 0.05
+        # The hung dependency does not take threads from the others
+        assert other.call(lambda: "ok") == "ok"
+
+        release.set()
+        wait_until_idle(guard)
+        assert guard.call(lambda: "ok") == "ok"
+
+    def test_rejection_leaves_probe_free(self, make_guard):
+        """Test that a rejected call does not take the half-open probe."""
+        release = threading.Event()
+        breaker = CircuitBreaker("hung", failure_rate=1.0, min_calls=1, recovery_timeout=0.05)
+        guard = make_guard("hung", timeout=0.05, breaker=breaker, max_concurrent=1)
+        with pytest.raises(TimeoutError):
+            guard.call(release.wait)
+        time.sleep(0.06)
+
+        with pytest.raises(BulkheadFullError):
+            guard.call(lambda: "ok")
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        release.set()
+        wait_until_idle(guard)
+        assert guard.call(lambda: "ok") == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_no_hedge_without_free_slot(self, make_guard):
+        """Test that hedging is skipped while the pool has no free thread."""
+        guard = make_guard("embed", timeout=1.0, hedge=True, hedge_min_delay=0.01, max_concurrent=1)
+        guard.latencies.extend([0.01] * DependencyGuard.HEDGE_MIN_SAMPLES)
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "primary"
+
+        before = metrics.snapshot()["counters"].get("hedges_skipped{name=embed}", 0)
+        assert guard.call(slow) == "primary"
+        assert len(calls) == 1
+        assert metrics.snapshot()["counters"]["hedges_skipped{name=embed}"] == before + 1
@@ -0,0 +1,171 @@
+"""
+Tests for single-flight coalescing of identical concurrent retrievals and answers.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+from qdrant_client import models
+from qdrant_client.http.models import QueryResponse
+
+from Backend.app.core.metrics import metrics
+from Backend.app.services.llm_router import LLMRouter
+from Backend.app.services.rag_service import RAGService
+from Backend.app.services.single_flight import SingleFlight, StreamFlight
+
+
+@pytest.fixture
+def service():
+    with patch.object(RAGService, "connect_qdrant"), \
+            patch.object(RAGService, "bootstrap_collection"), \
+            patch.object(RAGService, "init_lexical_fallback"), \
+            patch.object(RAGService, "init_models"):
+        service = RAGService()
+    service.refresh_alias_target = MagicMock()
+    service.llm_router = LLMRouter(service.create_guard)
+    yield service
+    service.close()
+
+
+class TestSingleFlight:
+    """Tests for sharing one call among concurrent identical callers."""
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test that callers arriving while the leader runs get its result without running func."""
+        flight = SingleFlight("test")
+        calls = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"context_text": "shared"}
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(lambda _: flight.do("key", work), range(5)))
+
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
+        assert len(flight) == 0
+
+    def test_error_reaches_followers(self):
+        """Test that the leader's exception is re-raised to every follower and not remembered."""
+        flight = SingleFlight("test")
+        gate = threading.Event()
+
+        def fail():
+            gate.wait()
+            raise ConnectionError("down")
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(flight.do, "key", fail) for _ in range(3)]
+            time.sleep(0.1)
+            gate.set()
+            for future in futures:
+                with pytest.raises(ConnectionError):
+                    future.result()
+        assert flight.do("key", lambda: "fresh") == "fresh"
+
+
+class TestStreamFlight:
+    """Tests for fanning one token stream out to several subscribers."""
+
+    def test_subscribers_share_stream(self):
+        """Test that one generator feeds all subscribers, late joiners replay from the start."""
+        flight = StreamFlight("test")
+        produced = []
+
+        def produce():
+            produced.append(1)
+            for token in ["Абылай", " хан", " 1771"]:
+                time.sleep(0.05)
+                yield token
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            first = pool.submit(lambda: list(flight.stream("q", produce)))
+            time.sleep(0.08)
+            late = pool.submit(lambda: list(flight.stream("q", produce)))
+            assert first.result() == late.result() == ["Абылай", " хан", " 1771"]
+
+        assert len(produced) == 1
+        assert len(flight) == 0
+
+    def test_stream_error_propagates(self):
+        """Test that a producer failure ends every subscriber's stream with the error."""
+        flight = StreamFlight("test")
+
+        def produce():
+            yield "a"
+            raise TimeoutError("idle")
+
+        received = []
+        with pytest.raises(TimeoutError):
+            for chunk in flight.stream("q", produce):
+                received.append(chunk)
+        assert received == ["a"]
+
+    def test_producer_stops_without_subscribers(self):
+        """Test that the shared generator is closed once all subscribers leave."""
+        flight = StreamFlight("test")
+        closed = threading.Event()
+
+        def produce():
+            try:
+                while True:
+                    time.sleep(0.01)
+                    yield "x"
+            finally:
+                closed.set()
+
+        stream = flight.stream("q", produce)
+        next(stream)
+        stream.close()
+        assert closed.wait(1.0)
+
+
+class TestRAGCoalescing:
+    """Tests for coalescing in RAGService."""
+
+    def test_hybrid_retriever_coalesces(self, service):
+        """Test that identical concurrent queries run one search and rerank."""
+        def slow_search(*args):
+            time.sleep(0.2)
+            point = models.ScoredPoint(
+                id=1, version=0, score=1.0,
+                payload={"page_content": "Абылай хан", "metadata": {"discipline": "Тарих", "pages": [1]}}
+            )
+            return QueryResponse(points=[point]), "qdrant"
+
+        service.search_context = MagicMock(side_effect=slow_search)
+        service.reranker = MagicMock()
+        service.reranker.rerank.return_value = [MagicMock(index=0)]
+
+        before = metrics.snapshot()["counters"].get("single_flight_shared{name=retrieval}", 0)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(
+                lambda _: service.hybrid_retriever_func("Абылай хан кім?", {"discipline": "Тарих"}), range(4)
+            ))
+
+        assert service.search_context.call_count == 1
+        assert all(r == results[0] for r in results)
+        assert metrics.snapshot()["counters"]["single_flight_shared{name=retrieval}"] == before + 3
+
+    def test_generation_coalesces_without_history(self, service):
+        """Test that history-free answers are shared and answers with history are not."""
+        def answer(context_messages, question, filters=None, route=None, usage=None):
+            time.sleep(0.1)
+            yield "жауап"
+
+        service.generate_answer = MagicMock(side_effect=answer)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(
+                lambda _: list(service.stream_chat_with_context([], "Ньютон заңы?", {"grade": "9"})), range(3)
+            ))
+        assert results == [["жауап"]] * 3
+        assert service.generate_answer.call_count == 1
+
+        history = [{"role": "user", "content": "Сәлем"}]
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(lambda _: list(service.stream_chat_with_context(history, "Ньютон заңы?")), range(2)))
+        assert service.generate_answer.call_count == 3
@@ -0,0 +1,183 @@
+"""
+Tests for the Telegram webhook update queue and the pre-checkout SLO metric.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Backend.app.core.metrics import metrics
+from Backend.app.db.database import Base
+from Backend.app.models.telegram import TelegramUpdate
+from Backend.app.services.telegram_bot import TelegramBotService
+from Backend.app.services.telegram_updates import TelegramUpdateQueue, UpdateQueueFull
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[TelegramUpdate.__table__])
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine, tables=[TelegramUpdate.__table__])
+
+
+def message(update_id):
+    return {"update_id": update_id, "message": {"message_id": update_id, "text": "/start"}}
+
+
+def pre_checkout(update_id):
+    return {"update_id": update_id, "pre_checkout_query": {"id": str(update_id), "invoice_payload": "p_u"}}
+
+
+def statuses(session_factory):
+    return {row.update_id: row.status for row in session_factory().query(TelegramUpdate).all()}
+
+
+class TestUpdateQueue:
+    """Tests for deduplication, priority and replay of webhook updates."""
+
+    def test_redelivered_update_is_processed_once(self, session_factory):
+        """Test that a second delivery of an update_id is acknowledged but not handled."""
+        handled = []
+
+        async def process(update):
+            handled.append(update["update_id"])
+
+        async def scenario():
+            queue = TelegramUpdateQueue(session_factory, process, workers=2)
+            queue.start()
+            first = await queue.submit(message(1))
+            again = await queue.submit(message(1))
+            await queue.join()
+            await queue.stop()
+            return first, again
+
+        assert asyncio.run(scenario()) == (True, False)
+        assert handled == [1]
+        assert statuses(session_factory) == {1: "done"}
+
+    def test_pre_checkout_jumps_the_queue(self, session_factory):
+        """Test that a waiting pre-checkout query is handled before earlier messages."""
+        handled = []
+
+        async def scenario():
+            release = asyncio.Event()
+
+            async def process(update):
+                if update["update_id"] == 1:
+                    await release.wait()
+                handled.append(update["update_id"])
+
+            queue = TelegramUpdateQueue(session_factory, process, workers=1, max_size=3)
+            queue.start()
+            await queue.submit(message(1))
+            await asyncio.sleep(0.05)  # Worker is now busy with update 1
+            await queue.submit(message(2))
+            await queue.submit(message(3))
+            await queue.submit(pre_checkout(4))
+            with pytest.raises(UpdateQueueFull):
+                await queue.submit(message(5))
+            release.set()
+            await queue.join()
+            await queue.stop()
+
+        asyncio.run(scenario())
+        assert handled == [1, 4, 2, 3]
+
+    def test_pending_updates_are_replayed(self, session_factory):
+        """Test that updates left pending are handled on start, except expired pre-checkouts."""
+        db = session_factory()
+        stale = datetime.now(timezone.utc) - timedelta(minutes=5)
+        db.add(TelegramUpdate(update_id=7, kind="message", payload=message(7), received_at=stale))
+        db.add(TelegramUpdate(update_id=8, kind="pre_checkout_query", payload=pre_checkout(8), received_at=stale))
+        db.commit()
+        handled = []
+
+        async def process(update):
+            handled.append(update["update_id"])
+
+        async def scenario():
+            queue = TelegramUpdateQueue(session_factory, process, workers=1)
+            queue.start()
+            await asyncio.sleep(0.05)
+            await queue.join()
+            await queue.stop()
+
+        asyncio.run(scenario())
+        assert handled == [7]
+        assert statuses(session_factory) == {7: "done", 8: "expired"}
+
+    def test_update_in_flight_at_stop_is_replayed(self, session_factory):
+        """Test that an update cancelled mid-handler by stop() goes back to pending and runs on the next start."""
+        handled = []
+
+        async def first_run():
+            started = asyncio.Event()
+
+            async def process(update):
+                started.set()
+                await asyncio.sleep(60)
+
+            queue = TelegramUpdateQueue(session_factory, process, workers=1)
+            queue.start()
+            await queue.submit(message(9))
+            await started.wait()
+            await queue.stop()
+
+        async def second_run():
+            async def process(update):
+                handled.append(update["update_id"])
+
+            queue = TelegramUpdateQueue(session_factory, process, workers=1)
+            queue.start()
+            await asyncio.sleep(0.05)
+            await queue.join()
+            await queue.stop()
+
+        asyncio.run(first_run())
+        assert statuses(session_factory) == {9: "pending"}
+        asyncio.run(second_run())
+        assert handled == [9]
+        assert statuses(session_factory) == {9: "done"}
+
+    def test_expired_processing_lease_is_reclaimed(self, session_factory):
+        """Test that updates stuck in processing past the lease are replayed, fresh claims are not."""
+        db = session_factory()
+        now = datetime.now(timezone.utc)
+        db.add(TelegramUpdate(update_id=10, kind="message", payload=message(10), status="processing",
+                              received_at=now, processed_at=now - timedelta(hours=1)))
+        db.add(TelegramUpdate(update_id=11, kind="message", payload=message(11), status="processing",
+                              received_at=now, processed_at=now))
+        db.commit()
+
+        rows = TelegramUpdateQueue(session_factory, None).load_pending()
+
+        assert [row.update_id for row in rows] == [10]
+        assert statuses(session_factory) == {10: "pending", 11: "processing"}
+
+
+class TestPreCheckoutSlo:
+    """Tests for the pre-checkout answer latency metric."""
+
+    def test_answer_latency_is_recorded(self, monkeypatch):
+        """Test that answering a pre-checkout query records latency and SLO outcome."""
+        service = TelegramBotService()
+        monkeypatch.setattr(service, "_payment_status", lambda payment_id: "pending")
+        answers = []
+
+        async def answer(ok, error_message=None):
+            answers.append(ok)
+
+        query = SimpleNamespace(invoice_payload="pay-1_user-1", answer=answer)
+        before = metrics.snapshot()["counters"].get("telegram_pre_checkout_answers{slo=met}", 0)
+
+        asyncio.run(service.pre_checkout_callback(SimpleNamespace(pre_checkout_query=query), None))
+
+        snapshot = metrics.snapshot()
+        assert answers == [True]
+        assert snapshot["counters"]["telegram_pre_checkout_answers{slo=met}"] == before + 1
+        assert snapshot["histograms"]["telegram_pre_checkout_answer_ms{ok=True}"]["count"] >= 1
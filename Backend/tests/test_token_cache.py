@@ -0,0 +1,114 @@
+"""
+Tests for the verified-token cache, trusted token claims and token revocation.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Backend.app.core import security
+from Backend.app.core.config import settings
+from Backend.app.db.database import Base
+from Backend.app.models import chat  # noqa: F401  (resolves User.conversations)
+from Backend.app.models.user import User, UserTokenVersion
+from Backend.app.services.token_cache import VerifiedTokenCache, revoke_user_tokens, token_versions
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [User.__table__, UserTokenVersion.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    token_versions.clear()
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    token_versions.clear()
+    Base.metadata.drop_all(bind=engine, tables=tables)
+
+
+@pytest.fixture
+def user(session_factory):
+    db = session_factory()
+    user = User(email="student@example.com", subscription_tier="pro", is_active=True, is_email_verified=True)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    return user
+
+
+def bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+class TestVerifiedTokenCache:
+    """Tests for skipping re-verification of known tokens."""
+
+    def test_repeated_decode_verifies_once(self, monkeypatch):
+        """Test that a token is verified once, while a tampered one is still rejected."""
+        monkeypatch.setattr(security, "verified_tokens", VerifiedTokenCache(max_size=8))
+        calls = []
+        real_decode = security.jwt.decode
+        monkeypatch.setattr(security.jwt, "decode", lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+
+        token = security.create_access_token({"sub": "a"})
+        assert security.decode_token(token)["sub"] == "a"
+        assert security.decode_token(token)["sub"] == "a"
+        assert len(calls) == 1
+
+        with pytest.raises(HTTPException) as exc:
+            security.decode_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+        assert exc.value.status_code == 401
+
+    def test_expired_entries_and_size_bound(self):
+        """Test that entries expire with the token and the oldest are evicted."""
+        cache = VerifiedTokenCache(max_size=2)
+        cache.put("expired", {"sub": "x", "exp": time.time() - 1})
+        assert cache.get("expired") is None
+
+        for name in ("a", "b", "c"):
+            cache.put(name, {"sub": name, "exp": time.time() + 60})
+        assert len(cache) == 2
+        assert cache.get("a") is None and cache.get("c")["sub"] == "c"
+
+
+class TestTrustedClaims:
+    """Tests for get_current_principal and revocation by token version."""
+
+    def test_trusted_mode_skips_user_lookup(self, session_factory, user, monkeypatch):
+        """Test that trusted claims authenticate without reading the users table."""
+        monkeypatch.setattr(settings, "TRUSTED_TOKEN_CLAIMS", True)
+        token = security.create_user_token(user, 0)
+        db = session_factory()
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+        principal = asyncio.run(security.get_current_principal(bearer(token), db))
+        principal_again = asyncio.run(security.get_current_principal(bearer(token), db))
+
+        assert principal == principal_again
+        assert principal.id == user.id and principal.subscription_tier == "pro"
+        assert not any("FROM users" in sql for sql in statements)
+        assert len(statements) == 1  # Token version, then cached
+        db.close()
+
+    def test_revocation_rejects_old_tokens(self, session_factory, user, monkeypatch):
+        """Test that bumping the token version rejects earlier tokens in both modes."""
+        old_token = security.create_user_token(user, 0)
+        db = session_factory()
+        assert revoke_user_tokens(db, user.id) == 1
+        assert revoke_user_tokens(db, user.id) == 2
+
+        for trusted in (True, False):
+            monkeypatch.setattr(settings, "TRUSTED_TOKEN_CLAIMS", trusted)
+            with pytest.raises(HTTPException) as exc:
+                asyncio.run(security.get_current_principal(bearer(old_token), db))
+            assert exc.value.status_code == 401
+
+        new_token = security.create_user_token(user, 2)
+        assert asyncio.run(security.get_current_user(bearer(new_token), db)).id == user.id
+        db.close()
@@ -0,0 +1,196 @@
+"""
+Tests for per-message usage capture, daily rollups and the admin usage endpoint.
+"""
+import asyncio
+import uuid
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from langchain_core.messages import AIMessageChunk
+from qdrant_client import models
+from qdrant_client.http.models import QueryResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Backend.app.api.endpoints.admin import get_message_usage, get_usage
+from Backend.app.core.config import settings
+from Backend.app.db.database import Base
+from Backend.app.models import chat as chat_models  # registers the messages table referenced by message_usage
+from Backend.app.models.usage import MessageUsage, UsageDaily
+from Backend.app.models.user import User
+from Backend.app.services.llm_router import LLMRouter
+from Backend.app.services.rag_service import RAGService
+from Backend.app.services.reranker import RerankResult, RerankResults
+from Backend.app.services.usage_service import UsageAggregator, UsageRecord, save_message_usage
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    # SQLite does not enforce the message_usage -> messages foreign key
+    tables = [User.__table__, MessageUsage.__table__, UsageDaily.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine, tables=tables)
+
+
+@pytest.fixture
+def users(session_factory):
+    db = session_factory()
+    rows = [User(email=f"student{i}@example.com") for i in range(2)]
+    db.add_all(rows)
+    db.commit()
+    ids = [row.id for row in rows]
+    db.close()
+    return ids
+
+
+def record(prompt=100, completion=20, total_ms=1500.0):
+    usage = UsageRecord(model="gemini-3-flash-preview", prompt_tokens=prompt, completion_tokens=completion)
+    usage.add_latency("total", total_ms)
+    return usage
+
+
+class TestUsageRollups:
+    """Tests for the batched per-user/day aggregator."""
+
+    def test_flush_upserts_increments(self, session_factory, users):
+        """Test that buffered answers are folded per user/day and added onto existing rows."""
+        aggregator = UsageAggregator(session_factory)
+        day = date(2026, 3, 2)
+        aggregator.add(users[0], record(), day)
+        aggregator.add(users[0], record(prompt=50), day)
+        aggregator.add(users[1], record(), day)
+        assert aggregator.flush() == 2
+        assert aggregator.pending() == 0
+
+        aggregator.add(users[0], record(completion=5), day)
+        aggregator.flush()
+
+        db = session_factory()
+        row = db.query(UsageDaily).filter(UsageDaily.user_id == users[0]).one()
+        assert (row.messages, row.prompt_tokens, row.completion_tokens) == (3, 250, 45)
+        assert row.generation_ms == pytest.approx(4500.0)
+        db.close()
+
+    def test_failed_flush_keeps_buffer(self, users):
+        """Test that a database error puts the increments back for the next flush."""
+        broken = MagicMock()
+        broken.return_value.execute.side_effect = RuntimeError("db down")
+        aggregator = UsageAggregator(broken)
+        aggregator.add(users[0], record(), date(2026, 3, 2))
+        assert aggregator.flush() == 0
+        assert aggregator.pending() == 1
+
+    def test_full_buffer_wakes_flush_task(self, session_factory, users):
+        """Test that a full buffer is flushed by the background task, not inside add()."""
+        aggregator = UsageAggregator(session_factory)
+
+        async def scenario():
+            aggregator.start()
+            try:
+                with patch.object(settings, "USAGE_FLUSH_MAX_KEYS", 2):
+                    aggregator.add(users[0], record(), date(2026, 3, 1))
+                    aggregator.add(users[0], record(), date(2026, 3, 2))
+                    # Nothing was written on the event loop
+                    assert aggregator.pending() == 2
+                    for _ in range(100):
+                        await asyncio.sleep(0.01)
+                        if aggregator.pending() == 0:
+                            break
+                assert aggregator.pending() == 0
+            finally:
+                await aggregator.stop()
+
+        asyncio.run(scenario())
+        db = session_factory()
+        assert db.query(UsageDaily).filter(UsageDaily.user_id == users[0]).count() == 2
+        db.close()
+
+
+class TestAdminUsage:
+    """Tests for the admin usage endpoints."""
+
+    def test_group_by_day_and_user(self, session_factory, users):
+        """Test that rollups are aggregated per day and per user, heaviest users first."""
+        aggregator = UsageAggregator(session_factory)
+        aggregator.add(users[0], record(), date(2026, 3, 1))
+        aggregator.add(users[0], record(), date(2026, 3, 2))
+        aggregator.add(users[1], record(prompt=1000), date(2026, 3, 2))
+        aggregator.flush()
+
+        db = session_factory()
+        by_day = get_usage(date(2026, 3, 1), date(2026, 3, 31), None, "day", 100, db, None)
+        assert [(r.day, r.messages, r.prompt_tokens) for r in by_day] == [
+            (date(2026, 3, 1), 1, 100), (date(2026, 3, 2), 2, 1100)
+        ]
+        by_user = get_usage(date(2026, 3, 1), date(2026, 3, 31), None, "user", 100, db, None)
+        assert [r.user_id for r in by_user] == [users[1], users[0]]
+        assert by_user[1].avg_generation_ms == 1500.0
+
+        with pytest.raises(HTTPException):
+            get_usage(date(2026, 3, 2), date(2026, 3, 1), None, "day", 100, db, None)
+        db.close()
+
+    def test_message_usage(self, session_factory, users):
+        """Test that usage saved with an assistant message can be looked up by message id."""
+        db = session_factory()
+        message_id = uuid.uuid4()
+        usage = record()
+        usage.embedding_tokens, usage.rerank_tokens = 8, 300
+        save_message_usage(db, message_id, users[0], usage)
+        db.commit()
+
+        stored = get_message_usage(message_id, db, None)
+        assert (stored.prompt_tokens, stored.embedding_tokens, stored.rerank_tokens) == (100, 8, 300)
+        assert stored.latencies_ms == {"total": 1500.0}
+        with pytest.raises(HTTPException):
+            get_message_usage(uuid.uuid4(), db, None)
+        db.close()
+
+
+class TestUsageCapture:
+    """Tests for collecting provider usage across the RAG pipeline."""
+
+    def test_answer_collects_all_stages(self):
+        """Test that embedding, rerank and LLM tokens plus stage latencies end up in the record."""
+        with patch.object(RAGService, "connect_qdrant"), \
+                patch.object(RAGService, "bootstrap_collection"), \
+                patch.object(RAGService, "init_lexical_fallback"), \
+                patch.object(RAGService, "init_models"):
+            service = RAGService()
+        try:
+            service.refresh_alias_target = MagicMock()
+            service.dense_model = MagicMock(model="voyage-3.5", truncation=True, output_dimension=4)
+            service.dense_model._is_context_model.return_value = False
+            service.dense_model._client.embed.return_value = SimpleNamespace(embeddings=[[0.1] * 4], total_tokens=9)
+            service.sparse_query = MagicMock(return_value=([1], [1.0]))
+            service.query_hybrid = MagicMock(return_value=QueryResponse(points=[models.ScoredPoint(
+                id=1, version=0, score=1.0,
+                payload={"page_content": "Абылай хан", "metadata": {"discipline": "Тарих", "pages": [1]}}
+            )]))
+            service.reranker = MagicMock()
+            service.reranker.rerank.return_value = RerankResults([RerankResult(0, 0.9)], total_tokens=120)
+            llm = MagicMock()
+            llm.stream.return_value = iter([
+                AIMessageChunk(content="Абылай", usage_metadata={"input_tokens": 900, "output_tokens": 1, "total_tokens": 901}),
+                AIMessageChunk(content=" хан", usage_metadata={"input_tokens": 0, "output_tokens": 2, "total_tokens": 2}),
+            ])
+            service.llm_router = LLMRouter(service.create_guard, clients={settings.LLM_DEFAULT_MODEL: llm})
+
+            usage = UsageRecord()
+            answer = "".join(service.stream_chat_with_context(
+                [{"role": "user", "content": "Сәлем"}], "Абылай хан кім?", usage=usage
+            ))
+        finally:
+            service.close()
+
+        assert answer == "Абылай хан"
+        assert (usage.embedding_tokens, usage.rerank_tokens) == (9, 120)
+        assert (usage.prompt_tokens, usage.completion_tokens) == (900, 3)
+        assert usage.model == settings.LLM_DEFAULT_MODEL
+        assert {"embed", "rerank", "retrieval", "first_token", "generation", "total"} <= set(usage.latencies_ms)